@@ -2,6 +2,9 @@ from fastapi import Depends, HTTPException
 from app.services.trading_service import TradingService
 from app.services.portfolio_service import PortfolioService
 from app.services.price_service import PriceService
+from app.services.ledger_replay import LedgerReplayService
+from app.services.order_service import OrderService
+from app.services.performance import PerformanceService
 
 def get_trading_service() -> TradingService:
     return TradingService()
@@ -11,3 +14,12 @@ def get_portfolio_service() -> PortfolioService:
 
 def get_price_service() -> PriceService:
     return PriceService()
+
+def get_ledger_replay_service() -> LedgerReplayService:
+    return LedgerReplayService()
+
+def get_order_service() -> OrderService:
+    return OrderService()
+
+def get_performance_service() -> PerformanceService:
+    return PerformanceService()
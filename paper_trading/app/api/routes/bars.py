@@ -0,0 +1,46 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from datetime import datetime, timezone
+from typing import Optional
+import numpy as np
+from app.models.bar import Bar, BarIngest, BarIngestResponse, BarSeries
+from app.services.bar_store import BAR_COLUMNS, Bars, bar_store, to_ns
+from app.services.performance import invalidate_symbol_history
+
+router = APIRouter()
+
+@router.post("/bars/{symbol}", response_model=BarIngestResponse)
+async def ingest_bars(symbol: str, ingest: BarIngest):
+    """Append bars to the local bar store"""
+    columns = {name: [getattr(bar, name) for bar in ingest.bars] for name in BAR_COLUMNS}
+    columns["timestamp"] = [to_ns(timestamp) for timestamp in columns["timestamp"]]
+    try:
+        total = await run_in_threadpool(bar_store.append, symbol, Bars(**columns))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Cached daily values may have marked these days without the new bars
+    first_day = min(bar.timestamp for bar in ingest.bars)
+    first_day = (first_day if first_day.tzinfo is None else first_day.astimezone(timezone.utc)).date()
+    await run_in_threadpool(invalidate_symbol_history, symbol, first_day)
+    return BarIngestResponse(symbol=symbol.upper(), appended=len(ingest.bars), total=total)
+
+@router.get("/bars/{symbol}", response_model=BarSeries)
+async def get_bars(
+    symbol: str,
+    start: Optional[datetime] = Query(None, description="First bar time (inclusive)"),
+    end: Optional[datetime] = Query(None, description="Last bar time (exclusive)"),
+    limit: int = Query(1000, ge=1, le=100000, description="Most recent bars returned within the window")
+):
+    """Read stored bars for a time window"""
+    try:
+        bars = bar_store.read(symbol, start, end)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    bars = bars[max(0, len(bars) - limit):]
+    timestamps = bars.timestamp.astype("datetime64[ns]").astype("datetime64[us]").astype(datetime)
+    return BarSeries(symbol=symbol.upper(), bars=[
+        Bar(timestamp=timestamp.replace(tzinfo=timezone.utc), open=o, high=h, low=l, close=c, volume=v)
+        for timestamp, o, h, l, c, v in zip(
+            timestamps, *(np.asarray(getattr(bars, name)).tolist() for name in BAR_COLUMNS[1:])
+        )
+    ])
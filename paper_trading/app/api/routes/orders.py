@@ -0,0 +1,56 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from typing import Literal, Optional
+from app.models.order import OrderCreate, OrderResponse, OrderList
+from app.services.order_service import OrderService
+from app.api.dependencies import get_order_service
+
+router = APIRouter()
+
+@router.post("/orders/", response_model=OrderResponse)
+async def submit_order(
+    order: OrderCreate,
+    order_service: OrderService = Depends(get_order_service)
+):
+    """Submit a limit, stop or stop-limit order"""
+    try:
+        return await run_in_threadpool(order_service.submit_order, order)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/orders/", response_model=OrderList)
+async def list_orders(
+    portfolio_id: str = Query("default", description="Portfolio ID"),
+    status: Optional[Literal["OPEN", "FILLED", "CANCELLED", "EXPIRED", "REJECTED"]] = Query(None, description="Only orders with this status"),
+    limit: int = Query(100, ge=1, le=1000, description="Most recent orders to return"),
+    order_service: OrderService = Depends(get_order_service)
+):
+    """List orders, most recent first"""
+    try:
+        orders = await run_in_threadpool(order_service.list_orders, portfolio_id, status, limit)
+        return OrderList(orders=orders)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/orders/{order_id}", response_model=OrderResponse)
+async def get_order(
+    order_id: int,
+    order_service: OrderService = Depends(get_order_service)
+):
+    """Get a specific order"""
+    return await run_in_threadpool(order_service.get_order, order_id)
+
+@router.delete("/orders/{order_id}", response_model=OrderResponse)
+async def cancel_order(
+    order_id: int,
+    order_service: OrderService = Depends(get_order_service)
+):
+    """Cancel a resting order"""
+    try:
+        return await run_in_threadpool(order_service.cancel_order, order_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
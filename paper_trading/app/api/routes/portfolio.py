@@ -1,7 +1,28 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from app.models.portfolio import PortfolioResponse, PortfolioPnL, CashBalanceUpdate
+from datetime import date
+from typing import List, Optional
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from app.models.portfolio import (
+    PortfolioResponse,
+    PortfolioPnL,
+    CashBalanceUpdate,
+    BulkPnLRequest,
+    BulkPortfolioPnL,
+    CostBasisUpdate,
+    PortfolioSnapshot,
+    RealizedPnLEntry,
+    SnapshotTotals
+)
+from app.models.ledger import PortfolioReplay
+from app.models.performance import EquityCurve, PerformanceSummary
+from app.core.config import settings
+from app.services.pnl_stream import pnl_hub, sse_events
 from app.services.portfolio_service import PortfolioService
-from app.api.dependencies import get_portfolio_service
+from app.services.ledger_replay import LedgerReplayService
+from app.services.performance import PerformanceService
+from app.api.dependencies import get_portfolio_service, get_ledger_replay_service, get_performance_service
+from app.api.streaming import closing_streaming_response
 
 router = APIRouter()
 
@@ -12,7 +33,7 @@ async def get_portfolio(
 ):
     """Get portfolio overview"""
     try:
-        return portfolio_service.get_portfolio(portfolio_id)
+        return await portfolio_service.get_portfolio_async(portfolio_id)
     except Exception as e:
         raise HTTPException(status_code=404, detail=str(e))
 
@@ -23,7 +44,59 @@ async def get_portfolio_pnl(
 ):
     """Get portfolio P&L with current market prices"""
     try:
-        return portfolio_service.get_portfolio_pnl(portfolio_id)
+        return await portfolio_service.get_portfolio_pnl_async(portfolio_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/portfolio/pnl/stream")
+async def stream_portfolio_pnl(
+    portfolio_id: str = Query("default", description="Portfolio ID")
+):
+    """Server-sent events: a P&L snapshot, then position deltas as prices tick or trades execute"""
+    try:
+        subscriber = await pnl_hub.subscribe(portfolio_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return StreamingResponse(
+        sse_events(pnl_hub, subscriber, settings.pnl_stream_heartbeat),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/portfolio/pnl/bulk", response_model=BulkPortfolioPnL)
+async def get_bulk_portfolio_pnl(
+    request: BulkPnLRequest,
+    stream: bool = Query(False, description="Stream one NDJSON line per portfolio"),
+    portfolio_service: PortfolioService = Depends(get_portfolio_service)
+):
+    """Get P&L for many portfolios (or all of them) plus firm-wide totals.
+
+    With stream=true portfolios are read, quoted and sent a chunk at a time.
+    """
+    if stream:
+        return closing_streaming_response(portfolio_service.stream_bulk_portfolio_pnl(request.portfolio_ids),
+                                          media_type="application/x-ndjson")
+    try:
+        bulk = await portfolio_service.get_bulk_portfolio_pnl_async(request.portfolio_ids)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return bulk.to_response()
+
+@router.get("/portfolio/ledger/check", response_model=PortfolioReplay)
+async def check_ledger(
+    portfolio_id: str = Query("default", description="Portfolio ID"),
+    ledger_service: LedgerReplayService = Depends(get_ledger_replay_service)
+):
+    """Replay new trades from the ledger and report positions or cash that diverge; writes nothing"""
+    try:
+        return await run_in_threadpool(ledger_service.replay_portfolio, portfolio_id, checkpoint=False)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -35,6 +108,97 @@ async def update_cash_balance(
 ):
     """Update portfolio cash balance"""
     try:
-        return portfolio_service.update_cash_balance(portfolio_id, cash_update.cash_balance)
+        return await portfolio_service.update_cash_balance_async(portfolio_id, cash_update.cash_balance)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.put("/portfolio/cost-basis", response_model=PortfolioResponse)
+async def set_cost_basis_method(
+    update: CostBasisUpdate,
+    portfolio_id: str = Query("default", description="Portfolio ID"),
+    portfolio_service: PortfolioService = Depends(get_portfolio_service)
+):
+    """Choose AVERAGE, FIFO or LIFO cost basis; only while the portfolio holds no positions"""
+    try:
+        return await run_in_threadpool(portfolio_service.set_cost_basis_method, portfolio_id, update.method)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/portfolio/realized", response_model=List[RealizedPnLEntry])
+async def get_realized_pnl(
+    portfolio_id: str = Query("default", description="Portfolio ID"),
+    symbol: Optional[str] = Query(None, description="Only sells of this symbol"),
+    limit: int = Query(100, ge=1, le=1000, description="Most recent sells to return"),
+    portfolio_service: PortfolioService = Depends(get_portfolio_service)
+):
+    """Realized P&L ledger: what each sell realized against the cost basis it released"""
+    try:
+        return await run_in_threadpool(portfolio_service.get_realized_pnl, portfolio_id,
+                                       symbol.upper() if symbol else None, limit)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/portfolio/performance", response_model=PerformanceSummary)
+async def get_performance(
+    portfolio_id: str = Query("default", description="Portfolio ID"),
+    start: Optional[date] = Query(None, description="First day (default: the first trade day)"),
+    end: Optional[date] = Query(None, description="Last day (default: today)"),
+    performance_service: PerformanceService = Depends(get_performance_service)
+):
+    """Return, volatility, max drawdown, Sharpe and Sortino of the daily equity curve"""
+    try:
+        return await run_in_threadpool(performance_service.get_performance, portfolio_id, start, end)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/portfolio/performance/equity", response_model=EquityCurve)
+async def get_equity_curve(
+    portfolio_id: str = Query("default", description="Portfolio ID"),
+    start: Optional[date] = Query(None, description="First day (default: the first trade day)"),
+    end: Optional[date] = Query(None, description="Last day (default: today)"),
+    performance_service: PerformanceService = Depends(get_performance_service)
+):
+    """End-of-day cash, market value and equity, rebuilt from the ledger and historical closes"""
+    try:
+        return await run_in_threadpool(performance_service.get_equity_curve, portfolio_id, start, end)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/portfolio/snapshots", response_model=List[PortfolioSnapshot])
+async def get_snapshots(
+    portfolio_id: str = Query("default", description="Portfolio ID"),
+    start: Optional[date] = Query(None, description="First day"),
+    end: Optional[date] = Query(None, description="Last day"),
+    intraday: bool = Query(False, description="Include intraday snapshots"),
+    limit: int = Query(1000, ge=1, le=10000, description="Most recent snapshots to return"),
+    portfolio_service: PortfolioService = Depends(get_portfolio_service)
+):
+    """Stored snapshots written by the rollup job, newest first"""
+    try:
+        return await run_in_threadpool(portfolio_service.get_snapshots, portfolio_id, start, end, intraday, limit)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/portfolio/snapshots/totals", response_model=List[SnapshotTotals])
+async def get_snapshot_totals(
+    start: Optional[date] = Query(None, description="First day"),
+    end: Optional[date] = Query(None, description="Last day"),
+    portfolio_service: PortfolioService = Depends(get_portfolio_service)
+):
+    """End-of-day cash, positions value, P&L and total value summed across all portfolios"""
+    try:
+        return await run_in_threadpool(portfolio_service.get_snapshot_totals, start, end)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
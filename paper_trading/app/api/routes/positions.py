@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 from app.models.position import PositionResponse, PriceResponse, BulkPriceRequest, BulkPriceResponse
 from app.services.portfolio_service import PortfolioService
@@ -15,7 +15,7 @@ async def get_positions(
 ):
     """Get all current positions"""
     try:
-        return portfolio_service.get_positions(portfolio_id)
+        return await portfolio_service.get_positions_async(portfolio_id)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -27,7 +27,7 @@ async def get_position(
 ):
     """Get specific position by symbol"""
     try:
-        position = portfolio_service.get_position_by_symbol(symbol, portfolio_id)
+        position = await portfolio_service.get_position_by_symbol_async(symbol, portfolio_id)
         if not position:
             raise HTTPException(status_code=404, detail=f"Position not found for symbol: {symbol}")
         return position
@@ -42,7 +42,7 @@ async def close_position(
 ):
     """Close entire position for a symbol"""
     try:
-        success = portfolio_service.close_position(symbol, portfolio_id)
+        success = await portfolio_service.close_position_async(symbol, portfolio_id)
         if not success:
             raise HTTPException(status_code=404, detail=f"Position not found or could not be closed: {symbol}")
         return {"message": f"Position for {symbol} closed successfully"}
@@ -52,11 +52,12 @@ async def close_position(
 @router.get("/prices/{symbol}", response_model=PriceResponse)
 async def get_price(
     symbol: str,
+    max_age: Optional[float] = Query(None, ge=0, description="Maximum age of a cached quote in seconds"),
     price_service: PriceService = Depends(get_price_service)
 ):
     """Get current price for a symbol"""
     try:
-        price = price_service.get_current_price(symbol)
+        price = await price_service.get_current_price_async(symbol, max_age)
         return PriceResponse(symbol=symbol, price=price, timestamp=datetime.now())
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -64,11 +65,12 @@ async def get_price(
 @router.post("/prices/bulk", response_model=BulkPriceResponse)
 async def get_bulk_prices(
     request: BulkPriceRequest,
+    max_age: Optional[float] = Query(None, ge=0, description="Maximum age of cached quotes in seconds"),
     price_service: PriceService = Depends(get_price_service)
 ):
     """Get current prices for multiple symbols"""
     try:
-        prices = price_service.get_multiple_prices(request.symbols)
-        return BulkPriceResponse(prices=prices, timestamp=datetime.now())
+        quotes = await price_service.get_quotes_async(request.symbols, max_age)
+        return BulkPriceResponse(prices=quotes.prices, failed=quotes.failures, timestamp=datetime.now())
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -1,8 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from typing import Optional
-from app.models.trade import TradeCreate, TradeResponse, TradeHistory
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from datetime import datetime
+from typing import Literal, Optional
+from app.models.trade import (
+    TradeCreate, TradeResponse, TradeHistory, TradeBatchCreate, TradeBatchResponse,
+    TradeImportResponse
+)
 from app.services.trading_service import TradingService
+from app.services.trade_export import EXPORT_FORMATS, arrow_available
 from app.api.dependencies import get_trading_service
+from app.api.streaming import closing_streaming_response
+from app.core.config import settings
 from app.core.exceptions import TradeNotFoundException
 
 router = APIRouter()
@@ -14,31 +22,97 @@ async def place_trade(
 ):
     """Place a new trade"""
     try:
-        return trading_service.place_trade(trade)
+        return await trading_service.place_trade_async(trade)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/trades/batch", response_model=TradeBatchResponse)
+async def place_trades_batch(
+    batch: TradeBatchCreate,
+    trading_service: TradingService = Depends(get_trading_service)
+):
+    """Execute many trades in a single transaction"""
+    try:
+        result = await run_in_threadpool(trading_service.place_trades_batch, batch.trades, batch.atomic)
+        return TradeBatchResponse(**result)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/trades/import", response_model=TradeImportResponse)
+async def import_trades(
+    file: UploadFile = File(..., description="CSV (with header) or Parquet trade file"),
+    format: Optional[Literal["csv", "parquet"]] = Query(None, description="File format; inferred from the file name if omitted"),
+    portfolio_id: str = Query("default", description="Portfolio for rows without a portfolio_id"),
+    trading_service: TradingService = Depends(get_trading_service)
+):
+    """Bulk-load historical fills with COPY and rebuild positions and cash"""
+    fmt = format or ("parquet" if (file.filename or "").lower().endswith(".parquet") else "csv")
+    if file.size is not None and file.size > settings.import_max_bytes:
+        raise HTTPException(status_code=413, detail=f"Import file exceeds {settings.import_max_bytes} bytes")
+    try:
+        result = await run_in_threadpool(trading_service.import_trades, file.file, fmt, portfolio_id)
+        return TradeImportResponse(**result)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/trades/", response_model=TradeHistory)
 async def get_trade_history(
     portfolio_id: str = Query("default", description="Portfolio ID"),
-    page: int = Query(1, ge=1, description="Page number"),
+    page: int = Query(1, ge=1, description="Page number (ignored when a cursor is given)"),
     page_size: int = Query(50, ge=1, le=100, description="Items per page"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    symbol: Optional[str] = Query(None, description="Only trades in this symbol"),
+    trade_type: Optional[Literal["BUY", "SELL"]] = Query(None, description="Only BUY or SELL trades"),
+    start_date: Optional[datetime] = Query(None, description="Trades on or after this time"),
+    end_date: Optional[datetime] = Query(None, description="Trades before this time"),
+    count: Literal["exact", "estimate", "none"] = Query("estimate", description="How to compute total_count"),
     trading_service: TradingService = Depends(get_trading_service)
 ):
-    """Get trade history with pagination"""
+    """Get trade history, newest first, paginated by cursor"""
     try:
-        history_data = trading_service.get_trade_history(portfolio_id, page, page_size)
+        history_data = await trading_service.get_trade_history_async(
+            portfolio_id, page, page_size, cursor=cursor, symbol=symbol, trade_type=trade_type,
+            start_date=start_date, end_date=end_date, count=count
+        )
         return TradeHistory(**history_data)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@router.get("/trades/export")
+async def export_trades(
+    format: Literal["ndjson", "csv", "arrow"] = Query("ndjson", description="Output format"),
+    portfolio_id: str = Query("default", description="Portfolio ID"),
+    symbol: Optional[str] = Query(None, description="Only trades in this symbol"),
+    trade_type: Optional[Literal["BUY", "SELL"]] = Query(None, description="Only BUY or SELL trades"),
+    start_date: Optional[datetime] = Query(None, description="Trades on or after this time"),
+    end_date: Optional[datetime] = Query(None, description="Trades before this time"),
+    trading_service: TradingService = Depends(get_trading_service)
+):
+    """Stream every matching trade, oldest first, without pagination"""
+    if format == "arrow" and not arrow_available():
+        raise HTTPException(status_code=400, detail="Arrow export requires pyarrow to be installed")
+
+    media_type = EXPORT_FORMATS[format][0]
+    content = trading_service.export_trades(format, portfolio_id, symbol, trade_type, start_date, end_date)
+    return closing_streaming_response(
+        content,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="trades-{portfolio_id}.{format}"'}
+    )
+
 @router.get("/trades/{trade_id}", response_model=TradeResponse)
 async def get_trade(
     trade_id: int,
     trading_service: TradingService = Depends(get_trading_service)
 ):
     """Get specific trade by ID"""
-    trade = trading_service.get_trade_by_id(trade_id)
+    trade = await trading_service.get_trade_by_id_async(trade_id)
     if not trade:
         raise TradeNotFoundException(trade_id)
     return trade
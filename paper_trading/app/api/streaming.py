@@ -0,0 +1,14 @@
+from typing import Iterator
+from starlette.background import BackgroundTask
+from fastapi.responses import StreamingResponse
+
+def closing_streaming_response(content: Iterator, **kwargs) -> StreamingResponse:
+    """Stream a blocking generator, closing it in the threadpool once the response ends.
+
+    Starlette stops iterating when the client disconnects but leaves the
+    generator suspended, holding whatever it holds (a pooled connection and
+    an open server-side cursor) until it is garbage collected. The
+    response's background task runs after a disconnect as well as after
+    the last chunk, and closing an exhausted generator does nothing.
+    """
+    return StreamingResponse(content, background=BackgroundTask(content.close), **kwargs)
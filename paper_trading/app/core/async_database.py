@@ -0,0 +1,157 @@
+import asyncio
+import asyncpg
+import itertools
+import re
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+from app.core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+_PLACEHOLDER = re.compile(r"%(?:\((\w+)\))?(s|%)")
+
+@lru_cache(maxsize=512)
+def to_asyncpg_query(query: str) -> Tuple[str, Tuple[str, ...]]:
+    """Translate psycopg2-style placeholders to asyncpg's $1, $2, ...
+
+    Positional %s markers are numbered in order. Named %(name)s markers
+    get one number per distinct name; the returned names give the order in
+    which a params dict must be passed.
+    """
+    counter = itertools.count(1)
+    names: Dict[str, int] = {}
+
+    def replace(match):
+        name, kind = match.groups()
+        if kind == "%":
+            return "%"
+        if name is None:
+            return f"${next(counter)}"
+        if name not in names:
+            names[name] = next(counter)
+        return f"${names[name]}"
+
+    return _PLACEHOLDER.sub(replace, query), tuple(names)
+
+def _bind(query: str, params) -> Tuple[str, Sequence[Any]]:
+    sql, names = to_asyncpg_query(query)
+    if isinstance(params, dict):
+        return sql, [params[name] for name in names]
+    return sql, params
+
+class AsyncCursor:
+    """Cursor-like wrapper over an asyncpg connection.
+
+    Accepts the same %s-style queries as the psycopg2 cursors handed out by
+    DatabaseManager and returns rows as dicts, so async service methods can
+    mirror their synchronous counterparts.
+    """
+
+    def __init__(self, conn: asyncpg.Connection):
+        self._conn = conn
+        self._rows: List[Dict[str, Any]] = []
+        self._position = 0
+
+    async def execute(self, query: str, params: Union[Sequence[Any], Dict[str, Any]] = ()):
+        sql, args = _bind(query, params)
+        records = await self._conn.fetch(sql, *args)
+        self._rows = [dict(record) for record in records]
+        self._position = 0
+
+    async def executemany(self, query: str, params_seq: Sequence[Sequence[Any]]):
+        sql, _ = to_asyncpg_query(query)
+        await self._conn.executemany(sql, [_bind(query, params)[1] for params in params_seq])
+        self._rows = []
+        self._position = 0
+
+    def fetchone(self) -> Optional[Dict[str, Any]]:
+        if self._position >= len(self._rows):
+            return None
+        row = self._rows[self._position]
+        self._position += 1
+        return row
+
+    def fetchall(self) -> List[Dict[str, Any]]:
+        rows = self._rows[self._position:]
+        self._position = len(self._rows)
+        return rows
+
+class AsyncDatabaseManager:
+    """asyncpg-backed counterpart to DatabaseManager for the async request path"""
+
+    def __init__(self):
+        self.connection_params = {
+            'host': settings.db_host,
+            'database': settings.db_name,
+            'user': settings.db_user,
+            'password': settings.db_password,
+            'port': settings.db_port
+        }
+        self._pool: Optional[asyncpg.Pool] = None
+        self._pool_lock: Optional[asyncio.Lock] = None
+
+    async def connect(self) -> asyncpg.Pool:
+        """Create the connection pool if it does not exist yet"""
+        if self._pool is not None:
+            return self._pool
+
+        if self._pool_lock is None:
+            self._pool_lock = asyncio.Lock()
+        async with self._pool_lock:
+            if self._pool is None:
+                self._pool = await asyncpg.create_pool(
+                    **self.connection_params,
+                    min_size=settings.db_pool_min_size,
+                    max_size=settings.db_pool_max_size,
+                    max_inactive_connection_lifetime=settings.db_pool_max_idle,
+                )
+                logger.info("Async database pool created")
+        return self._pool
+
+    async def close(self):
+        """Close the connection pool"""
+        pool, self._pool = self._pool, None
+        if pool:
+            await pool.close()
+
+    def pool_stats(self) -> Optional[Dict]:
+        """Async pool size statistics, or None before the pool is created"""
+        if self._pool is None:
+            return None
+        return {
+            "size": self._pool.get_size(),
+            "idle": self._pool.get_idle_size(),
+            "min_size": self._pool.get_min_size(),
+            "max_size": self._pool.get_max_size(),
+        }
+
+    @asynccontextmanager
+    async def get_connection(self):
+        """Async context manager for pooled database connections"""
+        pool = await self.connect()
+        try:
+            async with pool.acquire(timeout=settings.db_pool_timeout) as conn:
+                yield conn
+        except Exception as e:
+            logger.error(f"Database error: {e}")
+            raise
+
+    @asynccontextmanager
+    async def get_cursor(self):
+        """Async context manager yielding (cursor, conn) inside a transaction"""
+        async with self.get_connection() as conn:
+            transaction = conn.transaction()
+            await transaction.start()
+            try:
+                yield AsyncCursor(conn), conn
+            except Exception as e:
+                await transaction.rollback()
+                logger.error(f"Database operation error: {e}")
+                raise
+            else:
+                await transaction.commit()
+
+# Global async database instance
+async_db_manager = AsyncDatabaseManager()
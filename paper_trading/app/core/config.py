@@ -9,11 +9,87 @@ class Settings(BaseSettings):
     db_user: str = "postgres"
     db_password: str = "your_password"
 
+    # Connection pool settings
+    db_pool_enabled: bool = True
+    db_pool_min_size: int = 1
+    db_pool_max_size: int = 10
+    db_pool_timeout: float = 30.0  # seconds to wait for a free connection
+    db_pool_max_idle: float = 300.0  # seconds before an idle connection is reaped
+    db_pool_health_check_interval: float = 30.0  # ping connections idle longer than this
+
     # API settings
     api_host: str = "0.0.0.0"
     api_port: int = 8000
     debug: bool = True
 
+    # Market data settings
+    price_provider: str = "yfinance"  # yfinance, bar_store, synthetic or replay
+    quote_max_workers: int = 16  # concurrent upstream fetches across all requests
+    quote_timeout: float = 10.0  # per-symbol (or per-chunk) fetch timeout in seconds
+    quote_batch_size: int = 100  # symbols per multi-ticker request
+    quote_cache_ttl: float = 5.0  # default max age of a cached quote in seconds
+    quote_cache_max_entries: int = 10000
+    quote_trade_max_age: float = 1.0  # trades demand fresher quotes than P&L views
+    bar_store_path: str = "data/bars"  # local bar store read by the bar_store provider
+
+    # Offline price providers
+    synthetic_seed: int = 42
+    synthetic_start_price: float = 100.0  # symbols start between 0.5x and 1.5x this
+    synthetic_volatility: float = 0.001  # per-quote log-return standard deviation
+    synthetic_latency: float = 0.0  # simulated upstream latency in seconds
+    replay_file_path: Optional[str] = None  # CSV/Parquet tape with symbol and price columns
+    replay_loop: bool = True  # wrap around at the end of a symbol's tape
+
+    # Background market data poller
+    market_data_poller_enabled: bool = False
+    market_data_min_interval: float = 1.0  # fastest poll rate for moving symbols
+    market_data_max_interval: float = 30.0  # slowest poll rate for unchanged symbols
+    market_data_max_backoff: float = 300.0  # retry ceiling for failing symbols
+    market_data_symbol_refresh_interval: float = 30.0  # how often held symbols are re-read
+    market_data_max_age: float = 60.0  # oldest polled price served without refetching
+
+    # Trade export
+    export_batch_size: int = 5000  # rows fetched per server-side cursor round trip
+
+    # Bulk P&L
+    bulk_pnl_batch_size: int = 5000  # position rows fetched per round trip when streaming
+
+    # Trade import
+    import_max_bytes: int = 512 * 1024 * 1024  # largest accepted upload
+    import_parquet_batch_size: int = 100_000  # Parquet rows converted per COPY
+
+    # Ledger replay
+    ledger_replay_chunk_size: int = 10_000  # trades streamed per server-side cursor fetch
+    ledger_replay_workers: int = 4  # portfolios replayed concurrently
+    ledger_replay_settle_seconds: float = 60.0  # newer trades are checked but not checkpointed
+    ledger_replay_tolerance: float = 0.01  # cash and position amounts within this of the replay agree
+
+    # Write-behind trade journal
+    trade_journal_enabled: bool = False  # acknowledge trades once journaled; write to Postgres in batches
+    trade_journal_dir: str = "data/journal"
+    trade_journal_flush_interval: float = 0.05  # seconds between batch writes to Postgres
+    trade_journal_id_block: int = 1000  # trade ids reserved from the sequence per round trip
+    portfolio_state_ttl: float = 30.0  # seconds cached cash and positions are trusted before reloading
+
+    # Live P&L
+    live_pnl_ttl: float = 60.0  # seconds a portfolio's incrementally maintained P&L is trusted before reloading
+
+    # Streaming P&L
+    pnl_stream_heartbeat: float = 15.0  # seconds between keep-alive comments on an idle stream
+
+    # Performance analytics
+    performance_risk_free_rate: float = 0.0  # annual rate Sharpe and Sortino are measured against
+    performance_settle_seconds: float = 300.0  # a day's value is cached once the day ended this long ago
+
+    # Portfolio snapshots
+    snapshot_rollup_enabled: bool = False  # snapshot every portfolio on a schedule
+    snapshot_eod_time: str = "21:00"  # UTC time of the daily end-of-day snapshot
+    snapshot_intraday_interval: Optional[float] = None  # seconds between intraday snapshots; None disables them
+    snapshot_batch_size: int = 1000  # portfolios written per transaction
+
+    # Backtesting
+    backtest_max_workers: Optional[int] = None  # sweep processes; defaults to the CPU count
+
     # Application settings
     default_cash_balance: float = 100000.00
     default_portfolio_id: str = "default"
@@ -1,11 +1,227 @@
 import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import PoolError
+from collections import deque
 from contextlib import contextmanager
+from typing import Dict, List, Optional
 from app.core.config import settings
+from app.core.migrations import MigrationRunner
 import logging
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+class PoolTimeoutError(PoolError):
+    """Raised when no pooled connection becomes free within the checkout timeout"""
+
+class ConnectionPool:
+    """Thread-safe pool of reusable psycopg2 connections"""
+
+    def __init__(self, connection_params: Dict, min_size: int = 1, max_size: int = 10,
+                 timeout: float = 30.0, max_idle: float = 300.0,
+                 health_check_interval: float = 30.0):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"Invalid pool size: min={min_size}, max={max_size}")
+
+        self.connection_params = connection_params
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.health_check_interval = health_check_interval
+
+        # Idle connections as (conn, released_at); most recently used on the right
+        self._idle = deque()
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+        self._checkouts = 0
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+        self._exhausted = 0
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+        self._reaped = 0
+        self._health_check_failures = 0
+
+    def warm(self):
+        """Open connections up to the configured minimum size"""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                conn = self._connect()
+            except Exception:
+                self._forget()
+                raise
+            self.putconn(conn)
+
+    def getconn(self):
+        """Check out a healthy connection, waiting up to the pool timeout"""
+        start = time.monotonic()
+        deadline = start + self.timeout
+        counted_exhaustion = False
+
+        while True:
+            conn = None
+            released_at = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolError("Connection pool is closed")
+                    if self._idle:
+                        conn, released_at = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+
+                    if not counted_exhaustion:
+                        self._exhausted += 1
+                        counted_exhaustion = True
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeoutError(
+                            f"No database connection available after {self.timeout:.1f}s "
+                            f"(max_size={self.max_size})"
+                        )
+                    self._cond.wait(remaining)
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    self._forget()
+                    raise
+            elif not self._is_healthy(conn, released_at):
+                with self._cond:
+                    self._health_check_failures += 1
+                self._discard(conn)
+                continue
+
+            waited = time.monotonic() - start
+            with self._cond:
+                self._checkouts += 1
+                self._wait_time += waited
+                self._max_wait_time = max(self._max_wait_time, waited)
+            return conn
+
+    def putconn(self, conn):
+        """Return a connection to the pool, discarding it if it is no longer usable"""
+        if conn.closed or self._closed:
+            self._discard(conn)
+            return
+
+        status = conn.get_transaction_status()
+        if status == TRANSACTION_STATUS_UNKNOWN:
+            self._discard(conn)
+            return
+        if status != TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except Exception:
+                self._discard(conn)
+                return
+
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+        self.reap()
+
+    def reap(self):
+        """Close connections idle longer than max_idle, keeping at least min_size open"""
+        expired = []
+        now = time.monotonic()
+        with self._cond:
+            while (self._idle and self._size > self.min_size
+                   and now - self._idle[0][1] > self.max_idle):
+                conn, _ = self._idle.popleft()
+                self._size -= 1
+                self._reaped += 1
+                expired.append(conn)
+
+        for conn in expired:
+            self._close_quietly(conn)
+
+    def close(self):
+        """Close all idle connections; checked-out connections are closed on return"""
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+
+        for conn in idle:
+            self._close_quietly(conn)
+
+    def stats(self) -> Dict:
+        """Snapshot of pool usage counters"""
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                "size": self._size,
+                "idle": idle,
+                "in_use": self._size - idle,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "checkouts": self._checkouts,
+                "total_wait_time": self._wait_time,
+                "avg_wait_time": self._wait_time / self._checkouts if self._checkouts else 0.0,
+                "max_wait_time": self._max_wait_time,
+                "exhausted": self._exhausted,
+                "timeouts": self._timeouts,
+                "created": self._created,
+                "discarded": self._discarded,
+                "reaped": self._reaped,
+                "health_check_failures": self._health_check_failures,
+            }
+
+    def _connect(self):
+        conn = psycopg2.connect(**self.connection_params)
+        with self._cond:
+            self._created += 1
+        return conn
+
+    def _is_healthy(self, conn, released_at: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - released_at < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception as e:
+            logger.warning(f"Discarding unhealthy pooled connection: {e}")
+            return False
+
+    def _discard(self, conn):
+        self._close_quietly(conn)
+        with self._cond:
+            self._discarded += 1
+        self._forget()
+
+    def _forget(self):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
 class DatabaseManager:
     def __init__(self):
         self.connection_params = {
@@ -15,22 +231,58 @@ class DatabaseManager:
             'password': settings.db_password,
             'port': settings.db_port
         }
+        self._pool: Optional[ConnectionPool] = None
+        self._pool_lock = threading.Lock()
+
+    @property
+    def pool(self) -> Optional[ConnectionPool]:
+        """Connection pool, created lazily so each worker process gets its own"""
+        if not settings.db_pool_enabled:
+            return None
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ConnectionPool(
+                        self.connection_params,
+                        min_size=settings.db_pool_min_size,
+                        max_size=settings.db_pool_max_size,
+                        timeout=settings.db_pool_timeout,
+                        max_idle=settings.db_pool_max_idle,
+                        health_check_interval=settings.db_pool_health_check_interval,
+                    )
+        return self._pool
+
+    def close_pool(self):
+        """Close the connection pool, if one was opened"""
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool:
+            pool.close()
+
+    def pool_stats(self) -> Optional[Dict]:
+        """Connection pool statistics, or None when pooling is disabled"""
+        pool = self.pool
+        return pool.stats() if pool else None
 
     @contextmanager
     def get_connection(self):
         """Context manager for database connections"""
+        pool = self.pool
         conn = None
         try:
-            conn = psycopg2.connect(**self.connection_params)
+            conn = pool.getconn() if pool else psycopg2.connect(**self.connection_params)
             yield conn
         except Exception as e:
-            if conn:
+            if conn and not conn.closed:
                 conn.rollback()
             logger.error(f"Database error: {e}")
             raise
         finally:
             if conn:
-                conn.close()
+                if pool:
+                    pool.putconn(conn)
+                else:
+                    conn.close()
 
     @contextmanager
     def get_cursor(self, dict_cursor=True):
@@ -48,52 +300,12 @@ class DatabaseManager:
             finally:
                 cursor.close()
 
-    def init_database(self):
-        """Initialize database tables"""
-        create_tables_sql = """
-        -- Trades table
-        CREATE TABLE IF NOT EXISTS trades (
-            id SERIAL PRIMARY KEY,
-            symbol VARCHAR(10) NOT NULL,
-            trade_type VARCHAR(4) CHECK (trade_type IN ('BUY', 'SELL')),
-            quantity INTEGER NOT NULL,
-            price DECIMAL(10, 4) NOT NULL,
-            trade_date TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-            portfolio_id VARCHAR(50) DEFAULT 'default',
-            status VARCHAR(10) DEFAULT 'ACTIVE' CHECK (status IN ('ACTIVE', 'CLOSED'))
-        );
-
-        -- Positions table
-        CREATE TABLE IF NOT EXISTS positions (
-            id SERIAL PRIMARY KEY,
-            symbol VARCHAR(10) NOT NULL,
-            net_quantity INTEGER NOT NULL,
-            avg_price DECIMAL(10, 4) NOT NULL,
-            total_invested DECIMAL(15, 4) NOT NULL,
-            portfolio_id VARCHAR(50) DEFAULT 'default',
-            last_updated TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-            UNIQUE(symbol, portfolio_id)
-        );
-
-        -- Portfolio table
-        CREATE TABLE IF NOT EXISTS portfolio (
-            id SERIAL PRIMARY KEY,
-            portfolio_id VARCHAR(50) NOT NULL,
-            cash_balance DECIMAL(15, 4) DEFAULT 100000.00,
-            total_value DECIMAL(15, 4) DEFAULT 100000.00,
-            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-            UNIQUE(portfolio_id)
-        );
-
-        -- Insert default portfolio
-        INSERT INTO portfolio (portfolio_id, cash_balance, total_value)
-        VALUES ('default', %s, %s)
-        ON CONFLICT (portfolio_id) DO NOTHING;
-        """
-
-        with self.get_cursor() as (cursor, conn):
-            cursor.execute(create_tables_sql, (settings.default_cash_balance, settings.default_cash_balance))
+    def init_database(self) -> List[int]:
+        """Apply any pending schema migrations; a no-op when the schema is current"""
+        applied = MigrationRunner(self.connection_params).migrate()
+        if applied:
+            logger.info(f"Applied schema migrations: {applied}")
+        return applied
 
 # Global database instance
 db_manager = DatabaseManager()
@@ -0,0 +1,44 @@
+import threading
+from typing import Any, Callable, Dict, List
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Topics
+PRICE_TICK = "price_tick"  # payload: Dict[str, float] of symbol -> price
+# Cash or positions written outside the trade path (cash updates, imports, repairs)
+PORTFOLIO_CHANGED = "portfolio_changed"  # payload: List[str] of portfolio ids, or None for all
+PNL_CHANGED = "pnl_changed"  # payload: (portfolio_id, changed symbols or None after a reload)
+
+Handler = Callable[[Any], None]
+
+class EventBus:
+    """In-process publish/subscribe for synchronous handlers.
+
+    Handlers run on the publishing thread, in subscription order; one
+    failing handler is logged and does not stop the others.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._handlers: Dict[str, List[Handler]] = {}
+
+    def subscribe(self, topic: str, handler: Handler):
+        with self._lock:
+            # Copy on write, so publishing never holds the lock
+            self._handlers[topic] = self._handlers.get(topic, []) + [handler]
+
+    def unsubscribe(self, topic: str, handler: Handler):
+        with self._lock:
+            # Equality rather than identity, so a bound method unsubscribes itself
+            self._handlers[topic] = [h for h in self._handlers.get(topic, []) if h != handler]
+
+    def publish(self, topic: str, payload: Any):
+        for handler in self._handlers.get(topic, ()):
+            try:
+                handler(payload)
+            except Exception as e:
+                logger.error(f"Handler for {topic} failed: {e}")
+
+# Global event bus instance
+event_bus = EventBus()
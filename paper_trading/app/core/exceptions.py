@@ -23,3 +23,36 @@ class PortfolioNotFoundException(TradingException):
 class TradeNotFoundException(TradingException):
     def __init__(self, trade_id: int):
         super().__init__(detail=f"Trade not found: {trade_id}", status_code=404)
+
+class TradeBatchRejectedException(TradingException):
+    def __init__(self, errors: list):
+        super().__init__(
+            detail={"message": "Trade batch rejected", "rejected": errors},
+            status_code=400
+        )
+
+class TradeImportRejectedException(TradingException):
+    def __init__(self, reason: str, errors: list):
+        super().__init__(
+            detail={"message": f"Trade import rejected: {reason}", "rejected": errors},
+            status_code=400
+        )
+
+class InvalidCursorException(TradingException):
+    def __init__(self, detail: str = "Invalid pagination cursor"):
+        super().__init__(detail=detail, status_code=400)
+
+class OrderNotFoundException(TradingException):
+    def __init__(self, order_id: int):
+        super().__init__(detail=f"Order not found: {order_id}", status_code=404)
+
+class OrderNotOpenException(TradingException):
+    def __init__(self, order_id: int, status: str):
+        super().__init__(detail=f"Order {order_id} is already {status}", status_code=409)
+
+class CostBasisMethodLockedException(TradingException):
+    def __init__(self, portfolio_id: str):
+        super().__init__(
+            detail=f"Cost basis method of portfolio {portfolio_id} can only change while it holds no positions",
+            status_code=409
+        )
@@ -0,0 +1,395 @@
+import re
+import psycopg2
+from typing import Callable, Dict, List, Optional, Union
+from app.core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary key for the session advisory lock that serializes migrators
+MIGRATION_LOCK_KEY = 72_500_001
+
+# A failed CREATE INDEX CONCURRENTLY leaves an INVALID index behind, which
+# IF NOT EXISTS would then skip
+_CONCURRENT_INDEX = re.compile(
+    r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)", re.IGNORECASE
+)
+
+INVALID_INDEX_SQL = """
+    SELECT 1 FROM pg_index WHERE indexrelid = to_regclass(%s) AND NOT indisvalid
+"""
+
+class Migration:
+    """One schema change, applied at most once per database.
+
+    Transactional migrations run inside a transaction together with their
+    schema_migrations row, with a lock timeout so a migration waiting on a
+    busy table fails fast instead of queueing live traffic behind it.
+    Non-transactional migrations (e.g. CREATE INDEX CONCURRENTLY, which
+    builds without blocking writes) run statement by statement in
+    autocommit mode and must be idempotent, since a failure part-way is
+    retried from the first statement. An invalid index left by a failed
+    concurrent build is dropped before the build is retried.
+    """
+
+    def __init__(self, version: int, description: str,
+                 statements: Union[str, List[str], Callable], transactional: bool = True):
+        self.version = version
+        self.description = description
+        self.statements = statements
+        self.transactional = transactional
+
+    def apply(self, cursor):
+        if callable(self.statements):
+            self.statements(cursor)
+            return
+        statements = [self.statements] if isinstance(self.statements, str) else self.statements
+        for statement in statements:
+            if not self.transactional:
+                _drop_invalid_index(cursor, statement)
+            cursor.execute(statement)
+
+def _drop_invalid_index(cursor, statement: str):
+    match = _CONCURRENT_INDEX.search(statement)
+    if not match:
+        return
+    cursor.execute(INVALID_INDEX_SQL, (match.group(1),))
+    if cursor.fetchone():
+        logger.warning(f"Dropping invalid index {match.group(1)} left by a failed build")
+        cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {match.group(1)}")
+
+def _baseline_schema(cursor):
+    cursor.execute("""
+        -- Trades table
+        CREATE TABLE IF NOT EXISTS trades (
+            id SERIAL PRIMARY KEY,
+            symbol VARCHAR(10) NOT NULL,
+            trade_type VARCHAR(4) CHECK (trade_type IN ('BUY', 'SELL')),
+            quantity INTEGER NOT NULL,
+            price DECIMAL(10, 4) NOT NULL,
+            trade_date TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            portfolio_id VARCHAR(50) DEFAULT 'default',
+            status VARCHAR(10) DEFAULT 'ACTIVE' CHECK (status IN ('ACTIVE', 'CLOSED'))
+        );
+
+        -- Positions table
+        CREATE TABLE IF NOT EXISTS positions (
+            id SERIAL PRIMARY KEY,
+            symbol VARCHAR(10) NOT NULL,
+            net_quantity INTEGER NOT NULL,
+            avg_price DECIMAL(10, 4) NOT NULL,
+            total_invested DECIMAL(15, 4) NOT NULL,
+            portfolio_id VARCHAR(50) DEFAULT 'default',
+            last_updated TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(symbol, portfolio_id)
+        );
+
+        -- Portfolio table
+        CREATE TABLE IF NOT EXISTS portfolio (
+            id SERIAL PRIMARY KEY,
+            portfolio_id VARCHAR(50) NOT NULL,
+            cash_balance DECIMAL(15, 4) DEFAULT 100000.00,
+            total_value DECIMAL(15, 4) DEFAULT 100000.00,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(portfolio_id)
+        );
+
+        -- Insert default portfolio
+        INSERT INTO portfolio (portfolio_id, cash_balance, total_value)
+        VALUES ('default', %s, %s)
+        ON CONFLICT (portfolio_id) DO NOTHING;
+    """, (settings.default_cash_balance, settings.default_cash_balance))
+
+# Append new migrations with the next version number; never edit or
+# reorder ones that have shipped.
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Baseline trades, positions and portfolio tables", _baseline_schema),
+    Migration(2, "Index trade history by portfolio and date", """
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_trades_portfolio_date
+        ON trades (portfolio_id, trade_date DESC, id DESC)
+    """, transactional=False),
+    Migration(3, "Index positions by portfolio", """
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_positions_portfolio
+        ON positions (portfolio_id, symbol)
+    """, transactional=False),
+    Migration(4, "Index filtered trade history by symbol and by trade type", [
+        """
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_trades_portfolio_symbol_date
+        ON trades (portfolio_id, symbol, trade_date DESC, id DESC)
+        """,
+        """
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_trades_portfolio_type_date
+        ON trades (portfolio_id, trade_type, trade_date DESC, id DESC)
+        """,
+    ], transactional=False),
+    Migration(5, "Average-cost aggregate for rebuilding positions from trades", """
+        CREATE TYPE avg_cost_state AS (
+            quantity BIGINT,
+            avg_price NUMERIC,
+            invested NUMERIC,
+            oversold BOOLEAN
+        );
+
+        -- One fill applied to a position, with the rounding and rules of the
+        -- live BUY/SELL statements; oversold records a SELL beyond the holding.
+        -- Live fills are priced as trades.price stores them, so a rebuild
+        -- from trades matches the live positions.
+        CREATE FUNCTION avg_cost_step(state avg_cost_state, side VARCHAR, qty INTEGER, fill_price NUMERIC)
+        RETURNS avg_cost_state LANGUAGE plpgsql IMMUTABLE AS $$
+        BEGIN
+            IF side = 'BUY' THEN
+                state.invested := round(state.invested + qty * fill_price, 4);
+                state.quantity := state.quantity + qty;
+                state.avg_price := round(state.invested / state.quantity, 4);
+            ELSIF state.quantity > qty THEN
+                state.invested := round(state.invested * (state.quantity - qty) / state.quantity, 4);
+                state.quantity := state.quantity - qty;
+            ELSE
+                state.oversold := state.oversold OR state.quantity < qty;
+                state.quantity := state.quantity - qty;
+                state.invested := 0;
+                state.avg_price := 0;
+            END IF;
+            RETURN state;
+        END
+        $$;
+
+        CREATE AGGREGATE avg_cost(VARCHAR, INTEGER, NUMERIC) (
+            SFUNC = avg_cost_step,
+            STYPE = avg_cost_state,
+            INITCOND = '(0,0,0,f)'
+        );
+    """),
+    Migration(6, "Ledger replay checkpoints", """
+        CREATE TABLE IF NOT EXISTS ledger_checkpoints (
+            portfolio_id VARCHAR(50) PRIMARY KEY,
+            last_trade_date TIMESTAMP WITH TIME ZONE,
+            last_trade_id INTEGER,
+            max_trade_id INTEGER NOT NULL DEFAULT 0,
+            trade_count BIGINT NOT NULL DEFAULT 0,
+            opening_cash DECIMAL(15, 4) NOT NULL,
+            cash_flow DECIMAL(20, 4) NOT NULL DEFAULT 0,
+            positions JSONB NOT NULL DEFAULT '{}',
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        )
+    """),
+    Migration(7, "Resting limit, stop and stop-limit orders", """
+        CREATE TABLE IF NOT EXISTS orders (
+            id SERIAL PRIMARY KEY,
+            portfolio_id VARCHAR(50) NOT NULL,
+            symbol VARCHAR(10) NOT NULL,
+            trade_type VARCHAR(4) NOT NULL CHECK (trade_type IN ('BUY', 'SELL')),
+            order_type VARCHAR(10) NOT NULL CHECK (order_type IN ('LIMIT', 'STOP', 'STOP_LIMIT')),
+            quantity INTEGER NOT NULL CHECK (quantity > 0),
+            limit_price DECIMAL(10, 4),
+            stop_price DECIMAL(10, 4),
+            time_in_force VARCHAR(3) NOT NULL CHECK (time_in_force IN ('GTC', 'DAY', 'IOC')),
+            status VARCHAR(10) NOT NULL DEFAULT 'OPEN'
+                CHECK (status IN ('OPEN', 'FILLED', 'CANCELLED', 'EXPIRED', 'REJECTED')),
+            triggered BOOLEAN NOT NULL DEFAULT FALSE,
+            trade_id INTEGER,
+            reason TEXT,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMP WITH TIME ZONE,
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        );
+
+        -- The book is reloaded from open orders on startup
+        CREATE INDEX IF NOT EXISTS idx_orders_open ON orders (symbol) WHERE status = 'OPEN';
+        CREATE INDEX IF NOT EXISTS idx_orders_portfolio ON orders (portfolio_id, id DESC);
+    """),
+    Migration(8, "Cost basis methods, position lots and the realized P&L ledger", """
+        ALTER TABLE portfolio ADD COLUMN IF NOT EXISTS cost_basis_method VARCHAR(7) NOT NULL DEFAULT 'AVERAGE'
+            CHECK (cost_basis_method IN ('AVERAGE', 'FIFO', 'LIFO'));
+
+        -- Open lots of FIFO/LIFO portfolios, consumed in (opened_at, trade_id) order
+        CREATE TABLE IF NOT EXISTS position_lots (
+            portfolio_id VARCHAR(50) NOT NULL,
+            symbol VARCHAR(10) NOT NULL,
+            trade_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL CHECK (quantity > 0),
+            price DECIMAL(10, 4) NOT NULL,
+            opened_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            PRIMARY KEY (portfolio_id, symbol, trade_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_position_lots_order ON position_lots (portfolio_id, symbol, opened_at, trade_id);
+
+        -- One row per SELL: the cost basis it released and the P&L it realized
+        CREATE TABLE IF NOT EXISTS realized_pnl (
+            trade_id INTEGER PRIMARY KEY,
+            portfolio_id VARCHAR(50) NOT NULL,
+            symbol VARCHAR(10) NOT NULL,
+            quantity INTEGER NOT NULL,
+            cost_basis DECIMAL(15, 4) NOT NULL,
+            realized DECIMAL(15, 4) NOT NULL,
+            realized_at TIMESTAMP WITH TIME ZONE NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_realized_pnl_position
+        ON realized_pnl (portfolio_id, symbol, trade_id) INCLUDE (realized);
+        CREATE INDEX IF NOT EXISTS idx_realized_pnl_recent
+        ON realized_pnl (portfolio_id, realized_at DESC, trade_id DESC);
+
+        -- Every portfolio has been average cost so far: each earlier SELL
+        -- released what the position's invested amount dropped by
+        INSERT INTO realized_pnl (trade_id, portfolio_id, symbol, quantity, cost_basis, realized, realized_at)
+        SELECT id, portfolio_id, symbol, quantity, released, price * quantity - released, trade_date
+        FROM (
+            SELECT id, portfolio_id, symbol, trade_type, quantity, price, trade_date,
+                   lag(invested, 1, 0::numeric) OVER w - invested AS released
+            FROM (
+                SELECT t.*, (avg_cost(trade_type, quantity, price) OVER w).invested
+                FROM trades t
+                WINDOW w AS (PARTITION BY portfolio_id, symbol ORDER BY trade_date, id)
+            ) replayed
+            WINDOW w AS (PARTITION BY portfolio_id, symbol ORDER BY trade_date, id)
+        ) sells
+        WHERE trade_type = 'SELL'
+        ON CONFLICT (trade_id) DO NOTHING;
+    """),
+    Migration(9, "Daily portfolio value cache for performance analytics", """
+        -- End-of-day values reconstructed from the ledger and historical
+        -- closes; each portfolio's rows run unbroken from its first trade day
+        CREATE TABLE IF NOT EXISTS portfolio_daily_values (
+            portfolio_id VARCHAR(50) NOT NULL,
+            day DATE NOT NULL,
+            cash DECIMAL(15, 4) NOT NULL,
+            market_value DECIMAL(15, 4) NOT NULL,
+            PRIMARY KEY (portfolio_id, day)
+        );
+
+        -- Bumped whenever a portfolio's cached days are invalidated, so a
+        -- computation that read the old history does not write it back
+        CREATE TABLE IF NOT EXISTS portfolio_daily_values_state (
+            portfolio_id VARCHAR(50) PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0
+        );
+    """),
+    Migration(10, "Partitioned portfolio snapshots written by the rollup job", """
+        -- Monthly range partitions are created by the rollup as it reaches them
+        CREATE TABLE IF NOT EXISTS portfolio_snapshots (
+            portfolio_id VARCHAR(50) NOT NULL,
+            snapshot_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            end_of_day BOOLEAN NOT NULL,
+            cash_balance DECIMAL(15, 4) NOT NULL,
+            positions_value DECIMAL(15, 4) NOT NULL,
+            total_invested DECIMAL(15, 4) NOT NULL,
+            unrealized_pnl DECIMAL(15, 4) NOT NULL,
+            realized_pnl DECIMAL(15, 4) NOT NULL,
+            total_value DECIMAL(15, 4) NOT NULL,
+            position_count INTEGER NOT NULL,
+            PRIMARY KEY (portfolio_id, snapshot_at)
+        ) PARTITION BY RANGE (snapshot_at);
+        CREATE INDEX IF NOT EXISTS idx_portfolio_snapshots_eod
+        ON portfolio_snapshots (snapshot_at) WHERE end_of_day;
+    """),
+]
+
+class MigrationRunner:
+    """Applies pending migrations over a dedicated (non-pooled) connection"""
+
+    def __init__(self, connection_params: Dict, migrations: Optional[List[Migration]] = None,
+                 lock_timeout: str = "5s"):
+        self.connection_params = connection_params
+        self.migrations = sorted(migrations or MIGRATIONS, key=lambda m: m.version)
+        self.lock_timeout = lock_timeout
+
+    @property
+    def latest_version(self) -> int:
+        return self.migrations[-1].version if self.migrations else 0
+
+    def migrate(self) -> List[int]:
+        """Apply pending migrations; returns the versions applied"""
+        conn = psycopg2.connect(**self.connection_params)
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cursor:
+                # Up-to-date databases cost one read and no DDL
+                if self._applied_versions(cursor) >= {m.version for m in self.migrations}:
+                    return []
+
+                cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+                try:
+                    self._ensure_version_table(cursor)
+                    applied = self._applied_versions(cursor)
+                    pending = [m for m in self.migrations if m.version not in applied]
+                    for migration in pending:
+                        self._apply(conn, cursor, migration)
+                    return [m.version for m in pending]
+                finally:
+                    cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+        finally:
+            conn.close()
+
+    def status(self) -> List[Dict]:
+        """Every known migration and whether it has been applied"""
+        conn = psycopg2.connect(**self.connection_params)
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cursor:
+                applied = self._applied_versions(cursor)
+        finally:
+            conn.close()
+        return [
+            {"version": m.version, "description": m.description, "applied": m.version in applied}
+            for m in self.migrations
+        ]
+
+    def _apply(self, conn, cursor, migration: Migration):
+        logger.info(f"Applying migration {migration.version}: {migration.description}")
+        if migration.transactional:
+            conn.autocommit = False
+            try:
+                cursor.execute("SET LOCAL lock_timeout = %s", (self.lock_timeout,))
+                migration.apply(cursor)
+                self._record(cursor, migration)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.autocommit = True
+        else:
+            migration.apply(cursor)
+            self._record(cursor, migration)
+
+    @staticmethod
+    def _record(cursor, migration: Migration):
+        cursor.execute("""
+            INSERT INTO schema_migrations (version, description) VALUES (%s, %s)
+        """, (migration.version, migration.description))
+
+    @staticmethod
+    def _ensure_version_table(cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                description TEXT NOT NULL,
+                applied_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+    @staticmethod
+    def _applied_versions(cursor) -> set:
+        cursor.execute("SELECT to_regclass('schema_migrations') IS NOT NULL AS present")
+        if not cursor.fetchone()[0]:
+            return set()
+        cursor.execute("SELECT version FROM schema_migrations")
+        return {row[0] for row in cursor.fetchall()}
+
+if __name__ == "__main__":
+    import argparse
+    from app.core.database import db_manager
+
+    parser = argparse.ArgumentParser(description="Apply or inspect database schema migrations")
+    parser.add_argument("--status", action="store_true", help="List migrations without applying them")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    runner = MigrationRunner(db_manager.connection_params)
+    if args.status:
+        for row in runner.status():
+            print(f"{row['version']:>4}  {'applied' if row['applied'] else 'pending':8} {row['description']}")
+    else:
+        applied = runner.migrate()
+        print(f"Applied migrations: {applied}" if applied else "Schema is up to date")
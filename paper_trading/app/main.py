@@ -1,8 +1,19 @@
+import asyncio
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
 from app.core.database import db_manager
-from app.api.routes import trades, portfolio, positions
+from app.core.async_database import async_db_manager
+from app.core.events import PNL_CHANGED, PORTFOLIO_CHANGED, PRICE_TICK, event_bus
+from app.services.market_data import market_data_poller
+from app.services.quote_cache import quote_cache
+from app.services.order_book import order_book
+from app.services.trade_journal import trade_journal
+from app.services.order_service import OrderService, on_price_tick
+from app.services.live_pnl import live_pnl
+from app.services.pnl_stream import pnl_hub
+from app.services.snapshots import snapshot_rollup
+from app.api.routes import trades, portfolio, positions, bars, orders
 import logging
 
 # Configure logging
@@ -29,6 +40,8 @@ app.add_middleware(
 app.include_router(trades.router, prefix="/api/v1", tags=["Trades"])
 app.include_router(portfolio.router, prefix="/api/v1", tags=["Portfolio"])
 app.include_router(positions.router, prefix="/api/v1", tags=["Positions"])
+app.include_router(bars.router, prefix="/api/v1", tags=["Bars"])
+app.include_router(orders.router, prefix="/api/v1", tags=["Orders"])
 
 @app.on_event("startup")
 async def startup_event():
@@ -36,15 +49,97 @@ async def startup_event():
     try:
         db_manager.init_database()
         logger.info("Database initialized successfully")
+        if db_manager.pool:
+            db_manager.pool.warm()
+        await async_db_manager.connect()
+        if settings.trade_journal_enabled:
+            trade_journal.open()
+        resting = OrderService().load_open_orders()
     except Exception as e:
         logger.error(f"Failed to initialize database: {e}")
         raise
 
+    # Resting orders are matched against the poller's price ticks
+    event_bus.subscribe(PRICE_TICK, on_price_tick)
+    market_data_poller.add_symbol_source(order_book.symbols)
+    # Live P&L is revalued on the same ticks; its changes are streamed. The
+    # engine marks a portfolio stale before the hub asks for its reload
+    event_bus.subscribe(PRICE_TICK, live_pnl.on_price_tick)
+    event_bus.subscribe(PORTFOLIO_CHANGED, live_pnl.on_portfolio_changed)
+    pnl_hub.bind(asyncio.get_running_loop())
+    event_bus.subscribe(PNL_CHANGED, pnl_hub.on_pnl_changed)
+    event_bus.subscribe(PORTFOLIO_CHANGED, pnl_hub.on_portfolio_changed)
+    if settings.market_data_poller_enabled:
+        await market_data_poller.start()
+    elif resting:
+        logger.warning(f"{resting} resting orders will not fill until the market data poller is enabled")
+    if settings.snapshot_rollup_enabled:
+        await snapshot_rollup.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background tasks and release pooled database connections on shutdown"""
+    await snapshot_rollup.stop()
+    await market_data_poller.stop()
+    event_bus.unsubscribe(PRICE_TICK, on_price_tick)
+    event_bus.unsubscribe(PRICE_TICK, live_pnl.on_price_tick)
+    event_bus.unsubscribe(PORTFOLIO_CHANGED, live_pnl.on_portfolio_changed)
+    event_bus.unsubscribe(PNL_CHANGED, pnl_hub.on_pnl_changed)
+    event_bus.unsubscribe(PORTFOLIO_CHANGED, pnl_hub.on_portfolio_changed)
+    live_pnl.clear()
+    trade_journal.close()
+    await async_db_manager.close()
+    db_manager.close_pool()
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "message": "Paper Trading API is running"}
 
+@app.get("/health/db-pool")
+async def db_pool_stats():
+    """Database connection pool statistics"""
+    return {
+        "enabled": settings.db_pool_enabled,
+        "stats": db_manager.pool_stats(),
+        "async_stats": async_db_manager.pool_stats()
+    }
+
+@app.get("/health/quote-cache")
+async def quote_cache_stats():
+    """Quote cache hit/miss statistics"""
+    return quote_cache.stats()
+
+@app.get("/health/market-data")
+async def market_data_stats():
+    """Background market data poller statistics"""
+    return market_data_poller.stats()
+
+@app.get("/health/trade-journal")
+async def trade_journal_stats():
+    """Write-behind trade journal statistics"""
+    return trade_journal.stats()
+
+@app.get("/health/order-book")
+async def order_book_stats():
+    """Resting order book statistics"""
+    return order_book.stats()
+
+@app.get("/health/live-pnl")
+async def live_pnl_stats():
+    """Incremental P&L engine statistics"""
+    return live_pnl.stats()
+
+@app.get("/health/pnl-stream")
+async def pnl_stream_stats():
+    """Streaming P&L subscriber and fan-out statistics"""
+    return pnl_hub.stats()
+
+@app.get("/health/snapshots")
+async def snapshot_rollup_stats():
+    """Scheduled portfolio snapshot rollup statistics"""
+    return snapshot_rollup.stats()
+
 @app.get("/")
 async def root():
     """Root endpoint"""
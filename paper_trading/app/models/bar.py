@@ -0,0 +1,23 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import List
+
+class Bar(BaseModel):
+    timestamp: datetime
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float = 0
+
+class BarIngest(BaseModel):
+    bars: List[Bar] = Field(..., min_length=1, description="Bars in ascending time order, newer than any stored")
+
+class BarIngestResponse(BaseModel):
+    symbol: str
+    appended: int
+    total: int
+
+class BarSeries(BaseModel):
+    symbol: str
+    bars: List[Bar]
@@ -0,0 +1,29 @@
+from pydantic import BaseModel
+from decimal import Decimal
+from typing import List, Optional
+
+class PositionDivergence(BaseModel):
+    symbol: str
+    expected_quantity: int
+    actual_quantity: Optional[int] = None
+    expected_avg_price: Decimal
+    actual_avg_price: Optional[Decimal] = None
+    expected_invested: Decimal
+    actual_invested: Optional[Decimal] = None
+
+class PortfolioReplay(BaseModel):
+    portfolio_id: str
+    trades_replayed: int
+    full_replay: bool
+    expected_cash: Decimal
+    actual_cash: Decimal
+    cash_diverged: bool
+    divergences: List[PositionDivergence]
+    repaired: bool = False
+
+class LedgerReplayReport(BaseModel):
+    portfolios: List[PortfolioReplay]
+    failed: dict[str, str] = {}
+    trades_replayed: int
+    diverged_portfolios: int
+    elapsed_seconds: float
@@ -0,0 +1,51 @@
+from pydantic import BaseModel, Field, field_validator, model_validator
+from datetime import datetime
+from typing import List, Literal, Optional
+from decimal import Decimal
+
+class OrderCreate(BaseModel):
+    symbol: str = Field(..., min_length=1, max_length=10, description="Stock symbol")
+    trade_type: Literal["BUY", "SELL"] = Field(..., description="Trade type")
+    order_type: Literal["LIMIT", "STOP", "STOP_LIMIT"] = Field(..., description="Order type")
+    quantity: int = Field(..., gt=0, description="Number of shares")
+    limit_price: Optional[float] = Field(None, gt=0, description="Worst acceptable fill price (LIMIT, STOP_LIMIT)")
+    stop_price: Optional[float] = Field(None, gt=0, description="Price that activates the order (STOP, STOP_LIMIT)")
+    time_in_force: Literal["GTC", "DAY", "IOC"] = Field("GTC", description="GTC rests until cancelled, DAY until the end of the UTC day, IOC fills now or is cancelled")
+    portfolio_id: str = Field("default", description="Portfolio ID")
+
+    @field_validator("symbol")
+    @classmethod
+    def normalize_symbol(cls, symbol: str) -> str:
+        symbol = symbol.strip().upper()
+        if not symbol:
+            raise ValueError("symbol must not be blank")
+        return symbol
+
+    @model_validator(mode="after")
+    def check_prices(self) -> "OrderCreate":
+        if self.order_type in ("LIMIT", "STOP_LIMIT") and self.limit_price is None:
+            raise ValueError(f"{self.order_type} orders require limit_price")
+        if self.order_type in ("STOP", "STOP_LIMIT") and self.stop_price is None:
+            raise ValueError(f"{self.order_type} orders require stop_price")
+        return self
+
+class OrderResponse(BaseModel):
+    id: int
+    symbol: str
+    trade_type: str
+    order_type: str
+    quantity: int
+    limit_price: Optional[Decimal]
+    stop_price: Optional[Decimal]
+    time_in_force: str
+    portfolio_id: str
+    status: str
+    triggered: bool
+    trade_id: Optional[int]
+    reason: Optional[str]
+    created_at: datetime
+    expires_at: Optional[datetime]
+    updated_at: datetime
+
+class OrderList(BaseModel):
+    orders: List[OrderResponse]
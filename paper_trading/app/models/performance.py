@@ -0,0 +1,32 @@
+from pydantic import BaseModel
+from datetime import date
+from decimal import Decimal
+from typing import List, Optional
+
+class DailyValue(BaseModel):
+    day: date
+    cash: Decimal
+    market_value: Decimal
+    equity: Decimal
+    daily_return: Optional[float] = None
+    drawdown: float
+
+class EquityCurve(BaseModel):
+    portfolio_id: str
+    values: List[DailyValue]
+
+class PerformanceSummary(BaseModel):
+    portfolio_id: str
+    start: Optional[date] = None
+    end: Optional[date] = None
+    days: int
+    start_equity: Optional[Decimal] = None
+    end_equity: Optional[Decimal] = None
+    total_return: float
+    annualized_return: Optional[float] = None
+    volatility: Optional[float] = None
+    sharpe_ratio: Optional[float] = None
+    sortino_ratio: Optional[float] = None
+    max_drawdown: float
+    max_drawdown_peak: Optional[date] = None
+    max_drawdown_trough: Optional[date] = None
@@ -1,12 +1,13 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import List
+from typing import Dict, List, Literal, Optional
 from decimal import Decimal
 
 class PortfolioResponse(BaseModel):
     portfolio_id: str
     cash_balance: Decimal
     total_value: Decimal
+    cost_basis_method: str = "AVERAGE"
     created_at: datetime
     updated_at: datetime
 
@@ -19,6 +20,7 @@ class PositionPnL(BaseModel):
     current_value: Decimal
     pnl: Decimal
     pnl_percent: float
+    realized_pnl: Decimal = Decimal(0)
 
 class PortfolioPnL(BaseModel):
     portfolio_id: str
@@ -26,8 +28,63 @@ class PortfolioPnL(BaseModel):
     total_invested: Decimal
     current_value: Decimal
     total_pnl: Decimal
+    # total_pnl is the unrealized P&L of the open positions
+    unrealized_pnl: Decimal
+    realized_pnl: Decimal
     total_portfolio_value: Decimal
     positions_pnl: List[PositionPnL]
 
+class AggregatePnL(BaseModel):
+    portfolio_count: int
+    position_count: int
+    cash_balance: Decimal
+    total_invested: Decimal
+    current_value: Decimal
+    total_pnl: Decimal
+    unrealized_pnl: Decimal
+    realized_pnl: Decimal
+    total_portfolio_value: Decimal
+
+class BulkPnLRequest(BaseModel):
+    portfolio_ids: Optional[List[str]] = Field(None, description="Portfolio IDs to value (all portfolios if omitted)")
+
+class BulkPortfolioPnL(BaseModel):
+    portfolios: List[PortfolioPnL]
+    aggregate: AggregatePnL
+    not_found: List[str]
+    failed_symbols: Dict[str, str]
+
 class CashBalanceUpdate(BaseModel):
     cash_balance: float = Field(..., gt=0, description="New cash balance")
+
+class CostBasisUpdate(BaseModel):
+    method: Literal["AVERAGE", "FIFO", "LIFO"] = Field(..., description="Cost basis method for future sells")
+
+class RealizedPnLEntry(BaseModel):
+    trade_id: int
+    symbol: str
+    quantity: int
+    cost_basis: Decimal
+    realized: Decimal
+    realized_at: datetime
+
+class PortfolioSnapshot(BaseModel):
+    portfolio_id: str
+    snapshot_at: datetime
+    end_of_day: bool
+    cash_balance: Decimal
+    positions_value: Decimal
+    total_invested: Decimal
+    unrealized_pnl: Decimal
+    realized_pnl: Decimal
+    total_value: Decimal
+    position_count: int
+
+class SnapshotTotals(BaseModel):
+    snapshot_at: datetime
+    portfolio_count: int
+    cash_balance: Decimal
+    positions_value: Decimal
+    unrealized_pnl: Decimal
+    realized_pnl: Decimal
+    total_value: Decimal
@@ -20,4 +20,5 @@ class BulkPriceRequest(BaseModel):
 
 class BulkPriceResponse(BaseModel):
     prices: dict[str, float]
+    failed: dict[str, str] = {}
     timestamp: datetime
@@ -1,6 +1,6 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from datetime import datetime
-from typing import Optional, Literal
+from typing import Dict, List, Optional, Literal
 from decimal import Decimal
 
 class TradeCreate(BaseModel):
@@ -10,6 +10,15 @@ class TradeCreate(BaseModel):
     price: Optional[float] = Field(None, gt=0, description="Price per share (optional, will fetch current if not provided)")
     portfolio_id: str = Field("default", description="Portfolio ID")
 
+    @field_validator("symbol")
+    @classmethod
+    def normalize_symbol(cls, symbol: str) -> str:
+        # Stored as imports store them, so history filters and positions match
+        symbol = symbol.strip().upper()
+        if not symbol:
+            raise ValueError("symbol must not be blank")
+        return symbol
+
 class TradeResponse(BaseModel):
     id: int
     symbol: str
@@ -19,9 +28,31 @@ class TradeResponse(BaseModel):
     trade_date: datetime
     portfolio_id: str
     status: str
+    # P&L realized by a SELL as it executed; not reported for BUYs or in trade history
+    realized_pnl: Optional[Decimal] = None
 
 class TradeHistory(BaseModel):
     trades: list[TradeResponse]
-    total_count: int
+    total_count: Optional[int] = None
+    total_is_estimate: bool = False
     page: int
     page_size: int
+    next_cursor: Optional[str] = None
+
+class TradeBatchCreate(BaseModel):
+    trades: List[TradeCreate] = Field(..., min_length=1, max_length=5000, description="Trades to execute, in order")
+    atomic: bool = Field(True, description="Reject the whole batch if any trade fails validation")
+
+class TradeBatchError(BaseModel):
+    index: int
+    symbol: str
+    detail: str
+
+class TradeBatchResponse(BaseModel):
+    executed: list[TradeResponse]
+    rejected: list[TradeBatchError]
+
+class TradeImportResponse(BaseModel):
+    imported: int
+    positions_rebuilt: int
+    cash_adjustments: Dict[str, Decimal]
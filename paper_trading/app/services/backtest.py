@@ -0,0 +1,183 @@
+import itertools
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+from app.core.config import settings
+from app.services.bar_store import Bars
+from app.services.cost_basis import PositionState
+import logging
+
+logger = logging.getLogger(__name__)
+
+class BacktestResult:
+    """Equity curve, trade log and summary of one backtest run"""
+
+    def __init__(self, timestamps: np.ndarray, equity: np.ndarray, trades: List[Dict],
+                 rejected: List[Dict], cash: float, position: PositionState, initial_cash: float):
+        self.timestamps = timestamps
+        self.equity = equity
+        self.trades = trades
+        self.rejected = rejected
+        self.cash = cash
+        self.position = position
+        self.initial_cash = initial_cash
+
+    def summary(self) -> Dict:
+        final_equity = float(self.equity[-1]) if len(self.equity) else self.initial_cash
+        peaks = np.maximum.accumulate(self.equity) if len(self.equity) else np.ones(1)
+        drawdowns = 1 - self.equity / peaks if len(self.equity) else np.zeros(1)
+        return {
+            "bars": len(self.equity),
+            "trades": len(self.trades),
+            "rejected": len(self.rejected),
+            "final_equity": round(final_equity, 4),
+            "total_return": final_equity / self.initial_cash - 1,
+            "max_drawdown": float(drawdowns.max()),
+            "cash": round(self.cash, 4),
+            "position": self.position.quantity,
+        }
+
+def backtest(bars: Bars, targets: np.ndarray, initial_cash: Optional[float] = None,
+             fill_on: str = "next_open") -> BacktestResult:
+    """Trade toward a per-bar target share count with the paper-trading fill rules.
+
+    Orders are the changes in ``targets``; with ``fill_on="next_open"`` an
+    order computed on bar i fills at bar i+1's open, otherwise at bar i's
+    close. As in TradingService, a BUY the cash cannot cover and a SELL
+    beyond the shares held are rejected whole, positions use average cost
+    and nothing is shorted. Only order bars are visited in Python; the
+    equity curve is computed column-wise.
+    """
+    initial_cash = settings.default_cash_balance if initial_cash is None else initial_cash
+    targets = np.asarray(targets, dtype=np.int64)
+    if len(targets) != len(bars):
+        raise ValueError("targets must have one entry per bar")
+
+    deltas = np.diff(targets, prepend=0)
+    order_bars = np.flatnonzero(deltas)
+    if fill_on == "next_open":
+        fill_bars, fill_prices = order_bars + 1, bars.open
+        keep = fill_bars < len(bars)
+        order_bars, fill_bars = order_bars[keep], fill_bars[keep]
+    else:
+        fill_bars, fill_prices = order_bars, bars.close
+
+    position = PositionState()
+    cash = float(initial_cash)
+    trades: List[Dict] = []
+    rejected: List[Dict] = []
+    # Holdings after each executed fill, for the vectorized equity curve
+    fill_index = [0]
+    held = [0]
+    cash_after = [cash]
+
+    for order_bar, fill_bar in zip(order_bars.tolist(), fill_bars.tolist()):
+        # Trade toward the target from what is actually held, so a rejected
+        # order is retried on the next change rather than compounding
+        quantity = int(targets[order_bar]) - position.quantity
+        if quantity == 0:
+            continue
+        trade_type = "BUY" if quantity > 0 else "SELL"
+        quantity = abs(quantity)
+        price = float(fill_prices[fill_bar])
+        value = price * quantity
+
+        trade = {"bar": fill_bar, "timestamp": int(bars.timestamp[fill_bar]), "trade_type": trade_type,
+                 "quantity": quantity, "price": price}
+        if trade_type == "BUY" and value > cash:
+            rejected.append(dict(trade, reason="Insufficient cash balance"))
+            continue
+        if trade_type == "SELL" and quantity > position.quantity:
+            rejected.append(dict(trade, reason="Insufficient shares to sell"))
+            continue
+
+        position.apply(trade_type, quantity, price)
+        cash += -value if trade_type == "BUY" else value
+        trades.append(trade)
+        fill_index.append(fill_bar)
+        held.append(position.quantity)
+        cash_after.append(cash)
+
+    # Each bar carries the holdings of the latest fill at or before it
+    latest = np.searchsorted(np.asarray(fill_index[1:], dtype=np.int64), np.arange(len(bars)), side="right")
+    holdings = np.asarray(held, dtype=np.float64)[latest]
+    equity = np.asarray(cash_after)[latest] + holdings * bars.close
+    return BacktestResult(bars.timestamp, equity, trades, rejected, cash, position, float(initial_cash))
+
+def _sma(values: np.ndarray, window: int) -> np.ndarray:
+    sums = np.cumsum(np.asarray(values, dtype=np.float64))
+    sma = np.full(len(sums), np.nan)
+    if window <= len(sums):
+        sma[window - 1:] = (sums[window - 1:] - np.concatenate(([0.0], sums[:-window]))) / window
+    return sma
+
+def sma_crossover(bars: Bars, fast: int = 10, slow: int = 30, quantity: int = 100) -> np.ndarray:
+    """Hold ``quantity`` shares while the fast SMA is above the slow one"""
+    fast_sma, slow_sma = _sma(bars.close, fast), _sma(bars.close, slow)
+    return np.where(fast_sma > slow_sma, quantity, 0)
+
+def mean_reversion(bars: Bars, window: int = 20, threshold: float = 0.02, quantity: int = 100) -> np.ndarray:
+    """Hold ``quantity`` shares while the close is ``threshold`` below its SMA"""
+    sma = _sma(bars.close, window)
+    return np.where(bars.close < sma * (1 - threshold), quantity, 0)
+
+# Strategies map bars and parameters to a per-bar target position
+STRATEGIES: Dict[str, Callable[..., np.ndarray]] = {
+    "sma_crossover": sma_crossover,
+    "mean_reversion": mean_reversion,
+}
+
+def run_backtest(bars_path: str, strategy: str, params: Dict, initial_cash: Optional[float] = None,
+                 fill_on: str = "next_open") -> Dict:
+    """Load bars, run one named strategy and summarize; the unit of work of a sweep"""
+    bars = Bars.load(bars_path)
+    targets = STRATEGIES[strategy](bars, **params)
+    summary = backtest(bars, targets, initial_cash, fill_on).summary()
+    return dict(summary, params=params)
+
+def parameter_grid(grid: Dict[str, Iterable]) -> List[Dict]:
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+def run_sweep(bars_path: str, strategy: str, grid: Dict[str, Iterable],
+              initial_cash: Optional[float] = None, fill_on: str = "next_open",
+              max_workers: Optional[int] = None) -> List[Dict]:
+    """Backtest every parameter combination across a process pool, best return first.
+
+    Workers receive the bar path rather than the arrays; memory-mapped .npy
+    bars are then shared through the page cache instead of being pickled.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy: {strategy}")
+    combinations = parameter_grid(grid)
+    workers = max_workers or settings.backtest_max_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=min(workers, len(combinations) or 1)) as executor:
+        futures = [
+            executor.submit(run_backtest, bars_path, strategy, params, initial_cash, fill_on)
+            for params in combinations
+        ]
+        results = [future.result() for future in futures]
+    logger.info(f"Backtested {len(combinations)} {strategy} parameter sets over {bars_path}")
+    return sorted(results, key=lambda result: result["total_return"], reverse=True)
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    def parse_param(text: str):
+        name, _, values = text.partition("=")
+        return name, [json.loads(value) for value in values.split(",")]
+
+    parser = argparse.ArgumentParser(description="Backtest a strategy over local OHLCV bars")
+    parser.add_argument("bars", help="Parquet file or directory of per-column .npy files")
+    parser.add_argument("--strategy", default="sma_crossover", choices=sorted(STRATEGIES))
+    parser.add_argument("--param", action="append", default=[], type=parse_param,
+                        help="name=v1,v2,... (repeatable; combinations are swept)")
+    parser.add_argument("--cash", type=float, help="Initial cash balance")
+    parser.add_argument("--fill-on", default="next_open", choices=["next_open", "close"])
+    parser.add_argument("--workers", type=int, help="Sweep processes")
+    args = parser.parse_args()
+
+    results = run_sweep(args.bars, args.strategy, dict(args.param), args.cash, args.fill_on, args.workers)
+    print(json.dumps(results, indent=2))
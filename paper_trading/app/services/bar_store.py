@@ -0,0 +1,194 @@
+import os
+import re
+import threading
+import numpy as np
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple, Union
+from app.core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+BAR_COLUMNS = ("timestamp", "open", "high", "low", "close", "volume")
+COLUMN_DTYPES = {name: np.dtype("<f8") for name in BAR_COLUMNS}
+COLUMN_DTYPES["timestamp"] = np.dtype("<i8")
+
+# A symbol names its directory, so it may not be "." or ".." or start with a dot
+_SYMBOL = re.compile(r"[A-Za-z0-9^][A-Za-z0-9.^=_-]{0,31}")
+
+Timestamp = Union[int, datetime, None]
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+def to_ns(value: Timestamp) -> Optional[int]:
+    """Nanoseconds since the epoch; naive datetimes are taken as UTC"""
+    if value is None or isinstance(value, (int, np.integer)):
+        return value
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - _EPOCH) // timedelta(microseconds=1) * 1000
+
+class Bars:
+    """OHLCV bars for one symbol as parallel NumPy columns (timestamps in ns since epoch)"""
+
+    def __init__(self, timestamp: np.ndarray, open: np.ndarray, high: np.ndarray,
+                 low: np.ndarray, close: np.ndarray, volume: np.ndarray):
+        self.timestamp = timestamp
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+
+    def __len__(self) -> int:
+        return len(self.close)
+
+    def __getitem__(self, rows: slice) -> "Bars":
+        return Bars(self.timestamp[rows], self.open[rows], self.high[rows], self.low[rows],
+                    self.close[rows], self.volume[rows])
+
+    @classmethod
+    def empty(cls) -> "Bars":
+        return cls(*(np.empty(0, dtype=COLUMN_DTYPES[name]) for name in BAR_COLUMNS))
+
+    @classmethod
+    def load(cls, path: str) -> "Bars":
+        """Load a Parquet file, or memory-map a bar store symbol directory or a directory of .npy files"""
+        if os.path.isdir(path):
+            if os.path.exists(os.path.join(path, "timestamp.bin")):
+                return _map_columns(path) or cls.empty()
+            columns = {
+                name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in BAR_COLUMNS
+            }
+            return cls(**columns)
+
+        import pyarrow.parquet as pq
+        table = pq.read_table(path, columns=list(BAR_COLUMNS))
+        columns = {name: table.column(name).to_numpy() for name in BAR_COLUMNS}
+        columns["timestamp"] = columns["timestamp"].astype("datetime64[ns]").astype(np.int64)
+        return cls(**columns)
+
+    def save_npy(self, path: str):
+        """Write one .npy file per column, readable with Bars.load(path)"""
+        os.makedirs(path, exist_ok=True)
+        for name in BAR_COLUMNS:
+            np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(getattr(self, name)))
+
+def _column_path(directory: str, name: str) -> str:
+    return os.path.join(directory, f"{name}.bin")
+
+def _committed_rows(directory: str) -> int:
+    """Rows present in every column; a torn append is not visible"""
+    return min(
+        os.path.getsize(_column_path(directory, name)) // COLUMN_DTYPES[name].itemsize
+        if os.path.exists(_column_path(directory, name)) else 0
+        for name in BAR_COLUMNS
+    )
+
+def _map_columns(directory: str, rows: Optional[int] = None) -> Optional[Bars]:
+    rows = _committed_rows(directory) if rows is None else rows
+    if rows == 0:
+        return None
+    # Plain ndarray views of the mapping avoid np.memmap's per-slice overhead
+    return Bars(*(
+        np.memmap(_column_path(directory, name), dtype=COLUMN_DTYPES[name], mode="r", shape=(rows,)).view(np.ndarray)
+        for name in BAR_COLUMNS
+    ))
+
+class BarStore:
+    """Append-only, per-symbol columnar bar files, memory-mapped for reads.
+
+    Each symbol is a directory holding one raw little-endian file per
+    column. Appends write the value columns before the timestamps, and a
+    symbol's length is its shortest column, so readers never see a torn
+    append and the next append truncates one away. Reads return zero-copy
+    views of the mapping. Appends are serialized within a process; run a
+    single writer per store.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+        # symbol -> (timestamp file path, its size when mapped, mapped bars)
+        self._maps: Dict[str, Tuple[str, int, Optional[Bars]]] = {}
+
+    def _directory(self, symbol: str) -> str:
+        if not _SYMBOL.fullmatch(symbol):
+            raise ValueError(f"Invalid symbol: {symbol}")
+        return os.path.join(self.root, symbol.upper())
+
+    def symbols(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root)
+                      if os.path.exists(_column_path(os.path.join(self.root, name), "timestamp")))
+
+    def append(self, symbol: str, bars: Bars) -> int:
+        """Append bars newer than any stored for ``symbol``; returns the symbol's bar count"""
+        directory = self._directory(symbol)
+        timestamps = np.asarray(bars.timestamp, dtype=COLUMN_DTYPES["timestamp"])
+        if len(timestamps) > 1 and not np.all(np.diff(timestamps) > 0):
+            raise ValueError("Bar timestamps must be strictly increasing")
+        columns = {"timestamp": timestamps}
+        for name in BAR_COLUMNS[1:]:
+            columns[name] = np.asarray(getattr(bars, name), dtype=COLUMN_DTYPES[name])
+            if len(columns[name]) != len(timestamps):
+                raise ValueError(f"Column {name} has {len(columns[name])} rows, expected {len(timestamps)}")
+
+        with self._lock:
+            os.makedirs(directory, exist_ok=True)
+            rows = _committed_rows(directory)
+            if rows and len(timestamps):
+                last = np.memmap(_column_path(directory, "timestamp"), dtype=COLUMN_DTYPES["timestamp"],
+                                 mode="r", offset=(rows - 1) * 8, shape=(1,))[0]
+                if timestamps[0] <= last:
+                    raise ValueError(f"Bars for {symbol} must start after the last stored bar")
+
+            # Timestamps go last: they are what makes the new rows visible
+            for name in BAR_COLUMNS[1:] + BAR_COLUMNS[:1]:
+                values = columns[name]
+                with open(_column_path(directory, name), "ab") as f:
+                    f.truncate(rows * COLUMN_DTYPES[name].itemsize)
+                    f.write(values.tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+
+        logger.debug(f"Appended {len(timestamps)} bars for {symbol}")
+        return rows + len(timestamps)
+
+    def read(self, symbol: str, start: Timestamp = None, end: Timestamp = None) -> Bars:
+        """Bars with start <= timestamp < end, as views of the mapped files"""
+        bars = self._mapped(symbol)
+        if bars is None:
+            return Bars.empty()
+        start, end = to_ns(start), to_ns(end)
+        lo = 0 if start is None else int(bars.timestamp.searchsorted(start))
+        hi = len(bars) if end is None else int(bars.timestamp.searchsorted(end))
+        return bars[lo:max(lo, hi)]
+
+    def latest(self, symbol: str) -> Optional[Tuple[int, float]]:
+        """(timestamp, close) of the newest bar, or None"""
+        bars = self._mapped(symbol)
+        if bars is None:
+            return None
+        return int(bars.timestamp[-1]), float(bars.close[-1])
+
+    def _mapped(self, symbol: str) -> Optional[Bars]:
+        # Re-map only when the timestamp file has grown; a stat is the only
+        # filesystem access on the hot path
+        entry = self._maps.get(symbol)
+        if entry is None:
+            path, size, bars = _column_path(self._directory(symbol), "timestamp"), -1, None
+        else:
+            path, size, bars = entry
+        try:
+            current_size = os.stat(path).st_size
+        except FileNotFoundError:
+            return None
+        if current_size != size:
+            bars = _map_columns(os.path.dirname(path))
+            self._maps[symbol] = (path, current_size, bars)
+        return bars
+
+# Global bar store instance
+bar_store = BarStore(settings.bar_store_path)
@@ -0,0 +1,175 @@
+from collections import deque
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Deque, Dict, Iterable, List, Optional
+
+COST_BASIS_METHODS = ("AVERAGE", "FIFO", "LIFO")
+
+class PositionState:
+    """Average-cost position arithmetic, mirroring BUY_SQL/SELL_SQL in trading_service.
+
+    A BUY adds its cost to ``invested`` and re-derives the average price; a
+    SELL keeps the average price and scales ``invested`` down in proportion
+    to the shares that remain. A position sold down to zero resets to zero.
+    """
+
+    __slots__ = ("quantity", "avg_price", "invested")
+
+    def __init__(self, quantity: int = 0, avg_price: float = 0.0, invested: float = 0.0):
+        self.quantity = quantity
+        self.avg_price = avg_price
+        self.invested = invested
+
+    def apply(self, trade_type: str, quantity: int, price: float, trade_id: Optional[int] = None) -> float:
+        """Apply a fill and return the P&L it realized; callers are expected to
+        have validated SELL quantities"""
+        if trade_type == 'BUY':
+            self.quantity += quantity
+            self.invested += price * quantity
+            self.avg_price = self.invested / self.quantity if self.quantity > 0 else 0
+            return 0.0
+        invested = self.invested
+        remaining = self.quantity - quantity
+        if remaining > 0:
+            self.invested = self.invested * (remaining / self.quantity)
+        else:
+            self.invested = 0
+            self.avg_price = 0
+        self.quantity = remaining
+        return price * quantity - (invested - self.invested)
+
+    def release(self, quantity: int, cost: float):
+        """Remove sold shares whose cost basis was worked out elsewhere"""
+        self.quantity -= quantity
+        if self.quantity > 0:
+            self.invested -= cost
+            self.avg_price = self.invested / self.quantity
+        else:
+            self.invested = 0
+            self.avg_price = 0
+
+    def copy(self) -> "PositionState":
+        return PositionState(self.quantity, self.avg_price, self.invested)
+
+    def __repr__(self) -> str:
+        return f"PositionState(quantity={self.quantity}, avg_price={self.avg_price}, invested={self.invested})"
+
+MONEY = Decimal("0.0001")
+
+def _round(value: Decimal) -> Decimal:
+    # Postgres rounds numeric half away from zero when assigning to DECIMAL(_, 4)
+    return value.quantize(MONEY, rounding=ROUND_HALF_UP)
+
+class LedgerPositionState(PositionState):
+    """PositionState in Decimal, rounded after every fill as the DECIMAL(_, 4) columns are.
+
+    Replaying trades through this reproduces positions the SQL trade paths
+    wrote exactly; PositionState's float math, used by the batch and journal
+    paths, is only accurate to rounding.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, quantity: int = 0, avg_price: Decimal = Decimal(0), invested: Decimal = Decimal(0)):
+        super().__init__(quantity, avg_price, invested)
+
+    def apply(self, trade_type: str, quantity: int, price: Decimal, trade_id: Optional[int] = None) -> Decimal:
+        invested = self.invested
+        if trade_type == 'BUY':
+            self.invested = _round(self.invested + price * quantity)
+            self.quantity += quantity
+            self.avg_price = _round(self.invested / self.quantity)
+            return Decimal(0)
+        if self.quantity > quantity:
+            self.invested = _round(self.invested * (self.quantity - quantity) / self.quantity)
+            self.quantity -= quantity
+        else:
+            self.quantity -= quantity
+            self.invested = Decimal(0)
+            self.avg_price = Decimal(0)
+        return price * quantity - (invested - self.invested)
+
+    def copy(self) -> "LedgerPositionState":
+        return LedgerPositionState(self.quantity, self.avg_price, self.invested)
+
+class LotPositionState(PositionState):
+    """FIFO or LIFO position over its open lots.
+
+    Lots are [quantity, price, trade_id] lists in a deque, oldest on the
+    left. A SELL takes whole lots from the left (FIFO) or the right (LIFO)
+    and splits at most one, so it costs O(lots consumed) however many are
+    open. ``invested`` is the cost of the remaining lots. Every lot a fill
+    opens or changes is kept in ``changes`` by trade id, a consumed one
+    with quantity 0, until the owner writes them out and clears it.
+    """
+
+    __slots__ = ("lifo", "lots", "changes")
+
+    zero = 0.0
+
+    def __init__(self, lifo: bool = False, lots: Iterable[List] = ()):
+        self.lifo = lifo
+        self.lots: Deque[List] = deque(lots)
+        self.changes: Dict[int, List] = {}
+        quantity = sum(lot[0] for lot in self.lots)
+        invested = sum((lot[0] * lot[1] for lot in self.lots), self.zero)
+        super().__init__(quantity, self.zero, invested)
+        self.avg_price = self._average()
+
+    @property
+    def method(self) -> str:
+        return "LIFO" if self.lifo else "FIFO"
+
+    def apply(self, trade_type: str, quantity: int, price: float, trade_id: Optional[int] = None) -> float:
+        if trade_type == 'BUY':
+            lot = [quantity, price, trade_id]
+            self.lots.append(lot)
+            self.changes[trade_id] = lot
+            self.quantity += quantity
+            self.invested += price * quantity
+            self.avg_price = self._average()
+            return self.zero
+
+        cost = self.zero
+        needed = quantity
+        # Lots running out only happens replaying an oversold ledger
+        while needed and self.lots:
+            lot = self.lots[-1] if self.lifo else self.lots[0]
+            taken = min(lot[0], needed)
+            cost += taken * lot[1]
+            lot[0] -= taken
+            needed -= taken
+            self.changes[lot[2]] = lot
+            if lot[0] == 0:
+                if self.lifo:
+                    self.lots.pop()
+                else:
+                    self.lots.popleft()
+        self.quantity -= quantity
+        self.invested = self.invested - cost if self.quantity else self.zero
+        self.avg_price = self._average()
+        return price * quantity - cost
+
+    def _average(self):
+        return self.invested / self.quantity if self.quantity else self.zero
+
+    def copy(self) -> "LotPositionState":
+        return type(self)(self.lifo, ([lot[0], lot[1], lot[2]] for lot in self.lots))
+
+class LedgerLotPositionState(LotPositionState):
+    """LotPositionState in Decimal. Lot costs are exact at the columns' scale,
+    so only the average price is rounded, as the DECIMAL(_, 4) column does."""
+
+    __slots__ = ()
+
+    zero = Decimal(0)
+
+    def _average(self) -> Decimal:
+        return _round(self.invested / self.quantity) if self.quantity else self.zero
+
+def position_state(method: str) -> PositionState:
+    """An empty position under a cost basis method"""
+    return PositionState() if method == 'AVERAGE' else LotPositionState(method == 'LIFO')
+
+def ledger_position_state(method: str) -> PositionState:
+    """An empty position for a ledger replay under a cost basis method"""
+    return LedgerPositionState() if method == 'AVERAGE' else LedgerLotPositionState(method == 'LIFO')
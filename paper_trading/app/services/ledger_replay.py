@@ -0,0 +1,392 @@
+import json
+import time
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.core.database import db_manager
+from app.core.events import PORTFOLIO_CHANGED, event_bus
+from app.core.exceptions import PortfolioNotFoundException
+from app.services.cost_basis import LedgerLotPositionState, LedgerPositionState, PositionState, ledger_position_state
+from app.services.portfolio_state import portfolio_states, write_lots
+from app.models.ledger import LedgerReplayReport, PortfolioReplay, PositionDivergence
+import logging
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_SQL = """
+    SELECT last_trade_date, last_trade_id, max_trade_id, trade_count, opening_cash, cash_flow, positions
+    FROM ledger_checkpoints WHERE portfolio_id = %s
+"""
+
+SAVE_CHECKPOINT_SQL = """
+    INSERT INTO ledger_checkpoints (portfolio_id, last_trade_date, last_trade_id, max_trade_id,
+                                    trade_count, opening_cash, cash_flow, positions)
+    VALUES (%(portfolio_id)s, %(last_trade_date)s, %(last_trade_id)s, %(max_trade_id)s,
+            %(trade_count)s, %(opening_cash)s, %(cash_flow)s, %(positions)s)
+    ON CONFLICT (portfolio_id) DO UPDATE
+    SET last_trade_date = EXCLUDED.last_trade_date, last_trade_id = EXCLUDED.last_trade_id,
+        max_trade_id = EXCLUDED.max_trade_id, trade_count = EXCLUDED.trade_count,
+        opening_cash = EXCLUDED.opening_cash, cash_flow = EXCLUDED.cash_flow,
+        positions = EXCLUDED.positions, updated_at = CURRENT_TIMESTAMP
+    -- Written after the replay's snapshot is released, so a slower concurrent
+    -- replay never moves the checkpoint back
+    WHERE ledger_checkpoints.trade_count <= EXCLUDED.trade_count
+      AND ledger_checkpoints.max_trade_id <= EXCLUDED.max_trade_id
+"""
+
+# Trades after the checkpoint, in the (trade_date, id) order positions are
+# rebuilt in; served by idx_trades_portfolio_date
+TAIL_SQL = """
+    SELECT id, trade_type, symbol, quantity, price, trade_date
+    FROM trades
+    WHERE portfolio_id = %(portfolio_id)s
+      AND (%(after_date)s::timestamptz IS NULL OR (trade_date, id) > (%(after_date)s, %(after_id)s))
+    ORDER BY trade_date, id
+"""
+
+# Trades created since the checkpoint, wherever they sort; more than the
+# tail holds means a back-dated fill landed behind the checkpoint
+NEW_TRADES_SQL = """
+    SELECT COUNT(*) AS new_trades FROM trades WHERE id > %s AND portfolio_id = %s
+"""
+
+BOOK_SQL = """
+    SELECT pf.cash_balance, pos.symbol, pos.net_quantity, pos.avg_price, pos.total_invested
+    FROM portfolio pf
+    LEFT JOIN positions pos ON pos.portfolio_id = pf.portfolio_id
+    WHERE pf.portfolio_id = %s
+"""
+
+METHOD_SQL = "SELECT cost_basis_method FROM portfolio WHERE portfolio_id = %s"
+
+DELETE_LOTS_SQL = "DELETE FROM position_lots WHERE symbol = %s AND portfolio_id = %s"
+
+# Repairs run under the portfolio row lock every trade path takes
+LOCK_PORTFOLIO_SQL = "SELECT portfolio_id FROM portfolio WHERE portfolio_id = %s FOR UPDATE"
+
+REPAIR_POSITION_SQL = """
+    INSERT INTO positions (symbol, net_quantity, avg_price, total_invested, portfolio_id)
+    VALUES (%s, %s, %s, %s, %s)
+    ON CONFLICT (symbol, portfolio_id) DO UPDATE
+    SET net_quantity = EXCLUDED.net_quantity, avg_price = EXCLUDED.avg_price,
+        total_invested = EXCLUDED.total_invested, last_updated = CURRENT_TIMESTAMP
+"""
+
+DELETE_POSITION_SQL = "DELETE FROM positions WHERE symbol = %s AND portfolio_id = %s"
+
+REPAIR_CASH_SQL = """
+    UPDATE portfolio SET cash_balance = %s, updated_at = CURRENT_TIMESTAMP WHERE portfolio_id = %s
+"""
+
+class LedgerState:
+    """Positions and cash flow folded from a prefix of a portfolio's trades,
+    under the portfolio's cost basis method"""
+
+    def __init__(self, opening_cash: Decimal, method: str = 'AVERAGE'):
+        self.positions: Dict[str, PositionState] = {}
+        self.opening_cash = opening_cash
+        self.method = method
+        self.cash_flow = Decimal(0)
+        self.last_trade_date: Optional[datetime] = None
+        self.last_trade_id: Optional[int] = None
+        self.max_trade_id = 0
+        self.trade_count = 0
+
+    @classmethod
+    def from_checkpoint(cls, row: Dict, method: str = 'AVERAGE') -> "LedgerState":
+        state = cls(row['opening_cash'], method)
+        for symbol, (quantity, avg_price, invested, *lots) in row['positions'].items():
+            if lots:
+                state.positions[symbol] = LedgerLotPositionState(
+                    method == 'LIFO', ([lot_quantity, Decimal(price), trade_id] for lot_quantity, price, trade_id in lots[0])
+                )
+            else:
+                state.positions[symbol] = LedgerPositionState(quantity, Decimal(avg_price), Decimal(invested))
+        state.cash_flow = row['cash_flow']
+        state.last_trade_date = row['last_trade_date']
+        state.last_trade_id = row['last_trade_id']
+        state.max_trade_id = row['max_trade_id']
+        state.trade_count = row['trade_count']
+        return state
+
+    def apply(self, trade_id: int, trade_type: str, symbol: str, quantity: int,
+              price: Decimal, trade_date: datetime):
+        position = self.positions.get(symbol)
+        if position is None or position.quantity == 0:
+            # A flat position carries nothing over, even across a change of method
+            position = self.positions[symbol] = ledger_position_state(self.method)
+        position.apply(trade_type, quantity, price, trade_id)
+        value = price * quantity
+        self.cash_flow += -value if trade_type == 'BUY' else value
+        self.last_trade_date = trade_date
+        self.last_trade_id = trade_id
+        self.max_trade_id = max(self.max_trade_id, trade_id)
+        self.trade_count += 1
+
+    @property
+    def expected_cash(self) -> Decimal:
+        return self.opening_cash + self.cash_flow
+
+    def copy(self) -> "LedgerState":
+        state = LedgerState(self.opening_cash, self.method)
+        state.positions = {symbol: position.copy() for symbol, position in self.positions.items()}
+        state.cash_flow = self.cash_flow
+        state.last_trade_date = self.last_trade_date
+        state.last_trade_id = self.last_trade_id
+        state.max_trade_id = self.max_trade_id
+        state.trade_count = self.trade_count
+        return state
+
+    def checkpoint_params(self, portfolio_id: str) -> Dict:
+        # Sold-out symbols carry no state forward; FIFO/LIFO ones carry their lots
+        positions = {
+            symbol: [p.quantity, str(p.avg_price), str(p.invested)] + (
+                [[[lot[0], str(lot[1]), lot[2]] for lot in p.lots]] if isinstance(p, LedgerLotPositionState) else []
+            )
+            for symbol, p in self.positions.items() if p.quantity != 0
+        }
+        return {
+            "portfolio_id": portfolio_id,
+            "last_trade_date": self.last_trade_date,
+            "last_trade_id": self.last_trade_id,
+            "max_trade_id": self.max_trade_id,
+            "trade_count": self.trade_count,
+            "opening_cash": self.opening_cash,
+            "cash_flow": self.cash_flow,
+            "positions": json.dumps(positions),
+        }
+
+class LedgerReplayService:
+    """Rebuilds positions and cash from the trades ledger and reports drift.
+
+    Each portfolio resumes from its checkpoint, streaming only newer trades
+    through a server-side cursor. Trades inside the settle window are
+    checked but not checkpointed, since concurrent transactions may still
+    commit trades that sort before them. Cash is expected to equal the
+    checkpoint's opening balance (the default cash balance on a first
+    replay) plus the trades' net flow; direct cash updates therefore show
+    up as cash divergences and are only overwritten with ``repair_cash``.
+
+    Quantities must match exactly. Amounts may differ by up to
+    ``tolerance``: the batch and journal paths keep positions in floats and
+    round only when writing them, where the replay rounds after every fill.
+    """
+
+    def __init__(self, chunk_size: Optional[int] = None, settle_seconds: Optional[float] = None,
+                 tolerance: Optional[float] = None):
+        self.chunk_size = chunk_size or settings.ledger_replay_chunk_size
+        self.settle_seconds = settings.ledger_replay_settle_seconds if settle_seconds is None else settle_seconds
+        self.tolerance = Decimal(str(settings.ledger_replay_tolerance if tolerance is None else tolerance))
+
+    def replay_portfolio(self, portfolio_id: str, full: bool = False, repair: bool = False,
+                         repair_cash: bool = False, checkpoint: bool = True) -> PortfolioReplay:
+        """Replay one portfolio's new trades, compare and optionally repair.
+
+        With ``checkpoint`` the settled state is saved afterwards in its own
+        short transaction; a read-only check passes False.
+        """
+        writing = portfolio_states.writing([portfolio_id]) if repair or repair_cash else nullcontext()
+        with writing, db_manager.get_cursor() as (cursor, conn):
+            if repair or repair_cash:
+                cursor.execute(LOCK_PORTFOLIO_SQL, (portfolio_id,))
+            else:
+                # Trades, positions and cash must all come from one snapshot
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+
+            cursor.execute(METHOD_SQL, (portfolio_id,))
+            row = cursor.fetchone()
+            if row is None:
+                raise PortfolioNotFoundException(portfolio_id)
+            method = row['cost_basis_method']
+
+            saved = None
+            if not full:
+                cursor.execute(CHECKPOINT_SQL, (portfolio_id,))
+                saved = cursor.fetchone()
+
+            settled, current, replayed = self._fold(conn, cursor, portfolio_id, saved, method)
+            if settled is None:
+                # A back-dated trade sorts before the checkpoint
+                logger.info(f"Back-dated trades in {portfolio_id}; replaying from the start")
+                saved = None
+                settled, current, replayed = self._fold(conn, cursor, portfolio_id, None, method)
+
+            cash_balance, actual = self._read_book(cursor, portfolio_id)
+            divergences = self._compare(current, actual, self.tolerance)
+            result = PortfolioReplay(
+                portfolio_id=portfolio_id,
+                trades_replayed=replayed,
+                full_replay=saved is None,
+                expected_cash=current.expected_cash,
+                actual_cash=cash_balance,
+                cash_diverged=abs(current.expected_cash - cash_balance) > self.tolerance,
+                divergences=divergences
+            )
+
+            if (repair and divergences) or (repair_cash and result.cash_diverged):
+                self._repair(cursor, portfolio_id, current, divergences if repair else [],
+                             repair_cash and result.cash_diverged)
+                result.repaired = True
+
+        if checkpoint and settled.last_trade_id is not None:
+            with db_manager.get_cursor() as (cursor, conn):
+                cursor.execute(SAVE_CHECKPOINT_SQL, settled.checkpoint_params(portfolio_id))
+
+        if result.repaired:
+            event_bus.publish(PORTFOLIO_CHANGED, [portfolio_id])
+        if divergences or result.cash_diverged:
+            logger.warning(f"Ledger divergence in {portfolio_id}: {len(divergences)} positions, "
+                           f"cash {'diverged' if result.cash_diverged else 'ok'}")
+        return result
+
+    def replay_all(self, portfolio_ids: Optional[List[str]] = None, full: bool = False,
+                   repair: bool = False, repair_cash: bool = False,
+                   max_workers: Optional[int] = None) -> LedgerReplayReport:
+        """Replay many portfolios (all by default) concurrently"""
+        started = time.monotonic()
+        if portfolio_ids is None:
+            with db_manager.get_cursor() as (cursor, conn):
+                cursor.execute("SELECT portfolio_id FROM portfolio ORDER BY portfolio_id")
+                portfolio_ids = [row['portfolio_id'] for row in cursor.fetchall()]
+
+        results: List[PortfolioReplay] = []
+        failed: Dict[str, str] = {}
+        workers = max(1, min(max_workers or settings.ledger_replay_workers, len(portfolio_ids) or 1))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ledger-replay") as executor:
+            futures = {
+                portfolio_id: executor.submit(self.replay_portfolio, portfolio_id, full, repair, repair_cash)
+                for portfolio_id in portfolio_ids
+            }
+            for portfolio_id, future in futures.items():
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    logger.error(f"Ledger replay failed for {portfolio_id}: {e}")
+                    failed[portfolio_id] = str(e)
+
+        return LedgerReplayReport(
+            portfolios=results,
+            failed=failed,
+            trades_replayed=sum(result.trades_replayed for result in results),
+            diverged_portfolios=sum(1 for result in results if result.divergences or result.cash_diverged),
+            elapsed_seconds=time.monotonic() - started
+        )
+
+    def _fold(self, conn, cursor, portfolio_id: str, checkpoint: Optional[Dict],
+              method: str = 'AVERAGE') -> Tuple[Optional[LedgerState], LedgerState, int]:
+        """Stream trades after the checkpoint into (settled state, current state, count).
+
+        Returns a settled state of None when trades were created behind the
+        checkpoint, which invalidates it.
+        """
+        if checkpoint:
+            settled = LedgerState.from_checkpoint(checkpoint, method)
+            cursor.execute(NEW_TRADES_SQL, (settled.max_trade_id, portfolio_id))
+            new_trades = cursor.fetchone()['new_trades']
+        else:
+            settled = LedgerState(Decimal(str(settings.default_cash_balance)), method)
+            new_trades = None
+
+        horizon = datetime.now(timezone.utc) - timedelta(seconds=self.settle_seconds)
+        checkpoint_max_id = settled.max_trade_id
+        current = settled
+        replayed = tail_new = 0
+
+        with conn.cursor(name="ledger_replay") as stream:
+            stream.itersize = self.chunk_size
+            stream.execute(TAIL_SQL, {
+                "portfolio_id": portfolio_id,
+                "after_date": settled.last_trade_date,
+                "after_id": settled.last_trade_id,
+            })
+            while True:
+                rows = stream.fetchmany(self.chunk_size)
+                if not rows:
+                    break
+                for trade_id, trade_type, symbol, quantity, price, trade_date in rows:
+                    if current is settled and trade_date >= horizon:
+                        current = settled.copy()
+                    current.apply(trade_id, trade_type, symbol, quantity, price, trade_date)
+                    tail_new += trade_id > checkpoint_max_id
+                replayed += len(rows)
+
+        if new_trades is not None and new_trades != tail_new:
+            return None, current, replayed
+        return settled, current, replayed
+
+    @staticmethod
+    def _read_book(cursor, portfolio_id: str) -> Tuple[Decimal, Dict[str, Dict]]:
+        cursor.execute(BOOK_SQL, (portfolio_id,))
+        rows = cursor.fetchall()
+        if not rows:
+            raise PortfolioNotFoundException(portfolio_id)
+        positions = {row['symbol']: row for row in rows if row['symbol'] is not None}
+        return rows[0]['cash_balance'], positions
+
+    @staticmethod
+    def _compare(state: LedgerState, actual: Dict[str, Dict],
+                 tolerance: Decimal = Decimal(0)) -> List[PositionDivergence]:
+        divergences = []
+        for symbol in sorted(set(state.positions) | set(actual)):
+            expected = state.positions.get(symbol) or LedgerPositionState()
+            row = actual.get(symbol)
+            if row is None and expected.quantity == 0:
+                continue  # sold out and deleted, as it should be
+            if row is not None and row['net_quantity'] == expected.quantity \
+                    and abs(row['avg_price'] - expected.avg_price) <= tolerance \
+                    and abs(row['total_invested'] - expected.invested) <= tolerance:
+                continue
+            divergences.append(PositionDivergence(
+                symbol=symbol,
+                expected_quantity=expected.quantity,
+                actual_quantity=row['net_quantity'] if row else None,
+                expected_avg_price=expected.avg_price,
+                actual_avg_price=row['avg_price'] if row else None,
+                expected_invested=expected.invested,
+                actual_invested=row['total_invested'] if row else None
+            ))
+        return divergences
+
+    @staticmethod
+    def _repair(cursor, portfolio_id: str, state: LedgerState,
+                divergences: List[PositionDivergence], cash: bool):
+        for divergence in divergences:
+            if divergence.expected_quantity > 0:
+                cursor.execute(REPAIR_POSITION_SQL, (
+                    divergence.symbol, divergence.expected_quantity, divergence.expected_avg_price,
+                    divergence.expected_invested, portfolio_id
+                ))
+            else:
+                cursor.execute(DELETE_POSITION_SQL, (divergence.symbol, portfolio_id))
+            position = state.positions.get(divergence.symbol)
+            if isinstance(position, LedgerLotPositionState):
+                # A FIFO/LIFO position's lots are replaced by the replayed ones
+                cursor.execute(DELETE_LOTS_SQL, (divergence.symbol, portfolio_id))
+                write_lots(cursor, {
+                    (portfolio_id, divergence.symbol, lot[2]): (lot[0], lot[1]) for lot in position.lots
+                })
+        if cash:
+            cursor.execute(REPAIR_CASH_SQL, (state.expected_cash, portfolio_id))
+        logger.info(f"Repaired {len(divergences)} positions in {portfolio_id}"
+                    f"{' and cash' if cash else ''}")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rebuild positions and cash from the trades ledger")
+    parser.add_argument("portfolio_ids", nargs="*", help="Portfolios to replay (default: all)")
+    parser.add_argument("--full", action="store_true", help="Ignore checkpoints and replay from the first trade")
+    parser.add_argument("--repair", action="store_true", help="Overwrite diverged positions with the replayed ones")
+    parser.add_argument("--repair-cash", action="store_true", help="Also reset cash to opening balance plus trade flow")
+    parser.add_argument("--workers", type=int, help="Portfolios replayed concurrently")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    report = LedgerReplayService().replay_all(
+        args.portfolio_ids or None, full=args.full, repair=args.repair,
+        repair_cash=args.repair_cash, max_workers=args.workers
+    )
+    print(report.model_dump_json(indent=2))
@@ -0,0 +1,382 @@
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+import logging
+from app.core.config import settings
+from app.core.database import db_manager
+from app.core.events import PNL_CHANGED, event_bus
+from app.core.exceptions import PortfolioNotFoundException
+from app.services.cost_basis import PositionState
+from app.services.market_data import market_data_poller
+from app.services.pnl_engine import MONEY_PLACES, PORTFOLIO_BOOK_SQL
+from app.services.portfolio_state import portfolio_states
+from app.services.price_service import PriceService
+from app.models.portfolio import PortfolioPnL, PositionPnL
+from app.models.trade import TradeResponse
+
+logger = logging.getLogger(__name__)
+
+# Under any cost basis method every dollar spent on a symbol is either
+# still invested or was released by a sale, so realized P&L is the net cash
+# the symbol's trades returned plus what the open position still carries
+REALIZED_FLOWS_SQL = """
+    SELECT symbol,
+           SUM(CASE WHEN trade_type = 'SELL' THEN price * quantity ELSE -price * quantity END)::float8 AS net_flow
+    FROM trades
+    WHERE portfolio_id = %s
+    GROUP BY symbol
+"""
+
+# Loads of a portfolio that keeps trading give up after this many tries
+LOAD_ATTEMPTS = 3
+
+class LivePosition:
+    """One open position and its valuation at the last known price"""
+
+    __slots__ = ("symbol", "state", "price", "market_value", "unrealized")
+
+    def __init__(self, symbol: str, state: PositionState, price: Optional[float] = None):
+        self.symbol = symbol
+        self.state = state
+        self.revalue(price)
+
+    def revalue(self, price: Optional[float]):
+        # Without a quote a position is valued at cost, as /portfolio/pnl always has
+        self.price = price
+        current_price = self.state.avg_price if price is None else price
+        self.market_value = current_price * self.state.quantity
+        self.unrealized = self.market_value - self.state.invested
+
+class LivePortfolio:
+    """Cash, positions and running totals for one portfolio.
+
+    A trade or a tick changes one position; the totals move by that
+    position's change in value rather than being summed again. The sums
+    accumulate float rounding, which every reload resets.
+    """
+
+    def __init__(self, portfolio_id: str, cash_balance: float):
+        self.portfolio_id = portfolio_id
+        self.cash_balance = cash_balance
+        self.positions: Dict[str, LivePosition] = {}
+        # Per symbol, including closed positions
+        self.realized: Dict[str, float] = {}
+        self.invested = 0.0
+        self.market_value = 0.0
+        self.unrealized = 0.0
+        self.realized_total = 0.0
+        self.loaded_at = time.monotonic()
+        self.stale = False
+
+    def open(self, position: LivePosition):
+        self.positions[position.symbol] = position
+        self._count(position, 1)
+
+    def apply_trade(self, symbol: str, trade_type: str, quantity: int, price: float,
+                    last_price: Optional[float], realized: Optional[float] = None):
+        """Apply a fill; a SELL's ``realized`` P&L, when the trade path worked
+        it out under a FIFO/LIFO cost basis, decides the cost released"""
+        position = self.positions.get(symbol)
+        if position is None:
+            position = LivePosition(symbol, PositionState(), last_price)
+        else:
+            self._count(position, -1)
+
+        value = price * quantity
+        if trade_type == 'SELL' and realized is not None:
+            position.state.release(quantity, value - realized)
+        else:
+            realized = position.state.apply(trade_type, quantity, price)
+        if trade_type == 'BUY':
+            self.cash_balance -= value
+        else:
+            self.realized[symbol] = self.realized.get(symbol, 0.0) + realized
+            self.realized_total += realized
+            self.cash_balance += value
+
+        if position.state.quantity > 0:
+            position.revalue(position.price)
+            self.open(position)
+        else:
+            self.positions.pop(symbol, None)
+
+    def reprice(self, symbol: str, price: float) -> bool:
+        position = self.positions.get(symbol)
+        if position is None or position.price == price:
+            return False
+        self._count(position, -1)
+        position.revalue(price)
+        self._count(position, 1)
+        return True
+
+    def _count(self, position: LivePosition, sign: int):
+        self.invested += sign * position.state.invested
+        self.market_value += sign * position.market_value
+        self.unrealized += sign * position.unrealized
+
+    def totals(self) -> Dict[str, float]:
+        return {
+            "cash_balance": round(self.cash_balance, MONEY_PLACES),
+            "total_invested": round(self.invested, MONEY_PLACES),
+            "current_value": round(self.market_value, MONEY_PLACES),
+            "total_pnl": round(self.unrealized, MONEY_PLACES),
+            "unrealized_pnl": round(self.unrealized, MONEY_PLACES),
+            "realized_pnl": round(self.realized_total, MONEY_PLACES),
+            "total_portfolio_value": round(self.market_value + self.cash_balance, MONEY_PLACES),
+        }
+
+    def row(self, symbol: str) -> Optional[Dict]:
+        """A position as PositionPnL fields; None once closed"""
+        position = self.positions.get(symbol)
+        if position is None:
+            return None
+        state = position.state
+        return {
+            "symbol": symbol,
+            "quantity": state.quantity,
+            "avg_price": round(state.avg_price, MONEY_PLACES),
+            "current_price": round(state.avg_price if position.price is None else position.price, MONEY_PLACES),
+            "invested": round(state.invested, MONEY_PLACES),
+            "current_value": round(position.market_value, MONEY_PLACES),
+            "pnl": round(position.unrealized, MONEY_PLACES),
+            "pnl_percent": position.unrealized / state.invested * 100 if state.invested > 0 else 0.0,
+            "realized_pnl": round(self.realized.get(symbol, 0.0), MONEY_PLACES),
+        }
+
+    def to_pnl(self) -> PortfolioPnL:
+        totals = self.totals()
+        return PortfolioPnL(
+            portfolio_id=self.portfolio_id,
+            cash_balance=totals["cash_balance"],
+            total_invested=totals["total_invested"],
+            current_value=totals["current_value"],
+            total_pnl=totals["total_pnl"],
+            unrealized_pnl=totals["unrealized_pnl"],
+            realized_pnl=totals["realized_pnl"],
+            total_portfolio_value=totals["total_portfolio_value"],
+            positions_pnl=[PositionPnL(**self.row(symbol)) for symbol in sorted(self.positions)]
+        )
+
+class LivePnLEngine:
+    """P&L per portfolio, kept current by trades and price ticks instead of recomputed per read.
+
+    A portfolio is loaded from Postgres on first read, when a write outside
+    the trade path marks it stale, and once it is ``ttl`` seconds old.
+    After that each executed trade and each tick adjusts only the position
+    it touches, and a read serializes what is held. Every change is
+    announced on PNL_CHANGED as (portfolio_id, symbols), with symbols None
+    after a load.
+
+    Trade paths wrap their write in trading(), so a load can tell whether a
+    trade committed while it read; such a load is retried.
+    """
+
+    def __init__(self, ttl: float = 60.0):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._portfolios: Dict[str, LivePortfolio] = {}
+        # symbol -> loaded portfolios holding it
+        self._holders: Dict[str, Set[str]] = {}
+        self._prices: Dict[str, float] = {}
+        self._in_flight: Dict[str, int] = {}
+        # Bumped as each trade starts and ends
+        self._activity: Dict[str, int] = {}
+        self._hits = 0
+        self._loads = 0
+        self._load_retries = 0
+        self._trades = 0
+        self._ticks = 0
+
+    @contextmanager
+    def trading(self, portfolio_ids: Iterable[str]) -> Iterator[None]:
+        """Mark a trade on these portfolios as in flight, from before it writes until it is applied"""
+        ids = list(portfolio_ids)
+        with self._lock:
+            for portfolio_id in ids:
+                self._in_flight[portfolio_id] = self._in_flight.get(portfolio_id, 0) + 1
+                self._activity[portfolio_id] = self._activity.get(portfolio_id, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                for portfolio_id in ids:
+                    self._in_flight[portfolio_id] -= 1
+                    self._activity[portfolio_id] += 1
+
+    def apply_trades(self, trades: Iterable[TradeResponse]):
+        """Apply committed (or journaled) trades to the loaded portfolios they belong to"""
+        changed: Dict[str, List[str]] = {}
+        with self._lock:
+            for trade in trades:
+                portfolio = self._portfolios.get(trade.portfolio_id)
+                if portfolio is None:
+                    continue
+                held = trade.symbol in portfolio.positions
+                portfolio.apply_trade(trade.symbol, trade.trade_type, trade.quantity, float(trade.price),
+                                      self._prices.get(trade.symbol),
+                                      None if trade.realized_pnl is None else float(trade.realized_pnl))
+                if held != (trade.symbol in portfolio.positions):
+                    self._track(trade.portfolio_id, trade.symbol, not held)
+                changed.setdefault(trade.portfolio_id, []).append(trade.symbol)
+                self._trades += 1
+        for portfolio_id, symbols in changed.items():
+            event_bus.publish(PNL_CHANGED, (portfolio_id, list(dict.fromkeys(symbols))))
+
+    def apply_trade(self, trade: TradeResponse):
+        self.apply_trades([trade])
+
+    def on_price_tick(self, prices: Dict[str, float]):
+        """Event bus handler: revalue the loaded positions in the ticked symbols"""
+        changed: Dict[str, List[str]] = {}
+        with self._lock:
+            self._prices.update(prices)
+            for symbol, price in prices.items():
+                for portfolio_id in self._holders.get(symbol, ()):
+                    if self._portfolios[portfolio_id].reprice(symbol, price):
+                        changed.setdefault(portfolio_id, []).append(symbol)
+            self._ticks += 1
+        for portfolio_id, symbols in changed.items():
+            event_bus.publish(PNL_CHANGED, (portfolio_id, symbols))
+
+    def on_portfolio_changed(self, portfolio_ids: Optional[List[str]]):
+        """Event bus handler: reload these portfolios (default: all) on their next read"""
+        with self._lock:
+            for portfolio_id in list(self._portfolios) if portfolio_ids is None else portfolio_ids:
+                portfolio = self._portfolios.get(portfolio_id)
+                if portfolio is not None:
+                    portfolio.stale = True
+
+    def snapshot(self, portfolio_id: str) -> Optional[PortfolioPnL]:
+        """The portfolio's P&L if it can be served without I/O, else None"""
+        with self._lock:
+            portfolio = self._portfolios.get(portfolio_id)
+            if portfolio is None or not self._current(portfolio) or not market_data_poller.running:
+                return None
+            if any(position.price is None for position in portfolio.positions.values()):
+                return None
+            self._hits += 1
+            return portfolio.to_pnl()
+
+    def get_portfolio_pnl(self, portfolio_id: str) -> PortfolioPnL:
+        """The portfolio's P&L, loading it if needed. Without the market data
+        poller, held symbols are quoted on each read (through the quote cache);
+        with it, only symbols not yet ticked are."""
+        with self._lock:
+            portfolio = self._portfolios.get(portfolio_id)
+            current = portfolio is not None and self._current(portfolio)
+        if not current:
+            portfolio = self.load(portfolio_id)
+
+        with self._lock:
+            polled = market_data_poller.running
+            symbols = [symbol for symbol, position in portfolio.positions.items()
+                       if not polled or position.price is None]
+        if symbols:
+            self.on_price_tick(PriceService.get_quotes(symbols).prices)
+        with self._lock:
+            return portfolio.to_pnl()
+
+    def view(self, portfolio_id: str,
+             symbols: Optional[Iterable[str]] = None) -> Optional[Tuple[Dict, Dict[str, Optional[Dict]]]]:
+        """Rounded totals and position rows for a loaded portfolio: every open
+        position, or just ``symbols`` (None for each that has closed)"""
+        with self._lock:
+            portfolio = self._portfolios.get(portfolio_id)
+            if portfolio is None:
+                return None
+            rows = {symbol: portfolio.row(symbol)
+                    for symbol in (sorted(portfolio.positions) if symbols is None else symbols)}
+            return portfolio.totals(), rows
+
+    def load(self, portfolio_id: str) -> LivePortfolio:
+        """(Re)load a portfolio from Postgres and announce it"""
+        # Under write-behind, journaled trades take the portfolio lock, so
+        # holding it makes the flushed tables and the cache agree
+        guard = portfolio_states.lock(portfolio_id) if portfolio_states.write_behind else nullcontext()
+        for attempt in range(LOAD_ATTEMPTS):
+            with guard:
+                with self._lock:
+                    activity = self._activity.get(portfolio_id, 0)
+                    idle = not self._in_flight.get(portfolio_id)
+                if portfolio_states.before_load:
+                    portfolio_states.before_load()
+                rows, flows = self._read(portfolio_id)
+                with self._lock:
+                    clean = idle and self._activity.get(portfolio_id, 0) == activity
+                    if clean or attempt == LOAD_ATTEMPTS - 1:
+                        portfolio = self._install(portfolio_id, rows, flows)
+                        # Still unsettled; the next read tries again
+                        portfolio.stale = not clean
+                        break
+            self._load_retries += 1
+
+        event_bus.publish(PNL_CHANGED, (portfolio_id, None))
+        return portfolio
+
+    def _read(self, portfolio_id: str) -> Tuple[List[Dict], Dict[str, float]]:
+        with db_manager.get_cursor() as (cursor, conn):
+            # The book and the trade flows must come from one snapshot
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            cursor.execute(PORTFOLIO_BOOK_SQL, (portfolio_id,))
+            rows = cursor.fetchall()
+            if not rows:
+                raise PortfolioNotFoundException(portfolio_id)
+            cursor.execute(REALIZED_FLOWS_SQL, (portfolio_id,))
+            flows = {row['symbol']: row['net_flow'] for row in cursor.fetchall()}
+        return rows, flows
+
+    def _install(self, portfolio_id: str, rows: List[Dict], flows: Dict[str, float]) -> LivePortfolio:
+        """Replace a portfolio's state; the caller holds the lock"""
+        previous = self._portfolios.get(portfolio_id)
+        for symbol in previous.positions if previous else ():
+            self._track(portfolio_id, symbol, False)
+
+        portfolio = LivePortfolio(portfolio_id, float(rows[0]['cash_balance']))
+        for row in rows:
+            if row['symbol'] is not None:
+                state = PositionState(row['net_quantity'], row['avg_price'], row['total_invested'])
+                price = self._prices.get(row['symbol'], previous.positions[row['symbol']].price
+                                         if previous and row['symbol'] in previous.positions else None)
+                portfolio.open(LivePosition(row['symbol'], state, price))
+                self._track(portfolio_id, row['symbol'], True)
+        for symbol, net_flow in flows.items():
+            position = portfolio.positions.get(symbol)
+            portfolio.realized[symbol] = net_flow + (position.state.invested if position else 0.0)
+        portfolio.realized_total = sum(portfolio.realized.values(), 0.0)
+
+        self._portfolios[portfolio_id] = portfolio
+        self._loads += 1
+        return portfolio
+
+    def _current(self, portfolio: LivePortfolio) -> bool:
+        return not portfolio.stale and time.monotonic() - portfolio.loaded_at <= self.ttl
+
+    def _track(self, portfolio_id: str, symbol: str, held: bool):
+        if held:
+            self._holders.setdefault(symbol, set()).add(portfolio_id)
+            return
+        holders = self._holders.get(symbol)
+        if holders is not None:
+            holders.discard(portfolio_id)
+            if not holders:
+                del self._holders[symbol]
+
+    def clear(self):
+        with self._lock:
+            self._portfolios.clear()
+            self._holders.clear()
+
+    def stats(self) -> Dict:
+        return {
+            "portfolios": len(self._portfolios),
+            "symbols": len(self._holders),
+            "hits": self._hits,
+            "loads": self._loads,
+            "load_retries": self._load_retries,
+            "trades": self._trades,
+            "ticks": self._ticks,
+        }
+
+# Global live P&L engine instance
+live_pnl = LivePnLEngine(ttl=settings.live_pnl_ttl)
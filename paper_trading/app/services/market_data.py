@@ -0,0 +1,213 @@
+import asyncio
+import random
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+import logging
+from app.core.config import settings
+from app.core.async_database import async_db_manager
+from app.core.events import PRICE_TICK, event_bus
+from app.services.quote_cache import quote_cache
+from app.services.quote_engine import quote_engine
+
+logger = logging.getLogger(__name__)
+
+class PriceSnapshot:
+    """Latest polled price per symbol, readable in O(1) from any thread"""
+
+    def __init__(self, max_age: float = 60.0):
+        self.max_age = max_age
+        # symbol -> (price, monotonic time of the poll that confirmed it)
+        self._prices: Dict[str, Tuple[float, float]] = {}
+
+    def get(self, symbol: str, max_age: Optional[float] = None) -> Optional[float]:
+        """Price for a symbol if it was confirmed within max_age seconds"""
+        entry = self._prices.get(symbol)
+        if entry is None:
+            return None
+        price, polled_at = entry
+        if time.monotonic() - polled_at > (self.max_age if max_age is None else max_age):
+            return None
+        return price
+
+    def get_many(self, symbols: List[str], max_age: Optional[float] = None) -> Dict[str, float]:
+        prices = {}
+        for symbol in symbols:
+            price = self.get(symbol, max_age)
+            if price is not None:
+                prices[symbol] = price
+        return prices
+
+    def update(self, prices: Dict[str, float]):
+        now = time.monotonic()
+        for symbol, price in prices.items():
+            self._prices[symbol] = (price, now)
+
+    def discard(self, symbols: Set[str]):
+        for symbol in symbols:
+            self._prices.pop(symbol, None)
+
+    def __len__(self) -> int:
+        return len(self._prices)
+
+class _SymbolSchedule:
+    __slots__ = ("interval", "next_poll", "failures", "last_price")
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.next_poll = 0.0
+        self.failures = 0
+        self.last_price: Optional[float] = None
+
+class MarketDataPoller:
+    """Background task keeping the price snapshot warm for every held symbol.
+
+    Symbols whose price moved are polled more often (down to min_interval),
+    unchanged ones progressively less often (up to max_interval), and
+    symbols that fail to fetch back off exponentially up to max_backoff.
+    """
+
+    def __init__(self, snapshot: PriceSnapshot, min_interval: float = 1.0,
+                 max_interval: float = 30.0, max_backoff: float = 300.0,
+                 symbol_refresh_interval: float = 30.0):
+        self.snapshot = snapshot
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_backoff = max_backoff
+        self.symbol_refresh_interval = symbol_refresh_interval
+
+        self._schedules: Dict[str, _SymbolSchedule] = {}
+        # Polled alongside held symbols, e.g. symbols with resting orders
+        self._symbol_sources: List[Callable[[], Set[str]]] = []
+        self._next_symbol_refresh = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+        self._cycles = 0
+        self._fetched = 0
+        self._failed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if not self.running:
+            self._task = asyncio.create_task(self._run(), name="market-data-poller")
+            logger.info("Market data poller started")
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            logger.info("Market data poller stopped")
+
+    def add_symbol_source(self, source: Callable[[], Set[str]]):
+        if source not in self._symbol_sources:
+            self._symbol_sources.append(source)
+
+    def refresh_symbols(self):
+        """Re-read the tracked symbol set on the next cycle"""
+        self._next_symbol_refresh = 0.0
+
+    def stats(self) -> Dict:
+        return {
+            "running": self.running,
+            "tracked_symbols": len(self._schedules),
+            "snapshot_size": len(self.snapshot),
+            "cycles": self._cycles,
+            "fetched": self._fetched,
+            "failed": self._failed,
+            "backing_off": sum(1 for s in self._schedules.values() if s.failures),
+        }
+
+    async def _run(self):
+        while True:
+            try:
+                await self.poll_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Market data poll failed: {e}")
+            await asyncio.sleep(self._sleep_time())
+
+    async def poll_once(self):
+        """Refresh the tracked symbol set if due, then fetch every symbol that is due"""
+        now = time.monotonic()
+        if now >= self._next_symbol_refresh:
+            self._track(await self._load_symbols())
+            self._next_symbol_refresh = now + self.symbol_refresh_interval
+
+        due = [symbol for symbol, schedule in self._schedules.items() if schedule.next_poll <= now]
+        if not due:
+            return
+
+        batch = await asyncio.to_thread(quote_engine.fetch, due)
+        self.snapshot.update(batch.prices)
+        for symbol, price in batch.prices.items():
+            quote_cache.put(symbol, price)
+        if batch.prices:
+            # Subscribers (e.g. the order book) may write to the database
+            await asyncio.to_thread(event_bus.publish, PRICE_TICK, batch.prices)
+
+        now = time.monotonic()
+        for symbol in due:
+            schedule = self._schedules.get(symbol)
+            if schedule is None:
+                continue
+            if symbol in batch.prices:
+                self._on_success(schedule, batch.prices[symbol], now)
+            else:
+                self._on_failure(schedule, now)
+
+        self._cycles += 1
+        self._fetched += len(batch.prices)
+        self._failed += len(batch.failures)
+
+    def _on_success(self, schedule: _SymbolSchedule, price: float, now: float):
+        if schedule.last_price is not None and price != schedule.last_price:
+            schedule.interval = max(self.min_interval, schedule.interval / 2)
+        else:
+            schedule.interval = min(self.max_interval, schedule.interval * 1.5)
+        schedule.last_price = price
+        schedule.failures = 0
+        schedule.next_poll = now + schedule.interval
+
+    def _on_failure(self, schedule: _SymbolSchedule, now: float):
+        schedule.failures += 1
+        backoff = min(self.max_backoff, schedule.interval * 2 ** schedule.failures)
+        # Jitter keeps symbols that failed together from retrying in lockstep
+        schedule.next_poll = now + backoff * random.uniform(0.8, 1.2)
+
+    def _track(self, symbols: Set[str]):
+        for symbol in symbols - self._schedules.keys():
+            self._schedules[symbol] = _SymbolSchedule(self.min_interval)
+        dropped = self._schedules.keys() - symbols
+        for symbol in dropped:
+            del self._schedules[symbol]
+        self.snapshot.discard(dropped)
+
+    def _sleep_time(self) -> float:
+        now = time.monotonic()
+        wake = min([s.next_poll for s in self._schedules.values()] + [self._next_symbol_refresh])
+        return min(max(wake - now, 0.05), self.max_interval)
+
+    async def _load_symbols(self) -> Set[str]:
+        async with async_db_manager.get_cursor() as (cursor, conn):
+            await cursor.execute("SELECT DISTINCT symbol FROM positions WHERE net_quantity > 0")
+            symbols = {row['symbol'] for row in cursor.fetchall()}
+        for source in self._symbol_sources:
+            symbols |= source()
+        return symbols
+
+# Global snapshot and poller instances
+price_snapshot = PriceSnapshot(max_age=settings.market_data_max_age)
+market_data_poller = MarketDataPoller(
+    price_snapshot,
+    min_interval=settings.market_data_min_interval,
+    max_interval=settings.market_data_max_interval,
+    max_backoff=settings.market_data_max_backoff,
+    symbol_refresh_interval=settings.market_data_symbol_refresh_interval,
+)
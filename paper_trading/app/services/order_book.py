@@ -0,0 +1,228 @@
+import heapq
+import itertools
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Order:
+    """A resting order as held in the book"""
+
+    __slots__ = ("id", "portfolio_id", "symbol", "trade_type", "order_type", "quantity",
+                 "limit_price", "stop_price", "time_in_force", "expires_at", "triggered", "open")
+
+    def __init__(self, id: int, portfolio_id: str, symbol: str, trade_type: str, order_type: str,
+                 quantity: int, limit_price: Optional[float] = None, stop_price: Optional[float] = None,
+                 time_in_force: str = "GTC", expires_at: Optional[float] = None, triggered: bool = False):
+        self.id = id
+        self.portfolio_id = portfolio_id
+        self.symbol = symbol
+        self.trade_type = trade_type
+        self.order_type = order_type
+        self.quantity = quantity
+        self.limit_price = limit_price
+        self.stop_price = stop_price
+        self.time_in_force = time_in_force
+        self.expires_at = expires_at  # epoch seconds, or None for no expiry
+        # A stop-limit whose stop has been hit rests as a limit order
+        self.triggered = triggered or order_type == "LIMIT"
+        self.open = True
+
+    @classmethod
+    def from_row(cls, row: Dict) -> "Order":
+        return cls(
+            row['id'], row['portfolio_id'], row['symbol'], row['trade_type'], row['order_type'],
+            row['quantity'],
+            float(row['limit_price']) if row['limit_price'] is not None else None,
+            float(row['stop_price']) if row['stop_price'] is not None else None,
+            row['time_in_force'],
+            row['expires_at'].timestamp() if row['expires_at'] is not None else None,
+            row['triggered'],
+        )
+
+# Heap entries are (sign * threshold, sequence, order): the sign makes the
+# order that triggers first sit on top, and it triggers once
+# key <= sign * price. The sequence gives time priority within a price.
+_Entry = Tuple[float, int, Order]
+
+class _SymbolBook:
+    """Resting orders for one symbol, one heap per trigger direction"""
+
+    __slots__ = ("buy_limits", "sell_limits", "buy_stops", "sell_stops", "stale")
+
+    # BUY limits fill at or below their limit, SELL limits at or above;
+    # BUY stops trigger at or above their stop, SELL stops at or below
+    SIGNS = {"buy_limits": -1, "sell_limits": 1, "buy_stops": 1, "sell_stops": -1}
+
+    def __init__(self):
+        self.buy_limits: List[_Entry] = []
+        self.sell_limits: List[_Entry] = []
+        self.buy_stops: List[_Entry] = []
+        self.sell_stops: List[_Entry] = []
+        self.stale = 0  # cancelled entries still in the heaps
+
+    def __len__(self) -> int:
+        return len(self.buy_limits) + len(self.sell_limits) + len(self.buy_stops) + len(self.sell_stops)
+
+    def push(self, order: Order, sequence: int):
+        side = "buy" if order.trade_type == "BUY" else "sell"
+        # A STOP order has no limit to rest at, triggered or not
+        if order.triggered and order.order_type != "STOP":
+            name, threshold = f"{side}_limits", order.limit_price
+        else:
+            name, threshold = f"{side}_stops", order.stop_price
+        heapq.heappush(getattr(self, name), (self.SIGNS[name] * threshold, sequence, order))
+
+    def pop_through(self, name: str, price: float) -> List[Order]:
+        """Pop every open order in one heap that ``price`` reaches"""
+        heap, bound = getattr(self, name), self.SIGNS[name] * price
+        popped = []
+        while heap and (heap[0][0] <= bound or not heap[0][2].open):
+            order = heapq.heappop(heap)[2]
+            if order.open:
+                popped.append(order)
+            else:
+                self.stale -= 1
+        return popped
+
+    def compact(self):
+        for name in self.SIGNS:
+            heap = [entry for entry in getattr(self, name) if entry[2].open]
+            heapq.heapify(heap)
+            setattr(self, name, heap)
+        self.stale = 0
+
+class OrderBook:
+    """In-memory book of resting limit, stop and stop-limit orders.
+
+    Orders are indexed per symbol in heaps keyed by trigger price, so a
+    price tick pops exactly the orders it reaches in O(k log n) and never
+    scans the rest. Cancellation marks the order and leaves its heap entry
+    to be skipped lazily; a symbol's heaps are compacted once more than
+    half their entries are stale. Expiring orders sit in a separate heap
+    ordered by expiry time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._orders: Dict[int, Order] = {}
+        self._books: Dict[str, _SymbolBook] = {}
+        self._expiries: List[Tuple[float, int]] = []
+        self._last_prices: Dict[str, float] = {}
+        self._sequence = itertools.count()
+        self._ticks = 0
+        self._triggered = 0
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+    def __contains__(self, order_id: int) -> bool:
+        return order_id in self._orders
+
+    def add(self, order: Order):
+        with self._lock:
+            self._add(order)
+
+    def requeue(self, order: Order):
+        """Return an order taken by match() whose fill failed; it rests at its original trigger"""
+        with self._lock:
+            order.open = True
+            self._add(order)
+
+    def _add(self, order: Order):
+        # Pushed first, so an order that cannot rest is never indexed
+        self._books.setdefault(order.symbol, _SymbolBook()).push(order, next(self._sequence))
+        self._orders[order.id] = order
+        if order.expires_at is not None:
+            heapq.heappush(self._expiries, (order.expires_at, order.id))
+
+    def remove(self, order_id: int) -> Optional[Order]:
+        """Take an order out of the book; returns None if it was not resting"""
+        with self._lock:
+            order = self._orders.pop(order_id, None)
+            if order is None:
+                return None
+            order.open = False
+            book = self._books[order.symbol]
+            book.stale += 1
+            if book.stale * 2 > len(book):
+                book.compact()
+            if not len(book):
+                del self._books[order.symbol]
+            return order
+
+    def match(self, symbol: str, price: float) -> Tuple[List[Order], List[Order]]:
+        """Apply a price tick to one symbol.
+
+        Returns the orders to fill at ``price`` (taken out of the book) and
+        the stop-limit orders whose stop was hit but whose limit was not,
+        which now rest as limit orders.
+        """
+        with self._lock:
+            self._last_prices[symbol] = price
+            self._ticks += 1
+            book = self._books.get(symbol)
+            if book is None:
+                return [], []
+
+            fills, converted = [], []
+            for order in book.pop_through("buy_stops", price) + book.pop_through("sell_stops", price):
+                order.triggered = True
+                if order.order_type == "STOP":
+                    fills.append(order)
+                else:
+                    book.push(order, next(self._sequence))
+                    converted.append(order)
+            fills += book.pop_through("buy_limits", price) + book.pop_through("sell_limits", price)
+
+            for order in fills:
+                order.open = False
+                del self._orders[order.id]
+            if not len(book):
+                del self._books[symbol]
+            self._triggered += len(fills)
+
+            converted = [order for order in converted if order.open]
+            return sorted(fills, key=lambda order: order.id), converted
+
+    def expire(self, now: Optional[float] = None) -> List[Order]:
+        """Take every order past its expiry out of the book"""
+        now = time.time() if now is None else now
+        expired = []
+        while True:
+            with self._lock:
+                if not self._expiries or self._expiries[0][0] > now:
+                    break
+                order_id = heapq.heappop(self._expiries)[1]
+            order = self.remove(order_id)
+            if order is not None:
+                expired.append(order)
+        return expired
+
+    def last_price(self, symbol: str) -> Optional[float]:
+        return self._last_prices.get(symbol)
+
+    def get(self, order_id: int) -> Optional[Order]:
+        return self._orders.get(order_id)
+
+    def symbols(self) -> Set[str]:
+        return set(self._books)
+
+    def clear(self):
+        with self._lock:
+            self._orders.clear()
+            self._books.clear()
+            self._expiries.clear()
+
+    def stats(self) -> Dict:
+        return {
+            "resting_orders": len(self._orders),
+            "symbols": len(self._books),
+            "ticks": self._ticks,
+            "triggered": self._triggered,
+        }
+
+# Global order book instance
+order_book = OrderBook()
@@ -0,0 +1,232 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+import logging
+from app.core.config import settings
+from app.core.database import db_manager
+from app.core.exceptions import (
+    OrderNotFoundException,
+    OrderNotOpenException,
+    PortfolioNotFoundException,
+    TradingException
+)
+from app.services.live_pnl import live_pnl
+from app.services.market_data import market_data_poller, price_snapshot
+from app.services.order_book import Order, OrderBook, order_book
+from app.services.price_service import PriceService
+from app.services.trade_journal import trade_journal
+from app.services.trading_service import TradingService
+from app.models.order import OrderCreate, OrderResponse
+from app.models.trade import TradeCreate, TradeResponse
+
+logger = logging.getLogger(__name__)
+
+# Inserting from the portfolio row rejects unknown portfolios without a second query
+INSERT_ORDER_SQL = """
+    INSERT INTO orders (portfolio_id, symbol, trade_type, order_type, quantity,
+                        limit_price, stop_price, time_in_force, expires_at)
+    SELECT portfolio_id, %(symbol)s, %(trade_type)s, %(order_type)s, %(quantity)s,
+           %(limit_price)s, %(stop_price)s, %(time_in_force)s, %(expires_at)s
+    FROM portfolio
+    WHERE portfolio_id = %(portfolio_id)s
+    RETURNING *
+"""
+
+# A fill locks its order row, so a concurrent cancel either lands first
+# (and the fill is skipped) or waits and then finds the order closed
+LOCK_OPEN_ORDER_SQL = """
+    SELECT id FROM orders WHERE id = %s AND status = 'OPEN' FOR UPDATE
+"""
+
+CLOSE_ORDER_SQL = """
+    UPDATE orders
+    SET status = %(status)s, triggered = triggered OR %(triggered)s, trade_id = %(trade_id)s,
+        reason = %(reason)s, updated_at = CURRENT_TIMESTAMP
+    WHERE id = %(id)s AND status = 'OPEN'
+    RETURNING *
+"""
+
+CLOSE_ORDERS_SQL = """
+    UPDATE orders
+    SET status = %(status)s, reason = %(reason)s, updated_at = CURRENT_TIMESTAMP
+    WHERE id = ANY(%(ids)s) AND status = 'OPEN'
+"""
+
+MARK_TRIGGERED_SQL = """
+    UPDATE orders SET triggered = TRUE, updated_at = CURRENT_TIMESTAMP
+    WHERE id = ANY(%s) AND status = 'OPEN'
+"""
+
+def end_of_day(now: Optional[datetime] = None) -> datetime:
+    """Expiry of a DAY order: the next midnight UTC"""
+    now = now or datetime.now(timezone.utc)
+    return datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc)
+
+class OrderService:
+    """Persists resting orders and fills them from the in-memory book on price ticks"""
+
+    def __init__(self, book: OrderBook = order_book):
+        self.book = book
+        self.trading_service = TradingService()
+        self.price_service = PriceService()
+
+    def submit_order(self, order: OrderCreate) -> OrderResponse:
+        """Rest an order in the book, filling it at once if the last known price reaches it"""
+        price = None
+        if order.time_in_force == "IOC":
+            price = self.price_service.get_current_price(order.symbol, max_age=settings.quote_trade_max_age)
+
+        with db_manager.get_cursor() as (cursor, conn):
+            cursor.execute(INSERT_ORDER_SQL, {
+                **order.model_dump(),
+                "expires_at": end_of_day() if order.time_in_force == "DAY" else None,
+            })
+            row = cursor.fetchone()
+            if not row:
+                raise PortfolioNotFoundException(order.portfolio_id)
+
+        self.book.add(Order.from_row(row))
+        market_data_poller.refresh_symbols()
+        logger.info(f"Order {row['id']} resting: {order.order_type} {order.trade_type} "
+                    f"{order.quantity} {order.symbol}")
+
+        if price is None:
+            price = self.book.last_price(order.symbol) or price_snapshot.get(order.symbol)
+        if price is not None:
+            self.process_tick(order.symbol, price)
+
+        if order.time_in_force == "IOC" and self.book.remove(row['id']) is not None:
+            self._close_orders([row['id']], "CANCELLED", f"Not marketable at {price}")
+        return self.get_order(row['id'])
+
+    def cancel_order(self, order_id: int) -> OrderResponse:
+        with db_manager.get_cursor() as (cursor, conn):
+            cursor.execute(CLOSE_ORDER_SQL, {
+                "id": order_id, "status": "CANCELLED", "triggered": False, "trade_id": None,
+                "reason": "Cancelled",
+            })
+            row = cursor.fetchone()
+
+        if row is None:
+            order = self.get_order(order_id)
+            raise OrderNotOpenException(order_id, order.status)
+        self.book.remove(order_id)
+        return OrderResponse(**row)
+
+    def get_order(self, order_id: int) -> OrderResponse:
+        with db_manager.get_cursor() as (cursor, conn):
+            cursor.execute("SELECT * FROM orders WHERE id = %s", (order_id,))
+            row = cursor.fetchone()
+        if row is None:
+            raise OrderNotFoundException(order_id)
+        return OrderResponse(**row)
+
+    def list_orders(self, portfolio_id: str = "default", status: Optional[str] = None,
+                    limit: int = 100) -> List[OrderResponse]:
+        """Most recent orders first"""
+        query = "SELECT * FROM orders WHERE portfolio_id = %s"
+        params: list = [portfolio_id]
+        if status:
+            query += " AND status = %s"
+            params.append(status)
+        query += " ORDER BY id DESC LIMIT %s"
+        params.append(limit)
+
+        with db_manager.get_cursor() as (cursor, conn):
+            cursor.execute(query, params)
+            return [OrderResponse(**row) for row in cursor.fetchall()]
+
+    def on_price_tick(self, prices: Dict[str, float]):
+        """Event bus handler: expire due orders, then match each ticked symbol"""
+        self.expire_orders()
+        for symbol, price in prices.items():
+            self.process_tick(symbol, price)
+
+    def process_tick(self, symbol: str, price: float) -> List[OrderResponse]:
+        """Fill every order ``price`` reaches; returns the filled and rejected orders"""
+        fills, converted = self.book.match(symbol, price)
+        if converted:
+            with db_manager.get_cursor() as (cursor, conn):
+                cursor.execute(MARK_TRIGGERED_SQL, ([order.id for order in converted],))
+        closed = [self._fill(order, price) for order in fills]
+        return [order for order in closed if order is not None]
+
+    def _fill(self, order: Order, price: float) -> Optional[OrderResponse]:
+        trade = TradeCreate(symbol=order.symbol, trade_type=order.trade_type, quantity=order.quantity,
+                            price=price, portfolio_id=order.portfolio_id)
+        journaled = trade_journal.is_open
+        filled = None
+        try:
+            with live_pnl.trading([order.portfolio_id]):
+                with db_manager.get_cursor() as (cursor, conn):
+                    cursor.execute(LOCK_OPEN_ORDER_SQL, (order.id,))
+                    if cursor.fetchone() is None:
+                        return None
+
+                    params = {"id": order.id, "triggered": True, "trade_id": None, "reason": None}
+                    try:
+                        if journaled:
+                            filled = trade_journal.submit(trade, price)
+                        else:
+                            filled = self.trading_service.execute_trade(cursor, trade, price)
+                        params.update(status="FILLED", trade_id=filled.id)
+                    except TradingException as e:
+                        # Cash and shares are only checked at fill time
+                        params.update(status="REJECTED", reason=str(e.detail))
+                    cursor.execute(CLOSE_ORDER_SQL, params)
+                    row = cursor.fetchone()
+                # A journaled fill was applied when the journal took it
+                if row['status'] == "FILLED" and not journaled:
+                    live_pnl.apply_trade(filled)
+        except Exception as e:
+            if journaled and filled is not None:
+                # The journal acknowledged the trade; requeueing would fill the order twice
+                logger.error(f"Closing order {order.id} after its fill failed, recording it separately: {e}")
+                return self._record_fill(order, filled)
+            logger.error(f"Filling order {order.id} failed, returning it to the book: {e}")
+            self.book.requeue(order)
+            return None
+
+        logger.info(f"Order {order.id} {row['status'].lower()} at {price}")
+        return OrderResponse(**row)
+
+    def _record_fill(self, order: Order, filled: TradeResponse) -> Optional[OrderResponse]:
+        """Mark an order FILLED by an acknowledged trade, in a transaction of its own"""
+        params = {"id": order.id, "status": "FILLED", "triggered": True, "trade_id": filled.id, "reason": None}
+        try:
+            with db_manager.get_cursor() as (cursor, conn):
+                cursor.execute(CLOSE_ORDER_SQL, params)
+                row = cursor.fetchone()
+        except Exception as e:
+            logger.error(f"Order {order.id} was filled by trade {filled.id} but is still open: {e}")
+            return None
+        if row is None:
+            logger.error(f"Order {order.id} was filled by trade {filled.id} after it closed")
+            return None
+        logger.info(f"Order {order.id} filled at {filled.price}")
+        return OrderResponse(**row)
+
+    def expire_orders(self) -> int:
+        expired = self.book.expire()
+        if expired:
+            self._close_orders([order.id for order in expired], "EXPIRED", "Time in force elapsed")
+        return len(expired)
+
+    def _close_orders(self, order_ids: List[int], status: str, reason: str):
+        with db_manager.get_cursor() as (cursor, conn):
+            cursor.execute(CLOSE_ORDERS_SQL, {"ids": order_ids, "status": status, "reason": reason})
+
+    def load_open_orders(self) -> int:
+        """Rebuild the book from the orders table, e.g. on startup"""
+        with db_manager.get_cursor() as (cursor, conn):
+            cursor.execute("SELECT * FROM orders WHERE status = 'OPEN' ORDER BY id")
+            rows = cursor.fetchall()
+
+        self.book.clear()
+        for row in rows:
+            self.book.add(Order.from_row(row))
+        expired = self.expire_orders()
+        logger.info(f"Loaded {len(rows) - expired} resting orders")
+        return len(rows) - expired
+
+def on_price_tick(prices: Dict[str, float]):
+    OrderService().on_price_tick(prices)
@@ -0,0 +1,346 @@
+import numpy as np
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, Optional, Sequence, Tuple
+from psycopg2.extras import execute_values
+import logging
+from app.core.config import settings
+from app.core.database import db_manager
+from app.core.exceptions import PortfolioNotFoundException
+from app.services.bar_store import BarStore, bar_store
+from app.services.pnl_engine import MONEY_PLACES
+from app.models.performance import DailyValue, EquityCurve, PerformanceSummary
+
+logger = logging.getLogger(__name__)
+
+# Values are sampled every calendar day, closes carrying over weekends and
+# holidays, so returns are annualized over calendar days
+PERIODS_PER_YEAR = 365
+
+NS_PER_DAY = 86_400 * 10**9
+
+# Sorts before any real day index
+NO_FILL = np.iinfo(np.int64).min
+
+STATE_SQL = """
+    SELECT COALESCE(s.version, 0) AS version,
+           (SELECT MAX(day) FROM portfolio_daily_values d WHERE d.portfolio_id = pf.portfolio_id) AS cached_through,
+           (SELECT MIN(trade_date) FROM trades t WHERE t.portfolio_id = pf.portfolio_id) AS first_trade
+    FROM portfolio pf
+    LEFT JOIN portfolio_daily_values_state s ON s.portfolio_id = pf.portfolio_id
+    WHERE pf.portfolio_id = %s
+"""
+
+CACHED_SQL = """
+    SELECT day, cash::float8 AS cash, market_value::float8 AS market_value
+    FROM portfolio_daily_values
+    WHERE portfolio_id = %s AND day BETWEEN %s AND %s
+    ORDER BY day
+"""
+
+# Net quantity, cash flow and last fill per symbol and UTC day. Trades
+# before the first day to compute fold into one opening row per symbol,
+# whose day is NULL.
+DAILY_TRADES_SQL = """
+    SELECT symbol,
+           CASE WHEN trade_date >= %(start)s THEN (trade_date AT TIME ZONE 'UTC')::date END AS day,
+           SUM(CASE WHEN trade_type = 'BUY' THEN quantity ELSE -quantity END)::bigint AS quantity,
+           SUM(CASE WHEN trade_type = 'SELL' THEN price * quantity ELSE -price * quantity END)::float8 AS flow,
+           (array_agg(price ORDER BY trade_date DESC, id DESC))[1]::float8 AS last_price,
+           (MAX(trade_date) AT TIME ZONE 'UTC')::date AS last_day
+    FROM trades
+    WHERE portfolio_id = %(portfolio_id)s AND trade_date < %(end)s
+    GROUP BY 1, 2
+"""
+
+# The state row exists before it is share-locked, so an invalidation that
+# is still inserting it is waited for rather than missed
+ENSURE_STATE_SQL = """
+    INSERT INTO portfolio_daily_values_state (portfolio_id) VALUES (%s)
+    ON CONFLICT (portfolio_id) DO NOTHING
+"""
+
+VERSION_SQL = "SELECT version FROM portfolio_daily_values_state WHERE portfolio_id = %s FOR SHARE"
+
+SAVE_DAYS_SQL = """
+    INSERT INTO portfolio_daily_values (portfolio_id, day, cash, market_value)
+    VALUES %s
+    ON CONFLICT (portfolio_id, day) DO UPDATE
+    SET cash = EXCLUDED.cash, market_value = EXCLUDED.market_value
+"""
+
+INVALIDATE_SQL = """
+    WITH stale (portfolio_id, day) AS (VALUES %s),
+    bumped AS (
+        INSERT INTO portfolio_daily_values_state (portfolio_id, version)
+        SELECT portfolio_id, 1 FROM stale
+        ON CONFLICT (portfolio_id) DO UPDATE SET version = portfolio_daily_values_state.version + 1
+    )
+    DELETE FROM portfolio_daily_values d
+    USING stale s
+    WHERE d.portfolio_id = s.portfolio_id AND d.day >= s.day
+"""
+
+# Only portfolios that have cached days can hold stale ones
+SYMBOL_HOLDERS_SQL = """
+    SELECT s.portfolio_id
+    FROM portfolio_daily_values_state s
+    WHERE EXISTS (SELECT 1 FROM trades t WHERE t.portfolio_id = s.portfolio_id AND t.symbol = %s)
+"""
+
+def day_start(day: date) -> datetime:
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+def bar_marks(store: BarStore, symbol: str, day_ends: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Timestamp and close of the last stored bar before each day end (NaN close where there is none)"""
+    bars = store.read(symbol, end=int(day_ends[-1]))
+    if not len(bars):
+        return np.zeros(len(day_ends), dtype=np.int64), np.full(len(day_ends), np.nan)
+    last = bars.timestamp.searchsorted(day_ends) - 1
+    found = last >= 0
+    taken = np.maximum(last, 0)
+    return bars.timestamp[taken], np.where(found, bars.close[taken], np.nan)
+
+def value_days(first_day: date, days: int, opening_cash: float, rows: Sequence[Dict],
+               marks: Callable[[str, np.ndarray], Tuple[np.ndarray, np.ndarray]]) -> Tuple[np.ndarray, np.ndarray]:
+    """End-of-day cash and market value for ``days`` days from ``first_day``.
+
+    ``rows`` are DAILY_TRADES_SQL rows. A position is marked at the close of
+    its last bar before the day ended, or at its last fill when that came on
+    a later day or there is no bar.
+    """
+    day0 = np.datetime64(first_day, "D")
+    symbols = list(dict.fromkeys(row['symbol'] for row in rows))
+    index = {symbol: i for i, symbol in enumerate(symbols)}
+    shape = (len(symbols), days)
+
+    opening = np.zeros(len(symbols), dtype=np.int64)
+    opening_fill = np.full(len(symbols), NO_FILL)
+    opening_price = np.full(len(symbols), np.nan)
+    changes = np.zeros(shape, dtype=np.int64)
+    flows = np.zeros(days)
+    fill_days = np.full(shape, NO_FILL)
+    fill_prices = np.full(shape, np.nan)
+
+    for row in rows:
+        i = index[row['symbol']]
+        if row['day'] is None:
+            opening[i] = row['quantity']
+            opening_fill[i] = (np.datetime64(row['last_day'], "D") - day0).astype(np.int64)
+            opening_price[i] = row['last_price']
+            opening_cash += row['flow']
+        else:
+            day = (np.datetime64(row['day'], "D") - day0).astype(np.int64)
+            changes[i, day] = row['quantity']
+            flows[day] += row['flow']
+            fill_days[i, day] = day
+            fill_prices[i, day] = row['last_price']
+
+    cash = opening_cash + np.cumsum(flows)
+    if not symbols:
+        return cash, np.zeros(days)
+    quantities = opening[:, None] + np.cumsum(changes, axis=1)
+
+    # Carry each symbol's last fill forward
+    latest = np.maximum(np.maximum.accumulate(fill_days, axis=1), opening_fill[:, None])
+    carried = np.take_along_axis(fill_prices, np.clip(latest, 0, days - 1), axis=1)
+    fill_marks = np.where(latest >= 0, carried, opening_price[:, None])
+
+    day_ends = (day0 + np.arange(1, days + 1)).astype("datetime64[ns]").astype(np.int64)
+    day0_ns = day_ends[0] - NS_PER_DAY
+    prices = np.empty(shape)
+    for symbol, i in index.items():
+        timestamps, closes = marks(symbol, day_ends)
+        bar_days = (timestamps - day0_ns) // NS_PER_DAY
+        prices[i] = np.where(~np.isnan(closes) & (bar_days >= latest[i]), closes, fill_marks[i])
+
+    market_value = np.where(quantities != 0, quantities * prices, 0.0).sum(axis=0)
+    return cash, market_value
+
+def daily_returns(equity: np.ndarray) -> np.ndarray:
+    """Each day's return over the day before; NaN for the first day and after a non-positive value"""
+    returns = np.full(len(equity), np.nan)
+    if len(equity) > 1:
+        np.divide(equity[1:], equity[:-1], out=returns[1:], where=equity[:-1] > 0)
+        returns[1:] -= 1
+    return returns
+
+def drawdowns(equity: np.ndarray) -> np.ndarray:
+    """Fractional decline from the running peak"""
+    peaks = np.maximum.accumulate(equity)
+    return np.divide(peaks - equity, peaks, out=np.zeros(len(equity)), where=peaks > 0)
+
+def performance_metrics(equity: np.ndarray, risk_free_rate: float = 0.0,
+                        periods_per_year: int = PERIODS_PER_YEAR) -> Dict:
+    """Return and risk statistics of a daily equity curve; ratios are None when undefined"""
+    metrics = {"total_return": 0.0, "annualized_return": None, "volatility": None,
+               "sharpe_ratio": None, "sortino_ratio": None, "max_drawdown": 0.0,
+               "max_drawdown_peak": None, "max_drawdown_trough": None}
+    if not len(equity):
+        return metrics
+
+    declines = drawdowns(equity)
+    trough = int(np.argmax(declines))
+    if declines[trough] > 0:
+        metrics.update(max_drawdown=float(declines[trough]), max_drawdown_trough=trough,
+                       max_drawdown_peak=int(np.argmax(equity[:trough + 1])))
+
+    growth = equity[-1] / equity[0] if equity[0] > 0 else np.nan
+    if np.isfinite(growth):
+        metrics["total_return"] = float(growth - 1)
+        if len(equity) > 1 and growth > 0:
+            metrics["annualized_return"] = float(growth ** (periods_per_year / (len(equity) - 1)) - 1)
+
+    returns = daily_returns(equity)
+    returns = returns[~np.isnan(returns)]
+    if len(returns) > 1:
+        scale = np.sqrt(periods_per_year)
+        deviation = returns.std(ddof=1)
+        excess = returns - risk_free_rate / periods_per_year
+        downside = np.sqrt(np.mean(np.minimum(excess, 0.0) ** 2))
+        metrics["volatility"] = float(deviation * scale)
+        if deviation > 0:
+            metrics["sharpe_ratio"] = float(excess.mean() / deviation * scale)
+        if downside > 0:
+            metrics["sortino_ratio"] = float(excess.mean() / downside * scale)
+    return metrics
+
+def invalidate_daily_values(cursor, stale: Dict[str, date]):
+    """Drop cached days from each portfolio's given day on, in the caller's transaction"""
+    if stale:
+        execute_values(cursor, INVALIDATE_SQL, list(stale.items()), page_size=len(stale))
+
+def invalidate_symbol_history(symbol: str, first_day: date):
+    """Bars were added for ``symbol`` from ``first_day`` on; drop the cached
+    days that may have been marked without them"""
+    with db_manager.get_cursor() as (cursor, conn):
+        cursor.execute(SYMBOL_HOLDERS_SQL, (symbol.upper(),))
+        invalidate_daily_values(cursor, {row['portfolio_id']: first_day for row in cursor.fetchall()})
+
+class DailySeries:
+    """End-of-day cash and market value as NumPy columns"""
+
+    def __init__(self, days: np.ndarray, cash: np.ndarray, market_value: np.ndarray):
+        self.days = days
+        self.cash = cash
+        self.market_value = market_value
+
+    @property
+    def equity(self) -> np.ndarray:
+        return self.cash + self.market_value
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def day(self, index: Optional[int]) -> Optional[date]:
+        return None if index is None else self.days[index].astype(date)
+
+class PerformanceService:
+    """Daily equity curves rebuilt from the trades ledger and historical closes.
+
+    Cash starts at the default cash balance, as in the ledger replay, so
+    direct cash updates are not part of the curve. Positions are marked
+    from the bar store (see value_days). Days that ended more than the
+    settle window ago are cached in portfolio_daily_values, which always
+    runs unbroken from the portfolio's first trade day, so only the days
+    after the cache are rebuilt. Back-dated imports and newly ingested bars
+    drop the cached days they change.
+    """
+
+    def __init__(self, store: BarStore = bar_store, settle_seconds: Optional[float] = None,
+                 risk_free_rate: Optional[float] = None):
+        self.store = store
+        self.settle_seconds = settings.performance_settle_seconds if settle_seconds is None else settle_seconds
+        self.risk_free_rate = settings.performance_risk_free_rate if risk_free_rate is None else risk_free_rate
+
+    def daily_values(self, portfolio_id: str, start: Optional[date] = None,
+                     end: Optional[date] = None) -> DailySeries:
+        """Values for each day from ``start`` (default and earliest: the first trade day) to ``end`` (default: today)"""
+        today = datetime.now(timezone.utc).date()
+        end = min(end or today, today)
+        with db_manager.get_cursor() as (cursor, conn):
+            # The cache, its version and the ledger come from one snapshot
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            cursor.execute(STATE_SQL, (portfolio_id,))
+            state = cursor.fetchone()
+            if state is None:
+                raise PortfolioNotFoundException(portfolio_id)
+            first_day = state['first_trade'].astimezone(timezone.utc).date() if state['first_trade'] else today
+            start = max(start or first_day, first_day)
+            if start > end:
+                return DailySeries(np.empty(0, dtype="datetime64[D]"), np.empty(0), np.empty(0))
+
+            cached, rows = [], []
+            cached_through = state['cached_through']
+            if cached_through and cached_through >= start:
+                cursor.execute(CACHED_SQL, (portfolio_id, start, min(end, cached_through)))
+                cached = cursor.fetchall()
+            compute_from = cached_through + timedelta(days=1) if cached_through else first_day
+            if compute_from <= end:
+                cursor.execute(DAILY_TRADES_SQL, {"portfolio_id": portfolio_id, "start": day_start(compute_from),
+                                                  "end": day_start(end + timedelta(days=1))})
+                rows = cursor.fetchall()
+
+        days = [row['day'] for row in cached]
+        cash = [np.fromiter((row['cash'] for row in cached), dtype=np.float64, count=len(cached))]
+        market_value = [np.fromiter((row['market_value'] for row in cached), dtype=np.float64, count=len(cached))]
+        if compute_from <= end:
+            computed_cash, computed_value = (
+                np.round(values, MONEY_PLACES) for values in
+                value_days(compute_from, (end - compute_from).days + 1, settings.default_cash_balance, rows,
+                           lambda symbol, day_ends: bar_marks(self.store, symbol, day_ends))
+            )
+            self._save(portfolio_id, state['version'], compute_from, computed_cash, computed_value)
+            skip = max(0, (start - compute_from).days)
+            days.extend(compute_from + timedelta(days=offset) for offset in range(skip, len(computed_cash)))
+            cash.append(computed_cash[skip:])
+            market_value.append(computed_value[skip:])
+
+        return DailySeries(np.array(days, dtype="datetime64[D]"), np.concatenate(cash), np.concatenate(market_value))
+
+    def _save(self, portfolio_id: str, version: int, first_day: date, cash: np.ndarray, market_value: np.ndarray):
+        """Cache the settled days unless the history was invalidated since it was read"""
+        settled_before = (datetime.now(timezone.utc) - timedelta(seconds=self.settle_seconds)).date()
+        settled = min(len(cash), max(0, (settled_before - first_day).days))
+        if not settled:
+            return
+        with db_manager.get_cursor() as (cursor, conn):
+            cursor.execute(ENSURE_STATE_SQL, (portfolio_id,))
+            cursor.execute(VERSION_SQL, (portfolio_id,))
+            if cursor.fetchone()['version'] != version:
+                logger.debug(f"Daily values of {portfolio_id} were invalidated while computing; not caching")
+                return
+            execute_values(cursor, SAVE_DAYS_SQL, [
+                (portfolio_id, first_day + timedelta(days=offset), cash_value, value)
+                for offset, (cash_value, value) in enumerate(zip(cash[:settled].tolist(), market_value[:settled].tolist()))
+            ], page_size=1000)
+        logger.debug(f"Cached {settled} daily values for {portfolio_id}")
+
+    def get_equity_curve(self, portfolio_id: str, start: Optional[date] = None,
+                         end: Optional[date] = None) -> EquityCurve:
+        series = self.daily_values(portfolio_id, start, end)
+        equity = series.equity
+        returns = daily_returns(equity)
+        columns = zip(series.days.astype(date).tolist(), series.cash.tolist(), series.market_value.tolist(),
+                      np.round(equity, MONEY_PLACES).tolist(), returns.tolist(), drawdowns(equity).tolist())
+        return EquityCurve(portfolio_id=portfolio_id, values=[
+            DailyValue(day=day, cash=cash, market_value=market_value, equity=day_equity,
+                       daily_return=None if np.isnan(daily_return) else daily_return, drawdown=drawdown)
+            for day, cash, market_value, day_equity, daily_return, drawdown in columns
+        ])
+
+    def get_performance(self, portfolio_id: str, start: Optional[date] = None,
+                        end: Optional[date] = None) -> PerformanceSummary:
+        series = self.daily_values(portfolio_id, start, end)
+        equity = series.equity
+        metrics = performance_metrics(equity, self.risk_free_rate)
+        metrics["max_drawdown_peak"] = series.day(metrics["max_drawdown_peak"])
+        metrics["max_drawdown_trough"] = series.day(metrics["max_drawdown_trough"])
+        return PerformanceSummary(
+            portfolio_id=portfolio_id,
+            start=series.day(0) if len(series) else None,
+            end=series.day(len(series) - 1) if len(series) else None,
+            days=len(series),
+            start_equity=round(float(equity[0]), MONEY_PLACES) if len(series) else None,
+            end_equity=round(float(equity[-1]), MONEY_PLACES) if len(series) else None,
+            **metrics
+        )
@@ -0,0 +1,323 @@
+import json
+import numpy as np
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+from app.models.portfolio import AggregatePnL, BulkPortfolioPnL, PortfolioPnL, PositionPnL
+from app.services.quote_engine import QuoteBatch
+
+# Monetary outputs are rounded half-to-even to the scale of the DECIMAL
+# columns they derive from. Per-position arithmetic is the same float64
+# math the per-row loop used to do, so positions match it to within
+# 0.00005; totals are pairwise sums and may differ from a sequential sum
+# in the last float ulp before rounding. pnl_percent is left unrounded.
+MONEY_PLACES = 4
+
+# Cash and open positions for one portfolio in a single round trip. A
+# portfolio without positions yields one row whose position columns are NULL.
+PORTFOLIO_BOOK_SQL = """
+    SELECT pf.cash_balance::float8 AS cash_balance, pos.symbol, pos.net_quantity,
+           pos.avg_price::float8 AS avg_price, pos.total_invested::float8 AS total_invested
+    FROM portfolio pf
+    LEFT JOIN positions pos
+        ON pos.portfolio_id = pf.portfolio_id AND pos.net_quantity > 0
+    WHERE pf.portfolio_id = %s
+    ORDER BY pos.symbol
+"""
+
+# The same for many portfolios (all of them when the id list is NULL); rows
+# arrive grouped by portfolio, so they can be streamed a portfolio at a time
+BULK_BOOK_SQL = """
+    SELECT pf.portfolio_id, pf.cash_balance::float8 AS cash_balance, pos.symbol, pos.net_quantity,
+           pos.avg_price::float8 AS avg_price, pos.total_invested::float8 AS total_invested
+    FROM portfolio pf
+    LEFT JOIN positions pos
+        ON pos.portfolio_id = pf.portfolio_id AND pos.net_quantity > 0
+    WHERE %s::text[] IS NULL OR pf.portfolio_id = ANY(%s::text[])
+    ORDER BY pf.portfolio_id, pos.symbol
+"""
+
+# Realized P&L per symbol, closed positions included, for the same portfolios
+BULK_REALIZED_SQL = """
+    SELECT portfolio_id, symbol, SUM(realized)::float8 AS realized
+    FROM realized_pnl
+    WHERE %s::text[] IS NULL OR portfolio_id = ANY(%s::text[])
+    GROUP BY portfolio_id, symbol
+"""
+
+class PositionBook:
+    """Open positions held as parallel NumPy columns"""
+
+    def __init__(self, symbols: Sequence[str], quantities: np.ndarray,
+                 avg_prices: np.ndarray, invested: np.ndarray):
+        self.symbols = list(symbols)
+        self.quantities = quantities
+        self.avg_prices = avg_prices
+        self.invested = invested
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Tuple]) -> "PositionBook":
+        """Build from (symbol, net_quantity, avg_price, total_invested) tuples"""
+        if not rows:
+            return cls([], np.empty(0, dtype=np.int64), np.empty(0), np.empty(0))
+        symbols, quantities, avg_prices, invested = zip(*rows)
+        return cls(
+            symbols,
+            np.fromiter(quantities, dtype=np.int64, count=len(rows)),
+            np.fromiter(avg_prices, dtype=np.float64, count=len(rows)),
+            np.fromiter(invested, dtype=np.float64, count=len(rows)),
+        )
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+class BookValuation:
+    """Whole-book valuation at a set of prices, computed column-wise in one pass"""
+
+    def __init__(self, book: PositionBook, prices: Dict[str, float]):
+        quoted = np.fromiter((prices.get(symbol, np.nan) for symbol in book.symbols),
+                             dtype=np.float64, count=len(book))
+        # Positions without a quote are valued at cost, as before
+        self.current_prices = np.where(np.isnan(quoted), book.avg_prices, quoted)
+        self.current_values = self.current_prices * book.quantities
+        self.pnl = self.current_values - book.invested
+        self.pnl_percent = np.divide(self.pnl, book.invested, out=np.zeros(len(book)),
+                                     where=book.invested > 0) * 100
+
+def rows_to_book(rows: Sequence[Dict]) -> Tuple[PositionBook, float]:
+    """Split PORTFOLIO_BOOK_SQL rows into a position book and the cash balance"""
+    if not rows:
+        return PositionBook.from_rows([]), 0.0
+    cash_balance = float(rows[0]['cash_balance'])
+    book = PositionBook.from_rows([
+        (row['symbol'], row['net_quantity'], row['avg_price'], row['total_invested'])
+        for row in rows if row['symbol'] is not None
+    ])
+    return book, cash_balance
+
+def realized_by_portfolio(rows: Sequence[Dict]) -> Dict[str, Dict[str, float]]:
+    """Group BULK_REALIZED_SQL rows as {portfolio_id: {symbol: realized}}"""
+    realized: Dict[str, Dict[str, float]] = {}
+    for row in rows:
+        realized.setdefault(row['portfolio_id'], {})[row['symbol']] = row['realized']
+    return realized
+
+def build_portfolio_pnl(portfolio_id: str, book: PositionBook, valuation: BookValuation,
+                        cash_balance: float, rows: slice = slice(None),
+                        realized: Optional[Dict[str, float]] = None) -> PortfolioPnL:
+    """Materialize a valuation (or the rows of one portfolio within it) into PortfolioPnL.
+    ``realized`` is the portfolio's realized P&L by symbol, closed positions included."""
+    realized = realized or {}
+    invested = book.invested[rows]
+    current_values = valuation.current_values[rows]
+    pnl = valuation.pnl[rows]
+
+    columns = zip(
+        book.symbols[rows],
+        book.quantities[rows].tolist(),
+        _money(book.avg_prices[rows]),
+        _money(valuation.current_prices[rows]),
+        _money(invested),
+        _money(current_values),
+        _money(pnl),
+        valuation.pnl_percent[rows].tolist(),
+    )
+    positions_pnl = [
+        PositionPnL(
+            symbol=symbol,
+            quantity=quantity,
+            avg_price=avg_price,
+            current_price=current_price,
+            invested=invested_amount,
+            current_value=current_value,
+            pnl=position_pnl,
+            pnl_percent=pnl_percent,
+            realized_pnl=round(realized.get(symbol, 0.0), MONEY_PLACES)
+        )
+        for symbol, quantity, avg_price, current_price, invested_amount, current_value, position_pnl, pnl_percent
+        in columns
+    ]
+
+    current_value = float(current_values.sum())
+    unrealized = round(float(pnl.sum()), MONEY_PLACES)
+    return PortfolioPnL(
+        portfolio_id=portfolio_id,
+        cash_balance=round(cash_balance, MONEY_PLACES),
+        total_invested=round(float(invested.sum()), MONEY_PLACES),
+        current_value=round(current_value, MONEY_PLACES),
+        total_pnl=unrealized,
+        unrealized_pnl=unrealized,
+        realized_pnl=round(sum(realized.values(), 0.0), MONEY_PLACES),
+        total_portfolio_value=round(current_value + cash_balance, MONEY_PLACES),
+        positions_pnl=positions_pnl
+    )
+
+class MultiPortfolioBook:
+    """Positions of many portfolios in one PositionBook, contiguous per portfolio,
+    with each portfolio's realized P&L by symbol"""
+
+    def __init__(self, rows: Sequence[Dict], realized: Optional[Dict[str, Dict[str, float]]] = None):
+        self.realized = realized or {}
+        self.portfolio_ids: List[str] = []
+        self.cash_balances: List[float] = []
+        self.bounds: List[int] = [0]
+
+        position_rows = []
+        for row in rows:
+            if not self.portfolio_ids or row['portfolio_id'] != self.portfolio_ids[-1]:
+                if self.portfolio_ids:
+                    self.bounds.append(len(position_rows))
+                self.portfolio_ids.append(row['portfolio_id'])
+                self.cash_balances.append(float(row['cash_balance']))
+            if row['symbol'] is not None:
+                position_rows.append(
+                    (row['symbol'], row['net_quantity'], row['avg_price'], row['total_invested'])
+                )
+        self.bounds.append(len(position_rows))
+        self.book = PositionBook.from_rows(position_rows)
+
+    @property
+    def symbols(self) -> List[str]:
+        """Distinct symbols held across all portfolios"""
+        return list(dict.fromkeys(self.book.symbols))
+
+    def portfolio_pnls(self, valuation: BookValuation) -> Iterator[PortfolioPnL]:
+        """Yield each portfolio's P&L, one at a time"""
+        for index, portfolio_id in enumerate(self.portfolio_ids):
+            rows = slice(self.bounds[index], self.bounds[index + 1])
+            yield build_portfolio_pnl(portfolio_id, self.book, valuation,
+                                      self.cash_balances[index], rows, self.realized.get(portfolio_id))
+
+    def portfolio_totals(self, valuation: BookValuation) -> Dict[str, np.ndarray]:
+        """Each portfolio's totals as columns aligned with portfolio_ids, without
+        materializing position rows; sums are running-sum differences"""
+        if not self.portfolio_ids:
+            return {}
+        bounds = np.asarray(self.bounds)
+
+        def per_portfolio(values: np.ndarray) -> np.ndarray:
+            sums = np.concatenate(([0.0], np.cumsum(values)))
+            return sums[bounds[1:]] - sums[bounds[:-1]]
+
+        cash_balances = np.asarray(self.cash_balances)
+        current_values = per_portfolio(valuation.current_values)
+        return {
+            "cash_balance": cash_balances,
+            "total_invested": per_portfolio(self.book.invested),
+            "current_value": current_values,
+            "unrealized_pnl": per_portfolio(valuation.pnl),
+            "realized_pnl": np.fromiter((sum(self.realized.get(portfolio_id, {}).values(), 0.0)
+                                         for portfolio_id in self.portfolio_ids),
+                                        dtype=np.float64, count=len(self.portfolio_ids)),
+            "total_portfolio_value": current_values + cash_balances,
+            "position_count": np.diff(bounds),
+        }
+
+    def aggregate(self, valuation: BookValuation) -> AggregatePnL:
+        """Firm-wide totals across every portfolio in the book"""
+        return AggregateTotals().add(self, valuation).to_pnl()
+
+class AggregateTotals:
+    """Unrounded firm-wide sums, added to one MultiPortfolioBook at a time"""
+
+    def __init__(self):
+        self.portfolio_count = 0
+        self.position_count = 0
+        self.cash_balance = 0.0
+        self.total_invested = 0.0
+        self.current_value = 0.0
+        self.unrealized_pnl = 0.0
+        self.realized_pnl = 0.0
+
+    def add(self, books: MultiPortfolioBook, valuation: BookValuation) -> "AggregateTotals":
+        self.portfolio_count += len(books.portfolio_ids)
+        self.position_count += len(books.book)
+        self.cash_balance += float(sum(books.cash_balances))
+        self.total_invested += float(books.book.invested.sum())
+        self.current_value += float(valuation.current_values.sum())
+        self.unrealized_pnl += float(valuation.pnl.sum())
+        self.realized_pnl += sum((sum(books.realized.get(portfolio_id, {}).values(), 0.0)
+                                  for portfolio_id in books.portfolio_ids), 0.0)
+        return self
+
+    def to_pnl(self) -> AggregatePnL:
+        unrealized = round(self.unrealized_pnl, MONEY_PLACES)
+        return AggregatePnL(
+            portfolio_count=self.portfolio_count,
+            position_count=self.position_count,
+            cash_balance=round(self.cash_balance, MONEY_PLACES),
+            total_invested=round(self.total_invested, MONEY_PLACES),
+            current_value=round(self.current_value, MONEY_PLACES),
+            total_pnl=unrealized,
+            unrealized_pnl=unrealized,
+            realized_pnl=round(self.realized_pnl, MONEY_PLACES),
+            total_portfolio_value=round(self.current_value + self.cash_balance, MONEY_PLACES)
+        )
+
+def portfolio_chunks(batches: Iterable[List[Dict]]) -> Iterator[List[Dict]]:
+    """Regroup BULK_BOOK_SQL row batches so that no portfolio spans two chunks;
+    a batch's trailing portfolio is held back until its rows end"""
+    held: List[Dict] = []
+    for rows in batches:
+        if not rows:
+            continue
+        last = rows[-1]['portfolio_id']
+        split = len(rows)
+        while split and rows[split - 1]['portfolio_id'] == last:
+            split -= 1
+        if split == 0:
+            held.extend(rows)
+            continue
+        chunk = held + rows[:split]
+        held = rows[split:]
+        yield chunk
+    if held:
+        yield held
+
+class BulkPnLStream:
+    """NDJSON lines for a bulk valuation built a chunk of whole portfolios at a
+    time: a {"portfolio": ...} line per portfolio as its chunk is valued, then
+    a closing {"aggregate": ...} line"""
+
+    def __init__(self, requested_ids: Optional[List[str]] = None):
+        self.requested_ids = requested_ids
+        self.found: Set[str] = set()
+        self.failed_symbols: Dict[str, str] = {}
+        self.totals = AggregateTotals()
+
+    def add(self, books: MultiPortfolioBook, valuation: BookValuation,
+            failed_symbols: Optional[Dict[str, str]] = None) -> Iterator[str]:
+        """Lines for one chunk's portfolios"""
+        self.found.update(books.portfolio_ids)
+        self.failed_symbols.update(failed_symbols or {})
+        self.totals.add(books, valuation)
+        for portfolio_pnl in books.portfolio_pnls(valuation):
+            yield f'{{"portfolio": {portfolio_pnl.model_dump_json()}}}\n'
+
+    def summary(self) -> str:
+        summary = {
+            "aggregate": json.loads(self.totals.to_pnl().model_dump_json()),
+            "not_found": [pid for pid in dict.fromkeys(self.requested_ids or []) if pid not in self.found],
+            "failed_symbols": self.failed_symbols,
+        }
+        return json.dumps(summary) + "\n"
+
+class BulkValuation:
+    """P&L for many portfolios, consumable as one response or streamed per portfolio"""
+
+    def __init__(self, books: MultiPortfolioBook, quotes: QuoteBatch,
+                 requested_ids: Optional[List[str]] = None):
+        self.books = books
+        self.valuation = BookValuation(books.book, quotes.prices)
+        self.failed_symbols = quotes.failures
+        found = set(books.portfolio_ids)
+        self.not_found = [pid for pid in dict.fromkeys(requested_ids or []) if pid not in found]
+
+    def to_response(self) -> BulkPortfolioPnL:
+        return BulkPortfolioPnL(
+            portfolios=list(self.books.portfolio_pnls(self.valuation)),
+            aggregate=self.books.aggregate(self.valuation),
+            not_found=self.not_found,
+            failed_symbols=self.failed_symbols
+        )
+
+def _money(values: np.ndarray) -> List[float]:
+    return np.round(values, MONEY_PLACES).tolist()
@@ -0,0 +1,191 @@
+import asyncio
+import json
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+import logging
+from app.services.live_pnl import LivePnLEngine, live_pnl
+
+logger = logging.getLogger(__name__)
+
+def merge_messages(older: Dict, newer: Dict) -> Dict:
+    """Fold ``newer`` into a pending ``older`` message without mutating either,
+    since the same message is offered to every subscriber"""
+    if newer["type"] == "snapshot":
+        return newer
+    positions = dict(older["positions"])
+    closed = dict.fromkeys(older["closed"])
+    for symbol, row in newer["positions"].items():
+        positions[symbol] = row
+        closed.pop(symbol, None)
+    for symbol in newer["closed"]:
+        positions.pop(symbol, None)
+        # A pending snapshot simply no longer lists the position
+        if older["type"] != "snapshot":
+            closed[symbol] = None
+    return {**newer, "type": older["type"], "positions": positions, "closed": list(closed)}
+
+class PnLSubscriber:
+    """One client's mailbox, holding at most one pending message.
+
+    Messages offered while the client is still busy with the previous one
+    are merged into the pending one, so a slow client skips intermediate
+    states rather than queueing them, and never holds more than one
+    portfolio's worth of rows.
+    """
+
+    def __init__(self, portfolio_id: str):
+        self.portfolio_id = portfolio_id
+        self._pending: Optional[Dict] = None
+        self._ready = asyncio.Event()
+
+    def offer(self, message: Dict) -> bool:
+        """Queue a message without blocking; returns whether it was merged into a pending one"""
+        merged = self._pending is not None
+        self._pending = merge_messages(self._pending, message) if merged else message
+        self._ready.set()
+        return merged
+
+    async def get(self) -> Dict:
+        await self._ready.wait()
+        self._ready.clear()
+        message, self._pending = self._pending, None
+        return message
+
+class _PortfolioChannel:
+    """The subscribers to one portfolio's stream"""
+
+    def __init__(self, portfolio_id: str):
+        self.portfolio_id = portfolio_id
+        self.subscribers: Set[PnLSubscriber] = set()
+        self.sequence = 0
+        self.loading: Optional[asyncio.Future] = None
+        # A change landed while loading, so the load is repeated
+        self.stale = False
+
+class PnLStreamHub:
+    """Pushes each subscribed portfolio's P&L from the live P&L engine.
+
+    The engine announces every trade, tick and reload once; the hub turns
+    that into one message per portfolio and offers the same message to
+    every subscriber. A write outside the trade path has the engine reload
+    a streamed portfolio, with at most one load in flight per portfolio.
+    Event bus handlers may run on any thread and hand their work to the
+    event loop.
+    """
+
+    def __init__(self, engine: LivePnLEngine = live_pnl):
+        self.engine = engine
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._channels: Dict[str, _PortfolioChannel] = {}
+        self._published = 0
+        self._coalesced = 0
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+
+    async def subscribe(self, portfolio_id: str) -> PnLSubscriber:
+        """Subscribe to a portfolio; the first message is a snapshot. Raises
+        PortfolioNotFoundException for an unknown portfolio."""
+        await asyncio.to_thread(self.engine.get_portfolio_pnl, portfolio_id)
+        channel = self._channels.get(portfolio_id)
+        if channel is None:
+            channel = self._channels[portfolio_id] = _PortfolioChannel(portfolio_id)
+
+        subscriber = PnLSubscriber(portfolio_id)
+        channel.subscribers.add(subscriber)
+        subscriber.offer(self._message(channel, "snapshot", None))
+        return subscriber
+
+    def unsubscribe(self, subscriber: PnLSubscriber):
+        channel = self._channels.get(subscriber.portfolio_id)
+        if channel is None:
+            return
+        channel.subscribers.discard(subscriber)
+        if not channel.subscribers:
+            del self._channels[subscriber.portfolio_id]
+
+    def on_pnl_changed(self, change: Tuple[str, Optional[List[str]]]):
+        """Event bus handler"""
+        if change[0] in self._channels and self._loop:
+            self._loop.call_soon_threadsafe(self.publish, *change)
+
+    def on_portfolio_changed(self, portfolio_ids: Optional[List[str]]):
+        """Event bus handler"""
+        if self._channels and self._loop:
+            self._loop.call_soon_threadsafe(self.reload, portfolio_ids)
+
+    def publish(self, portfolio_id: str, symbols: Optional[List[str]]):
+        """Offer one message for an engine change to every subscriber of the portfolio"""
+        channel = self._channels.get(portfolio_id)
+        if channel is None:
+            return
+        channel.sequence += 1
+        message = self._message(channel, "pnl" if symbols is not None else "snapshot", symbols)
+        if message is None:
+            return
+        self._published += 1
+        for subscriber in channel.subscribers:
+            self._coalesced += subscriber.offer(message)
+
+    def reload(self, portfolio_ids: Optional[List[str]] = None):
+        """Have the engine reload these streamed portfolios (default: all)"""
+        for portfolio_id in list(self._channels) if portfolio_ids is None else portfolio_ids:
+            channel = self._channels.get(portfolio_id)
+            if channel is None:
+                continue
+            if channel.loading:
+                channel.stale = True
+            else:
+                channel.loading = asyncio.ensure_future(self._refresh(channel))
+
+    async def _refresh(self, channel: _PortfolioChannel):
+        try:
+            while True:
+                channel.stale = False
+                # The engine announces the load, which publishes a snapshot
+                await asyncio.to_thread(self.engine.get_portfolio_pnl, channel.portfolio_id)
+                if not channel.stale:
+                    return
+        except Exception as e:
+            logger.error(f"Reloading streamed P&L for {channel.portfolio_id} failed: {e}")
+        finally:
+            channel.loading = None
+
+    def _message(self, channel: _PortfolioChannel, kind: str, symbols: Optional[List[str]]) -> Optional[Dict]:
+        view = self.engine.view(channel.portfolio_id, symbols)
+        if view is None:
+            return None
+        totals, rows = view
+        return {
+            "type": kind,
+            "portfolio_id": channel.portfolio_id,
+            "sequence": channel.sequence,
+            **totals,
+            "positions": {symbol: row for symbol, row in rows.items() if row is not None},
+            "closed": [symbol for symbol, row in rows.items() if row is None],
+        }
+
+    def stats(self) -> Dict:
+        return {
+            "portfolios": len(self._channels),
+            "subscribers": sum(len(channel.subscribers) for channel in self._channels.values()),
+            "published": self._published,
+            "coalesced": self._coalesced,
+        }
+
+async def sse_events(hub: PnLStreamHub, subscriber: PnLSubscriber,
+                     heartbeat: float) -> AsyncIterator[str]:
+    """Server-sent events for one subscriber; the next message is only taken
+    once the previous one has been written, so a slow client coalesces"""
+    try:
+        while True:
+            try:
+                message = await asyncio.wait_for(subscriber.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"event: {message['type']}\nid: {message['sequence']}\ndata: {json.dumps(message)}\n\n"
+    finally:
+        hub.unsubscribe(subscriber)
+
+# Global P&L stream hub instance
+pnl_hub = PnLStreamHub()
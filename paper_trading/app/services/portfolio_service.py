@@ -1,10 +1,34 @@
-from typing import List, Dict
-from datetime import datetime
+import asyncio
+from typing import Iterator, List, Dict, Optional, Tuple
+from datetime import date, datetime, time, timedelta, timezone
+from psycopg2.extras import RealDictCursor
 import logging
+from app.core.config import settings
 from app.core.database import db_manager
-from app.core.exceptions import PortfolioNotFoundException
+from app.core.async_database import async_db_manager
+from app.core.events import PORTFOLIO_CHANGED, event_bus
+from app.core.exceptions import CostBasisMethodLockedException, PortfolioNotFoundException
+from app.services.live_pnl import live_pnl
+from app.services.portfolio_state import portfolio_states
 from app.services.price_service import PriceService
-from app.models.portfolio import PortfolioResponse, PortfolioPnL, PositionPnL
+from app.services.pnl_engine import (
+    BULK_BOOK_SQL,
+    BULK_REALIZED_SQL,
+    BookValuation,
+    BulkPnLStream,
+    BulkValuation,
+    MultiPortfolioBook,
+    portfolio_chunks,
+    realized_by_portfolio
+)
+from app.services.quote_engine import QuoteBatch
+from app.models.portfolio import (
+    PortfolioResponse,
+    PortfolioPnL,
+    PortfolioSnapshot,
+    RealizedPnLEntry,
+    SnapshotTotals
+)
 from app.models.position import PositionResponse
 
 logger = logging.getLogger(__name__)
@@ -17,7 +41,7 @@ class PortfolioService:
         """Get portfolio details"""
         with db_manager.get_cursor() as (cursor, conn):
             cursor.execute("""
-                SELECT portfolio_id, cash_balance, total_value, created_at, updated_at
+                SELECT portfolio_id, cash_balance, total_value, cost_basis_method, created_at, updated_at
                 FROM portfolio WHERE portfolio_id = %s
             """, (portfolio_id,))
 
@@ -56,94 +80,156 @@ class PortfolioService:
             return PositionResponse(**result)
 
     def get_portfolio_pnl(self, portfolio_id: str = "default") -> PortfolioPnL:
-        """Calculate portfolio P&L with current prices"""
-        positions = self.get_positions(portfolio_id)
-
-        if not positions:
-            cash_balance = self._get_cash_balance(portfolio_id)
-            return PortfolioPnL(
-                portfolio_id=portfolio_id,
-                cash_balance=cash_balance,
-                total_invested=0,
-                current_value=0,
-                total_pnl=0,
-                total_portfolio_value=cash_balance,
-                positions_pnl=[]
-            )
-
-        # Get current prices for all symbols
-        symbols = [pos.symbol for pos in positions]
-        current_prices = self.price_service.get_multiple_prices(symbols)
-
-        positions_pnl = []
-        total_pnl = 0
-        total_invested = 0
-        current_portfolio_value = 0
-
-        for position in positions:
-            symbol = position.symbol
-            quantity = position.net_quantity
-            avg_price = float(position.avg_price)
-            invested = float(position.total_invested)
-
-            current_price = current_prices.get(symbol, avg_price)
-            current_value = current_price * quantity
-            pnl = current_value - invested
-            pnl_percent = (pnl / invested) * 100 if invested > 0 else 0
-
-            position_pnl = PositionPnL(
-                symbol=symbol,
-                quantity=quantity,
-                avg_price=avg_price,
-                current_price=current_price,
-                invested=invested,
-                current_value=current_value,
-                pnl=pnl,
-                pnl_percent=pnl_percent
-            )
-
-            positions_pnl.append(position_pnl)
-            total_pnl += pnl
-            total_invested += invested
-            current_portfolio_value += current_value
-
-        cash_balance = self._get_cash_balance(portfolio_id)
-
-        return PortfolioPnL(
-            portfolio_id=portfolio_id,
-            cash_balance=cash_balance,
-            total_invested=total_invested,
-            current_value=current_portfolio_value,
-            total_pnl=total_pnl,
-            total_portfolio_value=current_portfolio_value + cash_balance,
-            positions_pnl=positions_pnl
-        )
+        """Portfolio P&L with current prices, from the live P&L engine"""
+        return live_pnl.get_portfolio_pnl(portfolio_id)
+
+    def get_bulk_portfolio_pnl(self, portfolio_ids: Optional[List[str]] = None) -> BulkValuation:
+        """Calculate P&L for many portfolios (all when None), quoting each symbol once"""
+        with db_manager.get_cursor() as (cursor, conn):
+            cursor.execute(BULK_BOOK_SQL, (portfolio_ids, portfolio_ids))
+            rows = cursor.fetchall()
+            cursor.execute(BULK_REALIZED_SQL, (portfolio_ids, portfolio_ids))
+            books = MultiPortfolioBook(rows, realized_by_portfolio(cursor.fetchall()))
+
+        quotes = self.price_service.get_quotes(books.symbols) if len(books.book) else QuoteBatch()
+        return BulkValuation(books, quotes, portfolio_ids)
+
+    def stream_bulk_portfolio_pnl(self, portfolio_ids: Optional[List[str]] = None,
+                                  batch_size: int = None) -> Iterator[str]:
+        """Bulk P&L as NDJSON, read through a server-side cursor and valued a chunk
+        of whole portfolios at a time.
+
+        Each chunk's realized P&L is read and only the symbols no earlier chunk
+        quoted are fetched, so the first lines go out after one chunk rather
+        than the whole book. The pooled connection is held until the stream
+        is exhausted or closed.
+        """
+        batch_size = batch_size or settings.bulk_pnl_batch_size
+        stream = BulkPnLStream(portfolio_ids)
+        prices: Dict[str, float] = {}
+        quoted = set()
+
+        with db_manager.get_connection() as conn:
+            try:
+                with conn.cursor(name="bulk_pnl", cursor_factory=RealDictCursor) as book_cursor, \
+                        conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                    book_cursor.itersize = batch_size
+                    book_cursor.execute(BULK_BOOK_SQL, (portfolio_ids, portfolio_ids))
+                    batches = iter(lambda: book_cursor.fetchmany(batch_size), [])
+                    for rows in portfolio_chunks(batches):
+                        ids = list(dict.fromkeys(row['portfolio_id'] for row in rows))
+                        cursor.execute(BULK_REALIZED_SQL, (ids, ids))
+                        books = MultiPortfolioBook(rows, realized_by_portfolio(cursor.fetchall()))
+
+                        new_symbols = [symbol for symbol in books.symbols if symbol not in quoted]
+                        quotes = self.price_service.get_quotes(new_symbols) if new_symbols else QuoteBatch()
+                        quoted.update(new_symbols)
+                        prices.update(quotes.prices)
+                        yield from stream.add(books, BookValuation(books.book, prices), quotes.failures)
+            finally:
+                # Read-only: ending the transaction also releases the cursor's portal
+                conn.rollback()
+        yield stream.summary()
 
     def update_cash_balance(self, portfolio_id: str, new_balance: float) -> PortfolioResponse:
         """Update portfolio cash balance"""
-        with db_manager.get_cursor() as (cursor, conn):
+        with portfolio_states.writing([portfolio_id]), db_manager.get_cursor() as (cursor, conn):
             cursor.execute("""
                 UPDATE portfolio
                 SET cash_balance = %s, updated_at = CURRENT_TIMESTAMP
                 WHERE portfolio_id = %s
-                RETURNING portfolio_id, cash_balance, total_value, created_at, updated_at
+                RETURNING portfolio_id, cash_balance, total_value, cost_basis_method, created_at, updated_at
             """, (new_balance, portfolio_id))
 
             result = cursor.fetchone()
             if not result:
                 raise PortfolioNotFoundException(portfolio_id)
 
-            return PortfolioResponse(**result)
+        event_bus.publish(PORTFOLIO_CHANGED, [portfolio_id])
+        return PortfolioResponse(**result)
 
-    def _get_cash_balance(self, portfolio_id: str) -> float:
-        """Get current cash balance"""
-        with db_manager.get_cursor() as (cursor, conn):
-            cursor.execute(
-                "SELECT cash_balance FROM portfolio WHERE portfolio_id = %s",
-                (portfolio_id,)
-            )
+    def set_cost_basis_method(self, portfolio_id: str, method: str) -> PortfolioResponse:
+        """Switch the cost basis method future sells use. Open lots would be
+        read under the wrong method, so the portfolio must hold no positions."""
+        with portfolio_states.writing([portfolio_id]), db_manager.get_cursor() as (cursor, conn):
+            # Trades update the portfolio row too, so this serializes with them
+            cursor.execute("SELECT 1 FROM portfolio WHERE portfolio_id = %s FOR UPDATE", (portfolio_id,))
+            if not cursor.fetchone():
+                raise PortfolioNotFoundException(portfolio_id)
+            cursor.execute("""
+                SELECT 1 FROM positions WHERE portfolio_id = %s AND net_quantity > 0 LIMIT 1
+            """, (portfolio_id,))
+            if cursor.fetchone():
+                raise CostBasisMethodLockedException(portfolio_id)
+
+            cursor.execute("DELETE FROM position_lots WHERE portfolio_id = %s", (portfolio_id,))
+            cursor.execute("""
+                UPDATE portfolio
+                SET cost_basis_method = %s, updated_at = CURRENT_TIMESTAMP
+                WHERE portfolio_id = %s
+                RETURNING portfolio_id, cash_balance, total_value, cost_basis_method, created_at, updated_at
+            """, (method, portfolio_id))
             result = cursor.fetchone()
-            return float(result['cash_balance']) if result else 0
+
+        logger.info(f"Portfolio {portfolio_id} now uses {method} cost basis")
+        event_bus.publish(PORTFOLIO_CHANGED, [portfolio_id])
+        return PortfolioResponse(**result)
+
+    def get_realized_pnl(self, portfolio_id: str = "default", symbol: Optional[str] = None,
+                         limit: int = 100) -> List[RealizedPnLEntry]:
+        """Realized P&L of the portfolio's most recent sells, newest first"""
+        with db_manager.get_cursor() as (cursor, conn):
+            cursor.execute("SELECT 1 FROM portfolio WHERE portfolio_id = %s", (portfolio_id,))
+            if not cursor.fetchone():
+                raise PortfolioNotFoundException(portfolio_id)
+            cursor.execute("""
+                SELECT trade_id, symbol, quantity, cost_basis, realized, realized_at
+                FROM realized_pnl
+                WHERE portfolio_id = %(portfolio_id)s AND (%(symbol)s::text IS NULL OR symbol = %(symbol)s)
+                ORDER BY realized_at DESC, trade_id DESC
+                LIMIT %(limit)s
+            """, {"portfolio_id": portfolio_id, "symbol": symbol, "limit": limit})
+            return [RealizedPnLEntry(**row) for row in cursor.fetchall()]
+
+    def get_snapshots(self, portfolio_id: str = "default", start: Optional[date] = None,
+                      end: Optional[date] = None, intraday: bool = False,
+                      limit: int = 1000) -> List[PortfolioSnapshot]:
+        """Stored snapshots of the portfolio, newest first; end-of-day only unless intraday"""
+        with db_manager.get_cursor() as (cursor, conn):
+            cursor.execute("SELECT 1 FROM portfolio WHERE portfolio_id = %s", (portfolio_id,))
+            if not cursor.fetchone():
+                raise PortfolioNotFoundException(portfolio_id)
+            query = """
+                SELECT portfolio_id, snapshot_at, end_of_day, cash_balance, positions_value, total_invested,
+                       unrealized_pnl, realized_pnl, total_value, position_count
+                FROM portfolio_snapshots
+                WHERE portfolio_id = %s
+            """
+            params: List = [portfolio_id]
+            # Literal bounds let Postgres prune the monthly partitions
+            query, params = _snapshot_range(query, params, start, end)
+            if not intraday:
+                query += " AND end_of_day"
+            query += " ORDER BY snapshot_at DESC LIMIT %s"
+            params.append(limit)
+            cursor.execute(query, params)
+            return [PortfolioSnapshot(**row) for row in cursor.fetchall()]
+
+    def get_snapshot_totals(self, start: Optional[date] = None,
+                            end: Optional[date] = None) -> List[SnapshotTotals]:
+        """End-of-day totals across all portfolios, newest first"""
+        query = """
+            SELECT snapshot_at, count(*) AS portfolio_count, sum(cash_balance) AS cash_balance,
+                   sum(positions_value) AS positions_value, sum(unrealized_pnl) AS unrealized_pnl,
+                   sum(realized_pnl) AS realized_pnl, sum(total_value) AS total_value
+            FROM portfolio_snapshots
+            WHERE end_of_day
+        """
+        query, params = _snapshot_range(query, [], start, end)
+        query += " GROUP BY snapshot_at ORDER BY snapshot_at DESC"
+        with db_manager.get_cursor() as (cursor, conn):
+            cursor.execute(query, params)
+            return [SnapshotTotals(**row) for row in cursor.fetchall()]
 
     def close_position(self, symbol: str, portfolio_id: str = "default") -> bool:
         """Close entire position for a symbol"""
@@ -169,3 +255,118 @@ class PortfolioService:
         except Exception as e:
             logger.error(f"Error closing position for {symbol}: {e}")
             return False
+
+    async def get_portfolio_async(self, portfolio_id: str = "default") -> PortfolioResponse:
+        """Get portfolio details on the async database path"""
+        async with async_db_manager.get_cursor() as (cursor, conn):
+            await cursor.execute("""
+                SELECT portfolio_id, cash_balance, total_value, cost_basis_method, created_at, updated_at
+                FROM portfolio WHERE portfolio_id = %s
+            """, (portfolio_id,))
+
+            result = cursor.fetchone()
+            if not result:
+                raise PortfolioNotFoundException(portfolio_id)
+
+            return PortfolioResponse(**result)
+
+    async def get_positions_async(self, portfolio_id: str = "default") -> List[PositionResponse]:
+        """Get all positions for a portfolio on the async database path"""
+        async with async_db_manager.get_cursor() as (cursor, conn):
+            await cursor.execute("""
+                SELECT symbol, net_quantity, avg_price, total_invested, last_updated, portfolio_id
+                FROM positions
+                WHERE portfolio_id = %s AND net_quantity > 0
+                ORDER BY symbol
+            """, (portfolio_id,))
+
+            return [PositionResponse(**row) for row in cursor.fetchall()]
+
+    async def get_position_by_symbol_async(self, symbol: str,
+                                           portfolio_id: str = "default") -> PositionResponse:
+        """Get specific position by symbol on the async database path"""
+        async with async_db_manager.get_cursor() as (cursor, conn):
+            await cursor.execute("""
+                SELECT symbol, net_quantity, avg_price, total_invested, last_updated, portfolio_id
+                FROM positions
+                WHERE symbol = %s AND portfolio_id = %s
+            """, (symbol, portfolio_id))
+
+            result = cursor.fetchone()
+            if not result:
+                return None
+
+            return PositionResponse(**result)
+
+    async def get_portfolio_pnl_async(self, portfolio_id: str = "default") -> PortfolioPnL:
+        """Portfolio P&L, served from memory when the engine holds it current"""
+        pnl = live_pnl.snapshot(portfolio_id)
+        if pnl is not None:
+            return pnl
+        return await asyncio.to_thread(live_pnl.get_portfolio_pnl, portfolio_id)
+
+    async def get_bulk_portfolio_pnl_async(self, portfolio_ids: Optional[List[str]] = None) -> BulkValuation:
+        """Calculate P&L for many portfolios on the async database path"""
+        async with async_db_manager.get_cursor() as (cursor, conn):
+            await cursor.execute(BULK_BOOK_SQL, (portfolio_ids, portfolio_ids))
+            rows = cursor.fetchall()
+            await cursor.execute(BULK_REALIZED_SQL, (portfolio_ids, portfolio_ids))
+            books = MultiPortfolioBook(rows, realized_by_portfolio(cursor.fetchall()))
+
+        quotes = await self.price_service.get_quotes_async(books.symbols) if len(books.book) else QuoteBatch()
+        return BulkValuation(books, quotes, portfolio_ids)
+
+    async def update_cash_balance_async(self, portfolio_id: str, new_balance: float) -> PortfolioResponse:
+        """Update portfolio cash balance on the async database path"""
+        if portfolio_states.write_behind:
+            # Serialized with the portfolio's journaled trades, off the event loop
+            return await asyncio.to_thread(self.update_cash_balance, portfolio_id, new_balance)
+        async with async_db_manager.get_cursor() as (cursor, conn):
+            await cursor.execute("""
+                UPDATE portfolio
+                SET cash_balance = %s, updated_at = CURRENT_TIMESTAMP
+                WHERE portfolio_id = %s
+                RETURNING portfolio_id, cash_balance, total_value, cost_basis_method, created_at, updated_at
+            """, (new_balance, portfolio_id))
+
+            result = cursor.fetchone()
+            if not result:
+                raise PortfolioNotFoundException(portfolio_id)
+
+        event_bus.publish(PORTFOLIO_CHANGED, [portfolio_id])
+        return PortfolioResponse(**result)
+
+    async def close_position_async(self, symbol: str, portfolio_id: str = "default") -> bool:
+        """Close entire position for a symbol on the async database path"""
+        position = await self.get_position_by_symbol_async(symbol, portfolio_id)
+        if not position:
+            return False
+
+        from app.services.trading_service import TradingService
+        from app.models.trade import TradeCreate
+
+        trading_service = TradingService()
+        sell_trade = TradeCreate(
+            symbol=symbol,
+            trade_type="SELL",
+            quantity=position.net_quantity,
+            portfolio_id=portfolio_id
+        )
+
+        try:
+            await trading_service.place_trade_async(sell_trade)
+            return True
+        except Exception as e:
+            logger.error(f"Error closing position for {symbol}: {e}")
+            return False
+
+def _snapshot_range(query: str, params: List, start: Optional[date],
+                    end: Optional[date]) -> Tuple[str, List]:
+    """Restrict a portfolio_snapshots query to the UTC days start..end, inclusive"""
+    if start:
+        query += " AND snapshot_at >= %s"
+        params.append(datetime.combine(start, time.min, timezone.utc))
+    if end:
+        query += " AND snapshot_at < %s"
+        params.append(datetime.combine(end + timedelta(days=1), time.min, timezone.utc))
+    return query, params
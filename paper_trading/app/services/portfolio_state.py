@@ -0,0 +1,299 @@
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from psycopg2.extras import execute_values
+from app.core.config import settings
+from app.core.database import db_manager
+from app.core.exceptions import (
+    InsufficientFundsException,
+    InsufficientSharesException,
+    PortfolioNotFoundException,
+    TradingException
+)
+from app.services.cost_basis import LotPositionState, PositionState, position_state
+from app.models.trade import TradeCreate
+
+# Open lots in consumption order per position
+PORTFOLIO_LOTS_SQL = """
+    SELECT portfolio_id, symbol, quantity, price::float8 AS price, trade_id
+    FROM position_lots
+    WHERE portfolio_id = %s
+    ORDER BY symbol, opened_at, trade_id
+"""
+
+POSITION_LOTS_SQL = """
+    SELECT portfolio_id, symbol, quantity, price::float8 AS price, trade_id
+    FROM position_lots
+    WHERE (portfolio_id, symbol) IN (SELECT * FROM unnest(%s::text[], %s::text[]))
+    ORDER BY portfolio_id, symbol, opened_at, trade_id
+"""
+
+def apply_trade(trade: TradeCreate, price: float, cash: Dict[str, float],
+                positions: Dict[Tuple[str, str], PositionState], method: str = 'AVERAGE',
+                trade_id: Optional[int] = None) -> Tuple[Optional[TradingException], float]:
+    """Validate one trade against in-memory cash and positions and apply it.
+    Returns the rejection (or None) and the P&L the trade realized; a
+    FIFO/LIFO BUY opens a lot under ``trade_id``."""
+    if trade.portfolio_id not in cash:
+        return PortfolioNotFoundException(trade.portfolio_id), 0.0
+
+    key = (trade.portfolio_id, trade.symbol)
+    trade_value = price * trade.quantity
+    position = positions.get(key)
+
+    if trade.trade_type == 'BUY':
+        if cash[trade.portfolio_id] < trade_value:
+            return InsufficientFundsException(
+                f"Required: ${trade_value:.2f}, Available: ${cash[trade.portfolio_id]:.2f}"
+            ), 0.0
+        if position is None or position.quantity == 0:
+            position = positions[key] = position_state(method)
+        realized = position.apply('BUY', trade.quantity, price, trade_id)
+        cash[trade.portfolio_id] -= trade_value
+    else:  # SELL
+        available_shares = position.quantity if position else 0
+        if available_shares < trade.quantity:
+            return InsufficientSharesException(
+                f"Required: {trade.quantity}, Available: {available_shares}"
+            ), 0.0
+        realized = position.apply('SELL', trade.quantity, price)
+        cash[trade.portfolio_id] += trade_value
+    return None, realized
+
+def write_positions(cursor, positions: Dict[Tuple[str, str], PositionState],
+                    touched: set, existing_keys: set):
+    """Write the net position change of a batch: one upsert and one delete"""
+    upserts, closed = [], []
+    for key in sorted(touched):
+        position = positions[key]
+        if position.quantity != 0:
+            upserts.append((key[1], position.quantity, position.avg_price, position.invested, key[0]))
+        elif key in existing_keys:
+            closed.append(key)
+
+    if upserts:
+        execute_values(cursor, """
+            INSERT INTO positions (symbol, net_quantity, avg_price, total_invested, portfolio_id)
+            VALUES %s
+            ON CONFLICT (symbol, portfolio_id) DO UPDATE
+            SET net_quantity = EXCLUDED.net_quantity,
+                avg_price = EXCLUDED.avg_price,
+                total_invested = EXCLUDED.total_invested,
+                last_updated = CURRENT_TIMESTAMP
+        """, upserts, page_size=len(upserts))
+    if closed:
+        cursor.execute("""
+            DELETE FROM positions
+            WHERE (portfolio_id, symbol) IN (SELECT * FROM unnest(%s::text[], %s::text[]))
+        """, ([key[0] for key in closed], [key[1] for key in closed]))
+
+def lot_positions(rows: Iterable[Dict], methods: Dict[str, str]) -> Dict[Tuple[str, str], LotPositionState]:
+    """Group lot rows, in consumption order per position, into lot positions"""
+    lots: Dict[Tuple[str, str], List[List]] = {}
+    for row in rows:
+        lots.setdefault((row['portfolio_id'], row['symbol']), []).append(
+            [row['quantity'], row['price'], row['trade_id']]
+        )
+    return {key: LotPositionState(methods[key[0]] == 'LIFO', position_lots) for key, position_lots in lots.items()}
+
+def lot_changes(positions: Dict[Tuple[str, str], PositionState],
+                keys: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str, int], Tuple[int, float]]:
+    """Take the lots opened or changed since the last call, as (portfolio, symbol, trade id) -> (quantity, price)"""
+    changes = {}
+    for key in keys:
+        position = positions.get(key)
+        if isinstance(position, LotPositionState):
+            for trade_id, lot in position.changes.items():
+                changes[(key[0], key[1], trade_id)] = (lot[0], lot[1])
+            position.changes.clear()
+    return changes
+
+def write_lots(cursor, lots: Dict[Tuple[str, str, int], Tuple[int, float]]):
+    """Upsert opened or split lots and delete consumed ones (quantity 0); a
+    new lot is dated by its trade, which must already be inserted"""
+    upserts = [(*key, quantity, price) for key, (quantity, price) in lots.items() if quantity > 0]
+    spent = [key for key, (quantity, _) in lots.items() if quantity == 0]
+    if upserts:
+        execute_values(cursor, """
+            INSERT INTO position_lots (portfolio_id, symbol, trade_id, quantity, price, opened_at)
+            SELECT v.portfolio_id, v.symbol, v.trade_id, v.quantity, v.price, t.trade_date
+            FROM (VALUES %s) AS v(portfolio_id, symbol, trade_id, quantity, price)
+            JOIN trades t ON t.id = v.trade_id
+            ON CONFLICT (portfolio_id, symbol, trade_id) DO UPDATE SET quantity = EXCLUDED.quantity
+        """, upserts, page_size=len(upserts))
+    if spent:
+        cursor.execute("""
+            DELETE FROM position_lots
+            WHERE (portfolio_id, symbol, trade_id) IN (
+                SELECT * FROM unnest(%s::text[], %s::text[], %s::integer[]))
+        """, ([key[0] for key in spent], [key[1] for key in spent], [key[2] for key in spent]))
+
+def write_realized(cursor, rows: List[Tuple[int, str, str, int, float, float]]):
+    """Record SELLs' (trade id, portfolio, symbol, quantity, cost basis, realized P&L)
+    in the realized P&L ledger, dated by their already inserted trades"""
+    if rows:
+        execute_values(cursor, """
+            INSERT INTO realized_pnl (trade_id, portfolio_id, symbol, quantity, cost_basis, realized, realized_at)
+            SELECT v.trade_id, v.portfolio_id, v.symbol, v.quantity, v.cost_basis, v.realized, t.trade_date
+            FROM (VALUES %s) AS v(trade_id, portfolio_id, symbol, quantity, cost_basis, realized)
+            JOIN trades t ON t.id = v.trade_id
+            ON CONFLICT (trade_id) DO NOTHING
+        """, rows, page_size=len(rows))
+
+def write_cash_deltas(cursor, deltas: Dict[str, float]):
+    """Move each portfolio's cash by its net trade flow in one statement"""
+    cursor.execute("""
+        UPDATE portfolio AS p
+        SET cash_balance = p.cash_balance + d.delta, updated_at = CURRENT_TIMESTAMP
+        FROM unnest(%s::text[], %s::numeric[]) AS d(portfolio_id, delta)
+        WHERE p.portfolio_id = d.portfolio_id
+    """, (list(deltas), list(deltas.values())))
+
+class PortfolioStateManager:
+    """Cached cash and positions per portfolio, mutated under a per-portfolio lock.
+
+    Trades on one portfolio are serialized by its lock while different
+    portfolios proceed in parallel. A portfolio is loaded from Postgres on
+    first use, again once it is ``ttl`` seconds old or has been
+    invalidated, and once more before a trade is rejected, so a deposit
+    made elsewhere is seen before refusing. ``before_load`` runs ahead of
+    every load, letting a write-behind owner flush what the cache holds
+    that Postgres does not yet.
+    """
+
+    def __init__(self, ttl: float = 30.0):
+        self.ttl = ttl
+        self.before_load: Optional[Callable[[], object]] = None
+        self._registry_lock = threading.Lock()
+        self._locks: Dict[str, threading.Lock] = {}
+        self._cash: Dict[str, float] = {}
+        self._methods: Dict[str, str] = {}
+        self._positions: Dict[Tuple[str, str], PositionState] = {}
+        self._symbols: Dict[str, Set[str]] = {}
+        self._loaded_at: Dict[str, float] = {}
+        # Bumped by invalidate(), so a load racing an external write is not trusted
+        self._generations: Dict[str, int] = {}
+        self._hits = 0
+        self._loads = 0
+        self._reloads_on_reject = 0
+
+    @property
+    def write_behind(self) -> bool:
+        return self.before_load is not None
+
+    def lock(self, portfolio_id: str) -> threading.Lock:
+        lock = self._locks.get(portfolio_id)
+        if lock is None:
+            with self._registry_lock:
+                lock = self._locks.setdefault(portfolio_id, threading.Lock())
+        return lock
+
+    def apply(self, trade: TradeCreate, price: float,
+              trade_id: Optional[int] = None) -> Tuple[Optional[TradingException], float]:
+        """Validate and apply a trade, as apply_trade; the caller holds lock(trade.portfolio_id)"""
+        portfolio_id = trade.portfolio_id
+        loaded = self._ensure_loaded(portfolio_id)
+        error, realized = apply_trade(trade, price, self._cash, self._positions, self.method(portfolio_id), trade_id)
+        if error is not None and not loaded:
+            self._reloads_on_reject += 1
+            self._load(portfolio_id)
+            error, realized = apply_trade(trade, price, self._cash, self._positions,
+                                          self.method(portfolio_id), trade_id)
+        if error is None:
+            self._symbols[portfolio_id].add(trade.symbol)
+        return error, realized
+
+    def position(self, portfolio_id: str, symbol: str) -> Optional[PositionState]:
+        return self._positions.get((portfolio_id, symbol))
+
+    def method(self, portfolio_id: str) -> str:
+        return self._methods.get(portfolio_id, 'AVERAGE')
+
+    def invalidate(self, portfolio_ids: Optional[Iterable[str]] = None):
+        """Reload these portfolios (default: all) on their next trade"""
+        for portfolio_id in list(self._loaded_at) if portfolio_ids is None else portfolio_ids:
+            self._generations[portfolio_id] = self._generations.get(portfolio_id, 0) + 1
+            self._loaded_at.pop(portfolio_id, None)
+
+    @contextmanager
+    def writing(self, portfolio_ids: Optional[Iterable[str]] = None) -> Iterator[None]:
+        """Hold portfolios' locks (default: every known portfolio) around a write made
+        outside the cache, then invalidate them"""
+        with self._registry_lock:
+            ids = sorted(self._locks if portfolio_ids is None else set(portfolio_ids))
+        # Locks are taken in sorted order so concurrent writers cannot deadlock
+        with ExitStack() as stack:
+            for portfolio_id in ids:
+                stack.enter_context(self.lock(portfolio_id))
+            if self.before_load:
+                self.before_load()
+            try:
+                yield
+            finally:
+                self.invalidate(ids)
+
+    def clear(self):
+        self.invalidate()
+        self._cash.clear()
+        self._methods.clear()
+        self._positions.clear()
+        self._symbols.clear()
+
+    def _ensure_loaded(self, portfolio_id: str) -> bool:
+        """Load the portfolio if it is missing or stale; returns whether it was loaded now"""
+        loaded_at = self._loaded_at.get(portfolio_id)
+        if loaded_at is not None and time.monotonic() - loaded_at <= self.ttl:
+            self._hits += 1
+            return False
+        self._load(portfolio_id)
+        return True
+
+    def _load(self, portfolio_id: str):
+        if self.before_load:
+            self.before_load()
+        generation = self._generations.get(portfolio_id, 0)
+        with db_manager.get_cursor() as (cursor, conn):
+            cursor.execute("SELECT cash_balance, cost_basis_method FROM portfolio WHERE portfolio_id = %s",
+                           (portfolio_id,))
+            row = cursor.fetchone()
+            cursor.execute("""
+                SELECT symbol, net_quantity, avg_price, total_invested
+                FROM positions WHERE portfolio_id = %s
+            """, (portfolio_id,))
+            positions = cursor.fetchall()
+            lots = []
+            if row is not None and row['cost_basis_method'] != 'AVERAGE':
+                cursor.execute(PORTFOLIO_LOTS_SQL, (portfolio_id,))
+                lots = cursor.fetchall()
+
+        self._loads += 1
+        self._cash.pop(portfolio_id, None)
+        self._methods.pop(portfolio_id, None)
+        for symbol in self._symbols.pop(portfolio_id, ()):
+            self._positions.pop((portfolio_id, symbol), None)
+        if row is None:
+            return
+
+        self._cash[portfolio_id] = float(row['cash_balance'])
+        self._methods[portfolio_id] = row['cost_basis_method']
+        self._symbols[portfolio_id] = {position['symbol'] for position in positions}
+        for position in positions:
+            self._positions[(portfolio_id, position['symbol'])] = PositionState(
+                position['net_quantity'], float(position['avg_price']), float(position['total_invested'])
+            )
+        # FIFO/LIFO positions are rebuilt from their lots
+        self._positions.update(lot_positions(lots, self._methods))
+        if self._generations.get(portfolio_id, 0) == generation:
+            self._loaded_at[portfolio_id] = time.monotonic()
+
+    def stats(self) -> Dict:
+        return {
+            "portfolios": len(self._loaded_at),
+            "hits": self._hits,
+            "loads": self._loads,
+            "reloads_on_reject": self._reloads_on_reject,
+        }
+
+# Global portfolio state instance
+portfolio_states = PortfolioStateManager(ttl=settings.portfolio_state_ttl)
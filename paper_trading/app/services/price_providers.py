@@ -0,0 +1,214 @@
+import csv
+import math
+import random
+import threading
+import time
+import zlib
+import yfinance as yf
+from typing import Dict, List, Tuple
+import logging
+from app.core.config import settings
+from app.services.bar_store import BarStore, bar_store
+
+logger = logging.getLogger(__name__)
+
+class PriceProvider:
+    """Upstream source of last-trade prices.
+
+    Providers implement ``get_price``; those with a native multi-symbol
+    request also set ``supports_batch`` and implement ``get_prices``.
+    Both raise (or omit symbols) when a quote is unavailable. A provider
+    that cannot serve many fetches at once sets ``max_concurrent_fetches``.
+    """
+
+    name = "base"
+    supports_batch = False
+    max_concurrent_fetches = None
+
+    def get_price(self, symbol: str, timeout: float = None) -> float:
+        raise NotImplementedError
+
+    def get_prices(self, symbols: List[str], timeout: float = None) -> Dict[str, float]:
+        """Fetch several prices; symbols without a quote are left out"""
+        prices = {}
+        for symbol in symbols:
+            try:
+                prices[symbol] = self.get_price(symbol, timeout=timeout)
+            except Exception as e:
+                logger.warning(f"{self.name}: no price for {symbol}: {e}")
+        return prices
+
+class YFinanceProvider(PriceProvider):
+    """Yahoo Finance quotes via yfinance"""
+
+    name = "yfinance"
+    supports_batch = True
+    # yf.download keeps per-call results in module globals, so concurrent
+    # downloads would clobber each other; each one still fetches its
+    # chunk's tickers in parallel
+    max_concurrent_fetches = 1
+
+    def get_price(self, symbol: str, timeout: float = None) -> float:
+        data = yf.Ticker(symbol).history(period="1d", interval="1m",
+                                         timeout=timeout or settings.quote_timeout)
+        if data.empty:
+            raise ValueError(f"No price data for {symbol}")
+        return float(data['Close'].iloc[-1])
+
+    def get_prices(self, symbols: List[str], timeout: float = None) -> Dict[str, float]:
+        data = yf.download(symbols, period="1d", interval="1m", progress=False,
+                           threads=True, timeout=timeout or settings.quote_timeout)
+        if data.empty:
+            return {}
+
+        closes = data['Close']
+        if len(symbols) == 1 and not hasattr(closes, 'columns'):
+            closes = closes.to_frame(symbols[0])
+
+        prices = {}
+        for symbol in symbols:
+            if symbol not in closes:
+                continue
+            series = closes[symbol].dropna()
+            if not series.empty:
+                prices[symbol] = float(series.iloc[-1])
+        return prices
+
+class BarStoreProvider(PriceProvider):
+    """Last close from the local bar store; no network access"""
+
+    name = "bar_store"
+    supports_batch = True
+
+    def __init__(self, store: BarStore = None):
+        self.store = store or bar_store
+
+    def get_price(self, symbol: str, timeout: float = None) -> float:
+        latest = self.store.latest(symbol)
+        if latest is None:
+            raise ValueError(f"No stored bars for {symbol}")
+        return latest[1]
+
+    def get_prices(self, symbols: List[str], timeout: float = None) -> Dict[str, float]:
+        prices = {}
+        for symbol in symbols:
+            latest = self.store.latest(symbol)
+            if latest is not None:
+                prices[symbol] = latest[1]
+        return prices
+
+class SyntheticProvider(PriceProvider):
+    """Seeded geometric random walk per symbol, for offline load tests.
+
+    Every call advances the symbol's walk by one step. A symbol's price
+    sequence depends only on the seed, the symbol and how many times it has
+    been quoted, so runs with the same seed see the same prices.
+    """
+
+    name = "synthetic"
+    supports_batch = True
+
+    def __init__(self, seed: int = None, start_price: float = None, volatility: float = None,
+                 latency: float = None):
+        self.seed = settings.synthetic_seed if seed is None else seed
+        self.start_price = start_price or settings.synthetic_start_price
+        self.volatility = settings.synthetic_volatility if volatility is None else volatility
+        self.latency = settings.synthetic_latency if latency is None else latency
+        self._walks: Dict[str, Tuple[random.Random, float]] = {}
+        self._lock = threading.Lock()
+
+    def _step(self, symbol: str) -> float:
+        key = symbol.upper()
+        walk = self._walks.get(key)
+        if walk is None:
+            rng = random.Random(zlib.crc32(f"{self.seed}:{key}".encode()))
+            # Spread starting prices so symbols are distinguishable
+            walk = (rng, self.start_price * rng.uniform(0.5, 1.5))
+        rng, price = walk
+        price = round(price * math.exp(rng.gauss(0.0, self.volatility)), 4)
+        self._walks[key] = (rng, price)
+        return price
+
+    def get_price(self, symbol: str, timeout: float = None) -> float:
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            return self._step(symbol)
+
+    def get_prices(self, symbols: List[str], timeout: float = None) -> Dict[str, float]:
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            return {symbol: self._step(symbol) for symbol in symbols}
+
+class ReplayProvider(PriceProvider):
+    """Replays a recorded tape of (symbol, price) rows from CSV or Parquet.
+
+    Each call returns the symbol's next recorded price, wrapping around at
+    the end of its tape when ``loop`` is set and repeating the last price
+    otherwise.
+    """
+
+    name = "replay"
+    supports_batch = True
+
+    def __init__(self, path: str = None, loop: bool = None):
+        self.path = path or settings.replay_file_path
+        if not self.path:
+            raise ValueError("The replay provider needs REPLAY_FILE_PATH")
+        self.loop = settings.replay_loop if loop is None else loop
+        self._tapes = self._load(self.path)
+        self._positions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load(path: str) -> Dict[str, List[float]]:
+        if path.endswith(".parquet"):
+            import pyarrow.parquet as pq
+            table = pq.read_table(path, columns=["symbol", "price"])
+            rows = zip(table.column("symbol").to_pylist(), table.column("price").to_pylist())
+        else:
+            with open(path, newline="") as f:
+                rows = [(row["symbol"], float(row["price"])) for row in csv.DictReader(f)]
+        tapes: Dict[str, List[float]] = {}
+        for symbol, price in rows:
+            tapes.setdefault(symbol.upper(), []).append(float(price))
+        return tapes
+
+    def _next(self, symbol: str) -> float:
+        key = symbol.upper()
+        tape = self._tapes.get(key)
+        if not tape:
+            raise ValueError(f"No recorded prices for {symbol}")
+        position = self._positions.get(key, 0)
+        self._positions[key] = position + 1
+        if self.loop:
+            return tape[position % len(tape)]
+        return tape[min(position, len(tape) - 1)]
+
+    def get_price(self, symbol: str, timeout: float = None) -> float:
+        with self._lock:
+            return self._next(symbol)
+
+    def get_prices(self, symbols: List[str], timeout: float = None) -> Dict[str, float]:
+        prices = {}
+        with self._lock:
+            for symbol in symbols:
+                if symbol.upper() in self._tapes:
+                    prices[symbol] = self._next(symbol)
+        return prices
+
+_PROVIDERS = {
+    YFinanceProvider.name: YFinanceProvider,
+    BarStoreProvider.name: BarStoreProvider,
+    SyntheticProvider.name: SyntheticProvider,
+    ReplayProvider.name: ReplayProvider,
+}
+
+def get_price_provider(name: str = None) -> PriceProvider:
+    """Instantiate the provider configured by settings.price_provider"""
+    name = name or settings.price_provider
+    try:
+        return _PROVIDERS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown price provider: {name}. Available: {sorted(_PROVIDERS)}")
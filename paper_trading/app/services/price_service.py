@@ -1,42 +1,63 @@
-import yfinance as yf
+import asyncio
 from typing import Optional, Dict, List
 import logging
 from app.core.exceptions import PriceNotAvailableException
+from app.services.market_data import price_snapshot
+from app.services.quote_cache import quote_cache
+from app.services.quote_engine import QuoteBatch, quote_engine
 
 logger = logging.getLogger(__name__)
 
 class PriceService:
     @staticmethod
-    def get_current_price(symbol: str) -> float:
-        """Get current price for a symbol"""
+    def get_current_price(symbol: str, max_age: Optional[float] = None) -> float:
+        """Get current price for a symbol, reusing polled or cached quotes up to max_age seconds old"""
+        price = price_snapshot.get(symbol, max_age)
+        if price is not None:
+            return price
+
         try:
-            ticker = yf.Ticker(symbol)
-            data = ticker.history(period="1d", interval="1m")
-            if not data.empty:
-                price = float(data['Close'].iloc[-1])
-                logger.info(f"Fetched price for {symbol}: {price}")
-                return price
-            else:
-                raise PriceNotAvailableException(symbol)
+            return quote_cache.get(symbol, PriceService._fetch_price, max_age)
         except Exception as e:
             logger.error(f"Error fetching price for {symbol}: {e}")
             raise PriceNotAvailableException(symbol)
 
     @staticmethod
-    def get_multiple_prices(symbols: List[str]) -> Dict[str, float]:
+    def get_multiple_prices(symbols: List[str], max_age: Optional[float] = None) -> Dict[str, float]:
         """Get current prices for multiple symbols"""
-        prices = {}
-        failed_symbols = []
+        return PriceService.get_quotes(symbols, max_age).prices
 
-        for symbol in symbols:
-            try:
-                price = PriceService.get_current_price(symbol)
-                prices[symbol] = price
-            except PriceNotAvailableException:
-                failed_symbols.append(symbol)
-                logger.warning(f"Failed to fetch price for {symbol}")
+    @staticmethod
+    def get_quotes(symbols: List[str], max_age: Optional[float] = None) -> QuoteBatch:
+        """Fetch prices for multiple symbols concurrently, reporting failed symbols"""
+        polled = price_snapshot.get_many(symbols, max_age)
+        if len(polled) == len(symbols):
+            batch = QuoteBatch()
+            batch.prices = polled
+            return batch
 
-        if failed_symbols:
-            logger.warning(f"Failed to fetch prices for symbols: {failed_symbols}")
+        batch = quote_cache.get_many([s for s in symbols if s not in polled], quote_engine.fetch, max_age)
+        batch.prices.update(polled)
+        return batch
 
-        return prices
+    @staticmethod
+    async def get_current_price_async(symbol: str, max_age: Optional[float] = None) -> float:
+        """Get current price without blocking the event loop"""
+        return await asyncio.to_thread(PriceService.get_current_price, symbol, max_age)
+
+    @staticmethod
+    async def get_multiple_prices_async(symbols: List[str], max_age: Optional[float] = None) -> Dict[str, float]:
+        """Get current prices for multiple symbols without blocking the event loop"""
+        return (await PriceService.get_quotes_async(symbols, max_age)).prices
+
+    @staticmethod
+    async def get_quotes_async(symbols: List[str], max_age: Optional[float] = None) -> QuoteBatch:
+        """Fetch a quote batch without blocking the event loop"""
+        return await asyncio.to_thread(PriceService.get_quotes, symbols, max_age)
+
+    @staticmethod
+    def _fetch_price(symbol: str) -> float:
+        """Fetch a single price from the upstream provider"""
+        price = quote_engine.provider.get_price(symbol)
+        logger.info(f"Fetched price for {symbol}: {price}")
+        return price
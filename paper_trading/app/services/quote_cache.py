@@ -0,0 +1,177 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+from app.core.config import settings
+from app.services.quote_engine import QuoteBatch
+
+logger = logging.getLogger(__name__)
+
+class QuoteCache:
+    """In-process quote cache with TTL expiry, LRU eviction and single-flight loads.
+
+    Concurrent misses for the same symbol share one upstream fetch: the
+    first caller loads the quote and everyone else waits on its result.
+    ``max_age`` lets a caller demand a fresher quote than the default TTL.
+    """
+
+    def __init__(self, ttl: float = 5.0, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._stale = 0
+        self._coalesced = 0
+        self._evictions = 0
+        self._load_errors = 0
+
+    def get(self, symbol: str, loader: Callable[[str], float], max_age: Optional[float] = None) -> float:
+        """Return a cached price no older than max_age, loading it if needed"""
+        max_age = self.ttl if max_age is None else max_age
+        with self._lock:
+            price = self._lookup(symbol, max_age, time.monotonic())
+            if price is not None:
+                return price
+            future, leader = self._join_or_lead(symbol)
+
+        if not leader:
+            return future.result()
+
+        try:
+            price = loader(symbol)
+        except Exception as e:
+            self._fail([symbol], {symbol: future}, e)
+            raise
+        self._complete({symbol: price}, {symbol: future})
+        return price
+
+    def get_many(self, symbols: List[str], loader: Callable[[List[str]], QuoteBatch],
+                 max_age: Optional[float] = None) -> QuoteBatch:
+        """Batch lookup: cached symbols are served locally, misses are loaded in one call"""
+        max_age = self.ttl if max_age is None else max_age
+        batch = QuoteBatch()
+        led: Dict[str, Future] = {}
+        followed: Dict[str, Future] = {}
+
+        with self._lock:
+            now = time.monotonic()
+            for symbol in dict.fromkeys(symbols):
+                price = self._lookup(symbol, max_age, now)
+                if price is not None:
+                    batch.prices[symbol] = price
+                    continue
+                future, leader = self._join_or_lead(symbol)
+                (led if leader else followed)[symbol] = future
+
+        if led:
+            try:
+                loaded = loader(list(led))
+            except Exception as e:
+                self._fail(list(led), led, e)
+                raise
+            self._complete(loaded.prices, led)
+            missing = [symbol for symbol in led if symbol not in loaded.prices]
+            self._fail(missing, led, LookupError("no price data"), loaded.failures)
+            batch.prices.update({symbol: loaded.prices[symbol] for symbol in led if symbol in loaded.prices})
+            for symbol in missing:
+                batch.failures[symbol] = loaded.failures.get(symbol, "no price data")
+
+        for symbol, future in followed.items():
+            try:
+                batch.prices[symbol] = future.result()
+            except Exception as e:
+                batch.failures[symbol] = str(e) or type(e).__name__
+
+        return batch
+
+    def put(self, symbol: str, price: float):
+        """Store a price fetched elsewhere, e.g. by a background poller"""
+        with self._lock:
+            self._store(symbol, price, time.monotonic())
+
+    def invalidate(self, symbol: Optional[str] = None):
+        """Drop one symbol, or everything when no symbol is given"""
+        with self._lock:
+            if symbol is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(symbol, None)
+
+    def stats(self) -> Dict:
+        """Snapshot of cache counters"""
+        with self._lock:
+            lookups = self._hits + self._misses + self._stale
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "stale": self._stale,
+                "coalesced": self._coalesced,
+                "evictions": self._evictions,
+                "load_errors": self._load_errors,
+                "inflight": len(self._inflight),
+                "hit_ratio": self._hits / lookups if lookups else 0.0,
+            }
+
+    def _lookup(self, symbol: str, max_age: float, now: float) -> Optional[float]:
+        entry = self._entries.get(symbol)
+        if entry is None:
+            self._misses += 1
+            return None
+        price, fetched_at = entry
+        if now - fetched_at > max_age:
+            self._stale += 1
+            return None
+        self._hits += 1
+        self._entries.move_to_end(symbol)
+        return price
+
+    def _join_or_lead(self, symbol: str) -> Tuple[Future, bool]:
+        future = self._inflight.get(symbol)
+        if future is not None:
+            self._coalesced += 1
+            return future, False
+        future = Future()
+        self._inflight[symbol] = future
+        return future, True
+
+    def _store(self, symbol: str, price: float, now: float):
+        self._entries[symbol] = (price, now)
+        self._entries.move_to_end(symbol)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def _complete(self, prices: Dict[str, float], futures: Dict[str, Future]):
+        with self._lock:
+            now = time.monotonic()
+            for symbol, price in prices.items():
+                if symbol in futures:
+                    self._store(symbol, price, now)
+                    self._inflight.pop(symbol, None)
+        for symbol, price in prices.items():
+            if symbol in futures:
+                futures[symbol].set_result(price)
+
+    def _fail(self, symbols: List[str], futures: Dict[str, Future], error: Exception,
+              reasons: Optional[Dict[str, str]] = None):
+        if not symbols:
+            return
+        with self._lock:
+            self._load_errors += len(symbols)
+            for symbol in symbols:
+                self._inflight.pop(symbol, None)
+        for symbol in symbols:
+            reason = (reasons or {}).get(symbol)
+            futures[symbol].set_exception(LookupError(reason) if reason else error)
+
+# Global quote cache instance
+quote_cache = QuoteCache(ttl=settings.quote_cache_ttl, max_entries=settings.quote_cache_max_entries)
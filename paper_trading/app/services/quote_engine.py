@@ -0,0 +1,133 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, List
+import logging
+from app.core.config import settings
+from app.services.price_providers import PriceProvider, get_price_provider
+
+logger = logging.getLogger(__name__)
+
+class QuoteBatch:
+    """Prices from a batched fetch, plus the reason each missing symbol failed"""
+
+    def __init__(self):
+        self.prices: Dict[str, float] = {}
+        self.failures: Dict[str, str] = {}
+
+    @property
+    def complete(self) -> bool:
+        return not self.failures
+
+class QuoteEngine:
+    """Fetches quotes for many symbols concurrently on a bounded thread pool.
+
+    Providers with a native multi-symbol request get one task per chunk of
+    ``batch_size`` symbols; other providers get one task per symbol. A task
+    that runs longer than ``timeout``, or that cannot start within
+    ``timeout`` because the pool is saturated or the provider is already
+    running its ``max_concurrent_fetches``, is abandoned and its symbols
+    are reported as failed, so a batch never takes much longer than twice
+    the timeout.
+    """
+
+    def __init__(self, provider: PriceProvider, max_workers: int = 16,
+                 timeout: float = 10.0, batch_size: int = 100):
+        self.provider = provider
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="quote")
+        self._slots = (threading.BoundedSemaphore(provider.max_concurrent_fetches)
+                       if provider.max_concurrent_fetches else None)
+
+    def fetch(self, symbols: List[str]) -> QuoteBatch:
+        """Fetch prices for the given symbols, collecting partial failures"""
+        batch = QuoteBatch()
+        unique_symbols = list(dict.fromkeys(symbols))
+        if not unique_symbols:
+            return batch
+
+        if self.provider.supports_batch:
+            groups = [unique_symbols[i:i + self.batch_size]
+                      for i in range(0, len(unique_symbols), self.batch_size)]
+            call = self.provider.get_prices
+        else:
+            groups = [[symbol] for symbol in unique_symbols]
+            call = self._get_single_price
+
+        started: Dict[int, float] = {}
+        begin = time.monotonic()
+        futures = {
+            self._executor.submit(self._run, call, group, started, index, begin): (index, group)
+            for index, group in enumerate(groups)
+        }
+        self._collect(futures, started, begin, batch)
+
+        if batch.failures:
+            logger.warning(f"Failed to fetch prices for symbols: {sorted(batch.failures)}")
+        return batch
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _get_single_price(self, group: List[str], timeout: float) -> Dict[str, float]:
+        return {group[0]: self.provider.get_price(group[0], timeout=timeout)}
+
+    def _run(self, call: Callable, group: List[str], started: Dict[int, float], index: int,
+             begin: float) -> Dict[str, float]:
+        # Waiting for a provider slot counts as waiting to start, not against
+        # the fetch's own timeout, and gives up once the task would be abandoned
+        if self._slots and not self._slots.acquire(timeout=max(begin + self.timeout - time.monotonic(), 0)):
+            raise TimeoutError("timed out waiting for a fetch worker")
+        try:
+            started[index] = time.monotonic()
+            return call(group, timeout=self.timeout)
+        finally:
+            if self._slots:
+                self._slots.release()
+
+    def _collect(self, futures: Dict, started: Dict[int, float], begin: float, batch: QuoteBatch):
+        pending = set(futures)
+        while pending:
+            now = time.monotonic()
+            next_expiry = min(started.get(futures[f][0], begin) + self.timeout for f in pending)
+            done, pending = wait(pending, timeout=max(next_expiry - now, 0.001),
+                                 return_when=FIRST_COMPLETED)
+
+            for future in done:
+                _, group = futures[future]
+                try:
+                    prices = future.result()
+                except Exception as e:
+                    for symbol in group:
+                        batch.failures[symbol] = str(e) or type(e).__name__
+                    continue
+                for symbol in group:
+                    price = prices.get(symbol)
+                    if price is None:
+                        batch.failures[symbol] = "no price data"
+                    else:
+                        batch.prices[symbol] = float(price)
+
+            now = time.monotonic()
+            for future in list(pending):
+                index, group = futures[future]
+                start = started.get(index)
+                if start is None and now - begin >= self.timeout:
+                    reason = "timed out waiting for a fetch worker"
+                elif start is not None and now - start >= self.timeout:
+                    reason = f"timed out after {self.timeout:.1f}s"
+                else:
+                    continue
+                future.cancel()
+                pending.discard(future)
+                for symbol in group:
+                    batch.failures[symbol] = reason
+
+# Global quote engine instance
+quote_engine = QuoteEngine(
+    get_price_provider(),
+    max_workers=settings.quote_max_workers,
+    timeout=settings.quote_timeout,
+    batch_size=settings.quote_batch_size,
+)
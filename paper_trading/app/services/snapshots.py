@@ -0,0 +1,252 @@
+import asyncio
+import time
+from datetime import date, datetime, time as clock_time, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from psycopg2.extras import execute_values
+import logging
+from app.core.config import settings
+from app.core.database import db_manager
+from app.services.portfolio_service import PortfolioService
+from app.services.portfolio_state import portfolio_states
+
+logger = logging.getLogger(__name__)
+
+# A rerun of the same snapshot overwrites it; an intraday snapshot that lands
+# on the end-of-day time never demotes the end-of-day row
+SAVE_SNAPSHOTS_SQL = """
+    INSERT INTO portfolio_snapshots (
+        portfolio_id, snapshot_at, end_of_day, cash_balance, positions_value, total_invested,
+        unrealized_pnl, realized_pnl, total_value, position_count
+    )
+    VALUES %s
+    ON CONFLICT (portfolio_id, snapshot_at) DO UPDATE SET
+        end_of_day = portfolio_snapshots.end_of_day OR EXCLUDED.end_of_day,
+        cash_balance = EXCLUDED.cash_balance,
+        positions_value = EXCLUDED.positions_value,
+        total_invested = EXCLUDED.total_invested,
+        unrealized_pnl = EXCLUDED.unrealized_pnl,
+        realized_pnl = EXCLUDED.realized_pnl,
+        total_value = EXCLUDED.total_value,
+        position_count = EXCLUDED.position_count
+"""
+
+# Rows arrive ordered by portfolio_id, so concurrent rollups lock in the same order
+TOTAL_VALUE_SQL = """
+    UPDATE portfolio pf
+    SET total_value = v.total_value, updated_at = CURRENT_TIMESTAMP
+    FROM (VALUES %s) AS v (portfolio_id, total_value)
+    WHERE pf.portfolio_id = v.portfolio_id
+"""
+
+LAST_END_OF_DAY_SQL = """
+    SELECT max(snapshot_at) AS snapshot_at FROM portfolio_snapshots WHERE end_of_day
+"""
+
+SNAPSHOT_COLUMNS = (
+    "cash_balance", "current_value", "total_invested", "unrealized_pnl",
+    "realized_pnl", "total_portfolio_value"
+)
+
+def partition_bounds(snapshot_at: datetime) -> Tuple[str, datetime, datetime]:
+    """Name and [start, end) of the monthly partition holding snapshot_at"""
+    snapshot_at = snapshot_at.astimezone(timezone.utc)
+    start = datetime(snapshot_at.year, snapshot_at.month, 1, tzinfo=timezone.utc)
+    end = (start + timedelta(days=32)).replace(day=1)
+    return f"portfolio_snapshots_y{start.year:04d}m{start.month:02d}", start, end
+
+def ensure_partition(cursor, snapshot_at: datetime):
+    """Create the month's partition if missing; serialized, since two CREATEs
+    of the same partition race on its bounds"""
+    name, start, end = partition_bounds(snapshot_at)
+    cursor.execute("SELECT pg_advisory_xact_lock(hashtext('portfolio_snapshots'))")
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {name} PARTITION OF portfolio_snapshots
+        FOR VALUES FROM (%s) TO (%s)
+    """, (start, end))
+
+def parse_clock(text: str) -> clock_time:
+    """An "HH:MM" UTC time of day"""
+    hour, minute = (int(part) for part in text.split(":"))
+    return clock_time(hour, minute, tzinfo=timezone.utc)
+
+class SnapshotRollup:
+    """Background task writing end-of-day, and optionally intraday, snapshots
+    of every portfolio.
+
+    Each rollup values all portfolios in one pass, quoting every held symbol
+    once, then writes a portfolio_snapshots row per portfolio and refreshes
+    portfolio.total_value, batch_size portfolios per transaction. The
+    end-of-day snapshot is stamped with the day's eod_time and intraday ones
+    with the start of their interval, so a rerun overwrites rather than
+    duplicates. A missed end-of-day is taken on the next start the same day;
+    earlier days are not backfilled.
+    """
+
+    def __init__(self, eod_time: str = "21:00", intraday_interval: Optional[float] = None,
+                 batch_size: int = 1000, retry_interval: float = 60.0):
+        self.eod_time = parse_clock(eod_time)
+        self.intraday_interval = intraday_interval
+        self.batch_size = batch_size
+        self.retry_interval = retry_interval
+        self.portfolio_service = PortfolioService()
+
+        self._last_end_of_day: Optional[date] = None
+        self._last_intraday: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self._rollups = 0
+        self._written = 0
+        self._failures = 0
+        self._last_rollup_seconds = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if not self.running:
+            self._task = asyncio.create_task(self._run(), name="snapshot-rollup")
+            logger.info("Snapshot rollup started")
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            logger.info("Snapshot rollup stopped")
+
+    def stats(self) -> Dict:
+        return {
+            "running": self.running,
+            "rollups": self._rollups,
+            "written": self._written,
+            "failures": self._failures,
+            "last_rollup_seconds": self._last_rollup_seconds,
+            "last_end_of_day": self._last_end_of_day.isoformat() if self._last_end_of_day else None,
+            "last_intraday": self._last_intraday.isoformat() if self._last_intraday else None,
+        }
+
+    def due(self, now: datetime) -> List[Tuple[datetime, bool]]:
+        """Snapshots due at now, as (snapshot_at, end_of_day): today's
+        end-of-day once its time has passed, and the current intraday slot"""
+        due = []
+        end_of_day = datetime.combine(now.date(), self.eod_time)
+        if now >= end_of_day and self._last_end_of_day != now.date():
+            due.append((end_of_day, True))
+        if self.intraday_interval:
+            slot = datetime.fromtimestamp(
+                now.timestamp() // self.intraday_interval * self.intraday_interval, timezone.utc
+            )
+            # A slot on the end-of-day time belongs to the end-of-day snapshot
+            if slot != self._last_intraday and slot != end_of_day:
+                due.append((slot, False))
+        return due
+
+    def mark_done(self, snapshot_at: datetime, end_of_day: bool):
+        if end_of_day:
+            self._last_end_of_day = snapshot_at.date()
+        else:
+            self._last_intraday = snapshot_at
+
+    async def _run(self):
+        loaded = False
+        while True:
+            retry = False
+            try:
+                if not loaded:
+                    self._last_end_of_day = await asyncio.to_thread(self.last_end_of_day)
+                    loaded = True
+                now = datetime.now(timezone.utc)
+                for snapshot_at, end_of_day in self.due(now):
+                    await asyncio.to_thread(self.rollup, snapshot_at, end_of_day)
+                    self.mark_done(snapshot_at, end_of_day)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Nothing is marked done, so the snapshot is retried
+                self._failures += 1
+                retry = True
+                logger.error(f"Snapshot rollup failed: {e}")
+            await asyncio.sleep(self.retry_interval if retry else self._sleep_time(datetime.now(timezone.utc)))
+
+    def _sleep_time(self, now: datetime) -> float:
+        """Seconds until the next snapshot falls due, rechecked at least every retry_interval"""
+        end_of_day = datetime.combine(now.date(), self.eod_time)
+        if now >= end_of_day:
+            end_of_day += timedelta(days=1)
+        wait = (end_of_day - now).total_seconds()
+        if self.intraday_interval:
+            wait = min(wait, self.intraday_interval - now.timestamp() % self.intraday_interval)
+        return max(0.0, min(wait, self.retry_interval))
+
+    def last_end_of_day(self) -> Optional[date]:
+        """Day of the latest end-of-day snapshot already written"""
+        with db_manager.get_cursor() as (cursor, conn):
+            cursor.execute(LAST_END_OF_DAY_SQL)
+            snapshot_at = cursor.fetchone()['snapshot_at']
+        return snapshot_at.astimezone(timezone.utc).date() if snapshot_at else None
+
+    def rollup(self, snapshot_at: datetime, end_of_day: bool = True) -> int:
+        """Snapshot every portfolio at snapshot_at; returns portfolios written"""
+        started = time.perf_counter()
+        # Write-behind trades are flushed first, so the snapshot reflects them
+        if portfolio_states.before_load:
+            portfolio_states.before_load()
+
+        bulk = self.portfolio_service.get_bulk_portfolio_pnl()
+        if bulk.failed_symbols:
+            logger.warning(f"Snapshot at {snapshot_at.isoformat()} values {len(bulk.failed_symbols)} "
+                           f"unquoted symbols at cost")
+        portfolio_ids = bulk.books.portfolio_ids
+        if not portfolio_ids:
+            return 0
+        totals = bulk.books.portfolio_totals(bulk.valuation)
+        columns = [totals[name].round(4).tolist() for name in SNAPSHOT_COLUMNS]
+        position_counts = totals["position_count"].tolist()
+        order = sorted(range(len(portfolio_ids)), key=portfolio_ids.__getitem__)
+
+        with db_manager.get_cursor() as (cursor, conn):
+            ensure_partition(cursor, snapshot_at)
+        for offset in range(0, len(order), self.batch_size):
+            batch = order[offset:offset + self.batch_size]
+            rows = [
+                (portfolio_ids[i], snapshot_at, end_of_day, *(column[i] for column in columns), position_counts[i])
+                for i in batch
+            ]
+            with db_manager.get_cursor() as (cursor, conn):
+                execute_values(cursor, SAVE_SNAPSHOTS_SQL, rows, page_size=len(rows))
+                execute_values(cursor, TOTAL_VALUE_SQL, [(row[0], row[8]) for row in rows],
+                               page_size=len(rows))
+
+        self._rollups += 1
+        self._written += len(order)
+        self._last_rollup_seconds = time.perf_counter() - started
+        logger.info(f"Snapshot {snapshot_at.isoformat()} written for {len(order)} portfolios "
+                    f"in {self._last_rollup_seconds:.3f}s")
+        return len(order)
+
+# Global snapshot rollup instance
+snapshot_rollup = SnapshotRollup(
+    settings.snapshot_eod_time,
+    intraday_interval=settings.snapshot_intraday_interval,
+    batch_size=settings.snapshot_batch_size,
+)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Snapshot every portfolio now")
+    parser.add_argument("--intraday", action="store_true",
+                        help="Write an intraday snapshot stamped now instead of today's end-of-day")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    now = datetime.now(timezone.utc)
+    if args.intraday:
+        snapshot_at, end_of_day = now.replace(microsecond=0), False
+    else:
+        snapshot_at, end_of_day = datetime.combine(now.date(), snapshot_rollup.eod_time), True
+    print(snapshot_rollup.rollup(snapshot_at, end_of_day))
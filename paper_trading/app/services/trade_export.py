@@ -0,0 +1,122 @@
+import csv
+import io
+from typing import Callable, Dict, Iterator, List, Tuple
+from app.core.config import settings
+from app.core.database import db_manager
+
+EXPORT_COLUMNS = ("id", "symbol", "trade_type", "quantity", "price", "trade_date", "portfolio_id", "status")
+
+# Oldest first, so a reconciliation can replay the export in order
+EXPORT_SQL = """
+    SELECT {columns}
+    FROM trades
+    WHERE {where}
+    ORDER BY trade_date, id
+"""
+
+# NDJSON lines are rendered by Postgres, so no per-row Python objects are built
+NDJSON_COLUMNS = """
+    json_build_object('id', id, 'symbol', symbol, 'trade_type', trade_type, 'quantity', quantity,
+                      'price', price, 'trade_date', trade_date, 'portfolio_id', portfolio_id,
+                      'status', status)::text
+"""
+
+def _ndjson_chunks(batches: Iterator[List[Tuple]]) -> Iterator[bytes]:
+    for rows in batches:
+        yield ("\n".join(row[0] for row in rows) + "\n").encode()
+
+def _csv_chunks(batches: Iterator[List[Tuple]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():  # header only, for an empty export
+        yield buffer.getvalue().encode()
+
+def _arrow_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ("id", pa.int32()),
+        ("symbol", pa.string()),
+        ("trade_type", pa.string()),
+        ("quantity", pa.int32()),
+        ("price", pa.decimal128(10, 4)),
+        ("trade_date", pa.timestamp("us", tz="UTC")),
+        ("portfolio_id", pa.string()),
+        ("status", pa.string()),
+    ])
+
+class _DrainableSink(io.RawIOBase):
+    """Write-only file that hands back whatever was written since the last drain"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def _arrow_chunks(batches: Iterator[List[Tuple]]) -> Iterator[bytes]:
+    import pyarrow as pa
+    schema = _arrow_schema()
+    sink = _DrainableSink()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for rows in batches:
+            columns = [pa.array(column, type=field.type) for column, field in zip(zip(*rows), schema)]
+            writer.write_batch(pa.RecordBatch.from_arrays(columns, schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+# format -> (media type, SELECT list, chunk writer)
+EXPORT_FORMATS: Dict[str, Tuple[str, str, Callable[[Iterator[List[Tuple]]], Iterator[bytes]]]] = {
+    "ndjson": ("application/x-ndjson", NDJSON_COLUMNS, _ndjson_chunks),
+    "csv": ("text/csv", ", ".join(EXPORT_COLUMNS), _csv_chunks),
+    "arrow": ("application/vnd.apache.arrow.stream", ", ".join(EXPORT_COLUMNS), _arrow_chunks),
+}
+
+def arrow_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def stream_trades(fmt: str, where: str, params: Dict, batch_size: int = None) -> Iterator[bytes]:
+    """Encode every matching trade in ``fmt``, reading through a server-side cursor.
+
+    Only one batch of rows is held in memory at a time. The pooled
+    connection is held until the stream is exhausted or closed.
+    """
+    _, columns, writer = EXPORT_FORMATS[fmt]
+    query = EXPORT_SQL.format(columns=columns, where=where)
+    batch_size = batch_size or settings.export_batch_size
+
+    with db_manager.get_connection() as conn:
+        try:
+            with conn.cursor(name="trade_export") as cursor:
+                cursor.itersize = batch_size
+                cursor.execute(query, params)
+                yield from writer(_fetch_batches(cursor, batch_size))
+        finally:
+            # Read-only: ending the transaction also releases the cursor's portal
+            conn.rollback()
+
+def _fetch_batches(cursor, batch_size: int) -> Iterator[List[Tuple]]:
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield rows
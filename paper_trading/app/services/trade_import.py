@@ -0,0 +1,346 @@
+import csv
+import io
+from typing import BinaryIO, Dict, List
+from psycopg2.extras import execute_values
+from app.core.database import db_manager
+from app.core.events import PORTFOLIO_CHANGED, event_bus
+from app.core.exceptions import TradeImportRejectedException
+from app.services.cost_basis import LedgerLotPositionState
+from app.services.performance import invalidate_daily_values
+from app.services.portfolio_state import portfolio_states, write_lots, write_realized
+import logging
+
+logger = logging.getLogger(__name__)
+
+IMPORT_COLUMNS = ("symbol", "trade_type", "quantity", "price", "trade_date", "portfolio_id")
+REQUIRED_COLUMNS = {"symbol", "trade_type", "quantity", "price"}
+
+# Rows reported per rejection reason
+MAX_REPORTED_ERRORS = 20
+
+# Trades streamed per fetch, and realized P&L rows written per insert,
+# when FIFO/LIFO positions are replayed
+LOT_REPLAY_CHUNK_SIZE = 10_000
+
+STAGING_SQL = """
+    CREATE TEMP TABLE trade_import_staging (
+        line BIGSERIAL,
+        symbol VARCHAR(10),
+        trade_type VARCHAR(4),
+        quantity INTEGER,
+        price DECIMAL(10, 4),
+        trade_date TIMESTAMP WITH TIME ZONE,
+        portfolio_id VARCHAR(50)
+    ) ON COMMIT DROP
+"""
+
+NORMALIZE_SQL = """
+    UPDATE trade_import_staging
+    SET symbol = upper(trim(symbol)),
+        trade_type = upper(trim(trade_type)),
+        portfolio_id = COALESCE(NULLIF(trim(portfolio_id), ''), %(portfolio_id)s),
+        trade_date = COALESCE(trade_date, CURRENT_TIMESTAMP)
+"""
+
+INVALID_ROWS_SQL = """
+    SELECT line FROM trade_import_staging
+    WHERE symbol IS NULL OR symbol = ''
+       OR trade_type IS NULL OR trade_type NOT IN ('BUY', 'SELL')
+       OR quantity IS NULL OR quantity <= 0
+       OR price IS NULL OR price <= 0
+    ORDER BY line
+    LIMIT %(limit)s
+"""
+
+UNKNOWN_PORTFOLIOS_SQL = """
+    SELECT DISTINCT s.portfolio_id
+    FROM trade_import_staging s
+    LEFT JOIN portfolio pf ON pf.portfolio_id = s.portfolio_id
+    WHERE pf.portfolio_id IS NULL
+    ORDER BY s.portfolio_id
+"""
+
+# Locking the affected portfolio rows serializes the import with live
+# trades, which all update their portfolio's cash
+LOCK_PORTFOLIOS_SQL = """
+    SELECT portfolio_id FROM portfolio
+    WHERE portfolio_id IN (SELECT DISTINCT portfolio_id FROM trade_import_staging)
+    ORDER BY portfolio_id
+    FOR UPDATE
+"""
+
+INSERT_TRADES_SQL = """
+    INSERT INTO trades (symbol, trade_type, quantity, price, trade_date, portfolio_id)
+    SELECT symbol, trade_type, quantity, price, trade_date, portfolio_id
+    FROM trade_import_staging
+    ORDER BY line
+"""
+
+# Cached daily values from each portfolio's earliest imported trade on are stale
+STALE_DAYS_SQL = """
+    SELECT portfolio_id, MIN((trade_date AT TIME ZONE 'UTC')::date) AS day
+    FROM trade_import_staging
+    GROUP BY portfolio_id
+"""
+
+AFFECTED_SQL = """
+    CREATE TEMP TABLE trade_import_affected ON COMMIT DROP AS
+    SELECT DISTINCT s.portfolio_id, s.symbol, pf.cost_basis_method
+    FROM trade_import_staging s
+    JOIN portfolio pf ON pf.portfolio_id = s.portfolio_id
+"""
+
+# Every (portfolio, symbol) touched by the import is re-derived from its
+# full trade history, so back-dated fills land in the right order. Average
+# cost positions are folded here; FIFO/LIFO ones are replayed in Python
+# and added to the same table.
+REBUILD_SQL = """
+    CREATE TEMP TABLE trade_import_rebuild ON COMMIT DROP AS
+    SELECT portfolio_id, symbol, (state).quantity, (state).avg_price, (state).invested, (state).oversold
+    FROM (
+        SELECT t.portfolio_id, t.symbol,
+               avg_cost(t.trade_type, t.quantity, t.price ORDER BY t.trade_date, t.id) AS state
+        FROM trades t
+        JOIN trade_import_affected affected
+            ON affected.portfolio_id = t.portfolio_id AND affected.symbol = t.symbol
+        WHERE affected.cost_basis_method = 'AVERAGE'
+        GROUP BY t.portfolio_id, t.symbol
+    ) replayed
+"""
+
+# A back-dated fill changes what every later SELL realized, so the
+# affected positions' realized P&L is recorded again
+DELETE_REALIZED_SQL = """
+    DELETE FROM realized_pnl r
+    USING trade_import_affected a
+    WHERE r.portfolio_id = a.portfolio_id AND r.symbol = a.symbol
+"""
+
+# Under average cost each SELL released what invested dropped by
+AVERAGE_REALIZED_SQL = """
+    INSERT INTO realized_pnl (trade_id, portfolio_id, symbol, quantity, cost_basis, realized, realized_at)
+    SELECT id, portfolio_id, symbol, quantity, released, price * quantity - released, trade_date
+    FROM (
+        SELECT id, portfolio_id, symbol, trade_type, quantity, price, trade_date,
+               lag(invested, 1, 0::numeric) OVER w - invested AS released
+        FROM (
+            SELECT t.*, (avg_cost(t.trade_type, t.quantity, t.price) OVER w).invested
+            FROM trades t
+            JOIN trade_import_affected affected
+                ON affected.portfolio_id = t.portfolio_id AND affected.symbol = t.symbol
+            WHERE affected.cost_basis_method = 'AVERAGE'
+            WINDOW w AS (PARTITION BY t.portfolio_id, t.symbol ORDER BY t.trade_date, t.id)
+        ) replayed
+        WINDOW w AS (PARTITION BY portfolio_id, symbol ORDER BY trade_date, id)
+    ) sells
+    WHERE trade_type = 'SELL'
+"""
+
+LOT_HISTORY_SQL = """
+    SELECT t.portfolio_id, t.symbol, t.id, t.trade_type, t.quantity, t.price, affected.cost_basis_method
+    FROM trades t
+    JOIN trade_import_affected affected
+        ON affected.portfolio_id = t.portfolio_id AND affected.symbol = t.symbol
+    WHERE affected.cost_basis_method <> 'AVERAGE'
+    ORDER BY t.portfolio_id, t.symbol, t.trade_date, t.id
+"""
+
+DELETE_LOTS_SQL = """
+    DELETE FROM position_lots l
+    USING trade_import_affected a
+    WHERE l.portfolio_id = a.portfolio_id AND l.symbol = a.symbol AND a.cost_basis_method <> 'AVERAGE'
+"""
+
+OVERSOLD_SQL = """
+    SELECT portfolio_id, symbol FROM trade_import_rebuild
+    WHERE oversold
+    ORDER BY portfolio_id, symbol
+    LIMIT %(limit)s
+"""
+
+UPSERT_POSITIONS_SQL = """
+    INSERT INTO positions (symbol, net_quantity, avg_price, total_invested, portfolio_id)
+    SELECT symbol, quantity, avg_price, invested, portfolio_id
+    FROM trade_import_rebuild
+    WHERE quantity > 0
+    ON CONFLICT (symbol, portfolio_id) DO UPDATE
+    SET net_quantity = EXCLUDED.net_quantity,
+        avg_price = EXCLUDED.avg_price,
+        total_invested = EXCLUDED.total_invested,
+        last_updated = CURRENT_TIMESTAMP
+"""
+
+DELETE_CLOSED_POSITIONS_SQL = """
+    DELETE FROM positions pos
+    USING trade_import_rebuild r
+    WHERE pos.portfolio_id = r.portfolio_id AND pos.symbol = r.symbol AND r.quantity = 0
+"""
+
+# Cash moves by the imported trades' net flow: BUYs debit, SELLs credit
+CASH_SQL = """
+    WITH flow AS (
+        SELECT portfolio_id,
+               SUM(CASE WHEN trade_type = 'BUY' THEN -1 ELSE 1 END * quantity * price) AS amount
+        FROM trade_import_staging
+        GROUP BY portfolio_id
+    )
+    UPDATE portfolio pf
+    SET cash_balance = pf.cash_balance + flow.amount, updated_at = CURRENT_TIMESTAMP
+    FROM flow
+    WHERE pf.portfolio_id = flow.portfolio_id
+    RETURNING pf.portfolio_id, flow.amount, pf.cash_balance
+"""
+
+def read_csv_header(file: BinaryIO) -> List[str]:
+    """Consume and validate the header line, leaving ``file`` at the first data row"""
+    line = file.readline().decode("utf-8-sig")
+    columns = [column.strip().lower() for column in next(csv.reader([line]), [])]
+    _check_columns(columns)
+    return columns
+
+def _check_columns(columns: List[str]):
+    unknown = [column for column in columns if column not in IMPORT_COLUMNS]
+    missing = REQUIRED_COLUMNS.difference(columns)
+    if unknown or missing or len(set(columns)) != len(columns):
+        raise TradeImportRejectedException(
+            "Unsupported columns",
+            [{"expected": list(IMPORT_COLUMNS), "unknown": unknown, "missing": sorted(missing)}]
+        )
+
+def copy_csv(cursor, file: BinaryIO, columns: List[str]):
+    """COPY header-less CSV rows from ``file`` into the staging table"""
+    cursor.copy_expert(
+        f"COPY trade_import_staging ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", file
+    )
+
+def copy_parquet(cursor, file: BinaryIO, batch_size: int):
+    """COPY a Parquet file into the staging table one record batch at a time"""
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+
+    parquet = pq.ParquetFile(file)
+    columns = [name.lower() for name in parquet.schema_arrow.names]
+    _check_columns(columns)
+    options = pa_csv.WriteOptions(include_header=False)
+    for batch in parquet.iter_batches(batch_size=batch_size):
+        buffer = io.BytesIO()
+        pa_csv.write_csv(batch, buffer, write_options=options)
+        buffer.seek(0)
+        copy_csv(cursor, buffer, columns)
+
+def load_staged_trades(cursor, default_portfolio_id: str) -> Dict:
+    """Validate staged rows, append them to trades and rebuild positions and cash.
+
+    Runs inside the caller's transaction; any rejection raises before the
+    transaction commits, so an import lands entirely or not at all.
+    """
+    cursor.execute(NORMALIZE_SQL, {"portfolio_id": default_portfolio_id})
+    staged = cursor.rowcount
+    if staged == 0:
+        return {"imported": 0, "positions_rebuilt": 0, "cash_adjustments": {}}
+
+    cursor.execute(INVALID_ROWS_SQL, {"limit": MAX_REPORTED_ERRORS})
+    invalid = cursor.fetchall()
+    if invalid:
+        raise TradeImportRejectedException("Invalid trade rows", [
+            {"line": row['line'], "detail": "symbol, BUY/SELL trade_type and positive quantity and price are required"}
+            for row in invalid
+        ])
+
+    cursor.execute(UNKNOWN_PORTFOLIOS_SQL)
+    unknown = cursor.fetchall()
+    if unknown:
+        raise TradeImportRejectedException("Unknown portfolios", [
+            {"portfolio_id": row['portfolio_id'], "detail": "Portfolio not found"} for row in unknown
+        ])
+
+    cursor.execute(LOCK_PORTFOLIOS_SQL)
+    cursor.execute(INSERT_TRADES_SQL)
+    cursor.execute(STALE_DAYS_SQL)
+    invalidate_daily_values(cursor, {row['portfolio_id']: row['day'] for row in cursor.fetchall()})
+    cursor.execute(AFFECTED_SQL)
+    cursor.execute(REBUILD_SQL)
+    cursor.execute(DELETE_REALIZED_SQL)
+    cursor.execute(AVERAGE_REALIZED_SQL)
+    replay_lot_positions(cursor)
+
+    cursor.execute(OVERSOLD_SQL, {"limit": MAX_REPORTED_ERRORS})
+    oversold = cursor.fetchall()
+    if oversold:
+        raise TradeImportRejectedException("Insufficient shares", [
+            {"portfolio_id": row['portfolio_id'], "symbol": row['symbol'],
+             "detail": "Trade history sells more shares than it holds"}
+            for row in oversold
+        ])
+
+    cursor.execute(UPSERT_POSITIONS_SQL)
+    rebuilt = cursor.rowcount
+    cursor.execute(DELETE_CLOSED_POSITIONS_SQL)
+    rebuilt += cursor.rowcount
+
+    cursor.execute(CASH_SQL)
+    adjustments = cursor.fetchall()
+    overdrawn = [row for row in adjustments if row['cash_balance'] < 0]
+    if overdrawn:
+        raise TradeImportRejectedException("Insufficient funds", [
+            {"portfolio_id": row['portfolio_id'], "detail": f"Cash balance would be {row['cash_balance']}"}
+            for row in overdrawn
+        ])
+
+    logger.info(f"Imported {staged} trades, rebuilt {rebuilt} positions")
+    return {
+        "imported": staged,
+        "positions_rebuilt": rebuilt,
+        "cash_adjustments": {row['portfolio_id']: row['amount'] for row in adjustments},
+    }
+
+def replay_lot_positions(cursor):
+    """Replay the affected FIFO/LIFO positions' histories into trade_import_rebuild,
+    rewriting their lots and realized P&L as they go"""
+    cursor.execute(DELETE_LOTS_SQL)
+    rebuilt, lots, realized = [], {}, []
+    key, position, oversold = None, None, False
+
+    def finish():
+        if key is not None:
+            rebuilt.append((*key, position.quantity, position.avg_price, position.invested, oversold))
+            lots.update({(*key, lot[2]): (lot[0], lot[1]) for lot in position.lots})
+
+    with cursor.connection.cursor(name="trade_import_lots") as stream:
+        stream.itersize = LOT_REPLAY_CHUNK_SIZE
+        stream.execute(LOT_HISTORY_SQL)
+        for portfolio_id, symbol, trade_id, trade_type, quantity, price, method in stream:
+            if (portfolio_id, symbol) != key:
+                finish()
+                key, position, oversold = (portfolio_id, symbol), LedgerLotPositionState(method == 'LIFO'), False
+            if trade_type == 'SELL':
+                oversold = oversold or position.quantity < quantity
+                pnl = position.apply(trade_type, quantity, price, trade_id)
+                realized.append((trade_id, portfolio_id, symbol, quantity, price * quantity - pnl, pnl))
+                if len(realized) >= LOT_REPLAY_CHUNK_SIZE:
+                    write_realized(cursor, realized)
+                    realized = []
+            else:
+                position.apply(trade_type, quantity, price, trade_id)
+        finish()
+
+    write_realized(cursor, realized)
+    if rebuilt:
+        execute_values(cursor, """
+            INSERT INTO trade_import_rebuild (portfolio_id, symbol, quantity, avg_price, invested, oversold)
+            VALUES %s
+        """, rebuilt)
+    write_lots(cursor, lots)
+
+def import_trades(file: BinaryIO, fmt: str, default_portfolio_id: str, batch_size: int) -> Dict:
+    """Bulk-load a CSV or Parquet trade file in one transaction"""
+    # The file's portfolios are only known once staged, so every cached one is held
+    with portfolio_states.writing(), db_manager.get_cursor() as (cursor, conn):
+        cursor.execute(STAGING_SQL)
+        if fmt == "parquet":
+            copy_parquet(cursor, file, batch_size)
+        else:
+            copy_csv(cursor, file, read_csv_header(file))
+        result = load_staged_trades(cursor, default_portfolio_id)
+    event_bus.publish(PORTFOLIO_CHANGED, None)
+    return result
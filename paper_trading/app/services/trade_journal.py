@@ -0,0 +1,364 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, Dict, List, Optional, Tuple
+from psycopg2.extras import execute_values
+import logging
+from app.core.config import settings
+from app.core.database import db_manager
+from app.services.cost_basis import LotPositionState, PositionState
+from app.services.live_pnl import live_pnl
+from app.services.portfolio_state import (
+    PortfolioStateManager,
+    portfolio_states,
+    write_cash_deltas,
+    write_lots,
+    write_positions,
+    write_realized
+)
+from app.models.trade import TradeCreate, TradeResponse
+from app.utils.helpers import round_price
+
+logger = logging.getLogger(__name__)
+
+# Ids come from the trades sequence, so journaled and directly inserted
+# trades never collide
+RESERVE_IDS_SQL = """
+    SELECT nextval(pg_get_serial_sequence('trades', 'id')) AS id FROM generate_series(1, %s)
+"""
+
+# Re-flushing an entry (after a crash between commit and segment removal)
+# inserts nothing, and only newly inserted trades move cash and positions
+INSERT_TRADES_SQL = """
+    INSERT INTO trades (id, symbol, trade_type, quantity, price, trade_date, portfolio_id)
+    VALUES %s
+    ON CONFLICT (id) DO NOTHING
+    RETURNING id
+"""
+
+SEGMENT_SUFFIX = ".journal"
+
+class _Segment:
+    """One append-only journal file. Appends are serialized by the journal;
+    fsyncs are grouped, so one fsync acknowledges every append before it."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "ab", buffering=0)
+        self.lock = threading.Lock()
+        self.written = 0
+        self.synced = 0
+
+    def append(self, data: bytes) -> int:
+        try:
+            if self.file.write(data) != len(data):
+                raise OSError(f"Short write to {self.path}")
+        except OSError:
+            # Cut off a partial entry, so later appends stay readable
+            self.file.truncate(self.written)
+            raise
+        self.written += len(data)
+        return self.written
+
+    def sync(self, upto: int):
+        with self.lock:
+            if self.synced >= upto:
+                return
+            target = self.written
+            os.fsync(self.file.fileno())
+            self.synced = target
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                os.fsync(self.file.fileno())
+                self.synced = self.written
+                self.file.close()
+
+class TradeJournal:
+    """Write-behind trade path: validate in memory, journal, acknowledge, write later.
+
+    A trade is checked against the cached cash and positions of its
+    portfolio, under that portfolio's lock, appended to the current journal
+    segment and acknowledged once the segment is fsync'd past it. The fsync
+    is waited for under the portfolio lock, so a trade that fails to append
+    or sync can be withdrawn before any later trade builds on it; fsyncs of
+    different portfolios' trades are still grouped.
+    A background thread periodically swaps in a fresh segment and writes
+    the previous segment's trades to Postgres in one transaction, then
+    deletes it. Segments left over from a crash are written on open().
+
+    While the journal is open it owns trading: cash and positions in
+    Postgres trail the acknowledged trades by up to one flush interval.
+    """
+
+    def __init__(self, directory: str, flush_interval: float = 0.05, id_block: int = 1000,
+                 states: PortfolioStateManager = portfolio_states):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.id_block = id_block
+        self.states = states
+
+        # Guards the segment and pending list; held only to append
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._id_lock = threading.Lock()
+        self._ids: Deque[int] = deque()
+        self._segment: Optional[_Segment] = None
+        self._sequence = 0
+        self._pending: List[Dict] = []
+        # Closed segments whose trades are not yet in Postgres, oldest first
+        self._backlog: List[Tuple[str, List[Dict]]] = []
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self._acknowledged = 0
+        self._flushed = 0
+        self._flush_failures = 0
+        self._last_flush_seconds = 0.0
+
+    @property
+    def is_open(self) -> bool:
+        return self._segment is not None
+
+    def open(self) -> int:
+        """Write any segments left by a previous run, then start journaling; returns trades recovered"""
+        os.makedirs(self.directory, exist_ok=True)
+        recovered = 0
+        with self._flush_lock:
+            segments = []
+            for name in sorted(os.listdir(self.directory)):
+                if name.endswith(SEGMENT_SUFFIX):
+                    self._sequence = max(self._sequence, int(name[:-len(SEGMENT_SUFFIX)]))
+                    segments.append((os.path.join(self.directory, name),
+                                     read_segment(os.path.join(self.directory, name))))
+            withdrawn = {e["withdrawn"] for _, entries in segments for e in entries if "withdrawn" in e}
+            for path, entries in segments:
+                entries = [e for e in entries if "id" in e and e["id"] not in withdrawn]
+                self._backlog.append((path, entries))
+                recovered += len(entries)
+            self._write_backlog()
+        if recovered:
+            logger.info(f"Recovered {recovered} journaled trades")
+
+        # Cached state is reloaded, and every reload first flushes the journal
+        self.states.clear()
+        self.states.before_load = self.flush
+        self._segment = self._new_segment()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="trade-journal-writer", daemon=True)
+        self._thread.start()
+        return recovered
+
+    def close(self):
+        """Stop the writer and flush everything journaled"""
+        if self._thread:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        if self._segment:
+            self.flush()
+            with self._lock:
+                segment, self._segment = self._segment, None
+            segment.close()
+            os.remove(segment.path)
+        self.states.before_load = None
+        self.states.clear()
+
+    def submit(self, trade: TradeCreate, price: float) -> TradeResponse:
+        """Validate, journal and acknowledge a trade; raises the usual trading exceptions,
+        or OSError if the journal cannot be written, and a trade that raises is not executed"""
+        price = round_price(price)
+        with self.states.lock(trade.portfolio_id), live_pnl.trading([trade.portfolio_id]):
+            if self._segment is None:
+                raise RuntimeError("Trade journal is not open")
+            # Reserved before the state changes; a rejected trade leaves a gap, as a rolled-back insert does
+            trade_id = self._next_id()
+            error, realized = self.states.apply(trade, price, trade_id)
+            if error:
+                raise error
+
+            position = self.states.position(trade.portfolio_id, trade.symbol)
+            entry = {
+                "id": trade_id,
+                "symbol": trade.symbol,
+                "trade_type": trade.trade_type,
+                "quantity": trade.quantity,
+                "price": price,
+                "trade_date": datetime.now(timezone.utc).isoformat(),
+                "portfolio_id": trade.portfolio_id,
+                # Position after this trade; a flush writes the last one per symbol
+                "position": [position.quantity, position.avg_price, position.invested],
+            }
+            if trade.trade_type == 'SELL':
+                entry["realized"] = realized
+            if isinstance(position, LotPositionState):
+                # Lots this trade opened or changed, as [trade id, quantity left, price]
+                entry["lots"] = [[lot_id, lot[0], lot[1]] for lot_id, lot in position.changes.items()]
+                position.changes.clear()
+            # Appending under the portfolio lock keeps each portfolio's entries in order
+            appended = False
+            try:
+                with self._lock:
+                    segment = self._segment
+                    offset = segment.append((json.dumps(entry) + "\n").encode())
+                    self._pending.append(entry)
+                    appended = True
+                segment.sync(offset)
+            except OSError:
+                # A flush that already wrote the entry to Postgres executed it
+                if not appended or self._withdraw(entry):
+                    self.states.invalidate([trade.portfolio_id])
+                    raise
+            self._acknowledged += 1
+
+            response = TradeResponse(
+                id=entry["id"], symbol=trade.symbol, trade_type=trade.trade_type, quantity=trade.quantity,
+                price=price, trade_date=entry["trade_date"], portfolio_id=trade.portfolio_id, status="ACTIVE",
+                realized_pnl=entry.get("realized")
+            )
+            # Live P&L follows the journal, which leads Postgres
+            live_pnl.apply_trade(response)
+        return response
+
+    def flush(self) -> int:
+        """Write every journaled trade to Postgres; returns how many were written"""
+        with self._flush_lock:
+            if self._pending and self._segment is not None:
+                # Created before taking the lock, so submits never wait on it
+                fresh = self._new_segment()
+                with self._lock:
+                    segment, self._segment = self._segment, fresh
+                    self._backlog.append((segment.path, self._pending))
+                    self._pending = []
+                segment.close()
+            return self._write_backlog()
+
+    def _write_backlog(self) -> int:
+        """Write closed segments oldest first; the caller holds the flush lock"""
+        written = 0
+        while self._backlog:
+            path, entries = self._backlog[0]
+            if entries:
+                started = time.perf_counter()
+                write_entries(entries)
+                self._last_flush_seconds = time.perf_counter() - started
+            os.remove(path)
+            self._backlog.pop(0)
+            written += len(entries)
+        self._flushed += written
+        return written
+
+    def _withdraw(self, entry: Dict) -> bool:
+        """Take back an entry whose fsync failed, before it reaches Postgres; False if a
+        flush already wrote it. The caller holds the entry's portfolio lock."""
+        with self._flush_lock, self._lock:
+            for entries in [self._pending] + [entries for _, entries in self._backlog]:
+                if entry in entries:
+                    entries.remove(entry)
+                    break
+            else:
+                return False
+            # Recovery skips the entry if the segment holding it survives a crash
+            try:
+                if self._segment:
+                    self._segment.append((json.dumps({"withdrawn": entry["id"]}) + "\n").encode())
+            except OSError as e:
+                logger.error(f"Could not journal withdrawal of trade {entry['id']}: {e}")
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                # The segment stays in the backlog and is retried next cycle
+                self._flush_failures += 1
+                logger.error(f"Trade journal flush failed: {e}")
+
+    def _new_segment(self) -> _Segment:
+        self._sequence += 1
+        segment = _Segment(os.path.join(self.directory, f"{self._sequence:012d}{SEGMENT_SUFFIX}"))
+        # Make the new file's directory entry durable
+        directory = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+        return segment
+
+    def _next_id(self) -> int:
+        with self._id_lock:
+            if not self._ids:
+                with db_manager.get_cursor() as (cursor, conn):
+                    cursor.execute(RESERVE_IDS_SQL, (self.id_block,))
+                    self._ids.extend(row['id'] for row in cursor.fetchall())
+            return self._ids.popleft()
+
+    def stats(self) -> Dict:
+        return {
+            "open": self.is_open,
+            "acknowledged": self._acknowledged,
+            "flushed": self._flushed,
+            "pending": len(self._pending) + sum(len(entries) for _, entries in self._backlog),
+            "flush_failures": self._flush_failures,
+            "last_flush_seconds": self._last_flush_seconds,
+            "state": self.states.stats(),
+        }
+
+def read_segment(path: str) -> List[Dict]:
+    """Entries and withdrawal markers of a journal segment; a torn final line
+    (never acknowledged) is dropped"""
+    entries = []
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                logger.warning(f"Ignoring torn journal entry in {path}")
+                break
+    return entries
+
+def write_entries(entries: List[Dict]):
+    """Insert journaled trades and apply their cash, position, lot and realized P&L effects in one transaction"""
+    with db_manager.get_cursor() as (cursor, conn):
+        inserted = execute_values(cursor, INSERT_TRADES_SQL, [
+            (e["id"], e["symbol"], e["trade_type"], e["quantity"], e["price"], e["trade_date"], e["portfolio_id"])
+            for e in entries
+        ], fetch=True, page_size=len(entries))
+        inserted_ids = {row['id'] for row in inserted}
+
+        positions: Dict[Tuple[str, str], PositionState] = {}
+        lots: Dict[Tuple[str, str, int], Tuple[int, float]] = {}
+        realized: List[Tuple[int, str, str, int, float, float]] = []
+        cash_deltas: Dict[str, float] = {}
+        for e in entries:
+            if e["id"] not in inserted_ids:
+                continue
+            positions[(e["portfolio_id"], e["symbol"])] = PositionState(*e["position"])
+            for lot_id, quantity, price in e.get("lots", ()):
+                lots[(e["portfolio_id"], e["symbol"], lot_id)] = (quantity, price)
+            if "realized" in e:
+                realized.append((e["id"], e["portfolio_id"], e["symbol"], e["quantity"],
+                                 e["price"] * e["quantity"] - e["realized"], e["realized"]))
+            value = e["price"] * e["quantity"]
+            delta = -value if e["trade_type"] == 'BUY' else value
+            cash_deltas[e["portfolio_id"]] = cash_deltas.get(e["portfolio_id"], 0.0) + delta
+
+        if positions:
+            write_positions(cursor, positions, set(positions), set(positions))
+            write_lots(cursor, lots)
+            write_realized(cursor, realized)
+            write_cash_deltas(cursor, cash_deltas)
+    logger.debug(f"Wrote {len(inserted_ids)} journaled trades")
+
+# Global trade journal instance
+trade_journal = TradeJournal(
+    settings.trade_journal_dir,
+    flush_interval=settings.trade_journal_flush_interval,
+    id_block=settings.trade_journal_id_block,
+)
@@ -1,161 +1,461 @@
-from typing import Optional, List, Dict
+import asyncio
+from typing import BinaryIO, Generator, Optional, Iterator, List, Dict, Tuple
+from datetime import datetime
 from decimal import Decimal
+import base64
+import json
+from psycopg2.extras import execute_values
 import logging
+from app.core.config import settings
 from app.core.database import db_manager
+from app.core.async_database import async_db_manager
 from app.core.exceptions import (
     InsufficientFundsException,
     InsufficientSharesException,
-    PortfolioNotFoundException
+    PortfolioNotFoundException,
+    PriceNotAvailableException,
+    TradeBatchRejectedException,
+    InvalidCursorException
+)
+from app.services.cost_basis import PositionState
+from app.services.live_pnl import live_pnl
+from app.services.portfolio_state import (
+    POSITION_LOTS_SQL,
+    apply_trade,
+    lot_changes,
+    lot_positions,
+    portfolio_states,
+    write_cash_deltas,
+    write_lots,
+    write_positions,
+    write_realized
 )
 from app.services.price_service import PriceService
-from app.models.trade import TradeCreate, TradeResponse
+from app.services.trade_export import stream_trades
+from app.services.trade_import import import_trades
+from app.services.trade_journal import RESERVE_IDS_SQL, trade_journal
+from app.models.trade import TradeCreate, TradeResponse, TradeBatchError
+from app.utils.helpers import round_price
 
 logger = logging.getLogger(__name__)
 
+# A BUY debits cash only if the balance covers it; the trade and position
+# upsert read from that debit, so an underfunded BUY changes nothing and
+# returns no row. Average price is re-derived from invested / quantity.
+# FIFO/LIFO portfolios also open a lot for the fill.
+BUY_SQL = """
+    WITH debit AS (
+        UPDATE portfolio
+        SET cash_balance = cash_balance - %(value)s::numeric, updated_at = CURRENT_TIMESTAMP
+        WHERE portfolio_id = %(portfolio_id)s::varchar AND cash_balance >= %(value)s::numeric
+        RETURNING portfolio_id, cost_basis_method
+    ), fill AS (
+        INSERT INTO trades (symbol, trade_type, quantity, price, portfolio_id)
+        SELECT %(symbol)s::varchar, 'BUY', %(quantity)s::integer, %(price)s::numeric, portfolio_id
+        FROM debit
+        RETURNING id, symbol, trade_type, quantity, price, trade_date, portfolio_id, status
+    ), position AS (
+        INSERT INTO positions (symbol, net_quantity, avg_price, total_invested, portfolio_id)
+        SELECT %(symbol)s::varchar, %(quantity)s::integer, %(price)s::numeric, %(value)s::numeric, portfolio_id
+        FROM debit
+        ON CONFLICT (symbol, portfolio_id) DO UPDATE
+        SET net_quantity = positions.net_quantity + EXCLUDED.net_quantity,
+            total_invested = positions.total_invested + EXCLUDED.total_invested,
+            avg_price = (positions.total_invested + EXCLUDED.total_invested)
+                        / NULLIF(positions.net_quantity + EXCLUDED.net_quantity, 0),
+            last_updated = CURRENT_TIMESTAMP
+    ), lot AS (
+        INSERT INTO position_lots (portfolio_id, symbol, trade_id, quantity, price, opened_at)
+        SELECT fill.portfolio_id, fill.symbol, fill.id, fill.quantity, fill.price, fill.trade_date
+        FROM fill, debit
+        WHERE debit.cost_basis_method <> 'AVERAGE'
+    )
+    SELECT * FROM fill
+"""
+
+# A SELL locks the position if enough shares are held. Under average cost
+# it keeps the average price, scales invested by the remaining fraction
+# and realizes the proceeds less what invested dropped by; cash, the trade
+# and its realized P&L row follow from that update. The remaining quantity
+# is returned so a fully closed position can be deleted. A FIFO/LIFO
+# position is only locked: the row comes back without a trade, and the
+# caller consumes its lots with SELL_LOTS_SQL.
+SELL_SQL = """
+    WITH held AS (
+        SELECT pos.id AS position_id, pos.total_invested AS invested_before, pf.cost_basis_method
+        FROM positions pos
+        JOIN portfolio pf ON pf.portfolio_id = pos.portfolio_id
+        WHERE pos.symbol = %(symbol)s::varchar AND pos.portfolio_id = %(portfolio_id)s::varchar
+              AND pos.net_quantity >= %(quantity)s::integer
+        FOR UPDATE OF pos
+    ), reduce AS (
+        UPDATE positions
+        SET net_quantity = net_quantity - %(quantity)s::integer,
+            total_invested = CASE WHEN net_quantity > %(quantity)s::integer
+                THEN total_invested * (net_quantity - %(quantity)s::integer) / net_quantity
+                ELSE 0 END,
+            avg_price = CASE WHEN net_quantity > %(quantity)s::integer THEN avg_price ELSE 0 END,
+            last_updated = CURRENT_TIMESTAMP
+        FROM held
+        WHERE positions.id = held.position_id AND held.cost_basis_method = 'AVERAGE'
+        RETURNING positions.portfolio_id, positions.net_quantity,
+                  held.invested_before - positions.total_invested AS cost_basis
+    ), credit AS (
+        UPDATE portfolio
+        SET cash_balance = cash_balance + %(value)s::numeric, updated_at = CURRENT_TIMESTAMP
+        FROM reduce
+        WHERE portfolio.portfolio_id = reduce.portfolio_id
+        RETURNING portfolio.portfolio_id
+    ), fill AS (
+        INSERT INTO trades (symbol, trade_type, quantity, price, portfolio_id)
+        SELECT %(symbol)s::varchar, 'SELL', %(quantity)s::integer, %(price)s::numeric, portfolio_id
+        FROM credit
+        RETURNING id, symbol, trade_type, quantity, price, trade_date, portfolio_id, status
+    ), realized AS (
+        INSERT INTO realized_pnl (trade_id, portfolio_id, symbol, quantity, cost_basis, realized, realized_at)
+        SELECT fill.id, fill.portfolio_id, fill.symbol, fill.quantity, reduce.cost_basis,
+               fill.price * fill.quantity - reduce.cost_basis, fill.trade_date
+        FROM fill, reduce
+        RETURNING realized
+    )
+    SELECT held.cost_basis_method, fill.*, reduce.net_quantity AS remaining_quantity,
+           realized.realized AS realized_pnl
+    FROM held
+    LEFT JOIN (fill CROSS JOIN reduce CROSS JOIN realized) ON TRUE
+"""
+
+# One page of a locked position's lots in consumption order, after the
+# last lot of the previous page
+FIFO_LOTS_SQL = """
+    SELECT trade_id, quantity, price, opened_at
+    FROM position_lots
+    WHERE portfolio_id = %(portfolio_id)s::varchar AND symbol = %(symbol)s::varchar
+      AND (%(after_date)s::timestamptz IS NULL
+           OR (opened_at, trade_id) > (%(after_date)s::timestamptz, %(after_id)s::integer))
+    ORDER BY opened_at, trade_id
+    LIMIT %(limit)s::integer
+"""
+
+LIFO_LOTS_SQL = """
+    SELECT trade_id, quantity, price, opened_at
+    FROM position_lots
+    WHERE portfolio_id = %(portfolio_id)s::varchar AND symbol = %(symbol)s::varchar
+      AND (%(after_date)s::timestamptz IS NULL
+           OR (opened_at, trade_id) < (%(after_date)s::timestamptz, %(after_id)s::integer))
+    ORDER BY opened_at DESC, trade_id DESC
+    LIMIT %(limit)s::integer
+"""
+
+# Lots read before the first page is large enough; later pages grow by LOT_PAGE_GROWTH
+LOT_PAGE_SIZE = 16
+LOT_PAGE_GROWTH = 4
+
+# A FIFO/LIFO SELL once its lots have been walked: consumed lots are
+# deleted, at most one is split, and invested drops by their cost
+SELL_LOTS_SQL = """
+    WITH spent AS (
+        DELETE FROM position_lots
+        WHERE portfolio_id = %(portfolio_id)s::varchar AND symbol = %(symbol)s::varchar
+          AND trade_id = ANY(%(spent)s::integer[])
+    ), split AS (
+        UPDATE position_lots SET quantity = %(split_quantity)s::integer
+        WHERE portfolio_id = %(portfolio_id)s::varchar AND symbol = %(symbol)s::varchar
+          AND trade_id = %(split_id)s::integer
+    ), reduce AS (
+        UPDATE positions
+        SET net_quantity = net_quantity - %(quantity)s::integer,
+            total_invested = total_invested - %(cost_basis)s::numeric,
+            avg_price = CASE WHEN net_quantity > %(quantity)s::integer
+                THEN (total_invested - %(cost_basis)s::numeric) / (net_quantity - %(quantity)s::integer)
+                ELSE 0 END,
+            last_updated = CURRENT_TIMESTAMP
+        WHERE symbol = %(symbol)s::varchar AND portfolio_id = %(portfolio_id)s::varchar
+        RETURNING portfolio_id, net_quantity
+    ), credit AS (
+        UPDATE portfolio
+        SET cash_balance = cash_balance + %(value)s::numeric, updated_at = CURRENT_TIMESTAMP
+        FROM reduce
+        WHERE portfolio.portfolio_id = reduce.portfolio_id
+        RETURNING portfolio.portfolio_id
+    ), fill AS (
+        INSERT INTO trades (symbol, trade_type, quantity, price, portfolio_id)
+        SELECT %(symbol)s::varchar, 'SELL', %(quantity)s::integer, %(price)s::numeric, portfolio_id
+        FROM credit
+        RETURNING id, symbol, trade_type, quantity, price, trade_date, portfolio_id, status
+    ), realized AS (
+        INSERT INTO realized_pnl (trade_id, portfolio_id, symbol, quantity, cost_basis, realized, realized_at)
+        SELECT id, portfolio_id, symbol, quantity, %(cost_basis)s::numeric,
+               price * quantity - %(cost_basis)s::numeric, trade_date
+        FROM fill
+        RETURNING realized
+    )
+    SELECT fill.*, reduce.net_quantity AS remaining_quantity, realized.realized AS realized_pnl
+    FROM fill, reduce, realized
+"""
+
+CLOSE_POSITION_SQL = """
+    DELETE FROM positions
+    WHERE symbol = %(symbol)s AND portfolio_id = %(portfolio_id)s AND net_quantity = 0
+"""
+
+# Only run when BUY_SQL/SELL_SQL matched nothing, to report why
+REJECTION_SQL = """
+    SELECT pf.cash_balance, COALESCE(pos.net_quantity, 0) AS net_quantity
+    FROM portfolio pf
+    LEFT JOIN positions pos ON pos.portfolio_id = pf.portfolio_id AND pos.symbol = %(symbol)s
+    WHERE pf.portfolio_id = %(portfolio_id)s
+"""
+
 class TradingService:
     def __init__(self):
         self.price_service = PriceService()
 
     def place_trade(self, trade: TradeCreate) -> TradeResponse:
         """Place a new trade"""
-        # Get current price if not provided
-        price = trade.price or self.price_service.get_current_price(trade.symbol)
-        trade_value = price * trade.quantity
+        # Get current price if not provided; cash, positions and the ledger
+        # all use the price as trades.price stores it
+        price = round_price(trade.price or self.price_service.get_current_price(
+            trade.symbol, max_age=settings.quote_trade_max_age
+        ))
 
-        with db_manager.get_cursor() as (cursor, conn):
-            # Verify portfolio exists
-            cursor.execute(
-                "SELECT cash_balance FROM portfolio WHERE portfolio_id = %s",
-                (trade.portfolio_id,)
-            )
-            portfolio_result = cursor.fetchone()
-            if not portfolio_result:
-                raise PortfolioNotFoundException(trade.portfolio_id)
-
-            cash_balance = float(portfolio_result['cash_balance'])
-
-            # Validate trade
-            if trade.trade_type == 'BUY':
-                if cash_balance < trade_value:
-                    raise InsufficientFundsException(
-                        f"Required: ${trade_value:.2f}, Available: ${cash_balance:.2f}"
-                    )
-            else:  # SELL
-                # Check if sufficient shares available
-                cursor.execute("""
-                    SELECT net_quantity FROM positions
-                    WHERE symbol = %s AND portfolio_id = %s
-                """, (trade.symbol, trade.portfolio_id))
-                position_result = cursor.fetchone()
-
-                available_shares = position_result['net_quantity'] if position_result else 0
-                if available_shares < trade.quantity:
-                    raise InsufficientSharesException(
-                        f"Required: {trade.quantity}, Available: {available_shares}"
-                    )
-
-            # Insert trade
-            cursor.execute("""
-                INSERT INTO trades (symbol, trade_type, quantity, price, portfolio_id)
-                VALUES (%s, %s, %s, %s, %s)
-                RETURNING id, symbol, trade_type, quantity, price, trade_date, portfolio_id, status
-            """, (trade.symbol, trade.trade_type, trade.quantity, price, trade.portfolio_id))
+        if trade_journal.is_open:
+            return trade_journal.submit(trade, price)
+        with live_pnl.trading([trade.portfolio_id]):
+            with db_manager.get_cursor() as (cursor, conn):
+                result = self.execute_trade(cursor, trade, price)
+            live_pnl.apply_trade(result)
+        return result
+
+    def execute_trade(self, cursor, trade: TradeCreate, price: float) -> TradeResponse:
+        """Execute a trade at ``price``, rounded as stored, within the caller's transaction"""
+        return _run_statements(cursor, self._trade_statements(trade, round_price(price)))
+
+    def _trade_statements(self, trade: TradeCreate,
+                          price: float) -> Generator[Tuple[str, Dict], object, TradeResponse]:
+        """The statements executing a trade, as (sql, params) pairs; each is sent
+        back the cursor it ran on, so the sync and async paths share one sequence"""
+        params = self._trade_params(trade, price)
+
+        # Cash/share checks, the trade insert and the position and cash
+        # updates all happen in one statement
+        cursor = yield BUY_SQL if trade.trade_type == 'BUY' else SELL_SQL, params
+        trade_result = cursor.fetchone()
 
+        if trade_result and trade_result['id'] is None:
+            # A FIFO/LIFO position, now locked; only the lots the SELL consumes are read
+            walk = _LotWalk(params, trade_result['cost_basis_method'] == 'LIFO')
+            while walk.needed:
+                cursor = yield walk.sql, walk.page
+                walk.take(cursor.fetchall())
+            cursor = yield SELL_LOTS_SQL, walk.params()
             trade_result = cursor.fetchone()
 
-            # Update positions
-            self._update_position(cursor, trade.symbol, trade.trade_type,
-                                trade.quantity, price, trade.portfolio_id)
+        if not trade_result:
+            cursor = yield REJECTION_SQL, params
+            raise self._rejection(trade, params, cursor.fetchone())
 
-            # Update cash balance
-            cash_change = -trade_value if trade.trade_type == 'BUY' else trade_value
-            cursor.execute("""
-                UPDATE portfolio
-                SET cash_balance = cash_balance + %s, updated_at = CURRENT_TIMESTAMP
-                WHERE portfolio_id = %s
-            """, (cash_change, trade.portfolio_id))
-
-            logger.info(f"Trade executed: {trade.trade_type} {trade.quantity} {trade.symbol} @ {price}")
-
-            return TradeResponse(**trade_result)
-
-    def _update_position(self, cursor, symbol: str, trade_type: str,
-                        quantity: int, price: float, portfolio_id: str):
-        """Update position after trade"""
-        cursor.execute("""
-            SELECT net_quantity, avg_price, total_invested
-            FROM positions WHERE symbol = %s AND portfolio_id = %s
-        """, (symbol, portfolio_id))
-
-        result = cursor.fetchone()
-
-        if result:
-            current_qty = result['net_quantity']
-            current_avg_price = float(result['avg_price'])
-            current_invested = float(result['total_invested'])
-
-            if trade_type == 'BUY':
-                new_qty = current_qty + quantity
-                new_invested = current_invested + (price * quantity)
-                new_avg_price = new_invested / new_qty if new_qty > 0 else 0
-            else:  # SELL
-                new_qty = current_qty - quantity
-                if new_qty > 0:
-                    new_invested = current_invested * (new_qty / current_qty)
-                    new_avg_price = current_avg_price
-                else:
-                    new_invested = 0
-                    new_avg_price = 0
+        if trade_result.pop('remaining_quantity', None) == 0:
+            yield CLOSE_POSITION_SQL, params
 
-            if new_qty == 0:
-                cursor.execute("""
-                    DELETE FROM positions WHERE symbol = %s AND portfolio_id = %s
-                """, (symbol, portfolio_id))
-            else:
-                cursor.execute("""
-                    UPDATE positions
-                    SET net_quantity = %s, avg_price = %s, total_invested = %s,
-                        last_updated = CURRENT_TIMESTAMP
-                    WHERE symbol = %s AND portfolio_id = %s
-                """, (new_qty, new_avg_price, new_invested, symbol, portfolio_id))
-        else:
-            # New position (only for BUY)
-            if trade_type == 'BUY':
-                cursor.execute("""
-                    INSERT INTO positions (symbol, net_quantity, avg_price, total_invested, portfolio_id)
-                    VALUES (%s, %s, %s, %s, %s)
-                """, (symbol, quantity, price, price * quantity, portfolio_id))
-
-    def get_trade_history(self, portfolio_id: str = "default",
-                         page: int = 1, page_size: int = 50) -> Dict:
-        """Get trade history with pagination"""
-        offset = (page - 1) * page_size
+        logger.info(f"Trade executed: {trade.trade_type} {trade.quantity} {trade.symbol} @ {price}")
 
-        with db_manager.get_cursor() as (cursor, conn):
-            # Get total count
+        return TradeResponse(**trade_result)
+
+    @staticmethod
+    def _trade_params(trade: TradeCreate, price: float) -> Dict:
+        return {
+            "symbol": trade.symbol,
+            "trade_type": trade.trade_type,
+            "quantity": trade.quantity,
+            "price": price,
+            "value": price * trade.quantity,
+            "portfolio_id": trade.portfolio_id,
+        }
+
+    @staticmethod
+    def _rejection(trade: TradeCreate, params: Dict, state: Optional[Dict]) -> Exception:
+        """Explain why the conditional trade statement matched no rows"""
+        if not state:
+            return PortfolioNotFoundException(trade.portfolio_id)
+        if trade.trade_type == 'BUY':
+            return InsufficientFundsException(
+                f"Required: ${params['value']:.2f}, Available: ${float(state['cash_balance']):.2f}"
+            )
+        return InsufficientSharesException(
+            f"Required: {trade.quantity}, Available: {state['net_quantity']}"
+        )
+
+    def place_trades_batch(self, trades: List[TradeCreate], atomic: bool = True) -> Dict:
+        """Validate and execute many trades in one transaction.
+
+        Trades are validated in order against the locked cash and position
+        rows (and the lots of FIFO/LIFO portfolios), each seeing the effect
+        of the ones before it. Accepted trades are bulk-inserted under ids
+        reserved up front and their position and cash changes are written as
+        one net update per (portfolio, symbol) and per portfolio. In atomic
+        mode any rejection rolls back the whole batch.
+        """
+        rejected: List[TradeBatchError] = []
+        prices = self._resolve_batch_prices(trades, rejected)
+
+        portfolio_ids = sorted({trade.portfolio_id for trade in trades})
+        position_keys = sorted({(trade.portfolio_id, trade.symbol) for trade in trades})
+
+        with live_pnl.trading(portfolio_ids), portfolio_states.writing(portfolio_ids), \
+                db_manager.get_cursor() as (cursor, conn):
+            # Lock in a consistent order so concurrent batches cannot deadlock
             cursor.execute("""
-                SELECT COUNT(*) as total FROM trades WHERE portfolio_id = %s
-            """, (portfolio_id,))
-            total_count = cursor.fetchone()['total']
+                SELECT portfolio_id, cash_balance, cost_basis_method FROM portfolio
+                WHERE portfolio_id = ANY(%s)
+                ORDER BY portfolio_id
+                FOR UPDATE
+            """, (portfolio_ids,))
+            rows = cursor.fetchall()
+            cash = {row['portfolio_id']: float(row['cash_balance']) for row in rows}
+            methods = {row['portfolio_id']: row['cost_basis_method'] for row in rows}
 
-            # Get trades
             cursor.execute("""
-                SELECT id, symbol, trade_type, quantity, price, trade_date, portfolio_id, status
-                FROM trades
-                WHERE portfolio_id = %s
-                ORDER BY trade_date DESC
-                LIMIT %s OFFSET %s
-            """, (portfolio_id, page_size, offset))
-
-            trades = [TradeResponse(**row) for row in cursor.fetchall()]
-
-            return {
-                "trades": trades,
-                "total_count": total_count,
-                "page": page,
-                "page_size": page_size
+                SELECT portfolio_id, symbol, net_quantity, avg_price, total_invested
+                FROM positions
+                WHERE (portfolio_id, symbol) IN (SELECT * FROM unnest(%s::text[], %s::text[]))
+                ORDER BY portfolio_id, symbol
+                FOR UPDATE
+            """, ([key[0] for key in position_keys], [key[1] for key in position_keys]))
+            positions = {
+                (row['portfolio_id'], row['symbol']): PositionState(
+                    row['net_quantity'], float(row['avg_price']), float(row['total_invested'])
+                )
+                for row in cursor.fetchall()
+            }
+            existing_keys = set(positions)
+
+            lot_keys = [key for key in position_keys if methods.get(key[0], 'AVERAGE') != 'AVERAGE']
+            if lot_keys:
+                cursor.execute(POSITION_LOTS_SQL, ([key[0] for key in lot_keys], [key[1] for key in lot_keys]))
+                positions.update(lot_positions(cursor.fetchall(), methods))
+
+            cursor.execute(RESERVE_IDS_SQL, (len(prices),))
+            trade_ids = dict(zip(sorted(prices), (row['id'] for row in cursor.fetchall())))
+
+            accepted: List[Tuple[int, TradeCreate, float]] = []
+            realized: Dict[int, float] = {}
+            for index, trade in enumerate(trades):
+                if index not in prices:
+                    continue
+                price = prices[index]
+                error, realized[index] = apply_trade(trade, price, cash, positions,
+                                                     methods.get(trade.portfolio_id, 'AVERAGE'), trade_ids[index])
+                if error:
+                    rejected.append(TradeBatchError(index=index, symbol=trade.symbol, detail=error.detail))
+                else:
+                    accepted.append((index, trade, price))
+
+            rejected.sort(key=lambda error: error.index)
+            if atomic and rejected:
+                raise TradeBatchRejectedException([error.model_dump() for error in rejected])
+            if not accepted:
+                return {"executed": [], "rejected": rejected}
+
+            executed = execute_values(cursor, """
+                INSERT INTO trades (id, symbol, trade_type, quantity, price, portfolio_id)
+                VALUES %s
+                RETURNING id, symbol, trade_type, quantity, price, trade_date, portfolio_id, status
+            """, [(trade_ids[index], trade.symbol, trade.trade_type, trade.quantity, price, trade.portfolio_id)
+                  for index, trade, price in accepted], fetch=True, page_size=len(accepted))
+
+            touched = {(trade.portfolio_id, trade.symbol) for _, trade, _ in accepted}
+            write_positions(cursor, positions, touched, existing_keys)
+            write_lots(cursor, lot_changes(positions, touched))
+
+            realized_pnl = {trade_ids[index]: realized[index] for index, trade, _ in accepted
+                            if trade.trade_type == 'SELL'}
+            write_realized(cursor, [
+                (trade_ids[index], trade.portfolio_id, trade.symbol, trade.quantity,
+                 price * trade.quantity - realized[index], realized[index])
+                for index, trade, price in accepted if trade.trade_type == 'SELL'
+            ])
+
+            cash_deltas: Dict[str, float] = {}
+            for _, trade, price in accepted:
+                value = price * trade.quantity
+                delta = -value if trade.trade_type == 'BUY' else value
+                cash_deltas[trade.portfolio_id] = cash_deltas.get(trade.portfolio_id, 0.0) + delta
+            write_cash_deltas(cursor, cash_deltas)
+
+            logger.info(f"Trade batch executed: {len(accepted)} accepted, {len(rejected)} rejected")
+
+            executed.sort(key=lambda row: row['id'])
+            result = {
+                "executed": [TradeResponse(**row, realized_pnl=realized_pnl.get(row['id'])) for row in executed],
+                "rejected": rejected
             }
 
+        live_pnl.apply_trades(result["executed"])
+        return result
+
+    def _resolve_batch_prices(self, trades: List[TradeCreate],
+                              rejected: List[TradeBatchError]) -> Dict[int, float]:
+        """Fill in missing prices with one quote batch; unpriced trades are rejected"""
+        missing = list({trade.symbol for trade in trades if not trade.price})
+        quotes = self.price_service.get_quotes(missing, max_age=settings.quote_trade_max_age) if missing else None
+
+        prices = {}
+        for index, trade in enumerate(trades):
+            price = trade.price or (quotes.prices.get(trade.symbol) if quotes else None)
+            if price is None:
+                rejected.append(TradeBatchError(
+                    index=index, symbol=trade.symbol,
+                    detail=PriceNotAvailableException(trade.symbol).detail
+                ))
+            else:
+                prices[index] = round_price(price)
+        return prices
+
+    async def place_trade_async(self, trade: TradeCreate) -> TradeResponse:
+        """Place a new trade on the async database path"""
+        price = round_price(trade.price or await self.price_service.get_current_price_async(
+            trade.symbol, max_age=settings.quote_trade_max_age
+        ))
+        if trade_journal.is_open:
+            # submit fsyncs, and may reserve ids or flush the journal through psycopg2
+            return await asyncio.to_thread(trade_journal.submit, trade, price)
+        with live_pnl.trading([trade.portfolio_id]):
+            async with async_db_manager.get_cursor() as (cursor, conn):
+                result = await _run_statements_async(cursor, self._trade_statements(trade, price))
+            live_pnl.apply_trade(result)
+        return result
+
+    def get_trade_history(self, portfolio_id: str = "default", page: int = 1, page_size: int = 50,
+                          cursor: Optional[str] = None, symbol: Optional[str] = None,
+                          trade_type: Optional[str] = None, start_date: Optional[datetime] = None,
+                          end_date: Optional[datetime] = None, count: str = "estimate") -> Dict:
+        """Get one page of trade history, newest first"""
+        filters = _history_filters(portfolio_id, symbol, trade_type, start_date, end_date)
+        query, params = _history_page_query(filters, page, page_size, cursor)
+
+        with db_manager.get_cursor() as (db_cursor, conn):
+            db_cursor.execute(query, params)
+            rows = db_cursor.fetchall()
+
+            total_count = None
+            if count != "none":
+                db_cursor.execute(_history_count_query(filters, count), filters.params)
+                total_count = _count_result(db_cursor.fetchone(), count)
+
+        return _history_page(rows, page, page_size, total_count, count)
+
+    def export_trades(self, fmt: str, portfolio_id: str = "default", symbol: Optional[str] = None,
+                      trade_type: Optional[str] = None, start_date: Optional[datetime] = None,
+                      end_date: Optional[datetime] = None) -> Iterator[bytes]:
+        """Stream all matching trades, oldest first, encoded as ``fmt``"""
+        filters = _history_filters(portfolio_id, symbol, trade_type, start_date, end_date)
+        return stream_trades(fmt, filters.where, filters.params)
+
+    def import_trades(self, file: BinaryIO, fmt: str = "csv",
+                      portfolio_id: str = "default") -> Dict:
+        """Bulk-load historical fills and rebuild the affected positions and cash"""
+        return import_trades(file, fmt, portfolio_id, settings.import_parquet_batch_size)
+
     def get_trade_by_id(self, trade_id: int) -> Optional[TradeResponse]:
         """Get specific trade by ID"""
         with db_manager.get_cursor() as (cursor, conn):
@@ -166,3 +466,189 @@ class TradingService:
 
             result = cursor.fetchone()
             return TradeResponse(**result) if result else None
+
+    async def get_trade_history_async(self, portfolio_id: str = "default", page: int = 1,
+                                      page_size: int = 50, cursor: Optional[str] = None,
+                                      symbol: Optional[str] = None, trade_type: Optional[str] = None,
+                                      start_date: Optional[datetime] = None,
+                                      end_date: Optional[datetime] = None,
+                                      count: str = "estimate") -> Dict:
+        """Get one page of trade history on the async database path"""
+        filters = _history_filters(portfolio_id, symbol, trade_type, start_date, end_date)
+        query, params = _history_page_query(filters, page, page_size, cursor)
+
+        async with async_db_manager.get_cursor() as (db_cursor, conn):
+            await db_cursor.execute(query, params)
+            rows = db_cursor.fetchall()
+
+            total_count = None
+            if count != "none":
+                await db_cursor.execute(_history_count_query(filters, count), filters.params)
+                total_count = _count_result(db_cursor.fetchone(), count)
+
+        return _history_page(rows, page, page_size, total_count, count)
+
+    async def get_trade_by_id_async(self, trade_id: int) -> Optional[TradeResponse]:
+        """Get specific trade by ID on the async database path"""
+        async with async_db_manager.get_cursor() as (cursor, conn):
+            await cursor.execute("""
+                SELECT id, symbol, trade_type, quantity, price, trade_date, portfolio_id, status
+                FROM trades WHERE id = %s
+            """, (trade_id,))
+
+            result = cursor.fetchone()
+            return TradeResponse(**result) if result else None
+
+def _run_statements(cursor, statements: Generator):
+    """Execute a statement generator on a psycopg2 cursor; returns its result"""
+    try:
+        statement = next(statements)
+        while True:
+            cursor.execute(*statement)
+            statement = statements.send(cursor)
+    except StopIteration as done:
+        return done.value
+
+async def _run_statements_async(cursor, statements: Generator):
+    """Execute a statement generator on an AsyncCursor; returns its result"""
+    try:
+        statement = next(statements)
+        while True:
+            await cursor.execute(*statement)
+            statement = statements.send(cursor)
+    except StopIteration as done:
+        return done.value
+
+class _LotWalk:
+    """The lots a FIFO/LIFO SELL consumes, read a page at a time in consumption order"""
+
+    def __init__(self, params: Dict, lifo: bool):
+        self.sql = LIFO_LOTS_SQL if lifo else FIFO_LOTS_SQL
+        self.needed = params["quantity"]
+        self.cost = Decimal(0)
+        self.spent: List[int] = []
+        self.split: Tuple[Optional[int], Optional[int]] = (None, None)
+        self.page = dict(params, after_date=None, after_id=None, limit=LOT_PAGE_SIZE)
+
+    def take(self, lots: List[Dict]):
+        if not lots:
+            raise RuntimeError(
+                f"Lots of {self.page['symbol']} in {self.page['portfolio_id']} do not cover the position"
+            )
+        for lot in lots:
+            taken = min(lot['quantity'], self.needed)
+            self.cost += taken * lot['price']
+            self.needed -= taken
+            if taken == lot['quantity']:
+                self.spent.append(lot['trade_id'])
+            else:
+                self.split = (lot['trade_id'], lot['quantity'] - taken)
+            if not self.needed:
+                return
+        last = lots[-1]
+        self.page.update(after_date=last['opened_at'], after_id=last['trade_id'],
+                         limit=self.page['limit'] * LOT_PAGE_GROWTH)
+
+    def params(self) -> Dict:
+        return dict(self.page, spent=self.spent, split_id=self.split[0], split_quantity=self.split[1],
+                    cost_basis=self.cost)
+
+class _HistoryFilters:
+    """WHERE clauses and named params shared by a history page and its count"""
+
+    def __init__(self, clauses: List[str], params: Dict):
+        self.clauses = clauses
+        self.params = params
+
+    @property
+    def where(self) -> str:
+        return " AND ".join(self.clauses)
+
+def _history_filters(portfolio_id: str, symbol: Optional[str], trade_type: Optional[str],
+                     start_date: Optional[datetime], end_date: Optional[datetime]) -> _HistoryFilters:
+    # Each combination leads with portfolio_id and orders by (trade_date, id),
+    # matching the idx_trades_portfolio_* indexes
+    clauses = ["portfolio_id = %(portfolio_id)s::varchar"]
+    params = {"portfolio_id": portfolio_id}
+    if symbol:
+        clauses.append("symbol = %(symbol)s::varchar")
+        params["symbol"] = symbol.upper()
+    if trade_type:
+        clauses.append("trade_type = %(trade_type)s::varchar")
+        params["trade_type"] = trade_type
+    if start_date:
+        clauses.append("trade_date >= %(start_date)s::timestamptz")
+        params["start_date"] = start_date
+    if end_date:
+        clauses.append("trade_date < %(end_date)s::timestamptz")
+        params["end_date"] = end_date
+    return _HistoryFilters(clauses, params)
+
+def _history_page_query(filters: _HistoryFilters, page: int, page_size: int,
+                        cursor: Optional[str]) -> Tuple[str, Dict]:
+    """Keyset query for the page after ``cursor``; page/OFFSET only without a cursor"""
+    clauses = list(filters.clauses)
+    params = dict(filters.params, limit=page_size + 1, offset=0)
+    if cursor:
+        params["after_date"], params["after_id"] = decode_history_cursor(cursor)
+        clauses.append("(trade_date, id) < (%(after_date)s::timestamptz, %(after_id)s::integer)")
+    else:
+        params["offset"] = (page - 1) * page_size
+
+    # One extra row tells whether a next page exists
+    query = f"""
+        SELECT id, symbol, trade_type, quantity, price, trade_date, portfolio_id, status
+        FROM trades
+        WHERE {" AND ".join(clauses)}
+        ORDER BY trade_date DESC, id DESC
+        LIMIT %(limit)s::integer OFFSET %(offset)s::integer
+    """
+    return query, params
+
+def _history_count_query(filters: _HistoryFilters, count: str) -> str:
+    if count == "exact":
+        return f"SELECT COUNT(*) AS total FROM trades WHERE {filters.where}"
+    # The planner's row estimate, read without scanning the matching rows
+    return f'EXPLAIN (FORMAT JSON) SELECT 1 FROM trades WHERE {filters.where}'
+
+def _count_result(row: Dict, count: str) -> int:
+    if count == "exact":
+        return row['total']
+    plan = row['QUERY PLAN']
+    if isinstance(plan, str):  # asyncpg leaves json undecoded
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+def _history_page(rows: List[Dict], page: int, page_size: int,
+                  total_count: Optional[int], count: str) -> Dict:
+    has_more = len(rows) > page_size
+    trades = [TradeResponse(**row) for row in rows[:page_size]]
+    next_cursor = None
+    if has_more:
+        last = trades[-1]
+        next_cursor = encode_history_cursor(last.trade_date, last.id)
+    return {
+        "trades": trades,
+        "total_count": total_count,
+        "total_is_estimate": count == "estimate",
+        "page": page,
+        "page_size": page_size,
+        "next_cursor": next_cursor
+    }
+
+def encode_history_cursor(trade_date: datetime, trade_id: int) -> str:
+    """Opaque continuation token for the position after (trade_date, trade_id)"""
+    payload = json.dumps([trade_date.isoformat(), trade_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_history_cursor(token: str) -> Tuple[datetime, int]:
+    """Inverse of encode_history_cursor"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        trade_date, trade_id = json.loads(base64.urlsafe_b64decode(padded))
+        trade_date = datetime.fromisoformat(trade_date)
+        if trade_date.tzinfo is None or not isinstance(trade_id, int):
+            raise ValueError(token)
+        return trade_date, trade_id
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorException() from e
@@ -7,6 +7,12 @@ def round_decimal(value: Union[float, Decimal], places: int = 2) -> Decimal:
         value = Decimal(str(value))
     return value.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
 
+def round_price(price: Union[float, Decimal]) -> float:
+    """Round a trade price to the 4 places trades.price stores"""
+    if isinstance(price, float):
+        price = Decimal(str(price))
+    return float(price.quantize(Decimal('0.0001'), rounding=ROUND_HALF_UP))
+
 def calculate_percentage(part: Union[float, Decimal], whole: Union[float, Decimal]) -> float:
     """Calculate percentage"""
     if whole == 0:
@@ -0,0 +1,87 @@
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+    return {"p50_ms": pick(0.50), "p99_ms": pick(0.99), "max_ms": ordered[-1] * 1000,
+            "mean_ms": statistics.fmean(ordered) * 1000}
+
+def timed_run(calls: int, concurrency: int, call: Callable[[int], None]) -> Dict[str, float]:
+    def timed(i: int) -> float:
+        started = time.perf_counter()
+        call(i)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(timed, range(calls)))
+    elapsed = time.perf_counter() - started
+    return dict(percentiles(latencies), calls=calls, per_second=calls / elapsed)
+
+def report(name: str, result: Dict[str, float]):
+    print(f"{name:<12} {result['per_second']:>10.0f}/s  p50 {result['p50_ms']:.3f}ms  "
+          f"p99 {result['p99_ms']:.3f}ms  max {result['max_ms']:.3f}ms  ({result['calls']} calls)")
+
+def benchmark_providers(args):
+    """Raw get_price latency of each provider, bypassing caches"""
+    from app.services.price_providers import get_price_provider
+    symbols = [f"SYM{i}" for i in range(args.symbols)]
+    for name in args.providers.split(","):
+        provider = get_price_provider(name)
+        report(name, timed_run(args.calls, args.concurrency,
+                               lambda i: provider.get_price(symbols[i % len(symbols)])))
+
+def benchmark_trades(args):
+    """End-to-end place_trade throughput with the configured provider"""
+    from app.core.config import settings
+    from app.core.database import db_manager
+    from app.models.trade import TradeCreate
+    from app.services.trading_service import TradingService
+
+    db_manager.init_database()
+    # Trades on one portfolio serialize on its row lock; spread them to measure the rest
+    portfolios = [f"{args.portfolio}-{k}" for k in range(args.portfolios)]
+    with db_manager.get_cursor() as (cursor, conn):
+        for portfolio_id in portfolios:
+            cursor.execute("""
+                INSERT INTO portfolio (portfolio_id, cash_balance) VALUES (%s, 10000000000)
+                ON CONFLICT (portfolio_id) DO UPDATE SET cash_balance = 10000000000
+            """, (portfolio_id,))
+
+    service = TradingService()
+    symbols = [f"SYM{i}" for i in range(args.symbols)]
+
+    def trade(i: int):
+        service.place_trade(TradeCreate(
+            symbol=symbols[i % len(symbols)], trade_type="BUY", quantity=1,
+            portfolio_id=portfolios[i % len(portfolios)]
+        ))
+
+    print(f"provider: {settings.price_provider}")
+    report("place_trade", timed_run(args.trades, args.concurrency, trade))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark price providers and the order path offline")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    providers = subparsers.add_parser("providers", help="Compare raw provider latency")
+    providers.add_argument("--providers", default="synthetic", help="Comma-separated provider names")
+    providers.add_argument("--calls", type=int, default=10000)
+    providers.add_argument("--symbols", type=int, default=50)
+    providers.add_argument("--concurrency", type=int, default=1)
+    providers.set_defaults(run=benchmark_providers)
+
+    trades = subparsers.add_parser("trades", help="Measure place_trade throughput (use a scratch database)")
+    trades.add_argument("--trades", type=int, default=5000)
+    trades.add_argument("--symbols", type=int, default=20)
+    trades.add_argument("--concurrency", type=int, default=8)
+    trades.add_argument("--portfolio", default="benchmark", help="Prefix of the scratch portfolios")
+    trades.add_argument("--portfolios", type=int, default=8)
+    trades.set_defaults(run=benchmark_trades)
+
+    args = parser.parse_args()
+    args.run(args)
@@ -0,0 +1,56 @@
+import asyncio
+from app.core.async_database import AsyncCursor, _bind, to_asyncpg_query
+
+def test_positional_placeholders_are_numbered_in_order():
+    assert to_asyncpg_query("SELECT * FROM t WHERE a = %s AND b = %s") == (
+        "SELECT * FROM t WHERE a = $1 AND b = $2", ()
+    )
+
+def test_named_placeholders_get_one_number_per_name():
+    sql, names = to_asyncpg_query(
+        "UPDATE t SET v = v - %(value)s WHERE id = %(id)s AND v >= %(value)s"
+    )
+
+    assert sql == "UPDATE t SET v = v - $1 WHERE id = $2 AND v >= $1"
+    assert names == ("value", "id")
+
+def test_escaped_percent_is_unescaped():
+    assert to_asyncpg_query("SELECT %s LIKE 'A%%'") == ("SELECT $1 LIKE 'A%'", ())
+
+def test_dict_params_are_passed_in_placeholder_order():
+    sql, args = _bind("SELECT %(b)s, %(a)s, %(b)s", {"a": 1, "b": 2, "unused": 3})
+
+    assert sql == "SELECT $1, $2, $1"
+    assert args == [2, 1]
+
+class FakeConnection:
+    def __init__(self, records):
+        self.records = records
+        self.calls = []
+
+    async def fetch(self, sql, *args):
+        self.calls.append((sql, args))
+        return self.records
+
+    async def executemany(self, sql, args):
+        self.calls.append((sql, args))
+
+def test_cursor_binds_params_and_serves_rows_like_psycopg2():
+    conn = FakeConnection([{"id": 1}, {"id": 2}])
+    cursor = AsyncCursor(conn)
+
+    asyncio.run(cursor.execute("SELECT id FROM t WHERE a = %(a)s AND b = %(b)s", {"b": 2, "a": 1}))
+
+    assert conn.calls == [("SELECT id FROM t WHERE a = $1 AND b = $2", (1, 2))]
+    assert cursor.fetchone() == {"id": 1}
+    assert cursor.fetchall() == [{"id": 2}]
+    assert cursor.fetchone() is None
+
+def test_executemany_binds_each_row():
+    conn = FakeConnection([])
+    cursor = AsyncCursor(conn)
+
+    asyncio.run(cursor.executemany("INSERT INTO t VALUES (%(a)s, %(b)s)", [{"a": 1, "b": 2}, {"b": 4, "a": 3}]))
+
+    assert conn.calls == [("INSERT INTO t VALUES ($1, $2)", [[1, 2], [3, 4]])]
+    assert cursor.fetchall() == []
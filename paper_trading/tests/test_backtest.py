@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+from app.services.backtest import Bars, backtest, parameter_grid, sma_crossover
+
+def make_bars(prices):
+    prices = np.asarray(prices, dtype=np.float64)
+    return Bars(np.arange(len(prices), dtype=np.int64), prices, prices, prices, prices, np.ones(len(prices)))
+
+def test_orders_fill_at_next_open_and_equity_follows_holdings():
+    bars = make_bars([10, 11, 12, 13])
+
+    result = backtest(bars, [5, 5, 0, 0], initial_cash=100)
+
+    assert [(t["bar"], t["trade_type"], t["price"]) for t in result.trades] == [(1, "BUY", 11.0), (3, "SELL", 13.0)]
+    assert result.equity.tolist() == [100, 100, 105, 110]
+    assert result.summary()["total_return"] == pytest.approx(0.10)
+
+def test_unaffordable_buy_is_rejected_like_a_live_trade():
+    result = backtest(make_bars([10, 11, 12]), [20, 20, 20], initial_cash=100, fill_on="close")
+
+    assert result.trades == []
+    assert result.rejected[0]["reason"] == "Insufficient cash balance"
+    assert result.equity.tolist() == [100, 100, 100]
+
+def test_sma_crossover_targets_and_grid():
+    bars = make_bars([1, 1, 1, 2, 3, 4])
+
+    assert sma_crossover(bars, fast=1, slow=3, quantity=10).tolist() == [0, 0, 0, 10, 10, 10]
+    assert parameter_grid({"fast": [1, 2], "slow": [5]}) == [{"fast": 1, "slow": 5}, {"fast": 2, "slow": 5}]
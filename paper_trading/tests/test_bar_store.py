@@ -0,0 +1,63 @@
+import numpy as np
+from datetime import datetime, timezone
+import pytest
+from app.services.bar_store import BarStore, Bars
+from app.services.price_providers import BarStoreProvider
+
+def make_bars(start, count):
+    timestamps = np.arange(start, start + count, dtype=np.int64) * 60_000_000_000
+    prices = np.arange(start, start + count, dtype=np.float64)
+    return Bars(timestamps, prices, prices + 1, prices - 1, prices, np.ones(count))
+
+def test_append_and_range_read(tmp_path):
+    store = BarStore(str(tmp_path))
+    store.append("AAPL", make_bars(0, 10))
+    assert store.append("aapl", make_bars(10, 5)) == 15
+
+    window = store.read("AAPL", 3 * 60_000_000_000, 7 * 60_000_000_000)
+
+    assert window.close.tolist() == [3, 4, 5, 6]
+    assert store.latest("AAPL") == (14 * 60_000_000_000, 14.0)
+    assert len(store.read("AAPL", datetime(1970, 1, 1, 0, 12, tzinfo=timezone.utc))) == 3
+    assert store.symbols() == ["AAPL"]
+
+def test_out_of_order_append_is_rejected(tmp_path):
+    store = BarStore(str(tmp_path))
+    store.append("AAPL", make_bars(5, 5))
+
+    with pytest.raises(ValueError):
+        store.append("AAPL", make_bars(0, 3))
+    assert len(store.read("AAPL")) == 5
+
+@pytest.mark.parametrize("symbol", ["..", ".", ".hidden", "", "A/B", "AAPL\n", "X" * 33])
+def test_symbols_that_are_not_plain_directory_names_are_rejected(tmp_path, symbol):
+    store = BarStore(str(tmp_path / "bars"))
+
+    with pytest.raises(ValueError):
+        store.append(symbol, make_bars(0, 1))
+    assert list(tmp_path.rglob("*.bin")) == []
+
+def test_index_and_class_share_symbols_are_accepted(tmp_path):
+    store = BarStore(str(tmp_path))
+
+    store.append("^GSPC", make_bars(0, 1))
+    store.append("BRK.B", make_bars(0, 1))
+    assert store.symbols() == ["BRK.B", "^GSPC"]
+
+def test_torn_append_is_invisible_and_repaired(tmp_path):
+    store = BarStore(str(tmp_path))
+    store.append("AAPL", make_bars(0, 3))
+    with open(tmp_path / "AAPL" / "close.bin", "ab") as f:
+        f.write(np.float64(99).tobytes())  # a value column written, its timestamp not
+
+    assert len(store.read("AAPL")) == 3
+    store.append("AAPL", make_bars(3, 1))
+    assert store.read("AAPL").close.tolist() == [0, 1, 2, 3]
+
+def test_provider_serves_last_close_offline(tmp_path):
+    store = BarStore(str(tmp_path))
+    store.append("MSFT", make_bars(0, 4))
+    provider = BarStoreProvider(store)
+
+    assert provider.get_price("MSFT") == 3.0
+    assert provider.get_prices(["MSFT", "NONE"]) == {"MSFT": 3.0}
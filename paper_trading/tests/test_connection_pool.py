@@ -0,0 +1,75 @@
+import pytest
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INTRANS
+from app.core import database
+from app.core.database import ConnectionPool, PoolTimeoutError
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.status = TRANSACTION_STATUS_IDLE
+        self.rollbacks = 0
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+@pytest.fixture
+def fake_connect(monkeypatch):
+    opened = []
+
+    def connect(**params):
+        conn = FakeConnection()
+        opened.append(conn)
+        return conn
+
+    monkeypatch.setattr(database.psycopg2, "connect", connect)
+    return opened
+
+def test_pool_reuses_connections(fake_connect):
+    pool = ConnectionPool({}, min_size=1, max_size=2)
+
+    conn = pool.getconn()
+    pool.putconn(conn)
+    assert pool.getconn() is conn
+
+    stats = pool.stats()
+    assert stats["checkouts"] == 2
+    assert stats["created"] == 1
+
+def test_pool_rolls_back_open_transactions(fake_connect):
+    pool = ConnectionPool({}, min_size=1, max_size=1)
+
+    conn = pool.getconn()
+    conn.status = TRANSACTION_STATUS_INTRANS
+    pool.putconn(conn)
+
+    assert conn.rollbacks == 1
+    assert pool.stats()["idle"] == 1
+
+def test_pool_times_out_when_exhausted(fake_connect):
+    pool = ConnectionPool({}, min_size=0, max_size=1, timeout=0.01)
+    pool.getconn()
+
+    with pytest.raises(PoolTimeoutError):
+        pool.getconn()
+
+    stats = pool.stats()
+    assert stats["exhausted"] == 1
+    assert stats["timeouts"] == 1
+
+def test_pool_reaps_idle_connections_above_min_size(fake_connect):
+    pool = ConnectionPool({}, min_size=1, max_size=3, max_idle=-1)
+
+    first, second = pool.getconn(), pool.getconn()
+    pool.putconn(first)
+    pool.putconn(second)
+
+    assert pool.stats()["size"] == 1
+    assert pool.stats()["reaped"] == 1
+    assert first.closed
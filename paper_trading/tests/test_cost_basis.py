@@ -0,0 +1,62 @@
+from decimal import Decimal
+from app.services.cost_basis import (
+    LedgerLotPositionState,
+    LedgerPositionState,
+    LotPositionState,
+    PositionState,
+    ledger_position_state,
+    position_state
+)
+
+def holding(lifo, *lots):
+    """A lot position built from (quantity, price) buys with trade ids 1, 2, ..."""
+    position = LotPositionState(lifo)
+    for trade_id, (quantity, price) in enumerate(lots, start=1):
+        position.apply('BUY', quantity, price, trade_id)
+    position.changes.clear()
+    return position
+
+def test_fifo_sells_the_oldest_lots_first():
+    position = holding(False, (10, 100.0), (10, 200.0), (10, 300.0))
+
+    assert position.apply('SELL', 15, 250.0, 4) == 15 * 250.0 - (10 * 100.0 + 5 * 200.0)
+    assert [lot[:2] for lot in position.lots] == [[5, 200.0], [10, 300.0]]
+    assert position.quantity == 15 and position.invested == 4000.0
+    # The consumed lot is reported with quantity 0, the split one with what is left
+    assert {trade_id: lot[0] for trade_id, lot in position.changes.items()} == {1: 0, 2: 5}
+
+def test_lifo_sells_the_newest_lots_first():
+    position = holding(True, (10, 100.0), (10, 200.0), (10, 300.0))
+
+    assert position.apply('SELL', 15, 250.0, 4) == 15 * 250.0 - (10 * 300.0 + 5 * 200.0)
+    assert [lot[:2] for lot in position.lots] == [[10, 100.0], [5, 200.0]]
+    assert position.avg_price == 2000.0 / 15
+
+def test_selling_out_resets_the_position():
+    position = holding(False, (3, 10.0), (2, 20.0))
+
+    assert position.apply('SELL', 5, 30.0) == 150.0 - 70.0
+    assert not position.lots
+    assert (position.quantity, position.avg_price, position.invested) == (0, 0.0, 0.0)
+
+def test_ledger_lots_round_only_the_average():
+    position = LedgerLotPositionState(False)
+    position.apply('BUY', 3, Decimal("10.0001"), 1)
+    position.apply('BUY', 3, Decimal("10.0002"), 2)
+
+    assert position.apply('SELL', 4, Decimal("11"), 3) == Decimal("44") - Decimal("40.0005")
+    assert position.invested == Decimal("20.0004")
+    assert position.avg_price == Decimal("10.0002")
+
+def test_copy_does_not_share_lots():
+    position = holding(False, (10, 100.0))
+    copy = position.copy()
+    copy.apply('SELL', 4, 100.0)
+
+    assert position.lots[0][0] == 10 and copy.lots[0][0] == 6
+
+def test_factories_pick_the_state_for_a_method():
+    assert type(position_state('AVERAGE')) is PositionState
+    assert position_state('LIFO').lifo and not position_state('FIFO').lifo
+    assert type(ledger_position_state('AVERAGE')) is LedgerPositionState
+    assert type(ledger_position_state('FIFO')) is LedgerLotPositionState
@@ -0,0 +1,41 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+from app.services.cost_basis import LedgerPositionState
+from app.services.ledger_replay import LedgerReplayService, LedgerState
+
+def test_ledger_position_rounds_like_the_decimal_columns():
+    position = LedgerPositionState()
+    for _ in range(5):
+        position.apply("BUY", 3, Decimal("33.3333"))
+    position.apply("SELL", 7, Decimal("40"))
+
+    assert (position.quantity, position.avg_price, position.invested) == (8, Decimal("33.3333"), Decimal("266.6664"))
+
+def test_ledger_state_tracks_cash_flow_and_checkpoint():
+    state = LedgerState(Decimal("1000"))
+    now = datetime.now(timezone.utc)
+    state.apply(1, "BUY", "AAPL", 2, Decimal("100"), now)
+    state.apply(2, "SELL", "AAPL", 2, Decimal("110"), now)
+
+    params = state.checkpoint_params("default")
+
+    assert state.expected_cash == Decimal("1020")
+    assert params["positions"] == "{}"
+    assert (params["last_trade_id"], params["max_trade_id"], params["trade_count"]) == (2, 2, 2)
+
+def test_compare_allows_rounding_within_tolerance_but_not_quantity_drift():
+    state = LedgerState(Decimal("100000"))
+    now = datetime.now(timezone.utc)
+    state.apply(1, "BUY", "MSFT", 7, Decimal("189.98"), now)
+    state.apply(2, "BUY", "MSFT", 3, Decimal("190.1235"), now)
+    state.apply(3, "BUY", "AAPL", 1, Decimal("150"), now)
+
+    # avg_price 190.02305: the replay rounds it up, a float path wrote it down
+    actual = {
+        "MSFT": {"net_quantity": 10, "avg_price": Decimal("190.0230"), "total_invested": Decimal("1900.2305")},
+        "AAPL": {"net_quantity": 2, "avg_price": Decimal("150"), "total_invested": Decimal("150")},
+    }
+
+    assert state.positions["MSFT"].avg_price == Decimal("190.0231")
+    assert [d.symbol for d in LedgerReplayService._compare(state, actual)] == ["AAPL", "MSFT"]
+    assert [d.symbol for d in LedgerReplayService._compare(state, actual, Decimal("0.01"))] == ["AAPL"]
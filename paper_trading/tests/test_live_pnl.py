@@ -0,0 +1,90 @@
+from datetime import datetime
+from decimal import Decimal
+from app.core.events import PNL_CHANGED, event_bus
+from app.services.live_pnl import LivePnLEngine
+from app.services.pnl_engine import BookValuation, PositionBook, build_portfolio_pnl
+from app.models.trade import TradeResponse
+
+def book_rows(cash, *positions):
+    """PORTFOLIO_BOOK_SQL rows for (symbol, quantity, avg_price) positions"""
+    if not positions:
+        return [{"cash_balance": cash, "symbol": None, "net_quantity": None,
+                 "avg_price": None, "total_invested": None}]
+    return [{"cash_balance": cash, "symbol": symbol, "net_quantity": quantity,
+             "avg_price": avg_price, "total_invested": quantity * avg_price}
+            for symbol, quantity, avg_price in positions]
+
+def engine_holding(rows, flows=None, prices=None):
+    """An engine with the default portfolio installed from in-memory rows"""
+    engine = LivePnLEngine(ttl=60)
+    engine._prices.update(prices or {})
+    with engine._lock:
+        engine._install("default", rows, flows or {})
+    return engine
+
+def executed(symbol, trade_type, quantity, price, realized_pnl=None):
+    return TradeResponse(id=1, symbol=symbol, trade_type=trade_type, quantity=quantity, price=Decimal(str(price)),
+                         trade_date=datetime.now(), portfolio_id="default", status="ACTIVE",
+                         realized_pnl=realized_pnl)
+
+def test_trades_and_ticks_match_a_full_recomputation():
+    engine = engine_holding(book_rows(1000.0, ("AAPL", 10, 100.0)), flows={"AAPL": -1000.0})
+    changes = []
+    event_bus.subscribe(PNL_CHANGED, changes.append)
+    try:
+        engine.on_price_tick({"AAPL": 110.0, "TSLA": 250.0})
+        engine.apply_trade(executed("AAPL", "SELL", 5, 120.0))
+        engine.apply_trade(executed("MSFT", "BUY", 2, 50.0))
+        engine.apply_trade(executed("TSLA", "BUY", 1, 240.0))
+    finally:
+        event_bus.unsubscribe(PNL_CHANGED, changes.append)
+
+    assert changes == [("default", ["AAPL"]), ("default", ["AAPL"]), ("default", ["MSFT"]), ("default", ["TSLA"])]
+    pnl = engine._portfolios["default"].to_pnl()
+    book = PositionBook.from_rows([("AAPL", 5, 100.0, 500.0), ("MSFT", 2, 50.0, 100.0), ("TSLA", 1, 240.0, 240.0)])
+    # MSFT has never been quoted, so it is valued at cost
+    expected = build_portfolio_pnl("default", book, BookValuation(book, {"AAPL": 110.0, "TSLA": 250.0}), 1260.0,
+                                   realized={"AAPL": 100.0})
+    assert pnl == expected
+
+    totals = engine._portfolios["default"].totals()
+    assert totals["realized_pnl"] == 100.0  # 5 sold at 120 against a 100 average
+    assert totals["total_pnl"] == 60.0
+
+def test_closing_a_position_keeps_its_realized_pnl():
+    engine = engine_holding(book_rows(0.0, ("AAPL", 10, 100.0)), flows={"AAPL": -1000.0, "MSFT": 25.0})
+    engine.apply_trade(executed("AAPL", "SELL", 10, 90.0))
+
+    totals, rows = engine.view("default", ["AAPL"])
+    assert rows == {"AAPL": None}
+    assert totals["cash_balance"] == 900.0 and totals["current_value"] == 0.0
+    assert totals["realized_pnl"] == -75.0
+    assert engine.stats()["symbols"] == 0
+
+def test_sell_releases_the_cost_its_lots_carried():
+    # 10 @ 100 then 10 @ 200; a FIFO sale of 10 @ 150 releases the first lot
+    engine = engine_holding(book_rows(0.0, ("AAPL", 20, 150.0)), flows={"AAPL": -3000.0})
+    engine.apply_trade(executed("AAPL", "SELL", 10, 150.0, realized_pnl=Decimal("500")))
+
+    totals, rows = engine.view("default", ["AAPL"])
+    assert rows["AAPL"]["invested"] == 2000.0 and rows["AAPL"]["avg_price"] == 200.0
+    assert rows["AAPL"]["realized_pnl"] == 500.0
+    assert totals["realized_pnl"] == 500.0
+
+def test_load_racing_a_trade_is_retried():
+    engine = LivePnLEngine(ttl=60)
+    reads = []
+
+    def read(portfolio_id):
+        if not reads:
+            # A trade on the portfolio commits while the first read runs
+            with engine.trading([portfolio_id]):
+                pass
+        reads.append(portfolio_id)
+        return book_rows(500.0), {}
+
+    engine._read = read
+    portfolio = engine.load("default")
+
+    assert len(reads) == 2 and not portfolio.stale
+    assert engine.stats()["load_retries"] == 1 and engine.stats()["loads"] == 1
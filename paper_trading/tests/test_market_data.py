@@ -0,0 +1,48 @@
+import asyncio
+from app.services import market_data
+from app.services.market_data import MarketDataPoller, PriceSnapshot
+from app.services.price_providers import PriceProvider
+from app.services.quote_engine import QuoteEngine
+
+class FakeProvider(PriceProvider):
+    name = "fake"
+
+    def __init__(self, prices):
+        self.prices = prices
+
+    def get_price(self, symbol, timeout=None):
+        if symbol not in self.prices:
+            raise ValueError(f"unknown symbol {symbol}")
+        return self.prices[symbol]
+
+def make_poller(monkeypatch, prices, held):
+    monkeypatch.setattr(market_data, "quote_engine", QuoteEngine(FakeProvider(prices), timeout=2))
+    poller = MarketDataPoller(PriceSnapshot(), min_interval=1, max_interval=8, max_backoff=60)
+
+    async def load_symbols():
+        return set(held)
+
+    monkeypatch.setattr(poller, "_load_symbols", load_symbols)
+    return poller
+
+def test_poll_fills_snapshot_for_held_symbols(monkeypatch):
+    poller = make_poller(monkeypatch, {"AAPL": 150.0, "MSFT": 300.0}, ["AAPL", "MSFT"])
+
+    asyncio.run(poller.poll_once())
+
+    assert poller.snapshot.get("AAPL") == 150.0
+    assert poller.snapshot.get_many(["AAPL", "MSFT", "TSLA"]) == {"AAPL": 150.0, "MSFT": 300.0}
+
+def test_unchanged_symbols_slow_down_and_failures_back_off(monkeypatch):
+    poller = make_poller(monkeypatch, {"AAPL": 150.0}, ["AAPL", "BAD"])
+
+    asyncio.run(poller.poll_once())
+    for schedule in poller._schedules.values():
+        schedule.next_poll = 0
+    asyncio.run(poller.poll_once())
+
+    aapl, bad = poller._schedules["AAPL"], poller._schedules["BAD"]
+    assert aapl.interval > poller.min_interval
+    assert aapl.failures == 0
+    assert bad.failures == 2
+    assert bad.next_poll > aapl.next_poll
@@ -0,0 +1,95 @@
+from app.core import migrations
+from app.core.migrations import Migration, MigrationRunner
+
+class FakeCursor:
+    """Records statements; schema_migrations and invalid indexes live in sets"""
+
+    def __init__(self, applied=None, invalid=()):
+        self.applied = applied
+        self.invalid = set(invalid)
+        self.statements = []
+        self.row = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.statements.append(" ".join(sql.split()))
+        self.row = None
+        if "to_regclass('schema_migrations')" in sql:
+            self.row = (self.applied is not None,)
+        elif "SELECT version FROM schema_migrations" in sql:
+            self.rows = [(version,) for version in sorted(self.applied)]
+        elif "CREATE TABLE IF NOT EXISTS schema_migrations" in sql and self.applied is None:
+            self.applied = set()
+        elif "INSERT INTO schema_migrations" in sql:
+            self.applied.add(params[0])
+        elif "NOT indisvalid" in sql:
+            self.row = (1,) if params[0] in self.invalid else None
+
+    def fetchone(self):
+        return self.row
+
+    def fetchall(self):
+        return self.rows
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.autocommit = False
+        self.commits = 0
+
+    def cursor(self):
+        return self._cursor
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+def runner_over(monkeypatch, cursor, versions):
+    conn = FakeConnection(cursor)
+    monkeypatch.setattr(migrations.psycopg2, "connect", lambda **params: conn)
+    steps = [Migration(v, f"step {v}", f"CREATE TABLE t{v} (id INT)") for v in versions]
+    return MigrationRunner({}, steps), conn
+
+def test_pending_migrations_apply_in_version_order(monkeypatch):
+    cursor = FakeCursor(applied={1})
+    runner, conn = runner_over(monkeypatch, cursor, [3, 1, 2])
+
+    assert runner.latest_version == 3
+    assert runner.migrate() == [2, 3]
+    assert [s for s in cursor.statements if s.startswith("CREATE TABLE t")] == [
+        "CREATE TABLE t2 (id INT)", "CREATE TABLE t3 (id INT)"
+    ]
+    assert cursor.applied == {1, 2, 3} and conn.commits == 2
+    assert [row["applied"] for row in runner.status()] == [True, True, True]
+
+def test_up_to_date_database_takes_no_lock(monkeypatch):
+    cursor = FakeCursor(applied={1, 2})
+    runner, _ = runner_over(monkeypatch, cursor, [1, 2])
+
+    assert runner.migrate() == []
+    assert not any("pg_advisory_lock" in s for s in cursor.statements)
+
+def test_invalid_index_is_dropped_before_a_concurrent_rebuild():
+    cursor = FakeCursor(invalid={"idx_broken"})
+    migration = Migration(9, "index", [
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_broken ON trades (symbol)",
+        "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_fine ON trades (id)",
+    ], transactional=False)
+
+    migration.apply(cursor)
+
+    assert [s for s in cursor.statements if "INDEX" in s and "indisvalid" not in s] == [
+        "DROP INDEX CONCURRENTLY IF EXISTS idx_broken",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_broken ON trades (symbol)",
+        "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_fine ON trades (id)",
+    ]
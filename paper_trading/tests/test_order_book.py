@@ -0,0 +1,63 @@
+from app.services.order_book import Order, OrderBook
+
+def order(id, trade_type, order_type, limit=None, stop=None, **kwargs):
+    return Order(id, "default", "AAPL", trade_type, order_type, 10, limit, stop, **kwargs)
+
+def test_tick_fills_only_the_orders_it_reaches():
+    book = OrderBook()
+    book.add(order(1, "BUY", "LIMIT", limit=100))
+    book.add(order(2, "BUY", "LIMIT", limit=95))
+    book.add(order(3, "SELL", "LIMIT", limit=110))
+    book.add(order(4, "SELL", "STOP", stop=90))
+    book.add(order(5, "BUY", "STOP", stop=120))
+
+    fills, _ = book.match("AAPL", 99)
+    assert [o.id for o in fills] == [1]
+
+    fills, _ = book.match("AAPL", 89)
+    assert [o.id for o in fills] == [2, 4]
+
+    fills, _ = book.match("AAPL", 125)
+    assert [o.id for o in fills] == [3, 5]
+    assert len(book) == 0 and book.symbols() == set()
+
+def test_stop_limit_rests_as_limit_once_triggered():
+    book = OrderBook()
+    book.add(order(1, "SELL", "STOP_LIMIT", limit=95, stop=98))
+
+    fills, converted = book.match("AAPL", 94)
+    assert fills == [] and [o.id for o in converted] == [1]
+    assert book.get(1).triggered
+
+    fills, _ = book.match("AAPL", 99)
+    assert [o.id for o in fills] == [1]
+
+    book.add(order(2, "SELL", "STOP_LIMIT", limit=95, stop=98))
+    fills, converted = book.match("AAPL", 97)
+    assert [o.id for o in fills] == [2] and converted == []
+
+def test_cancelled_and_expired_orders_never_fill():
+    book = OrderBook()
+    for i in range(10):
+        book.add(order(i, "BUY", "LIMIT", limit=100 + i))
+    book.add(order(10, "BUY", "LIMIT", limit=100, expires_at=50.0))
+
+    for i in range(8):
+        assert book.remove(i) is not None
+    assert book.remove(0) is None
+    assert [o.id for o in book.expire(now=60.0)] == [10]
+
+    fills, _ = book.match("AAPL", 1)
+    assert [o.id for o in fills] == [8, 9]
+
+def test_failed_stop_fill_rests_again_at_its_stop():
+    book = OrderBook()
+    book.add(order(1, "SELL", "STOP", stop=90))
+
+    fills, _ = book.match("AAPL", 89)
+    assert fills[0].triggered
+    book.requeue(fills[0])
+
+    assert 1 in book and book.match("AAPL", 95) == ([], [])
+    fills, _ = book.match("AAPL", 90)
+    assert [o.id for o in fills] == [1] and len(book) == 0
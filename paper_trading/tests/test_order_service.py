@@ -0,0 +1,90 @@
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from app.models.trade import TradeResponse
+from app.services import order_service
+from app.services.order_book import Order, OrderBook
+from app.services.order_service import OrderService
+
+class FakeCursor:
+    """Answers the order fill statements; the close fails while ``fail`` is set"""
+
+    def __init__(self, fail: bool):
+        self.fail = fail
+        self.row = None
+
+    def execute(self, sql, params=None):
+        if "FOR UPDATE" in sql:
+            self.row = {"id": params[0]}
+        elif "UPDATE orders" in sql:
+            if self.fail:
+                raise RuntimeError("connection lost")
+            now = datetime.now(timezone.utc)
+            self.row = {
+                "id": params["id"], "symbol": "AAPL", "trade_type": "SELL", "order_type": "STOP",
+                "quantity": 10, "limit_price": None, "stop_price": 90, "time_in_force": "GTC",
+                "portfolio_id": "default", "status": params["status"], "triggered": True,
+                "trade_id": params["trade_id"], "reason": params["reason"], "created_at": now,
+                "expires_at": None, "updated_at": now,
+            }
+
+    def fetchone(self):
+        return self.row
+
+class FakeDatabase:
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.closed = []
+
+    @contextmanager
+    def get_cursor(self):
+        cursor = FakeCursor(self.failures > 0)
+        self.failures -= 1
+        yield cursor, None
+        if cursor.row and "status" in cursor.row:
+            self.closed.append(cursor.row)
+
+class FakeJournal:
+    is_open = True
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, trade, price):
+        self.submitted.append(trade)
+        return TradeResponse(id=len(self.submitted), symbol=trade.symbol, trade_type=trade.trade_type,
+                             quantity=trade.quantity, price=price, trade_date=datetime.now(timezone.utc),
+                             portfolio_id=trade.portfolio_id, status="ACTIVE")
+
+class ClosedJournal:
+    is_open = False
+
+def stop_orders(book, *ids):
+    for order_id in ids:
+        book.add(Order(order_id, "default", "AAPL", "SELL", "STOP", 10, stop_price=90))
+
+def test_failed_fills_return_to_the_book_and_the_tick_goes_on(monkeypatch):
+    database = FakeDatabase(failures=2)
+    monkeypatch.setattr(order_service, "db_manager", database)
+    monkeypatch.setattr(order_service, "trade_journal", ClosedJournal())
+    book = OrderBook()
+    stop_orders(book, 1, 2)
+    service = OrderService(book)
+    monkeypatch.setattr(service.trading_service, "execute_trade",
+                        lambda cursor, trade, price: FakeJournal().submit(trade, price))
+
+    assert service.process_tick("AAPL", 89) == []
+    assert 1 in book and 2 in book
+
+def test_acknowledged_journal_fill_is_recorded_not_requeued(monkeypatch):
+    database = FakeDatabase(failures=1)
+    journal = FakeJournal()
+    monkeypatch.setattr(order_service, "db_manager", database)
+    monkeypatch.setattr(order_service, "trade_journal", journal)
+    book = OrderBook()
+    stop_orders(book, 1)
+
+    filled = OrderService(book).process_tick("AAPL", 89)
+
+    assert len(journal.submitted) == 1 and 1 not in book
+    assert [(o.id, o.status, o.trade_id) for o in filled] == [(1, "FILLED", 1)]
+    assert book.match("AAPL", 80) == ([], [])
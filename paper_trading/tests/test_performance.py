@@ -0,0 +1,57 @@
+import numpy as np
+from datetime import date
+from app.services.performance import daily_returns, drawdowns, performance_metrics, value_days
+
+def trades(*rows):
+    """DAILY_TRADES_SQL rows from (symbol, day, quantity, flow, last_price, last_day) tuples"""
+    return [dict(zip(("symbol", "day", "quantity", "flow", "last_price", "last_day"), row)) for row in rows]
+
+def no_bars(symbol, day_ends):
+    return np.zeros(len(day_ends), dtype=np.int64), np.full(len(day_ends), np.nan)
+
+def test_positions_are_marked_at_fills_without_bars():
+    rows = trades(("AAPL", None, 10, -1000.0, 100.0, date(2024, 1, 1)),
+                  ("AAPL", date(2024, 1, 3), -4, 480.0, 120.0, date(2024, 1, 3)))
+
+    cash, market_value = value_days(date(2024, 1, 2), 3, 5000.0, rows, no_bars)
+
+    assert cash.tolist() == [4000.0, 4480.0, 4480.0]
+    assert market_value.tolist() == [1000.0, 720.0, 720.0]
+
+def test_bar_closes_mark_unless_a_later_fill_is_newer():
+    day_end = np.datetime64("2024-01-02", "ns").astype(np.int64)
+
+    def bars(symbol, day_ends):
+        # One bar during Jan 1, so every day end sees it
+        return np.full(len(day_ends), day_end - 3600 * 10**9), np.full(len(day_ends), 110.0)
+
+    rows = trades(("AAPL", None, 10, -1000.0, 100.0, date(2023, 12, 31)),
+                  ("AAPL", date(2024, 1, 2), 1, -130.0, 130.0, date(2024, 1, 2)))
+
+    cash, market_value = value_days(date(2024, 1, 1), 3, 1130.0, rows, bars)
+
+    assert market_value.tolist() == [1100.0, 1430.0, 1430.0]
+    assert cash.tolist() == [130.0, 0.0, 0.0]
+
+def test_metrics_of_a_curve_with_a_drawdown():
+    equity = np.array([100.0, 110.0, 99.0, 121.0])
+
+    metrics = performance_metrics(equity, periods_per_year=1)
+    returns = daily_returns(equity)[1:]
+
+    assert np.isnan(daily_returns(equity)[0])
+    assert abs(metrics["total_return"] - 0.21) < 1e-12
+    assert abs(metrics["annualized_return"] - (1.21 ** (1 / 3) - 1)) < 1e-12
+    assert abs(metrics["max_drawdown"] - 0.1) < 1e-12
+    assert (metrics["max_drawdown_peak"], metrics["max_drawdown_trough"]) == (1, 2)
+    assert abs(metrics["sharpe_ratio"] - returns.mean() / returns.std(ddof=1)) < 1e-12
+    downside = np.sqrt(np.mean(np.minimum(returns, 0) ** 2))
+    assert abs(metrics["sortino_ratio"] - returns.mean() / downside) < 1e-12
+    assert drawdowns(equity).tolist()[1:3] == [0.0, 0.1]
+
+def test_flat_curve_has_no_ratios():
+    metrics = performance_metrics(np.full(5, 100.0))
+
+    assert metrics["total_return"] == 0.0 and metrics["volatility"] == 0.0
+    assert metrics["sharpe_ratio"] is None and metrics["sortino_ratio"] is None
+    assert metrics["max_drawdown_peak"] is None
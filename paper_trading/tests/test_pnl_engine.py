@@ -0,0 +1,110 @@
+import json
+from decimal import Decimal
+from app.services.pnl_engine import (
+    BookValuation,
+    BulkPnLStream,
+    BulkValuation,
+    MultiPortfolioBook,
+    PositionBook,
+    build_portfolio_pnl,
+    portfolio_chunks
+)
+from app.services.quote_engine import QuoteBatch
+
+def test_valuation_matches_per_position_math():
+    rows = [("AAPL", 15, 155.0, 2325.0), ("MSFT", 3, 333.33, 999.99), ("TSLA", 7, 0.0, 0.0)]
+    book = PositionBook.from_rows(rows)
+    prices = {"AAPL": 171.1111, "TSLA": 250.0}
+
+    pnl = build_portfolio_pnl("default", book, BookValuation(book, prices), 1000.0)
+
+    for (symbol, quantity, avg_price, invested), position in zip(rows, pnl.positions_pnl):
+        current_price = prices.get(symbol, avg_price)
+        expected_pnl = current_price * quantity - invested
+        assert position.current_price == Decimal(str(current_price))
+        assert abs(float(position.pnl) - expected_pnl) < 0.00005
+        assert position.pnl_percent == (expected_pnl / invested * 100 if invested > 0 else 0)
+
+    assert pnl.total_invested == Decimal("3324.99")
+    assert pnl.total_portfolio_value == pnl.current_value + pnl.cash_balance
+
+def test_empty_book_reports_cash_only():
+    book = PositionBook.from_rows([])
+
+    pnl = build_portfolio_pnl("default", book, BookValuation(book, {}), 500.0)
+
+    assert pnl.positions_pnl == []
+    assert pnl.total_portfolio_value == Decimal("500.0")
+
+def bulk_rows():
+    """BULK_BOOK_SQL rows: one per position, or a single NULL-symbol row for a flat portfolio"""
+    def row(portfolio_id, cash, symbol=None, quantity=None, avg_price=None, invested=None):
+        return {"portfolio_id": portfolio_id, "cash_balance": cash, "symbol": symbol,
+                "net_quantity": quantity, "avg_price": avg_price, "total_invested": invested}
+    return [
+        row("a", 1000, "AAPL", 10, 100.0, 1000.0),
+        row("a", 1000, "MSFT", 5, 200.0, 1000.0),
+        row("b", 500),
+        row("c", 0, "AAPL", 2, 90.0, 180.0),
+    ]
+
+def test_multi_portfolio_book_groups_positions_per_portfolio():
+    books = MultiPortfolioBook(bulk_rows(), {"a": {"AAPL": 25.0}, "c": {"TSLA": -5.0}})
+    valuation = BookValuation(books.book, {"AAPL": 110.0, "MSFT": 190.0})
+
+    pnls = list(books.portfolio_pnls(valuation))
+
+    assert books.portfolio_ids == ["a", "b", "c"]
+    assert books.bounds == [0, 2, 2, 3]
+    assert books.symbols == ["AAPL", "MSFT"]
+    assert [[p.symbol for p in pnl.positions_pnl] for pnl in pnls] == [["AAPL", "MSFT"], [], ["AAPL"]]
+    assert [pnl.total_portfolio_value for pnl in pnls] == [Decimal("3050.0"), Decimal("500.0"), Decimal("220.0")]
+    assert [pnl.realized_pnl for pnl in pnls] == [Decimal("25.0"), Decimal("0"), Decimal("-5.0")]
+
+def test_aggregate_sums_every_portfolio():
+    books = MultiPortfolioBook(bulk_rows(), {"a": {"AAPL": 25.0}, "c": {"TSLA": -5.0}})
+    valuation = BookValuation(books.book, {"AAPL": 110.0, "MSFT": 190.0})
+
+    aggregate = books.aggregate(valuation)
+
+    assert (aggregate.portfolio_count, aggregate.position_count) == (3, 3)
+    assert aggregate.cash_balance == Decimal("1500.0")
+    assert aggregate.total_invested == Decimal("2180.0")
+    assert aggregate.current_value == Decimal("2270.0")
+    assert aggregate.unrealized_pnl == Decimal("90.0")
+    assert aggregate.realized_pnl == Decimal("20.0")
+    assert aggregate.total_portfolio_value == Decimal("3770.0")
+
+def test_portfolio_chunks_never_split_a_portfolio():
+    rows = bulk_rows()
+
+    for size in (1, 2, 3, 10):
+        batches = [rows[i:i + size] for i in range(0, len(rows), size)]
+        chunks = list(portfolio_chunks(batches))
+
+        assert [row for chunk in chunks for row in chunk] == rows
+        ids = [{row["portfolio_id"] for row in chunk} for chunk in chunks]
+        assert all(not (a & b) for i, a in enumerate(ids) for b in ids[i + 1:])
+    assert [len(chunk) for chunk in portfolio_chunks([rows[:1], rows[1:3], rows[3:]])] == [2, 2]
+
+def test_bulk_ndjson_streams_portfolios_chunk_by_chunk_then_the_summary():
+    quotes = QuoteBatch()
+    quotes.prices["AAPL"] = 110.0
+    quotes.failures["MSFT"] = "timeout"
+    requested = ["c", "missing", "a", "missing"]
+    stream = BulkPnLStream(requested)
+
+    lines = []
+    for rows in portfolio_chunks([bulk_rows()[:1], bulk_rows()[1:]]):
+        books = MultiPortfolioBook(rows)
+        lines += [json.loads(line) for line in stream.add(books, BookValuation(books.book, quotes.prices),
+                                                          quotes.failures)]
+    summary = json.loads(stream.summary())
+
+    assert [line["portfolio"]["portfolio_id"] for line in lines] == ["a", "b", "c"]
+    # Unquoted MSFT is valued at cost
+    assert lines[0]["portfolio"]["current_value"] == "2100.0"
+    assert summary["not_found"] == ["missing"]
+    assert summary["failed_symbols"] == {"MSFT": "timeout"}
+    whole = BulkValuation(MultiPortfolioBook(bulk_rows()), quotes, requested).to_response()
+    assert summary["aggregate"] == json.loads(whole.aggregate.model_dump_json())
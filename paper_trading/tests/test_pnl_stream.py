@@ -0,0 +1,51 @@
+import asyncio
+from app.services.pnl_stream import PnLStreamHub, PnLSubscriber, _PortfolioChannel
+from tests.test_live_pnl import book_rows, engine_holding, executed
+
+def hub_streaming(engine, subscribers=1):
+    hub = PnLStreamHub(engine)
+    channel = hub._channels["default"] = _PortfolioChannel("default")
+    channel.subscribers.update(PnLSubscriber("default") for _ in range(subscribers))
+    return hub, list(channel.subscribers)
+
+def test_each_change_is_rendered_once_and_fanned_out():
+    engine = engine_holding(book_rows(1000.0, ("AAPL", 10, 100.0), ("MSFT", 5, 200.0)),
+                            prices={"AAPL": 100.0, "MSFT": 200.0})
+    hub, subscribers = hub_streaming(engine, subscribers=3)
+
+    engine.on_price_tick({"AAPL": 110.0})
+    hub.publish("default", ["AAPL"])
+
+    messages = [asyncio.run(subscriber.get()) for subscriber in subscribers]
+    assert all(message is messages[0] for message in messages)
+    assert list(messages[0]["positions"]) == ["AAPL"]
+    assert messages[0]["positions"]["AAPL"]["pnl"] == 100.0
+    assert messages[0]["total_pnl"] == 100.0
+    assert messages[0]["total_portfolio_value"] == 3100.0
+    assert hub.stats()["published"] == 1
+
+def test_slow_subscriber_gets_one_coalesced_message():
+    engine = engine_holding(book_rows(1000.0, ("AAPL", 10, 100.0), ("MSFT", 5, 200.0)),
+                            prices={"AAPL": 100.0, "MSFT": 200.0})
+    hub, (subscriber,) = hub_streaming(engine)
+
+    for symbol, price in [("AAPL", 101.0), ("MSFT", 190.0), ("AAPL", 105.0)]:
+        engine.on_price_tick({symbol: price})
+        hub.publish("default", [symbol])
+    engine.apply_trade(executed("MSFT", "SELL", 5, 190.0))
+    hub.publish("default", ["MSFT"])
+
+    message = asyncio.run(subscriber.get())
+    assert message["type"] == "pnl"
+    assert message["positions"]["AAPL"]["current_price"] == 105.0
+    assert "MSFT" not in message["positions"] and message["closed"] == ["MSFT"]
+    assert message["cash_balance"] == 1950.0 and message["total_pnl"] == 50.0
+    assert message["realized_pnl"] == -50.0
+    assert hub.stats()["coalesced"] == 3
+
+    # A pending snapshot absorbs later deltas and stays a snapshot
+    hub.publish("default", None)
+    engine.on_price_tick({"AAPL": 90.0})
+    hub.publish("default", ["AAPL"])
+    message = asyncio.run(subscriber.get())
+    assert message["type"] == "snapshot" and message["positions"]["AAPL"]["pnl"] == -100.0
@@ -0,0 +1,45 @@
+import time
+from app.core.exceptions import InsufficientFundsException
+from app.services.portfolio_state import PortfolioStateManager
+from app.models.trade import TradeCreate
+
+def manager_over(database):
+    """A manager whose loads read from a dict standing in for Postgres"""
+    states = PortfolioStateManager(ttl=60)
+
+    def load(portfolio_id):
+        states._loads += 1
+        states._cash[portfolio_id] = database[portfolio_id]
+        states._symbols[portfolio_id] = set()
+        states._loaded_at[portfolio_id] = time.monotonic()
+
+    states._load = load
+    return states
+
+def buy(quantity, price=10.0):
+    return TradeCreate(symbol="AAPL", trade_type="BUY", quantity=quantity, price=price)
+
+def test_state_is_cached_and_rejections_reload_once():
+    database = {"default": 100.0}
+    states = manager_over(database)
+
+    with states.lock("default"):
+        assert states.apply(buy(5), 10.0) == (None, 0.0)
+        database["default"] = 1000.0  # deposited outside the cache
+        assert states.apply(buy(10), 10.0) == (None, 0.0)
+        assert isinstance(states.apply(buy(1000), 10.0)[0], InsufficientFundsException)
+
+    assert states.position("default", "AAPL").quantity == 15
+    assert states.stats()["loads"] == 3 and states.stats()["reloads_on_reject"] == 2
+
+def test_writing_invalidates_the_portfolio():
+    database = {"default": 100.0}
+    states = manager_over(database)
+    with states.lock("default"):
+        states.apply(buy(1), 10.0)
+
+    with states.writing(["default"]):
+        database["default"] = 5.0
+    with states.lock("default"):
+        assert isinstance(states.apply(buy(1), 10.0)[0], InsufficientFundsException)
+    assert states.stats()["loads"] == 2
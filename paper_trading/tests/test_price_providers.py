@@ -0,0 +1,43 @@
+import pytest
+from app.services.price_providers import ReplayProvider, SyntheticProvider, get_price_provider
+
+def test_synthetic_walk_is_reproducible_per_seed():
+    first, second = SyntheticProvider(seed=7), SyntheticProvider(seed=7)
+
+    walk = [first.get_price("AAPL") for _ in range(5)]
+
+    assert walk == [second.get_price("AAPL") for _ in range(5)]
+    assert len(set(walk)) > 1
+    assert SyntheticProvider(seed=8).get_price("AAPL") != walk[0]
+    assert first.get_prices(["AAPL", "MSFT"]).keys() == {"AAPL", "MSFT"}
+
+def test_replay_provider_walks_the_tape(tmp_path):
+    tape = tmp_path / "tape.csv"
+    tape.write_text("symbol,price\nAAPL,1\nMSFT,10\nAAPL,2\n")
+
+    looping = ReplayProvider(str(tape))
+    holding = ReplayProvider(str(tape), loop=False)
+
+    assert [looping.get_price("AAPL") for _ in range(3)] == [1.0, 2.0, 1.0]
+    assert [holding.get_price("AAPL") for _ in range(3)] == [1.0, 2.0, 2.0]
+    assert looping.get_prices(["MSFT", "TSLA"]) == {"MSFT": 10.0}
+
+def test_replay_provider_shares_one_cursor_across_symbol_case(tmp_path):
+    tape = tmp_path / "tape.csv"
+    tape.write_text("symbol,price\naapl,1\nAAPL,2\nAAPL,3\n")
+    provider = ReplayProvider(str(tape))
+
+    assert [provider.get_price("aapl"), provider.get_price("AAPL")] == [1.0, 2.0]
+    assert provider.get_prices(["Aapl"]) == {"Aapl": 3.0}
+
+def test_synthetic_provider_walks_one_series_across_symbol_case():
+    mixed, upper = SyntheticProvider(seed=7), SyntheticProvider(seed=7)
+
+    walk = [mixed.get_price("aapl"), mixed.get_price("AAPL"), mixed.get_prices(["Aapl"])["Aapl"]]
+
+    assert walk == [upper.get_price("AAPL") for _ in range(3)]
+
+def test_providers_are_selected_by_name():
+    assert isinstance(get_price_provider("synthetic"), SyntheticProvider)
+    with pytest.raises(ValueError):
+        get_price_provider("nope")
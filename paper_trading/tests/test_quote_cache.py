@@ -0,0 +1,66 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app.services.quote_cache import QuoteCache
+from app.services.quote_engine import QuoteBatch
+
+def test_serves_cached_quotes_until_stale():
+    cache = QuoteCache(ttl=60)
+    calls = []
+    loader = lambda symbol: calls.append(symbol) or 100.0
+
+    assert cache.get("AAPL", loader) == 100.0
+    assert cache.get("AAPL", loader) == 100.0
+    assert cache.get("AAPL", loader, max_age=0) == 100.0
+
+    assert calls == ["AAPL", "AAPL"]
+    stats = cache.stats()
+    assert (stats["misses"], stats["hits"], stats["stale"]) == (1, 1, 1)
+
+def test_evicts_least_recently_used():
+    cache = QuoteCache(ttl=60, max_entries=2)
+    cache.put("A", 1.0)
+    cache.put("B", 2.0)
+    cache.get("A", lambda symbol: 0.0)
+    cache.put("C", 3.0)
+
+    assert cache.get("B", lambda symbol: -1.0) == -1.0
+    assert cache.stats()["evictions"] == 2
+
+def test_concurrent_misses_share_one_fetch():
+    cache = QuoteCache(ttl=60)
+    calls = []
+    release = threading.Event()
+
+    def slow_loader(symbol):
+        calls.append(symbol)
+        release.wait(1)
+        return 150.0
+
+    with ThreadPoolExecutor(8) as executor:
+        futures = [executor.submit(cache.get, "AAPL", slow_loader) for _ in range(8)]
+        time.sleep(0.05)
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert results == [150.0] * 8
+    assert calls == ["AAPL"]
+    assert cache.stats()["coalesced"] == 7
+
+def test_get_many_loads_only_missing_symbols():
+    cache = QuoteCache(ttl=60)
+    cache.put("AAPL", 150.0)
+    requested = []
+
+    def loader(symbols):
+        requested.append(symbols)
+        batch = QuoteBatch()
+        batch.prices = {"MSFT": 300.0}
+        batch.failures = {"BAD": "no price data"}
+        return batch
+
+    batch = cache.get_many(["AAPL", "MSFT", "BAD"], loader)
+
+    assert requested == [["MSFT", "BAD"]]
+    assert batch.prices == {"AAPL": 150.0, "MSFT": 300.0}
+    assert batch.failures == {"BAD": "no price data"}
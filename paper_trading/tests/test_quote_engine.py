@@ -0,0 +1,88 @@
+import time
+from app.services.price_providers import PriceProvider
+from app.services.quote_engine import QuoteEngine
+
+class FakeProvider(PriceProvider):
+    name = "fake"
+
+    def __init__(self, prices, delay=0.0, slow=()):
+        self.prices = prices
+        self.delay = delay
+        self.slow = set(slow)
+        self.calls = []
+
+    def get_price(self, symbol, timeout=None):
+        self.calls.append(symbol)
+        time.sleep(1.0 if symbol in self.slow else self.delay)
+        if symbol not in self.prices:
+            raise ValueError(f"unknown symbol {symbol}")
+        return self.prices[symbol]
+
+class FakeBatchProvider(FakeProvider):
+    supports_batch = True
+
+    def get_prices(self, symbols, timeout=None):
+        self.calls.append(list(symbols))
+        return {symbol: self.prices[symbol] for symbol in symbols if symbol in self.prices}
+
+def test_fetches_symbols_concurrently():
+    prices = {f"S{i}": float(i) for i in range(20)}
+    engine = QuoteEngine(FakeProvider(prices, delay=0.05), max_workers=20, timeout=2)
+
+    start = time.monotonic()
+    batch = engine.fetch(list(prices))
+    elapsed = time.monotonic() - start
+
+    assert batch.prices == prices
+    assert batch.complete
+    assert elapsed < 0.5  # sequential fetching would take a full second
+
+def test_reports_partial_failures_and_timeouts():
+    provider = FakeProvider({"AAPL": 150.0, "SLOW": 1.0}, slow={"SLOW"})
+    engine = QuoteEngine(provider, max_workers=4, timeout=0.2)
+
+    batch = engine.fetch(["AAPL", "MISSING", "SLOW", "AAPL"])
+
+    assert batch.prices == {"AAPL": 150.0}
+    assert "unknown symbol" in batch.failures["MISSING"]
+    assert "timed out" in batch.failures["SLOW"]
+    assert provider.calls.count("AAPL") == 1
+
+def test_batch_provider_is_called_per_chunk():
+    prices = {f"S{i}": float(i) for i in range(5)}
+    provider = FakeBatchProvider(prices)
+    engine = QuoteEngine(provider, timeout=2, batch_size=2)
+
+    batch = engine.fetch(list(prices) + ["NOPE"])
+
+    assert batch.prices == prices
+    assert batch.failures == {"NOPE": "no price data"}
+    assert sorted(len(call) for call in provider.calls) == [2, 2, 2]
+
+class SerialBatchProvider(FakeBatchProvider):
+    max_concurrent_fetches = 1
+
+    def __init__(self, prices, delay):
+        super().__init__(prices, delay=delay)
+        self.running = 0
+        self.max_running = 0
+
+    def get_prices(self, symbols, timeout=None):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        time.sleep(self.delay)
+        self.running -= 1
+        return super().get_prices(symbols, timeout)
+
+def test_waiting_for_a_provider_slot_does_not_count_against_the_fetch_timeout():
+    prices = {f"S{i}": float(i) for i in range(3)}
+    provider = SerialBatchProvider(prices, delay=0.2)
+    engine = QuoteEngine(provider, max_workers=4, timeout=0.3, batch_size=1)
+
+    batch = engine.fetch(list(prices))
+
+    # The second chunk waits 0.2s and then runs within its own 0.3s; the
+    # third cannot start before the batch's 0.3s start deadline
+    assert provider.max_running == 1
+    assert len(batch.prices) == 2
+    assert list(batch.failures.values()) == ["timed out waiting for a fetch worker"]
@@ -0,0 +1,54 @@
+from datetime import datetime, timezone
+from app.services.pnl_engine import BookValuation, MultiPortfolioBook
+from app.services.snapshots import SnapshotRollup, partition_bounds
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+def test_end_of_day_is_due_once_per_day_after_its_time():
+    rollup = SnapshotRollup("21:00")
+
+    assert rollup.due(utc(2024, 3, 5, 20, 59)) == []
+    assert rollup.due(utc(2024, 3, 5, 22, 30)) == [(utc(2024, 3, 5, 21, 0), True)]
+
+    rollup.mark_done(utc(2024, 3, 5, 21, 0), True)
+    assert rollup.due(utc(2024, 3, 5, 23, 0)) == []
+    assert rollup.due(utc(2024, 3, 6, 21, 0)) == [(utc(2024, 3, 6, 21, 0), True)]
+
+def test_intraday_slots_skip_the_end_of_day_time():
+    rollup = SnapshotRollup("21:00", intraday_interval=900)
+    rollup.mark_done(utc(2024, 3, 5, 21, 0), True)
+
+    assert rollup.due(utc(2024, 3, 5, 14, 7)) == [(utc(2024, 3, 5, 14, 0), False)]
+    rollup.mark_done(utc(2024, 3, 5, 14, 0), False)
+    assert rollup.due(utc(2024, 3, 5, 14, 14)) == []
+    assert rollup.due(utc(2024, 3, 5, 21, 5)) == []
+
+def test_partitions_are_monthly():
+    assert partition_bounds(utc(2024, 12, 31, 21, 0)) == (
+        "portfolio_snapshots_y2024m12", utc(2024, 12, 1), utc(2025, 1, 1)
+    )
+
+def test_portfolio_totals_match_per_portfolio_pnl():
+    rows = [
+        {"portfolio_id": "a", "cash_balance": 1000, "symbol": "AAPL", "net_quantity": 10,
+         "avg_price": 100.0, "total_invested": 1000.0},
+        {"portfolio_id": "a", "cash_balance": 1000, "symbol": "MSFT", "net_quantity": 5,
+         "avg_price": 200.0, "total_invested": 1000.0},
+        {"portfolio_id": "b", "cash_balance": 500, "symbol": None, "net_quantity": None,
+         "avg_price": None, "total_invested": None},
+        {"portfolio_id": "c", "cash_balance": 0, "symbol": "AAPL", "net_quantity": 1,
+         "avg_price": 90.0, "total_invested": 90.0},
+    ]
+    books = MultiPortfolioBook(rows, {"a": {"AAPL": 25.0}})
+    valuation = BookValuation(books.book, {"AAPL": 110.0, "MSFT": 190.0})
+
+    totals = books.portfolio_totals(valuation)
+
+    for index, pnl in enumerate(books.portfolio_pnls(valuation)):
+        assert round(totals["current_value"][index], 4) == float(pnl.current_value)
+        assert round(totals["unrealized_pnl"][index], 4) == float(pnl.unrealized_pnl)
+        assert round(totals["total_portfolio_value"][index], 4) == float(pnl.total_portfolio_value)
+        assert totals["realized_pnl"][index] == float(pnl.realized_pnl)
+        assert totals["position_count"][index] == len(pnl.positions_pnl)
+    assert totals["total_portfolio_value"].tolist() == [3050.0, 500.0, 110.0]
@@ -0,0 +1,68 @@
+import json
+import anyio
+import pytest
+from datetime import datetime, timezone
+from decimal import Decimal
+from app.api.streaming import closing_streaming_response
+from app.services.trade_export import _arrow_chunks, _csv_chunks, _ndjson_chunks
+
+ROWS = [
+    (1, "AAPL", "BUY", 10, Decimal("150.2500"), datetime(2024, 1, 2, 15, 0, tzinfo=timezone.utc), "default", "ACTIVE"),
+    (2, "AAPL", "SELL", 4, Decimal("151.0000"), datetime(2024, 1, 3, 15, 0, tzinfo=timezone.utc), "default", "ACTIVE"),
+]
+
+def test_csv_writes_header_once_then_rows_per_batch():
+    chunks = list(_csv_chunks(iter([ROWS[:1], ROWS[1:]])))
+
+    assert len(chunks) == 2
+    assert chunks[0].decode().splitlines()[0].startswith("id,symbol")
+    assert chunks[1].decode().startswith("2,AAPL,SELL,4,151.0000")
+
+def test_csv_empty_export_is_header_only():
+    assert b"".join(_csv_chunks(iter([]))).decode().strip() == "id,symbol,trade_type,quantity,price,trade_date,portfolio_id,status"
+
+def test_arrow_stream_round_trips():
+    pa = pytest.importorskip("pyarrow")
+
+    table = pa.ipc.open_stream(b"".join(_arrow_chunks(iter([ROWS[:1], ROWS[1:]])))).read_all()
+
+    assert table.num_rows == 2
+    assert table.column("price").to_pylist() == [Decimal("150.2500"), Decimal("151.0000")]
+
+def test_ndjson_writes_one_line_per_row():
+    chunks = list(_ndjson_chunks(iter([[('{"id": 1}',), ('{"id": 2}',)], [('{"id": 3}',)]])))
+
+    assert chunks == [b'{"id": 1}\n{"id": 2}\n', b'{"id": 3}\n']
+    assert [json.loads(line)["id"] for line in b"".join(chunks).splitlines()] == [1, 2, 3]
+
+def test_stream_is_closed_when_the_client_disconnects():
+    closed = []
+
+    def chunks():
+        try:
+            while True:
+                yield b"row\n"
+        finally:
+            closed.append(True)
+
+    response = closing_streaming_response(chunks(), media_type="application/x-ndjson")
+    sent = []
+
+    async def serve():
+        disconnected = anyio.Event()
+
+        async def receive():
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+            if len(sent) == 3:
+                disconnected.set()
+
+        await response({"type": "http"}, receive, send)
+
+    anyio.run(serve)
+
+    assert len(sent) >= 3 and sent[-1].get("more_body", True)  # the stream never finished
+    assert closed == [True]
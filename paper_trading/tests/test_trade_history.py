@@ -0,0 +1,57 @@
+import pytest
+from datetime import datetime, timezone
+from pydantic import ValidationError
+from app.core.exceptions import InvalidCursorException
+from app.models.trade import TradeCreate
+from app.services.trading_service import (
+    _history_filters,
+    _history_page,
+    _history_page_query,
+    decode_history_cursor,
+    encode_history_cursor
+)
+
+def test_cursor_round_trips():
+    trade_date = datetime(2024, 3, 1, 14, 30, 5, 123456, tzinfo=timezone.utc)
+
+    assert decode_history_cursor(encode_history_cursor(trade_date, 42)) == (trade_date, 42)
+
+@pytest.mark.parametrize("token", ["garbage", "", encode_history_cursor(datetime(2024, 1, 1), 1)])
+def test_invalid_cursor_is_rejected(token):
+    with pytest.raises(InvalidCursorException):
+        decode_history_cursor(token)
+
+def test_trade_symbols_are_normalized_on_input():
+    assert TradeCreate(symbol=" aapl ", trade_type="BUY", quantity=1).symbol == "AAPL"
+    with pytest.raises(ValidationError):
+        TradeCreate(symbol="   ", trade_type="BUY", quantity=1)
+
+def test_filters_lead_with_the_portfolio_and_match_stored_symbols():
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    filters = _history_filters("p1", "msft", "SELL", start, None)
+
+    assert filters.where == ("portfolio_id = %(portfolio_id)s::varchar AND symbol = %(symbol)s::varchar"
+                             " AND trade_type = %(trade_type)s::varchar AND trade_date >= %(start_date)s::timestamptz")
+    assert filters.params == {"portfolio_id": "p1", "symbol": "MSFT", "trade_type": "SELL", "start_date": start}
+
+def test_cursor_pages_by_keyset_and_pages_by_offset_without_one():
+    filters = _history_filters("p1", None, None, None, None)
+    trade_date = datetime(2024, 3, 1, tzinfo=timezone.utc)
+
+    query, params = _history_page_query(filters, 3, 50, None)
+    assert (params["limit"], params["offset"]) == (51, 100) and "after_id" not in params
+
+    query, params = _history_page_query(filters, 3, 50, encode_history_cursor(trade_date, 42))
+    assert "(trade_date, id) < (%(after_date)s::timestamptz, %(after_id)s::integer)" in query
+    assert (params["offset"], params["after_date"], params["after_id"]) == (0, trade_date, 42)
+
+def test_page_hands_out_a_cursor_only_when_more_rows_exist():
+    rows = [{"id": i, "symbol": "AAPL", "trade_type": "BUY", "quantity": 1, "price": 1,
+             "trade_date": datetime(2024, 3, i, tzinfo=timezone.utc), "portfolio_id": "p1", "status": "ACTIVE"}
+            for i in (3, 2, 1)]
+
+    page = _history_page(rows, 1, 2, None, "none")
+    assert [t.id for t in page["trades"]] == [3, 2]
+    assert decode_history_cursor(page["next_cursor"]) == (rows[1]["trade_date"], 2)
+    assert _history_page(rows, 1, 3, 3, "exact")["next_cursor"] is None
@@ -0,0 +1,211 @@
+import io
+from contextlib import contextmanager
+from datetime import datetime
+import psycopg2
+import pytest
+from psycopg2.extras import RealDictCursor
+from app.core.database import db_manager
+from app.core.exceptions import TradeImportRejectedException
+from app.core.migrations import MigrationRunner
+from app.models.trade import TradeCreate
+from app.services import trade_import
+from app.services.trade_import import STAGING_SQL, copy_csv, import_trades, load_staged_trades, read_csv_header
+from app.services.trading_service import TradingService
+
+def test_header_is_normalized_and_consumed():
+    file = io.BytesIO("﻿Symbol, Trade_Type,quantity,price\nAAPL,BUY,1,10\n".encode("utf-8"))
+
+    assert read_csv_header(file) == ["symbol", "trade_type", "quantity", "price"]
+    assert file.read() == b"AAPL,BUY,1,10\n"
+
+@pytest.mark.parametrize("header", ["symbol,quantity,price", "symbol,side,trade_type,quantity,price", "symbol,symbol,trade_type,quantity,price"])
+def test_unsupported_headers_are_rejected(header):
+    with pytest.raises(TradeImportRejectedException):
+        read_csv_header(io.BytesIO(f"{header}\n".encode()))
+
+class StagingCursor:
+    """Answers load_staged_trades' statements from a script, recording what ran"""
+
+    def __init__(self, staged=3, answers=None, rowcounts=None):
+        self.answers = answers or {}
+        self.rowcounts = dict({trade_import.NORMALIZE_SQL: staged}, **(rowcounts or {}))
+        self.executed = []
+        self.copied = []
+        self.rows = []
+        self.rowcount = 0
+        self.connection = self
+
+    def execute(self, sql, params=None):
+        self.executed.append(sql)
+        self.rows = self.answers.get(sql, [])
+        self.rowcount = self.rowcounts.get(sql, len(self.rows))
+
+    def fetchall(self):
+        return self.rows
+
+    def copy_expert(self, sql, file):
+        self.copied.append((sql, file.read()))
+
+    @contextmanager
+    def cursor(self, name=None):
+        # The FIFO/LIFO lot history stream; these scripts have no such positions
+        yield LotStream()
+
+class LotStream(list):
+    itersize = None
+
+    def execute(self, sql):
+        pass
+
+@pytest.fixture
+def stale_days(monkeypatch):
+    stale = []
+    monkeypatch.setattr(trade_import, "invalidate_daily_values", lambda cursor, days: stale.append(days))
+    return stale
+
+def rejection(cursor):
+    with pytest.raises(TradeImportRejectedException) as rejected:
+        load_staged_trades(cursor, "default")
+    return rejected.value.detail
+
+def test_rows_are_copied_into_the_header_columns():
+    cursor = StagingCursor()
+    file = io.BytesIO(b"Symbol,trade_type,quantity,price\naapl,buy,1,10\n")
+
+    copy_csv(cursor, file, read_csv_header(file))
+
+    assert cursor.copied == [("COPY trade_import_staging (symbol, trade_type, quantity, price) "
+                              "FROM STDIN WITH (FORMAT csv)", b"aapl,buy,1,10\n")]
+
+def test_empty_file_imports_nothing(stale_days):
+    cursor = StagingCursor(staged=0)
+
+    assert load_staged_trades(cursor, "default") == {"imported": 0, "positions_rebuilt": 0, "cash_adjustments": {}}
+    assert cursor.executed == [trade_import.NORMALIZE_SQL]
+
+def test_invalid_rows_reject_the_import_before_anything_is_written(stale_days):
+    cursor = StagingCursor(answers={trade_import.INVALID_ROWS_SQL: [{"line": 2}, {"line": 5}]})
+
+    detail = rejection(cursor)
+
+    assert detail["message"] == "Trade import rejected: Invalid trade rows"
+    assert [error["line"] for error in detail["rejected"]] == [2, 5]
+    assert trade_import.INSERT_TRADES_SQL not in cursor.executed and stale_days == []
+
+def test_unknown_portfolios_reject_the_import(stale_days):
+    cursor = StagingCursor(answers={trade_import.UNKNOWN_PORTFOLIOS_SQL: [{"portfolio_id": "nope"}]})
+
+    detail = rejection(cursor)
+
+    assert detail["rejected"] == [{"portfolio_id": "nope", "detail": "Portfolio not found"}]
+    assert trade_import.INSERT_TRADES_SQL not in cursor.executed
+
+def test_oversold_history_rejects_the_import_before_positions_are_written(stale_days):
+    cursor = StagingCursor(answers={trade_import.OVERSOLD_SQL: [{"portfolio_id": "default", "symbol": "AAPL"}]})
+
+    detail = rejection(cursor)
+
+    assert detail["message"] == "Trade import rejected: Insufficient shares"
+    assert detail["rejected"][0]["symbol"] == "AAPL"
+    assert trade_import.UPSERT_POSITIONS_SQL not in cursor.executed
+
+def test_overdrawn_cash_rejects_the_import(stale_days):
+    cursor = StagingCursor(answers={trade_import.CASH_SQL: [
+        {"portfolio_id": "default", "amount": -500, "cash_balance": -100},
+        {"portfolio_id": "other", "amount": 50, "cash_balance": 150},
+    ]})
+
+    detail = rejection(cursor)
+
+    assert detail["message"] == "Trade import rejected: Insufficient funds"
+    assert detail["rejected"] == [{"portfolio_id": "default", "detail": "Cash balance would be -100"}]
+
+def test_valid_import_rebuilds_positions_and_reports_cash(stale_days):
+    day = datetime(2026, 1, 2).date()
+    cursor = StagingCursor(
+        answers={
+            trade_import.STALE_DAYS_SQL: [{"portfolio_id": "default", "day": day}],
+            trade_import.CASH_SQL: [{"portfolio_id": "default", "amount": -100, "cash_balance": 900}],
+        },
+        rowcounts={trade_import.UPSERT_POSITIONS_SQL: 2, trade_import.DELETE_CLOSED_POSITIONS_SQL: 1},
+    )
+
+    result = load_staged_trades(cursor, "default")
+
+    assert result == {"imported": 3, "positions_rebuilt": 3, "cash_adjustments": {"default": -100}}
+    assert stale_days == [{"default": day}]
+    # Portfolios are locked before the trades land, and positions are rebuilt after
+    executed = cursor.executed.index
+    assert executed(trade_import.LOCK_PORTFOLIOS_SQL) < executed(trade_import.INSERT_TRADES_SQL) \
+        < executed(trade_import.REBUILD_SQL) < executed(trade_import.UPSERT_POSITIONS_SQL)
+
+def test_unsupported_header_is_rejected_before_copying(monkeypatch):
+    cursor = StagingCursor()
+
+    @contextmanager
+    def get_cursor():
+        yield cursor, None
+
+    monkeypatch.setattr(trade_import.db_manager, "get_cursor", get_cursor)
+
+    with pytest.raises(TradeImportRejectedException):
+        import_trades(io.BytesIO(b"symbol,side,quantity,price\nAAPL,BUY,1,10\n"), "csv", "default", 100)
+    assert cursor.executed == [STAGING_SQL] and cursor.copied == []
+
+@pytest.fixture
+def db_cursor():
+    """A cursor on the configured database, migrated; everything it does is rolled back"""
+    try:
+        conn = psycopg2.connect(**db_manager.connection_params, connect_timeout=2)
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"Database unavailable: {e}")
+    conn.close()
+    MigrationRunner(db_manager.connection_params).migrate()
+    conn = psycopg2.connect(**db_manager.connection_params)
+    try:
+        yield conn.cursor(cursor_factory=RealDictCursor)
+    finally:
+        conn.rollback()
+        conn.close()
+
+IMPORTED_TRADES = [
+    ("AAPL", "BUY", 7, 189.97999572753906),
+    ("AAPL", "BUY", 3, 190.12345),
+    ("AAPL", "SELL", 4, 191.55555),
+    ("MSFT", "BUY", 5, 410.00005),
+    ("MSFT", "SELL", 5, 409.99995),
+]
+
+@pytest.mark.parametrize("method", ["AVERAGE", "FIFO"])
+def test_rebuilt_positions_and_cash_match_live_trades(db_cursor, method):
+    cursor = db_cursor
+    live, imported = "import-test-live", "import-test-imported"
+    cursor.execute("""
+        INSERT INTO portfolio (portfolio_id, cash_balance, total_value, cost_basis_method)
+        VALUES (%(live)s, 100000, 100000, %(method)s), (%(imported)s, 100000, 100000, %(method)s)
+    """, {"live": live, "imported": imported, "method": method})
+
+    service = TradingService()
+    for symbol, trade_type, quantity, price in IMPORTED_TRADES:
+        trade = TradeCreate(symbol=symbol, trade_type=trade_type, quantity=quantity, portfolio_id=live)
+        service.execute_trade(cursor, trade, price)
+
+    cursor.execute(STAGING_SQL)
+    rows = "".join(f"{symbol},{trade_type},{quantity},{price!r}\n" for symbol, trade_type, quantity, price in IMPORTED_TRADES)
+    file = io.BytesIO(f"symbol,trade_type,quantity,price\n{rows}".encode())
+    copy_csv(cursor, file, read_csv_header(file))
+    result = load_staged_trades(cursor, imported)
+    assert result["imported"] == len(IMPORTED_TRADES)
+
+    def state(portfolio_id):
+        cursor.execute("""
+            SELECT symbol, net_quantity, avg_price, total_invested FROM positions
+            WHERE portfolio_id = %s ORDER BY symbol
+        """, (portfolio_id,))
+        positions = [dict(row) for row in cursor.fetchall()]
+        cursor.execute("SELECT cash_balance FROM portfolio WHERE portfolio_id = %s", (portfolio_id,))
+        return positions, cursor.fetchone()['cash_balance']
+
+    live_positions, live_cash = state(live)
+    assert [row['symbol'] for row in live_positions] == ["AAPL"]
+    assert state(imported) == (live_positions, live_cash)
@@ -0,0 +1,133 @@
+import json
+import time
+from contextlib import contextmanager
+import pytest
+from app.services import trade_journal
+from app.services.portfolio_state import PortfolioStateManager
+from app.services.trade_journal import TradeJournal, read_segment
+from app.models.trade import TradeCreate
+
+def test_torn_final_entry_is_dropped(tmp_path):
+    segment = tmp_path / "000000000001.journal"
+    entries = [{"id": 1, "symbol": "AAPL"}, {"id": 2, "symbol": "MSFT"}]
+    segment.write_text("".join(json.dumps(e) + "\n" for e in entries) + '{"id": 3, "sym')
+
+    assert read_segment(str(segment)) == entries
+
+def test_closed_journal_refuses_trades(tmp_path):
+    journal = TradeJournal(str(tmp_path))
+
+    with pytest.raises(RuntimeError):
+        journal.submit(TradeCreate(symbol="AAPL", trade_type="BUY", quantity=1), 100.0)
+    assert not journal.is_open and journal.stats()["acknowledged"] == 0
+
+def journal_over(tmp_path, monkeypatch, database):
+    """An open journal whose states load from ``database`` and whose flushes are recorded"""
+    states = PortfolioStateManager(ttl=60)
+
+    def load(portfolio_id):
+        states._loads += 1
+        states._cash[portfolio_id] = database[portfolio_id]
+        states._symbols[portfolio_id] = set()
+        for symbol in [key[1] for key in states._positions if key[0] == portfolio_id]:
+            states._positions.pop((portfolio_id, symbol))
+        states._loaded_at[portfolio_id] = time.monotonic()
+
+    states._load = load
+    flushed = []
+    monkeypatch.setattr(trade_journal, "write_entries", lambda entries: flushed.append(list(entries)))
+    journal = TradeJournal(str(tmp_path), flush_interval=60, states=states)
+    journal._ids.extend(range(1, 100))
+    journal.open()
+    return journal, states, flushed
+
+def buy(quantity):
+    return TradeCreate(symbol="AAPL", trade_type="BUY", quantity=quantity)
+
+def test_submitted_trades_are_flushed_in_order(tmp_path, monkeypatch):
+    journal, states, flushed = journal_over(tmp_path, monkeypatch, {"default": 1000.0})
+
+    first = journal.submit(buy(5), 10.00004)
+    journal.submit(buy(5), 20.0)
+    assert journal.stats()["pending"] == 2
+    assert journal.flush() == 2
+
+    assert first.id == 1 and first.price == 10.0
+    assert [(e["id"], e["position"]) for e in flushed[0]] == [(1, [5, 10.0, 50.0]), (2, [10, 15.0, 150.0])]
+    assert journal.stats()["pending"] == 0
+    assert len(list(tmp_path.glob("*.journal"))) == 1  # only the fresh segment
+    journal.close()
+    assert list(tmp_path.glob("*.journal")) == []
+
+def test_failed_append_leaves_the_trade_unexecuted(tmp_path, monkeypatch):
+    journal, states, flushed = journal_over(tmp_path, monkeypatch, {"default": 1000.0})
+
+    def fail(data):
+        raise OSError("No space left on device")
+    monkeypatch.setattr(journal._segment, "append", fail)
+    with pytest.raises(OSError):
+        journal.submit(buy(5), 10.0)
+
+    assert journal.stats()["acknowledged"] == 0 and journal.stats()["pending"] == 0
+    with states.lock("default"):
+        assert states.apply(buy(100), 10.0) == (None, 0.0)
+    # Reloaded before the trade rather than on its rejection
+    assert states.stats()["reloads_on_reject"] == 0
+    assert states.position("default", "AAPL").quantity == 100
+
+def test_failed_sync_withdraws_the_trade(tmp_path, monkeypatch):
+    journal, states, flushed = journal_over(tmp_path, monkeypatch, {"default": 1000.0})
+    journal.submit(buy(1), 10.0)
+
+    def fail(upto):
+        raise OSError("I/O error")
+    monkeypatch.setattr(journal._segment, "sync", fail)
+    with pytest.raises(OSError):
+        journal.submit(buy(5), 10.0)
+
+    segment = next(tmp_path.glob("*.journal"))
+    assert [e.get("id", e.get("withdrawn")) for e in read_segment(str(segment))] == [1, 2, 2]
+    assert journal.flush() == 1
+    assert [e["id"] for e in flushed[0]] == [1]
+    journal.close()
+
+def test_open_writes_leftover_segments_without_withdrawn_trades(tmp_path, monkeypatch):
+    entries = [{"id": i, "symbol": "AAPL"} for i in range(1, 4)]
+    (tmp_path / "000000000007.journal").write_text("".join(json.dumps(e) + "\n" for e in entries[:2]))
+    (tmp_path / "000000000008.journal").write_text(json.dumps(entries[2]) + '\n{"withdrawn": 2}\n')
+
+    journal, states, flushed = journal_over(tmp_path, monkeypatch, {})
+
+    assert flushed == [[entries[0]], [entries[2]]]
+    assert [path.name for path in tmp_path.glob("*.journal")] == ["000000000009.journal"]
+    assert journal.stats()["flushed"] == 2
+    journal.close()
+
+class FakeCursor:
+    pass
+
+def test_reflushed_entries_apply_only_newly_inserted_trades(monkeypatch):
+    @contextmanager
+    def get_cursor():
+        yield FakeCursor(), None
+
+    written = {}
+    monkeypatch.setattr(trade_journal.db_manager, "get_cursor", get_cursor)
+    # Trade 1 was inserted by a flush that crashed before removing its segment
+    monkeypatch.setattr(trade_journal, "execute_values", lambda *args, **kwargs: [{"id": 2}])
+    monkeypatch.setattr(trade_journal, "write_positions",
+                        lambda cursor, positions, *args: written.update(positions=positions))
+    monkeypatch.setattr(trade_journal, "write_lots", lambda cursor, lots: written.update(lots=lots))
+    monkeypatch.setattr(trade_journal, "write_realized", lambda cursor, rows: written.update(realized=rows))
+    monkeypatch.setattr(trade_journal, "write_cash_deltas", lambda cursor, deltas: written.update(cash=deltas))
+
+    trade_journal.write_entries([
+        {"id": 1, "symbol": "AAPL", "trade_type": "BUY", "quantity": 10, "price": 10.0,
+         "trade_date": "2026-01-02T00:00:00+00:00", "portfolio_id": "default", "position": [10, 10.0, 100.0]},
+        {"id": 2, "symbol": "AAPL", "trade_type": "SELL", "quantity": 4, "price": 12.0, "realized": 8.0,
+         "trade_date": "2026-01-02T00:00:01+00:00", "portfolio_id": "default", "position": [6, 10.0, 60.0]},
+    ])
+
+    assert {key: (p.quantity, p.invested) for key, p in written["positions"].items()} == {("default", "AAPL"): (6, 60.0)}
+    assert written["realized"] == [(2, "default", "AAPL", 4, 40.0, 8.0)]
+    assert written["cash"] == {"default": 48.0}
@@ -0,0 +1,202 @@
+import asyncio
+import pytest
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from app.core.exceptions import (
+    InsufficientFundsException,
+    InsufficientSharesException,
+    PortfolioNotFoundException,
+    TradeBatchRejectedException
+)
+from app.models.trade import TradeCreate
+from app.services import trading_service
+from app.services.cost_basis import PositionState
+from app.services.portfolio_state import apply_trade
+from app.services.trading_service import TradingService
+from app.utils.helpers import round_price
+
+def test_prices_are_rounded_half_up_to_four_places():
+    assert round_price(189.97999572753906) == 189.98
+    assert round_price(1.00005) == 1.0001
+    assert round_price(150.0) == 150.0
+
+def test_trade_value_uses_the_rounded_price():
+    trade = TradeCreate(symbol="AAPL", trade_type="BUY", quantity=10)
+
+    params = TradingService._trade_params(trade, round_price(189.97999572753906))
+
+    assert params["price"] == 189.98
+    assert params["value"] == 189.98 * 10
+
+def test_rejections_explain_the_failed_check():
+    buy = TradeCreate(symbol="AAPL", trade_type="BUY", quantity=10)
+    sell = TradeCreate(symbol="AAPL", trade_type="SELL", quantity=10, portfolio_id="p1")
+    params = TradingService._trade_params(buy, 150.0)
+
+    funds = TradingService._rejection(buy, params, {"cash_balance": 100, "net_quantity": 0})
+    shares = TradingService._rejection(sell, params, {"cash_balance": 100, "net_quantity": 4})
+    missing = TradingService._rejection(sell, params, None)
+
+    assert isinstance(funds, InsufficientFundsException)
+    assert funds.detail == "Required: $1500.00, Available: $100.00"
+    assert isinstance(shares, InsufficientSharesException)
+    assert shares.detail == "Required: 10, Available: 4"
+    assert isinstance(missing, PortfolioNotFoundException)
+    assert missing.status_code == 404
+
+def trade(trade_type, quantity, price=100.0, portfolio_id="default"):
+    return TradeCreate(symbol="AAPL", trade_type=trade_type, quantity=quantity, price=price,
+                       portfolio_id=portfolio_id)
+
+def test_position_state_averages_buys_and_scales_down_on_sells():
+    position = PositionState()
+    position.apply("BUY", 10, 100.0)
+    position.apply("BUY", 10, 110.0)
+
+    assert position.apply("SELL", 5, 120.0) == pytest.approx(5 * 120.0 - 525.0)
+    assert (position.quantity, position.avg_price, position.invested) == (15, 105.0, 1575.0)
+    position.apply("SELL", 15, 90.0)
+    assert (position.quantity, position.avg_price, position.invested) == (0, 0, 0)
+
+def test_batch_trades_are_validated_against_the_ones_before_them():
+    cash, positions = {"default": 1000.0}, {}
+
+    results = [apply_trade(t, t.price, cash, positions) for t in
+               (trade("BUY", 5), trade("BUY", 6), trade("SELL", 5, 110.0), trade("SELL", 1))]
+
+    assert [error is None for error, _ in results] == [True, False, True, False]
+    assert isinstance(results[1][0], InsufficientFundsException)
+    assert isinstance(results[3][0], InsufficientSharesException)
+    assert results[2][1] == 50.0
+    assert cash == {"default": 1050.0} and positions[("default", "AAPL")].quantity == 0
+
+def test_rejected_trade_leaves_state_untouched():
+    cash = {"default": 1000.0}
+    positions = {("default", "AAPL"): PositionState(3, 100.0, 300.0)}
+
+    for rejected in (trade("BUY", 11), trade("SELL", 4), trade("BUY", 1, portfolio_id="nope")):
+        error, realized = apply_trade(rejected, rejected.price, cash, positions)
+        assert error is not None and realized == 0.0
+
+    position = positions[("default", "AAPL")]
+    assert cash == {"default": 1000.0}
+    assert (position.quantity, position.avg_price, position.invested) == (3, 100.0, 300.0)
+    assert list(positions) == [("default", "AAPL")]
+
+class BatchCursor:
+    """Answers the batch's locking reads for one AVERAGE portfolio with no positions"""
+
+    def __init__(self, cash):
+        self.cash = cash
+        self.rows = []
+
+    def execute(self, sql, params=None):
+        if "FROM portfolio" in sql:
+            self.rows = [{"portfolio_id": pid, "cash_balance": balance, "cost_basis_method": "AVERAGE"}
+                         for pid, balance in self.cash.items() if pid in params[0]]
+        elif "nextval" in sql:
+            self.rows = [{"id": i} for i in range(1, params[0] + 1)]
+        else:
+            self.rows = []
+
+    def fetchall(self):
+        return self.rows
+
+@pytest.fixture
+def batch_database(monkeypatch):
+    """Runs place_trades_batch over BatchCursor and records what it writes"""
+    written = {"trades": [], "cash": None}
+
+    @contextmanager
+    def get_cursor():
+        yield BatchCursor({"default": 1000.0}), None
+
+    def insert(cursor, sql, rows, fetch=False, page_size=100):
+        written["trades"] += rows
+        return [{"id": row[0], "symbol": row[1], "trade_type": row[2], "quantity": row[3], "price": row[4],
+                 "trade_date": datetime.now(timezone.utc), "portfolio_id": row[5], "status": "ACTIVE"}
+                for row in rows]
+
+    monkeypatch.setattr(trading_service.db_manager, "get_cursor", get_cursor)
+    monkeypatch.setattr(trading_service, "execute_values", insert)
+    for name in ("write_positions", "write_lots", "write_realized"):
+        monkeypatch.setattr(trading_service, name, lambda *args: None)
+    monkeypatch.setattr(trading_service, "write_cash_deltas",
+                        lambda cursor, deltas: written.update(cash=deltas))
+    return written
+
+def test_atomic_batch_rejects_everything_on_one_failure(batch_database):
+    with pytest.raises(TradeBatchRejectedException) as rejected:
+        TradingService().place_trades_batch([trade("BUY", 5), trade("BUY", 6)])
+
+    assert [error["index"] for error in rejected.value.detail["rejected"]] == [1]
+    assert batch_database == {"trades": [], "cash": None}
+
+def test_non_atomic_batch_executes_what_it_can(batch_database):
+    result = TradingService().place_trades_batch(
+        [trade("BUY", 5), trade("BUY", 6), trade("SELL", 2, 110.0)], atomic=False
+    )
+
+    assert [t.id for t in result["executed"]] == [1, 3]
+    assert [(error.index, error.detail) for error in result["rejected"]] == [
+        (1, "Required: $600.00, Available: $500.00")
+    ]
+    assert batch_database["cash"] == {"default": -500.0 + 220.0}
+    assert result["executed"][1].realized_pnl == 20.0
+
+class ScriptedCursor:
+    """Answers each statement with the next rows scripted for it, recording what ran"""
+
+    def __init__(self, script):
+        self.script = {sql: list(answers) for sql, answers in script.items()}
+        self.executed = []
+        self.rows = []
+
+    def execute(self, sql, params=None):
+        self.executed.append(sql)
+        answers = self.script.get(sql)
+        self.rows = answers.pop(0) if answers else []
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+class AsyncScriptedCursor(ScriptedCursor):
+    async def execute(self, sql, params=None):
+        super().execute(sql, params)
+
+def fifo_sell_script():
+    now = datetime(2026, 1, 2, tzinfo=timezone.utc)
+    return {
+        trading_service.SELL_SQL: [[{"id": None, "cost_basis_method": "FIFO"}]],
+        trading_service.FIFO_LOTS_SQL: [[{"trade_id": 1, "quantity": 4, "price": 90, "opened_at": now},
+                                         {"trade_id": 2, "quantity": 6, "price": 95, "opened_at": now}]],
+        trading_service.SELL_LOTS_SQL: [[{"id": 3, "symbol": "AAPL", "trade_type": "SELL", "quantity": 10,
+                                          "price": 100, "trade_date": now, "portfolio_id": "default",
+                                          "status": "ACTIVE", "realized_pnl": 70, "remaining_quantity": 0}]],
+    }
+
+def test_sync_and_async_paths_run_the_same_trade_statements():
+    sync_cursor, async_cursor = ScriptedCursor(fifo_sell_script()), AsyncScriptedCursor(fifo_sell_script())
+    service = TradingService()
+
+    sync_result = service.execute_trade(sync_cursor, trade("SELL", 10), 100.0)
+    async_result = asyncio.run(trading_service._run_statements_async(
+        async_cursor, service._trade_statements(trade("SELL", 10), 100.0)
+    ))
+
+    assert sync_cursor.executed == async_cursor.executed == [
+        trading_service.SELL_SQL, trading_service.FIFO_LOTS_SQL,
+        trading_service.SELL_LOTS_SQL, trading_service.CLOSE_POSITION_SQL,
+    ]
+    assert sync_result == async_result
+    assert sync_result.id == 3 and float(sync_result.realized_pnl) == 70
+
+def test_unmatched_trade_statement_reports_the_rejection():
+    cursor = ScriptedCursor({trading_service.REJECTION_SQL: [[{"cash_balance": 100, "net_quantity": 0}]]})
+
+    with pytest.raises(InsufficientFundsException):
+        TradingService().execute_trade(cursor, trade("BUY", 10), 100.0)
+    assert cursor.executed == [trading_service.BUY_SQL, trading_service.REJECTION_SQL]